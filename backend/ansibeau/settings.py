@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 from decouple import Csv, config
@@ -65,6 +66,16 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
+    # Request duration metrics, covering the middleware listed after it
+    "api.middleware.MetricsMiddleware",
+    # Request profiles, covering the middleware listed after it (but not
+    # the metrics above)
+    "api.middleware.RequestProfilingMiddleware",
+    # Compression must run after (i.e. be listed before) anything that
+    # modifies the response body
+    "api.middleware.CompressionMiddleware",
+    # Query counts, covering the middleware listed after it
+    "api.middleware.QueryCountMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     # CORS middleware must be before CommonMiddleware
     "corsheaders.middleware.CorsMiddleware",
@@ -115,6 +126,25 @@ if config("DJANGO_PROD", default=False, cast=bool):
         "PORT": config("DB_PORT", cast=int),
     }
 
+# Read replicas (see api.db_router): comma-separated PostgreSQL hostnames in
+# production, SQLite database paths in development. Read-only API endpoints
+# are served from a replica unless it lags more than REPLICA_MAX_LAG seconds
+# behind the primary (checked at most every REPLICA_CHECK_INTERVAL seconds).
+DATABASE_REPLICAS = []
+for index, replica in enumerate(config("DB_REPLICAS", default="", cast=Csv())):
+    alias = f"replica{index + 1}"
+    if config("DJANGO_PROD", default=False, cast=bool):
+        DATABASES[alias] = {**DATABASES["default"], "HOST": replica}
+    else:
+        DATABASES[alias] = {"ENGINE": "django.db.backends.sqlite3", "NAME": replica}
+    # Tests run against the primary only
+    DATABASES[alias]["TEST"] = {"MIRROR": "default"}
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ["api.db_router.ReplicaRouter"]
+REPLICA_MAX_LAG = config("REPLICA_MAX_LAG", default=5, cast=float)
+REPLICA_CHECK_INTERVAL = config("REPLICA_CHECK_INTERVAL", default=5, cast=float)
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -164,14 +194,130 @@ DEFAULT_AUTO_FIELD = "api.fields.UUIDAutoField"
 # Set to False to disable token requirement on POST /api/logs/
 AUTH_REQUIRED = config("AUTH_REQUIRED", default=True, cast=bool)
 
+# Log uploads (multipart files and raw text/plain bodies)
+# Uploads are kept in memory up to FILE_UPLOAD_MAX_MEMORY_SIZE bytes and spooled
+# to a temporary file beyond that. LOG_UPLOAD_MAX_SIZE caps the size of a log
+# after gzip decompression.
+FILE_UPLOAD_MAX_MEMORY_SIZE = config(
+    "FILE_UPLOAD_MAX_MEMORY_SIZE", default=2 * 1024 * 1024, cast=int
+)
+LOG_UPLOAD_MAX_SIZE = config("LOG_UPLOAD_MAX_SIZE", default=200 * 1024 * 1024, cast=int)
+# Maximum number of logs per batch upload (POST /api/logs/batch/), whose
+# total size is also capped by LOG_UPLOAD_MAX_SIZE
+LOG_BATCH_MAX_ENTRIES = config("LOG_BATCH_MAX_ENTRIES", default=1000, cast=int)
+# Dry runs (POST /api/logs/?dry_run=1, admin preview) parse at most the first
+# LOG_PREVIEW_MAX_SIZE bytes of a log, cut at a line boundary
+LOG_PREVIEW_MAX_SIZE = config(
+    "LOG_PREVIEW_MAX_SIZE", default=10 * 1024 * 1024, cast=int
+)
+
+# Raw log storage (see api.services.raw_storage)
+# "db" stores compressed logs in the RawLogBlob table, "filesystem" stores them
+# as files under RAW_LOG_STORAGE_DIR. New logs are compressed with zstd when
+# the zstandard module is installed, gzip otherwise (or RAW_LOG_COMPRESSION).
+RAW_LOG_STORAGE = config("RAW_LOG_STORAGE", default="db")
+RAW_LOG_STORAGE_DIR = config("RAW_LOG_STORAGE_DIR", default=str(BASE_DIR / "raw_logs"))
+RAW_LOG_COMPRESSION = config("RAW_LOG_COMPRESSION", default=None)
+
+# Monthly range partitioning of the Task table (PostgreSQL only, see
+# api.services.partitions). Experimental: the table rebuild of migration 0011
+# and of manage_partitions is only covered by the PostgreSQL-only
+# PartitioningTests. Enable before the first migration, or run
+# "manage.py manage_partitions --convert" to convert an existing table.
+# manage_partitions keeps TASK_PARTITION_MONTHS_AHEAD months created ahead.
+TASK_PARTITIONING = config("TASK_PARTITIONING", default=False, cast=bool)
+TASK_PARTITION_MONTHS_AHEAD = config("TASK_PARTITION_MONTHS_AHEAD", default=3, cast=int)
+
+# Log parsing process pool (see api.services.parse_pool)
+# Uploaded logs are parsed in PARSE_POOL_WORKERS processes per server process
+# (0 parses in the request thread). At most PARSE_POOL_MAX_PENDING parses are
+# queued or running at once; further uploads wait for a slot.
+PARSE_POOL_WORKERS = config(
+    "PARSE_POOL_WORKERS", default=min(4, os.cpu_count() or 1), cast=int
+)
+PARSE_POOL_MAX_PENDING = config(
+    "PARSE_POOL_MAX_PENDING", default=PARSE_POOL_WORKERS * 4, cast=int
+)
+
+# Serve the read-only log, host, play and history endpoints with async views
+# (api.async_views). Only useful under an ASGI server, see docker/entrypoint.api.sh
+API_ASYNC_VIEWS = config("API_ASYNC_VIEWS", default=False, cast=bool)
+
+# Live log event streams (see api.services.live_events)
+# Each server process polls the events of a watched log every
+# LIVE_EVENTS_POLL_INTERVAL seconds, and sends a keep-alive comment to idle
+# clients every LIVE_EVENTS_HEARTBEAT seconds.
+LIVE_EVENTS_POLL_INTERVAL = config("LIVE_EVENTS_POLL_INTERVAL", default=1.0, cast=float)
+LIVE_EVENTS_HEARTBEAT = config("LIVE_EVENTS_HEARTBEAT", default=15.0, cast=float)
+
+# In-process token validation cache (see api.services.token_cache)
+# Token changes made in the admin reach other worker processes after at most
+# TOKEN_CACHE_TTL seconds. Set to 0 to disable caching.
+TOKEN_CACHE_TTL = config("TOKEN_CACHE_TTL", default=10, cast=float)
+TOKEN_CACHE_MAX_SIZE = config("TOKEN_CACHE_MAX_SIZE", default=1024, cast=int)
+
 # CORS Configuration
 # Allow frontend development server to make requests to the backend
 CORS_ALLOWED_ORIGINS = config(
     "CORS_ALLOWED_ORIGINS", default="http://localhost:5173", cast=Csv()
 )
 
+# API response compression
+# Responses under API_COMPRESSION_PATH_PREFIXES larger than this many bytes are
+# compressed with zstd, brotli (when installed) or gzip
+API_COMPRESSION_MIN_SIZE = config("API_COMPRESSION_MIN_SIZE", default=1024, cast=int)
+API_COMPRESSION_PATH_PREFIXES = ["/api/"]
+
+# Add an X-DB-Queries header (queries run by each request) to responses, for
+# the loadtest command. Leave disabled in production.
+API_QUERY_COUNT_HEADER = config("API_QUERY_COUNT_HEADER", default=False, cast=bool)
+
+# Request profiling: a Server-Timing header and a log line per request with
+# the total, database, parse and serialization times. A fraction of the
+# requests (API_PROFILING_SAMPLE_RATE, e.g. 0.01) also runs under cProfile,
+# and the profiles of the slowest API_PROFILING_SLOWEST_PERCENT % are
+# written to API_PROFILING_DIR. cProfile only sees the views of WSGI
+# servers (runserver): requests served over ASGI are not sampled.
+API_PROFILING = config("API_PROFILING", default=False, cast=bool)
+API_PROFILING_SAMPLE_RATE = config("API_PROFILING_SAMPLE_RATE", default=0.0, cast=float)
+API_PROFILING_SLOWEST_PERCENT = config(
+    "API_PROFILING_SLOWEST_PERCENT", default=1.0, cast=float
+)
+API_PROFILING_DIR = config("API_PROFILING_DIR", default=str(BASE_DIR / "profiles"))
+
+# Prometheus metrics served at /metrics (see api.services.metrics): parse
+# and storage times, log sizes and request durations. Each server process
+# adds its metrics to the METRICS_DB SQLite file at most every
+# METRICS_FLUSH_INTERVAL seconds, so that the metrics of all the gunicorn
+# workers add up whichever one is scraped. Set METRICS_TOKEN to require an
+# "Authorization: Bearer <token>" header from the scraper.
+METRICS_ENABLED = config("METRICS_ENABLED", default=False, cast=bool)
+METRICS_DB = config("METRICS_DB", default=str(BASE_DIR / "metrics.sqlite3"))
+METRICS_FLUSH_INTERVAL = config("METRICS_FLUSH_INTERVAL", default=1.0, cast=float)
+METRICS_TOKEN = config("METRICS_TOKEN", default="")
+
+# Request profiles are logged as one JSON object per line
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {"console": {"class": "logging.StreamHandler"}},
+    "loggers": {
+        "api.profiling": {"handlers": ["console"], "level": "INFO", "propagate": False}
+    },
+}
+
 # Django REST Framework Configuration
 REST_FRAMEWORK = {
+    # orjson-backed JSON (de)serialization, falls back to stdlib json
+    "DEFAULT_RENDERER_CLASSES": [
+        "api.renderers.FastJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ],
+    "DEFAULT_PARSER_CLASSES": [
+        "api.parsers.FastJSONParser",
+        "rest_framework.parsers.FormParser",
+        "rest_framework.parsers.MultiPartParser",
+    ],
     "DEFAULT_PERMISSION_CLASSES": [
         "rest_framework.permissions.AllowAny",  # Open for development
     ],
@@ -17,7 +17,11 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 
+from api.views import metrics_view
+
 urlpatterns = [
     path("admin/", admin.site.urls),
     path("api/", include("api.urls")),
+    # Prometheus metrics (METRICS_ENABLED), not proxied by the Docker nginx
+    path("metrics", metrics_view, name="metrics"),
 ]
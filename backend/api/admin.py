@@ -1,12 +1,22 @@
-from django.contrib import admin
-from django.db.models import Q
+from django.contrib import admin, messages
+from django.db import transaction
+from django.db.models import Count, Exists, Max, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 from django.shortcuts import render
 from django.urls import path
 from django.utils.html import format_html
 
 from .models import Host, Log, Play, Task, Token
 from .services.log_creator import create_log_entities
-from .services.log_parser import LogParserService
+from .services.log_preview import preview_log
+from .services.metrics import PERSIST_DURATION
+from .services.parse_pool import parse_log
+from .services.purge import count_purge, purge_logs
+from .services.raw_storage import attach_raw_content, collect_garbage
+from .services.token_cache import token_cache
+
+# Rows the purge action deletes within a request; use purge_logs beyond that
+PURGE_ACTION_MAX_ROWS = 50_000
 
 
 # Custom List Filters
@@ -25,10 +35,11 @@ class HasFailuresFilter(admin.SimpleListFilter):
         )
 
     def queryset(self, request, queryset):
+        # Stored flag, indexed with the upload time the changelist sorts on
         if self.value() == "yes":
-            return queryset.filter(hosts__plays__status="failed").distinct()
+            return queryset.filter(has_failures=True)
         if self.value() == "no":
-            return queryset.exclude(hosts__plays__status="failed").distinct()
+            return queryset.filter(has_failures=False)
         return queryset
 
 
@@ -46,15 +57,17 @@ class PlayStatusFilter(admin.SimpleListFilter):
         )
 
     def queryset(self, request, queryset):
+        # Semi-joins on the (host, status) play index, instead of joining
+        # every play and removing the duplicate hosts
+        plays = Play.objects.filter(host=OuterRef("pk"))
         if self.value() == "failed":
-            return queryset.filter(plays__status="failed").distinct()
+            return queryset.filter(Exists(plays.filter(status="failed")))
         if self.value() == "changed":
-            return queryset.filter(plays__status="changed").distinct()
+            return queryset.filter(Exists(plays.filter(status="changed")))
         if self.value() == "ok":
-            return (
-                queryset.filter(plays__status="ok")
-                .exclude(Q(plays__status="changed") | Q(plays__status="failed"))
-                .distinct()
+            return queryset.filter(
+                Exists(plays.filter(status="ok")),
+                ~Exists(plays.filter(status__in=["changed", "failed"])),
             )
         return queryset
 
@@ -94,25 +107,63 @@ class TaskCountRangeFilter(admin.SimpleListFilter):
         )
 
     def queryset(self, request, queryset):
+        # Ranges of the stored, indexed total (ok + changed + failed)
         if self.value() == "0-5":
-            return queryset.filter(
-                tasks_ok__lte=5, tasks_changed__lte=5, tasks_failed__lte=5
-            )
+            return queryset.filter(tasks_total__lte=5)
         if self.value() == "6-10":
-            return queryset.filter(
-                tasks_ok__lte=10, tasks_changed__lte=10, tasks_failed__lte=10
-            ).exclude(tasks_ok__lte=5, tasks_changed__lte=5, tasks_failed__lte=5)
+            return queryset.filter(tasks_total__range=(6, 10))
         if self.value() == "11-20":
-            return queryset.filter(
-                tasks_ok__lte=20, tasks_changed__lte=20, tasks_failed__lte=20
-            ).exclude(tasks_ok__lte=10, tasks_changed__lte=10, tasks_failed__lte=10)
+            return queryset.filter(tasks_total__range=(11, 20))
         if self.value() == "20+":
-            return queryset.filter(
-                Q(tasks_ok__gt=20) | Q(tasks_changed__gt=20) | Q(tasks_failed__gt=20)
-            )
+            return queryset.filter(tasks_total__gt=20)
         return queryset
 
 
+class RelatedLabelListFilter(admin.RelatedFieldListFilter):
+    """
+    Related object filter listing its choices in one query.
+
+    The default filter runs a query per choice when the label of the related
+    object follows a foreign key, e.g. a host shows the title of its log.
+    """
+
+    def field_choices(self, field, request, model_admin):
+        ordering = self.field_admin_ordering(field, request, model_admin)
+        queryset = field.related_model._default_manager.select_related()
+        if ordering:
+            queryset = queryset.order_by(*ordering)
+        return [(obj.pk, str(obj)) for obj in queryset]
+
+
+# Changelist Annotations
+
+
+def related_aggregate(queryset, outer_field: str, aggregate):
+    """
+    Aggregate the rows of `queryset` whose `outer_field` is the outer row.
+
+    Used as a correlated subquery annotation, computed for the rows of the
+    displayed page only, instead of grouping the joined tables of the whole
+    changelist or running a query per row.
+    """
+    return Subquery(
+        queryset.filter(**{outer_field: OuterRef("pk")})
+        .order_by()
+        .values(outer_field)
+        .annotate(value=aggregate)
+        .values("value")
+    )
+
+
+def related_count(queryset, outer_field: str):
+    """Number of rows of `queryset` related to the outer row (0 if none)."""
+    return Coalesce(related_aggregate(queryset, outer_field, Count("pk")), 0)
+
+
+def plural(count: int, noun: str) -> str:
+    return f"{count} {noun}{'s' if count != 1 else ''}"
+
+
 # Inline Admin Classes
 
 
@@ -125,11 +176,14 @@ class HostInline(admin.TabularInline):
     extra = 0
     can_delete = True
 
+    def get_queryset(self, request):
+        qs = super().get_queryset(request)
+        return qs.annotate(play_count=related_count(Play.objects.all(), "host"))
+
     def play_count_display(self, obj):
         """Display play count for inline host."""
         if obj.pk:
-            count = obj.plays.count()
-            return f"{count} play{'s' if count != 1 else ''}"
+            return plural(obj.play_count, "play")
         return "-"
 
     play_count_display.short_description = "Plays"
@@ -172,14 +226,34 @@ class TaskInline(admin.TabularInline):
 class LogAdmin(admin.ModelAdmin):
     """Admin interface for Log model."""
 
-    list_display = ["title", "uploaded_at", "host_count", "total_plays", "has_failures"]
-    list_filter = ["uploaded_at", HasFailuresFilter]
+    list_display = [
+        "title",
+        "uploaded_at",
+        "status",
+        "host_count",
+        "total_plays",
+        "has_failures",
+    ]
+    list_filter = ["uploaded_at", "status", HasFailuresFilter]
     search_fields = ["title", "hosts__hostname"]
-    readonly_fields = ["id", "uploaded_at", "host_count", "total_plays"]
+    readonly_fields = [
+        "id",
+        "uploaded_at",
+        "status",
+        "host_count",
+        "total_plays",
+        "has_failures",
+        "raw_storage",
+        "raw_sha256",
+        "raw_size",
+        "raw_compressed_size",
+        "idempotency_key",
+    ]
     date_hierarchy = "uploaded_at"
     inlines = [HostInline]
     ordering = ["-uploaded_at"]
     change_list_template = "admin/api/log/change_list.html"
+    actions = ["purge_selected"]
 
     def get_urls(self):
         """Add custom URL for log submission testing."""
@@ -194,7 +268,12 @@ class LogAdmin(admin.ModelAdmin):
         return custom_urls + urls
 
     def submit_test_view(self, request):
-        """View for testing log submission via admin."""
+        """
+        View for testing log submission via admin.
+
+        The "Preview" button only parses the log (see log_preview) and shows
+        what would be stored, without writing to the database.
+        """
         context = {
             **self.admin_site.each_context(request),
             "title": "Test Log Submission",
@@ -204,6 +283,7 @@ class LogAdmin(admin.ModelAdmin):
         if request.method == "POST":
             title = request.POST.get("title", "").strip()
             raw_content = request.POST.get("raw_content", "")
+            dry_run = "dry_run" in request.POST
 
             # Keep form data for re-display on error
             context["form_data"] = {"title": title, "raw_content": raw_content}
@@ -222,9 +302,16 @@ class LogAdmin(admin.ModelAdmin):
                 }
                 return render(request, "admin/api/log/submit_test.html", context)
 
-            # Parse the log
-            parser_service = LogParserService()
-            result = parser_service.parse(raw_content)
+            if dry_run:
+                preview = preview_log(raw_content)
+                result = preview.result
+                context["preview"] = {"title": title, **preview.as_dict()}
+                if result.success:
+                    context["preview"].update(preview.summary)
+                    return render(request, "admin/api/log/submit_test.html", context)
+            else:
+                # Parse the log (in the parser pool)
+                result = parse_log(raw_content)
 
             if not result.success:
                 context["error"] = {
@@ -237,49 +324,78 @@ class LogAdmin(admin.ModelAdmin):
                 return render(request, "admin/api/log/submit_test.html", context)
 
             # Create the log and related entities
-            log = Log.objects.create(title=title, raw_content=raw_content)
-            create_log_entities(log, result)
+            with PERSIST_DURATION.time(mode="single"), transaction.atomic():
+                log = Log(title=title)
+                attach_raw_content(log, raw_content)
+                log.save()
+                create_log_entities(log, result)
 
             # Success - show result
-            total_plays = sum(host.plays.count() for host in log.hosts.all())
             context["result"] = {
                 "id": log.id,
                 "title": log.title,
                 "host_count": log.hosts.count(),
-                "total_plays": total_plays,
+                "total_plays": Play.objects.filter(host__log=log).count(),
             }
             context["form_data"] = {"title": "", "raw_content": ""}
 
         return render(request, "admin/api/log/submit_test.html", context)
 
     def get_queryset(self, request):
-        """Optimize queryset with prefetch_related to avoid N+1 queries."""
+        """Annotate the host and play counts of each log."""
         qs = super().get_queryset(request)
-        qs = qs.prefetch_related("hosts__plays")
-        return qs
+        return qs.annotate(
+            host_count=related_count(Host.objects.all(), "log"),
+            total_plays=related_count(Play.objects.all(), "host__log"),
+        )
+
+    @admin.action(
+        description="Purge selected logs (batched delete)", permissions=["delete"]
+    )
+    def purge_selected(self, request, queryset):
+        """Delete logs bottom-up in bounded batches instead of a cascade."""
+        rows = count_purge(queryset).rows
+        if rows > PURGE_ACTION_MAX_ROWS:
+            self.message_user(
+                request,
+                f"The selected logs have {rows} rows, more than can be purged "
+                f"here ({PURGE_ACTION_MAX_ROWS}): run "
+                f"'python manage.py purge_logs --older-than ...' instead",
+                messages.ERROR,
+            )
+            return
+        logs = list(
+            queryset.only(
+                "id", "title", "uploaded_at", "raw_storage", "raw_sha256"
+            ).order_by("uploaded_at")
+        )
+        stats = purge_logs(logs)
+        blobs = collect_garbage(blobs=stats.raw_blobs)
+        self.message_user(
+            request,
+            f"Purged {stats.logs} logs ({stats.hosts} hosts, {stats.plays} plays, "
+            f"{stats.tasks} tasks) in {stats.elapsed:.1f}s "
+            f"({stats.rows_per_second:.0f} rows/s), {blobs} raw log blob(s)",
+            messages.SUCCESS,
+        )
 
     def host_count(self, obj):
         """Display number of hosts in this log."""
-        count = obj.hosts.count()
-        return f"{count} host{'s' if count != 1 else ''}"
+        return plural(obj.host_count, "host")
 
     host_count.short_description = "Hosts"
+    host_count.admin_order_field = "host_count"
 
     def total_plays(self, obj):
         """Display total number of plays across all hosts."""
-        total = sum(host.plays.count() for host in obj.hosts.all())
-        return f"{total} play{'s' if total != 1 else ''}"
+        return plural(obj.total_plays, "play")
 
     total_plays.short_description = "Total Plays"
+    total_plays.admin_order_field = "total_plays"
 
     def has_failures(self, obj):
         """Display visual indicator if any play failed."""
-        has_failed = any(
-            play.status == "failed"
-            for host in obj.hosts.all()
-            for play in host.plays.all()
-        )
-        if has_failed:
+        if obj.has_failures:
             return format_html(
                 '<span style="background: #7f1d1d; color: #ef4444; padding: 2px 8px; '
                 'border-radius: 4px; font-weight: 600;">FAILED</span>'
@@ -290,6 +406,7 @@ class LogAdmin(admin.ModelAdmin):
         )
 
     has_failures.short_description = "Status"
+    has_failures.admin_order_field = "has_failures"
 
 
 @admin.register(Host)
@@ -319,10 +436,16 @@ class HostAdmin(admin.ModelAdmin):
     ordering = ["hostname"]
 
     def get_queryset(self, request):
-        """Optimize queryset with select_related and prefetch_related."""
+        """Annotate the play counts per status and the latest play date."""
         qs = super().get_queryset(request)
-        qs = qs.select_related("log").prefetch_related("plays")
-        return qs
+        plays = Play.objects.all()
+        # Failed plays are counted by the per-run summary (plays_failed)
+        return qs.select_related("log").annotate(
+            play_count=related_count(plays, "host"),
+            plays_ok=related_count(plays.filter(status="ok"), "host"),
+            plays_changed=related_count(plays.filter(status="changed"), "host"),
+            latest_play_date=related_aggregate(plays, "host", Max("date")),
+        )
 
     def log_title(self, obj):
         """Display log title with link."""
@@ -332,17 +455,16 @@ class HostAdmin(admin.ModelAdmin):
 
     def play_count(self, obj):
         """Display number of plays on this host."""
-        count = obj.plays.count()
-        return f"{count} play{'s' if count != 1 else ''}"
+        return plural(obj.play_count, "play")
 
     play_count.short_description = "Plays"
+    play_count.admin_order_field = "play_count"
 
     def status_summary(self, obj):
         """Display visual summary of play statuses."""
-        plays = obj.plays.all()
-        ok_count = sum(1 for play in plays if play.status == "ok")
-        changed_count = sum(1 for play in plays if play.status == "changed")
-        failed_count = sum(1 for play in plays if play.status == "failed")
+        ok_count = obj.plays_ok
+        changed_count = obj.plays_changed
+        failed_count = obj.plays_failed
 
         parts = []
         if ok_count > 0:
@@ -376,13 +498,14 @@ class HostAdmin(admin.ModelAdmin):
         return format_html("".join(str(part) for part in parts)) if parts else "-"
 
     status_summary.short_description = "Status Summary"
+    status_summary.admin_order_field = "plays_failed"
 
     def latest_play_date(self, obj):
         """Display most recent play execution date."""
-        latest = obj.plays.order_by("-date").first()
-        return latest.date if latest else "-"
+        return obj.latest_play_date or "-"
 
     latest_play_date.short_description = "Latest Play"
+    latest_play_date.admin_order_field = "latest_play_date"
 
 
 @admin.register(Play)
@@ -401,7 +524,7 @@ class PlayAdmin(admin.ModelAdmin):
     list_filter = [
         "status",
         "date",
-        "host",
+        ("host", RelatedLabelListFilter),
         "host__log",
         HasFailedTasksFilter,
         TaskCountRangeFilter,
@@ -489,9 +612,10 @@ class PlayAdmin(admin.ModelAdmin):
 
     def total_tasks(self, obj):
         """Display total number of tasks."""
-        return obj.tasks_ok + obj.tasks_changed + obj.tasks_failed
+        return obj.tasks_total
 
     total_tasks.short_description = "Total Tasks"
+    total_tasks.admin_order_field = "tasks_total"
 
 
 @admin.register(Task)
@@ -506,7 +630,11 @@ class TaskAdmin(admin.ModelAdmin):
         "status_badge",
         "has_failure_message",
     ]
-    list_filter = ["status", "play__host__log", "play__host"]
+    list_filter = [
+        "status",
+        "play__host__log",
+        ("play__host", RelatedLabelListFilter),
+    ]
     search_fields = ["name", "play__name", "play__host__hostname"]
     readonly_fields = ["id", "created_at"]
     ordering = ["play", "order"]
@@ -635,6 +763,26 @@ class TokenAdmin(admin.ModelAdmin):
     is_valid_display.boolean = True
     is_valid_display.short_description = "Currently Valid"
 
+    def save_model(self, request, obj, form, change):
+        """Save token and drop cached validation results for it."""
+        super().save_model(request, obj, form, change)
+        # The value itself may have been edited: drop both old and new entries
+        if change and form.initial.get("value"):
+            token_cache.invalidate(form.initial["value"])
+        token_cache.invalidate(obj.value)
+
+    def delete_model(self, request, obj):
+        """Delete token and drop its cached validation result."""
+        super().delete_model(request, obj)
+        token_cache.invalidate(obj.value)
+
+    def delete_queryset(self, request, queryset):
+        """Bulk delete tokens and drop their cached validation results."""
+        values = list(queryset.values_list("value", flat=True))
+        super().delete_queryset(request, queryset)
+        for value in values:
+            token_cache.invalidate(value)
+
 
 # Admin Site Customization
 admin.site.site_header = "Ansibeau Administration"
@@ -0,0 +1,223 @@
+"""
+Async versions of the read-only API endpoints, for ASGI deployments.
+
+They serve the same URLs and payloads as the DRF actions in api.views
+(log details, log hosts, play tasks and host history) using Django's async
+ORM, so a slow client holds a coroutine instead of a worker thread. They are
+routed ahead of the DRF router when API_ASYNC_VIEWS is enabled.
+
+LogEventsView, the Server-Sent Events stream of a running log, is always
+routed.
+
+Under ASGI, Django runs every sync view in one thread per worker
+(thread_sensitive=True), so an upload waiting for the parser pool would
+hold up the uploads behind it. ingest_view serves the DRF ingest actions
+(uploads and live log writes) each in a thread of its own instead. They are
+always routed.
+"""
+
+import functools
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.db import close_old_connections
+from django.http import HttpResponse, StreamingHttpResponse
+from django.views import View
+
+from .db_router import pick_replica, read_from
+from .models import Host, Log, Play, Task
+from .renderers import FastJSONRenderer
+from .services.live_events import iter_log_event_backlog, stream_log_events
+from .serializers import (
+    HostHistorySerializer,
+    HostSerializer,
+    LogSerializer,
+    TaskSerializer,
+)
+from .views import HostViewSet, LogViewSet
+
+
+def json_response(data, status=200) -> HttpResponse:
+    """Render data like the DRF JSON renderer does."""
+    return HttpResponse(
+        FastJSONRenderer().render(data), status=status, content_type="application/json"
+    )
+
+
+def not_found(model) -> HttpResponse:
+    """404 response worded like DRF's get_object_or_404."""
+    detail = f"No {model._meta.object_name} matches the given query."
+    return json_response({"detail": detail}, status=404)
+
+
+def _run_with_own_connections(view, request, *args, **kwargs):
+    """Run a view in a pool thread, which has its own database connections."""
+    # Like the request_started and request_finished signal handlers, for the
+    # connections of this thread
+    close_old_connections()
+    try:
+        return view(request, *args, **kwargs)
+    finally:
+        close_old_connections()
+
+
+def ingest_view(actions: dict, **initkwargs):
+    """
+    A LogViewSet action view that does not hold up the other sync views.
+
+    Under ASGI the action runs in a thread of the default executor, so a
+    worker parses and stores several uploads at once. Under WSGI (and the
+    test client) it runs in the request thread, like any DRF view.
+
+    Args:
+        actions: HTTP method to action mapping, as for ViewSet.as_view()
+        initkwargs: View attributes set by the router (basename, detail)
+    """
+    view = LogViewSet.as_view(actions, basename="log", **initkwargs)
+
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if isinstance(request, ASGIRequest):
+            run = sync_to_async(_run_with_own_connections, thread_sensitive=False)
+            return await run(view, request, *args, **kwargs)
+        return await sync_to_async(view)(request, *args, **kwargs)
+
+    return wrapper
+
+
+class AsyncReadView(View):
+    """
+    Base class for async read views served from a read replica.
+
+    Subclasses implement `read()`. Like ReplicaReadMixin, objects missing on
+    the replica are looked up again on the primary.
+    """
+
+    http_method_names = ["get", "head", "options"]
+
+    async def get(self, request, *args, **kwargs):
+        alias = await sync_to_async(pick_replica)()
+        with read_from(alias):
+            response = await self.read(request, *args, **kwargs)
+        if response.status_code == 404 and alias is not None:
+            # The replica may not have caught up yet
+            with read_from(None):
+                response = await self.read(request, *args, **kwargs)
+        return response
+
+    async def read(self, request, *args, **kwargs) -> HttpResponse:
+        raise NotImplementedError
+
+
+class LogDetailView(AsyncReadView):
+    """GET /api/logs/{id}/ — a log with its hosts and plays."""
+
+    async def read(self, request, pk):
+        log = await Log.objects.filter(pk=pk).prefetch_related("hosts__plays").afirst()
+        if log is None:
+            return not_found(Log)
+        return json_response(LogSerializer(log).data)
+
+
+class LogHostsView(AsyncReadView):
+    """GET /api/logs/{id}/hosts/ — the hosts of a log with their plays."""
+
+    async def read(self, request, pk):
+        if not await Log.objects.filter(pk=pk).aexists():
+            return not_found(Log)
+        hosts = [
+            host
+            async for host in Host.objects.filter(log_id=pk).prefetch_related("plays")
+        ]
+        return json_response(HostSerializer(hosts, many=True).data)
+
+
+class PlayTasksView(AsyncReadView):
+    """GET /api/plays/{id}/tasks/ — the tasks of a play, optionally filtered."""
+
+    async def read(self, request, pk):
+        play = await Play.objects.select_related("host__log").filter(pk=pk).afirst()
+        if play is None:
+            return not_found(Play)
+
+        # Tasks carry their log's upload time: lets PostgreSQL prune partitions
+        tasks = Task.objects.filter(
+            play=play, created_at=play.host.log.uploaded_at
+        ).order_by("order")
+
+        status_filter = request.GET.get("status")
+        if status_filter:
+            valid_statuses = [choice[0] for choice in Task.STATUS_CHOICES]
+            if status_filter not in valid_statuses:
+                return json_response(
+                    {
+                        "error": f"Invalid status '{status_filter}'",
+                        "valid_statuses": valid_statuses,
+                    },
+                    status=400,
+                )
+            # Include both "failed" and "fatal" when filtering on "failed"
+            if status_filter == "failed":
+                tasks = tasks.filter(status__in=["failed", "fatal"])
+            else:
+                tasks = tasks.filter(status=status_filter)
+
+        return json_response(TaskSerializer([t async for t in tasks], many=True).data)
+
+
+class HostHistoryView(AsyncReadView):
+    """GET /api/hosts/{hostname}/history/ — per-run timeline of a host."""
+
+    async def read(self, request, hostname):
+        try:
+            runs, limit, paged = HostViewSet.history_runs(hostname, request.GET)
+        except ValueError as exc:
+            return json_response({"error": str(exc)}, status=400)
+
+        # Fetch one extra run to know whether there is a next page
+        page = [
+            run
+            async for run in runs.only(
+                "log_id", "log_uploaded_at", "status", "plays_failed", "tasks_failed"
+            )[: limit + 1]
+        ]
+        if not page and not paged:
+            return json_response({"error": f"Host '{hostname}' not found"}, status=404)
+
+        results = HostHistorySerializer(page[:limit], many=True).data
+        return json_response(
+            HostViewSet.history_page(hostname, results, len(page) > limit)
+        )
+
+
+class LogEventsView(View):
+    """
+    GET /api/logs/{id}/events/ — Server-Sent Events stream of a running log.
+
+    Resumes after the Last-Event-ID header (or ?after= query parameter).
+    Reads go to the primary so clients see appends as soon as they commit.
+    """
+
+    http_method_names = ["get", "options"]
+
+    async def get(self, request, pk):
+        log = await Log.objects.filter(pk=pk).only("id", "status").afirst()
+        if log is None:
+            return not_found(Log)
+
+        after = request.headers.get("Last-Event-ID") or request.GET.get("after")
+        try:
+            after = int(after) if after else None
+        except ValueError:
+            return json_response({"error": f"Invalid event id '{after}'"}, status=400)
+
+        running = log.status == "running"
+        if isinstance(request, ASGIRequest):
+            stream = stream_log_events(log.pk, after, running)
+        else:
+            stream = iter_log_event_backlog(log.pk, after, running)
+        response = StreamingHttpResponse(stream, content_type="text/event-stream")
+        response["Cache-Control"] = "no-cache"
+        # Do not let nginx buffer the stream
+        response["X-Accel-Buffering"] = "no"
+        return response
@@ -0,0 +1,310 @@
+"""
+ansibeau-upload: upload Ansible log files to the Ansibeau API.
+
+Files are uploaded concurrently (--parallel) as gzip-compressed text/plain
+bodies to POST /api/logs/, each worker thread reusing one keep-alive
+connection. Every upload carries an Idempotency-Key derived from the title
+and content of the file, so failed uploads can be retried, and a bulk upload
+interrupted halfway can be run again: logs already stored are returned by
+the server instead of being created twice.
+
+This module does not import Django: it only needs the standard library.
+"""
+
+import argparse
+import gzip
+import hashlib
+import http.client
+import json
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+from urllib.parse import quote, urlsplit
+
+GZIP_MAGIC = b"\x1f\x8b"
+
+# Statuses worth retrying, as uploads are idempotent. A 500 is retried too,
+# unless it is the API's parse failure response, which would fail again.
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 30.0
+
+
+class UploadError(Exception):
+    """Raised when a file cannot be uploaded."""
+
+
+@dataclass
+class UploadResult:
+    """Outcome of the upload of one file."""
+
+    path: Path
+    log_id: Optional[str] = None
+    replayed: bool = False
+    size: int = 0
+    sent: int = 0
+    attempts: int = 0
+    seconds: float = 0.0
+    error: Optional[str] = None
+
+
+def format_size(size: float) -> str:
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024 or unit == "GB":
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+
+
+def idempotency_key(title: str, content: bytes) -> str:
+    """Key identifying an upload: the same file and title give the same log."""
+    digest = hashlib.sha256(title.encode("utf-8") + b"\0" + content)
+    return f"ansibeau-upload:{digest.hexdigest()}"
+
+
+class Uploader:
+    """Uploads files to the API, with one keep-alive connection per thread."""
+
+    def __init__(
+        self,
+        url: str,
+        token: str,
+        retries: int = 5,
+        timeout: float = 300.0,
+        compress: bool = True,
+    ):
+        parts = urlsplit(url)
+        if parts.scheme not in ("http", "https") or not parts.hostname:
+            raise UploadError(f"Invalid API URL '{url}'")
+        self.scheme = parts.scheme
+        self.netloc = parts.netloc
+        self.prefix = parts.path.rstrip("/")
+        self.token = token
+        self.retries = max(0, retries)
+        self.timeout = timeout
+        self.compress = compress
+        self._local = threading.local()
+
+    def _connection(self) -> http.client.HTTPConnection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            if self.scheme == "https":
+                connection = http.client.HTTPSConnection(
+                    self.netloc, timeout=self.timeout
+                )
+            else:
+                connection = http.client.HTTPConnection(
+                    self.netloc, timeout=self.timeout
+                )
+            self._local.connection = connection
+        return connection
+
+    def _reset_connection(self) -> None:
+        connection = getattr(self._local, "connection", None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
+
+    def upload(self, path: Path, title: str) -> UploadResult:
+        """Upload one file, retrying with exponential backoff."""
+        result = UploadResult(path=path)
+        start = time.perf_counter()
+        try:
+            content = path.read_bytes()
+            result.size = len(content)
+            key = idempotency_key(title, content)
+            if self.compress and not content.startswith(GZIP_MAGIC):
+                content = gzip.compress(content, compresslevel=6)
+            result.sent = len(content)
+            self._post(title, key, content, result)
+        except (OSError, UploadError) as exc:
+            result.error = str(exc)
+        result.seconds = time.perf_counter() - start
+        return result
+
+    def _post(self, title, key, body, result) -> None:
+        url = f"{self.prefix}/api/logs/?title={quote(title)}"
+        headers = {
+            "Authorization": f"Bearer {self.token}",
+            "Content-Type": "text/plain",
+            "Accept": "application/json",
+            "Idempotency-Key": key,
+        }
+        error = None
+        for attempt in range(self.retries + 1):
+            result.attempts = attempt + 1
+            if attempt:
+                delay = min(BACKOFF_MAX, BACKOFF_BASE * 2**attempt)
+                time.sleep(delay * random.uniform(0.5, 1.0))
+            try:
+                connection = self._connection()
+                connection.request("POST", url, body, headers)
+                response = connection.getresponse()
+                payload = response.read()
+            except (OSError, http.client.HTTPException) as exc:
+                # The server may have closed the kept-alive connection
+                self._reset_connection()
+                error = f"{type(exc).__name__}: {exc}"
+                continue
+            if response.will_close:
+                self._reset_connection()
+
+            if response.status in RETRY_STATUSES and not _is_parse_failure(payload):
+                error = f"HTTP {response.status}"
+                continue
+            if response.status >= 400:
+                raise UploadError(_error_message(response.status, payload))
+            data = json.loads(payload)
+            result.log_id = data.get("id")
+            result.replayed = response.getheader("Idempotent-Replayed") == "true"
+            return
+        raise UploadError(f"Gave up after {self.retries + 1} attempts ({error})")
+
+
+def _is_parse_failure(payload: bytes) -> bool:
+    """Whether a response is the API's report of a log it cannot parse."""
+    try:
+        data = json.loads(payload)
+    except ValueError:
+        return False
+    return isinstance(data, dict) and "parser_type" in data
+
+
+def _error_message(status: int, payload: bytes) -> str:
+    try:
+        data = json.loads(payload)
+    except ValueError:
+        return f"HTTP {status}"
+    if isinstance(data, dict):
+        detail = data.get("error") or data.get("detail") or data
+        return f"HTTP {status}: {detail}"
+    return f"HTTP {status}: {data}"
+
+
+def make_title(template: str, path: Path) -> str:
+    name = path.name
+    stem = name[: -len(".gz")] if name.endswith(".gz") else name
+    stem = Path(stem).stem
+    return template.format(name=name, stem=stem, path=str(path))
+
+
+def print_result(result: UploadResult, out) -> None:
+    if result.error is not None:
+        print(f"FAILED  {result.path}: {result.error}", file=out, flush=True)
+        return
+    rate = result.size / result.seconds if result.seconds else 0
+    state = "EXISTS" if result.replayed else "OK"
+    retries = f", {result.attempts} attempts" if result.attempts > 1 else ""
+    print(
+        f"{state:<7} {result.path} -> {result.log_id} "
+        f"{format_size(result.size)} in {result.seconds:.2f}s "
+        f"({format_size(rate)}/s, {format_size(result.sent)} sent{retries})",
+        file=out,
+        flush=True,
+    )
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="ansibeau-upload",
+        description="Upload Ansible log files to Ansibeau.",
+    )
+    parser.add_argument("files", nargs="+", type=Path, help="Log files to upload")
+    parser.add_argument(
+        "--url",
+        default=os.environ.get("ANSIBEAU_URL", "http://localhost:8000"),
+        help="API server URL, without /api/ (default: $ANSIBEAU_URL)",
+    )
+    parser.add_argument(
+        "--token",
+        default=os.environ.get("ANSIBEAU_TOKEN"),
+        help="API token (default: $ANSIBEAU_TOKEN)",
+    )
+    parser.add_argument(
+        "--title",
+        default="{stem}",
+        help="Log title template, with {name}, {stem} and {path} placeholders "
+        "(default: {stem})",
+    )
+    parser.add_argument(
+        "-j",
+        "--parallel",
+        type=int,
+        default=4,
+        help="Number of concurrent uploads (default: 4)",
+    )
+    parser.add_argument(
+        "--retries",
+        type=int,
+        default=5,
+        help="Retries per file on connection errors and 429 or 5xx responses "
+        "(default: 5)",
+    )
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=300.0,
+        help="Timeout of a request in seconds (default: 300)",
+    )
+    parser.add_argument(
+        "--no-compress",
+        dest="compress",
+        action="store_false",
+        help="Send files as-is instead of gzip-compressing them",
+    )
+    return parser
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    if not args.token:
+        print("ansibeau-upload: a token is required (--token or $ANSIBEAU_TOKEN)")
+        return 2
+    if args.parallel < 1:
+        print("ansibeau-upload: --parallel must be at least 1")
+        return 2
+    try:
+        uploader = Uploader(
+            args.url,
+            args.token,
+            retries=args.retries,
+            timeout=args.timeout,
+            compress=args.compress,
+        )
+    except UploadError as exc:
+        print(f"ansibeau-upload: {exc}")
+        return 2
+
+    start = time.perf_counter()
+    results = []
+    with ThreadPoolExecutor(max_workers=args.parallel) as executor:
+        futures = [
+            executor.submit(uploader.upload, path, make_title(args.title, path))
+            for path in args.files
+        ]
+        for future in as_completed(futures):
+            result = future.result()
+            print_result(result, sys.stdout)
+            results.append(result)
+    elapsed = time.perf_counter() - start
+
+    failed = sum(1 for result in results if result.error is not None)
+    existing = sum(1 for result in results if result.replayed)
+    size = sum(result.size for result in results if result.error is None)
+    sent = sum(result.sent for result in results if result.error is None)
+    rate = size / elapsed if elapsed else 0
+    print(
+        f"{len(results) - failed} uploaded ({existing} already stored), "
+        f"{failed} failed: {format_size(size)} ({format_size(sent)} sent) "
+        f"in {elapsed:.2f}s, {format_size(rate)}/s"
+    )
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,156 @@
+"""
+Database router sending read-only API requests to read replicas.
+
+Reads use the database selected for the current context with
+``read_from(alias)`` (or ``set_read_database``), and the primary
+(``default``) otherwise. Writes always go to the primary. Views opt in per
+action through ``api.views.ReplicaReadMixin``, which picks a replica with
+``pick_replica()``: replicas that lag more than REPLICA_MAX_LAG seconds
+behind the primary, or cannot be reached, are skipped.
+"""
+
+import logging
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar, Token
+from typing import Iterable, Iterator, Optional
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+from django.db.models import Max
+
+logger = logging.getLogger(__name__)
+
+_read_database: ContextVar[Optional[str]] = ContextVar("read_database", default=None)
+
+# alias -> (monotonic time of the check, healthy)
+_health: dict[str, tuple[float, bool]] = {}
+_health_lock = threading.Lock()
+
+POSTGRES_LAG_SQL = (
+    "SELECT CASE "
+    "WHEN NOT pg_is_in_recovery() THEN 0 "
+    "WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"
+)
+
+
+def get_replicas() -> list[str]:
+    """Return the aliases of the configured read replicas."""
+    return list(getattr(settings, "DATABASE_REPLICAS", []))
+
+
+def current_read_database() -> Optional[str]:
+    """Return the replica alias reads currently go to, or None for the primary."""
+    return _read_database.get()
+
+
+def set_read_database(alias: Optional[str]) -> Token:
+    """Send reads of the current context to `alias` (None for the primary)."""
+    return _read_database.set(alias)
+
+
+def reset_read_database(token: Token) -> None:
+    """Undo a set_read_database call."""
+    _read_database.reset(token)
+
+
+@contextmanager
+def read_from(alias: Optional[str]):
+    """Context manager sending reads to `alias` (None for the primary)."""
+    token = set_read_database(alias)
+    try:
+        yield
+    finally:
+        reset_read_database(token)
+
+
+def iter_reading_from(alias: Optional[str], iterable: Iterable) -> Iterator:
+    """
+    Iterate `iterable` with reads sent to `alias`.
+
+    For streaming responses, whose generators run after the view returned.
+    """
+    iterator = iter(iterable)
+    while True:
+        with read_from(alias):
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+        yield item
+
+
+def replica_lag(alias: str) -> float:
+    """
+    Return how many seconds a replica lags behind the primary.
+
+    PostgreSQL replicas report their WAL replay delay. For other databases
+    (e.g. SQLite copies used locally) the newest log upload times of the
+    replica and the primary are compared.
+    """
+    connection = connections[alias]
+    if connection.vendor == "postgresql":
+        with connection.cursor() as cursor:
+            cursor.execute(POSTGRES_LAG_SQL)
+            return float(cursor.fetchone()[0] or 0)
+
+    from .models import Log
+
+    field = "uploaded_at__max"
+    primary = Log.objects.using(DEFAULT_DB_ALIAS).aggregate(Max("uploaded_at"))[field]
+    replica = Log.objects.using(alias).aggregate(Max("uploaded_at"))[field]
+    if primary is None:
+        return 0.0
+    if replica is None:
+        return float("inf")
+    return max((primary - replica).total_seconds(), 0.0)
+
+
+def is_healthy(alias: str) -> bool:
+    """Whether a replica is reachable and within REPLICA_MAX_LAG (cached)."""
+    now = time.monotonic()
+    interval = getattr(settings, "REPLICA_CHECK_INTERVAL", 5)
+    with _health_lock:
+        checked_at, healthy = _health.get(alias, (None, False))
+    if checked_at is not None and now - checked_at < interval:
+        return healthy
+
+    try:
+        lag = replica_lag(alias)
+        healthy = lag <= getattr(settings, "REPLICA_MAX_LAG", 5)
+        if not healthy:
+            logger.warning("Replica %s lags %.1fs behind, using primary", alias, lag)
+    except DatabaseError:
+        logger.warning("Replica %s is unreachable, using primary", alias, exc_info=True)
+        healthy = False
+
+    with _health_lock:
+        _health[alias] = (now, healthy)
+    return healthy
+
+
+def pick_replica() -> Optional[str]:
+    """Return a random healthy replica alias, or None to use the primary."""
+    healthy = [alias for alias in get_replicas() if is_healthy(alias)]
+    return random.choice(healthy) if healthy else None
+
+
+class ReplicaRouter:
+    """Route reads to the replica selected for the current context."""
+
+    def db_for_read(self, model, **hints):
+        return _read_database.get() or DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas are copies of the primary, never migrated on their own
+        return db not in get_replicas()
@@ -0,0 +1,29 @@
+"""
+Django management command to delete stored raw logs no longer used by any log.
+
+Usage:
+    python manage.py gc_raw_logs                    # Keep blobs from the last hour
+    python manage.py gc_raw_logs --grace-seconds 0  # Collect everything unreferenced
+"""
+
+from django.core.management.base import BaseCommand
+
+from api.services.raw_storage import collect_garbage
+
+
+class Command(BaseCommand):
+    help = "Delete stored raw log blobs that are no longer referenced by any log"
+
+    def add_arguments(self, parser):
+        """Define command-line arguments."""
+        parser.add_argument(
+            "--grace-seconds",
+            type=float,
+            default=3600,
+            help="Keep blobs written within this many seconds (default: 3600)",
+        )
+
+    def handle(self, *args, **options):
+        """Main command handler."""
+        deleted = collect_garbage(grace_seconds=options["grace_seconds"])
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} raw log blob(s)"))
@@ -0,0 +1,112 @@
+"""
+Django management command to import Ansible log files from disk in bulk.
+
+Usage:
+    python manage.py import_logs /var/log/ansible                # A directory
+    python manage.py import_logs "/backups/**/*.log.gz"          # A glob pattern
+    python manage.py import_logs logs-2023.tar.gz --workers 16   # An archive
+    python manage.py import_logs /var/log/ansible --title "{path}"
+
+Files are parsed in parallel by --workers processes and stored by this
+process in batches of --batch-size logs, each in its own transaction.
+Content already stored is skipped. The sources of each stored batch are
+recorded in the --checkpoint file, so an interrupted import can simply be
+started again: it resumes after the last stored batch.
+"""
+
+import os
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.cli import format_size
+from api.services.log_import import (
+    DEFAULT_BATCH_SIZE,
+    Checkpoint,
+    ImportStats,
+    LogImporter,
+)
+
+
+class Command(BaseCommand):
+    help = "Import Ansible log files, directories, globs or archives in bulk"
+
+    def add_arguments(self, parser):
+        """Define command-line arguments."""
+        parser.add_argument(
+            "sources",
+            nargs="+",
+            help="Log files, directories, glob patterns, or tar/zip archives",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=os.cpu_count() or 1,
+            help="Number of parser processes (default: number of CPUs)",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help=f"Logs stored per transaction (default: {DEFAULT_BATCH_SIZE})",
+        )
+        parser.add_argument(
+            "--title",
+            default="{stem}",
+            help="Log title template, with {name}, {stem} and {path} placeholders "
+            "(default: {stem})",
+        )
+        parser.add_argument(
+            "--checkpoint",
+            type=Path,
+            default=Path("import_logs.checkpoint"),
+            help="File recording the imported sources "
+            "(default: import_logs.checkpoint)",
+        )
+        parser.add_argument(
+            "--reset",
+            action="store_true",
+            help="Ignore and overwrite an existing checkpoint file "
+            "(content already stored is still skipped)",
+        )
+
+    def handle(self, *args, **options):
+        """Main command handler."""
+        for source in options["sources"]:
+            if not any(char in source for char in "*?[") and not os.path.exists(source):
+                raise CommandError(f"No such file or directory: '{source}'")
+
+        checkpoint_path = options["checkpoint"]
+        if options["reset"] and checkpoint_path.exists():
+            checkpoint_path.unlink()
+        checkpoint = Checkpoint(checkpoint_path)
+        if checkpoint.keys:
+            self.stdout.write(
+                f"Resuming from {checkpoint_path} "
+                f"({len(checkpoint.keys)} sources already imported)"
+            )
+
+        importer = LogImporter(
+            workers=options["workers"],
+            batch_size=options["batch_size"],
+            title=options["title"],
+            checkpoint=checkpoint,
+            on_progress=lambda stats: self.stdout.write(f"  {self._summary(stats)}"),
+            on_failure=lambda name, error: self.stderr.write(
+                f"  Failed {name}: {error}"
+            ),
+        )
+        stats = importer.run(options["sources"])
+
+        style = self.style.WARNING if stats.failed else self.style.SUCCESS
+        self.stdout.write(style(f"Done: {self._summary(stats)}"))
+
+    @staticmethod
+    def _summary(stats: ImportStats) -> str:
+        return (
+            f"{stats.files} files: {stats.imported} imported, "
+            f"{stats.skipped} already stored, {stats.failed} failed - "
+            f"{format_size(stats.bytes_read)} in {stats.elapsed:.1f}s "
+            f"({stats.files_per_second:.1f} files/s, "
+            f"{format_size(stats.bytes_per_second)}/s)"
+        )
@@ -0,0 +1,321 @@
+"""
+Django management command to load test a running Ansibeau server.
+
+Usage:
+    python manage.py loadtest                                  # 30s on :8000
+    python manage.py loadtest --url http://localhost:8000 --duration 60 \\
+        --concurrency 16 --mix upload=1,log=5,hosts=2,tasks=2
+    python manage.py loadtest --upload-hosts 5,50,500 --output results.json
+
+Reads target the logs of this database (seed it with populate_mock_data
+first), the most recent ones being the most popular. Uploads send mock logs
+of --upload-hosts hosts each, reported separately per size. Start the
+server with API_QUERY_COUNT_HEADER=True to also report the number of
+database queries of each endpoint. A temporary API token is created for the
+run, and the uploaded logs are deleted afterwards unless --keep is given.
+"""
+
+import json
+import random
+import secrets
+import uuid
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.cli import format_size
+from api.models import Log, Play, Token
+from api.services.loadtest import (
+    LoadTest,
+    LoadTestError,
+    Operation,
+    Request,
+    ZipfPicker,
+)
+from api.services.mock_data import MockOptions, generate_run
+from api.services.purge import purge_logs
+
+READ_ENDPOINTS = {
+    "log": "GET /api/logs/{id}/",
+    "hosts": "GET /api/logs/{id}/hosts/",
+    "tasks": "GET /api/plays/{id}/tasks/",
+}
+
+
+class Command(BaseCommand):
+    help = "Load test a running server with a mix of uploads and reads"
+
+    def add_arguments(self, parser):
+        """Define command-line arguments."""
+        parser.add_argument(
+            "--url",
+            default="http://localhost:8000",
+            help="Server URL (default: http://localhost:8000)",
+        )
+        parser.add_argument(
+            "--duration",
+            type=float,
+            default=30,
+            help="Duration of the run in seconds (default: 30)",
+        )
+        parser.add_argument(
+            "--requests",
+            type=int,
+            default=None,
+            help="Stop after this many requests, if before the end of the run",
+        )
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=8,
+            help="Number of concurrent clients (default: 8)",
+        )
+        parser.add_argument(
+            "--mix",
+            default="upload=1,log=5,hosts=2,tasks=2",
+            help="Relative weights of the operations: upload, log, hosts and "
+            "tasks (default: upload=1,log=5,hosts=2,tasks=2)",
+        )
+        parser.add_argument(
+            "--upload-hosts",
+            default="5,50,200",
+            help="Sizes of the uploaded logs, in hosts (default: 5,50,200)",
+        )
+        parser.add_argument(
+            "--sample",
+            type=int,
+            default=200,
+            help="Number of recent logs read (default: 200)",
+        )
+        parser.add_argument(
+            "--zipf",
+            type=float,
+            default=1.1,
+            help="Popularity skew of the reads, 0 for uniform (default: 1.1)",
+        )
+        parser.add_argument(
+            "--token",
+            default=None,
+            help="API token to upload with (default: a temporary token)",
+        )
+        parser.add_argument(
+            "--keep",
+            action="store_true",
+            help="Keep the logs uploaded during the run",
+        )
+        parser.add_argument(
+            "--seed", type=int, default=0, help="Random seed (default: 0)"
+        )
+        parser.add_argument(
+            "--output",
+            default=None,
+            help="Also write the results to this JSON file",
+        )
+
+    def handle(self, *args, **options):
+        """Main command handler."""
+        mix = self.parse_mix(options["mix"])
+        rng = random.Random(options["seed"])
+        operations = self.read_operations(mix, options["sample"], options["zipf"])
+        if mix.get("upload"):
+            operations += self.upload_operations(
+                mix["upload"], options["upload_hosts"], rng
+            )
+
+        token, temporary = options["token"], None
+        if token is None and mix.get("upload"):
+            token = secrets.token_urlsafe(32)
+            temporary = Token.objects.create(value=token, comment="loadtest command")
+
+        try:
+            load_test = LoadTest(
+                options["url"],
+                operations,
+                concurrency=options["concurrency"],
+                duration=options["duration"],
+                max_requests=options["requests"],
+                token=token,
+                seed=options["seed"],
+            )
+            load_test.check()
+            self.stdout.write(
+                self.style.HTTP_INFO(
+                    f"Load testing {options['url']} for {options['duration']:g}s "
+                    f"with {load_test.concurrency} clients..."
+                )
+            )
+            result = load_test.run()
+        except LoadTestError as exc:
+            raise CommandError(str(exc))
+        finally:
+            if temporary is not None:
+                temporary.delete()
+
+        self.display_results(result)
+        if options["output"]:
+            self.write_report(result, options)
+            self.stdout.write(f"Results written to {options['output']}")
+
+        created = [entry["id"] for entry in result.created if "id" in entry]
+        if created and not options["keep"]:
+            purge_logs(Log.objects.filter(pk__in=created).iterator())
+            self.stdout.write(f"Deleted the {len(created)} logs uploaded by the run")
+
+    @staticmethod
+    def parse_mix(value: str) -> dict[str, float]:
+        """Parse a mix such as ``upload=1,log=5`` into weights."""
+        mix = {}
+        for item in filter(None, value.split(",")):
+            name, _, weight = item.partition("=")
+            name = name.strip()
+            if name != "upload" and name not in READ_ENDPOINTS:
+                raise CommandError(f"Unknown operation '{name}' in --mix")
+            try:
+                mix[name] = float(weight)
+            except ValueError:
+                raise CommandError(f"Invalid weight '{weight}' for '{name}'")
+            if mix[name] < 0:
+                raise CommandError(f"Negative weight for '{name}'")
+        if not any(mix.values()):
+            raise CommandError("The mix has no operations")
+        return mix
+
+    def read_operations(self, mix, sample, zipf) -> list[Operation]:
+        """Reads of the most recent logs, the most recent being the most read."""
+        reads = {name: weight for name, weight in mix.items() if name != "upload"}
+        if not any(reads.values()):
+            return []
+        log_ids = list(
+            Log.objects.filter(status="complete")
+            .order_by("-uploaded_at")
+            .values_list("id", flat=True)[:sample]
+        )
+        if not log_ids:
+            raise CommandError(
+                "No logs to read: seed the database first (populate_mock_data)"
+            )
+        logs = ZipfPicker(log_ids, zipf)
+
+        operations = []
+        if reads.get("log"):
+            operations.append(
+                Operation(
+                    READ_ENDPOINTS["log"],
+                    reads["log"],
+                    lambda rng: Request("GET", f"/api/logs/{logs.pick(rng)}/"),
+                )
+            )
+        if reads.get("hosts"):
+            operations.append(
+                Operation(
+                    READ_ENDPOINTS["hosts"],
+                    reads["hosts"],
+                    lambda rng: Request("GET", f"/api/logs/{logs.pick(rng)}/hosts/"),
+                )
+            )
+        if reads.get("tasks"):
+            plays: dict[uuid.UUID, list] = {log_id: [] for log_id in log_ids}
+            for play_id, log_id in Play.objects.filter(
+                host__log_id__in=log_ids
+            ).values_list("id", "host__log_id"):
+                plays[log_id].append(play_id)
+            # Plays of the popular logs are the popular plays
+            popular = ZipfPicker([ids for ids in plays.values() if ids], zipf)
+            operations.append(
+                Operation(
+                    READ_ENDPOINTS["tasks"],
+                    reads["tasks"],
+                    lambda rng: Request(
+                        "GET", f"/api/plays/{rng.choice(popular.pick(rng))}/tasks/"
+                    ),
+                )
+            )
+        return operations
+
+    def upload_operations(self, weight, sizes, rng) -> list[Operation]:
+        """Uploads of mock logs of each size, sharing the upload weight."""
+        try:
+            host_counts = [int(size) for size in sizes.split(",") if size]
+        except ValueError:
+            raise CommandError(f"Invalid --upload-hosts '{sizes}'")
+        if not host_counts:
+            raise CommandError("--upload-hosts needs at least one size")
+
+        operations = []
+        for hosts in host_counts:
+            run = generate_run(rng, MockOptions(hosts_per_log=hosts))
+            body = run.raw_content.encode("utf-8")
+            name = f"POST /api/logs/ ({hosts} hosts, {format_size(len(body))})"
+
+            def build(rng, body=body, hosts=hosts):
+                return Request(
+                    "POST",
+                    f"/api/logs/?title=loadtest-{hosts}-hosts",
+                    body,
+                    {"Content-Type": "text/plain; charset=utf-8"},
+                )
+
+            operations.append(Operation(name, weight / len(host_counts), build))
+        return operations
+
+    def display_results(self, result):
+        """Display the latency, errors and queries of each endpoint."""
+        self.stdout.write("\n" + "=" * 78)
+        self.stdout.write(
+            self.style.HTTP_INFO(
+                f"{result.requests} requests in {result.elapsed:.1f}s "
+                f"({result.requests / result.elapsed:.1f} req/s)"
+            )
+        )
+        self.stdout.write("=" * 78)
+        for name, stats in result.endpoints.items():
+            summary = stats.summary(result.elapsed)
+            latency = summary["latency_ms"]
+            style = self.style.ERROR if stats.errors else self.style.SUCCESS
+            self.stdout.write(self.style.HTTP_INFO(f"\n{name}"))
+            self.stdout.write(
+                f"  {stats.requests} requests ({summary['throughput']:.1f}/s), "
+                + style(f"{stats.errors} errors ({stats.error_rate:.1%})")
+                + ", statuses "
+                + ", ".join(f"{code}: {n}" for code, n in summary["statuses"].items())
+            )
+            self.stdout.write(
+                f"  latency p50 {latency['p50']:.1f}ms, p90 {latency['p90']:.1f}ms, "
+                f"p99 {latency['p99']:.1f}ms, max {latency['max']:.1f}ms"
+            )
+            queries = summary["queries"]
+            self.stdout.write(
+                f"  queries mean {queries['mean']:.1f}, max {queries['max']}"
+                if queries
+                else "  queries n/a (start the server with API_QUERY_COUNT_HEADER)"
+            )
+            self.display_histogram(stats.histogram())
+        self.stdout.write("")
+
+    def display_histogram(self, histogram):
+        """Display the latency buckets holding requests, as bars."""
+        largest = max((count for _, count in histogram), default=0)
+        if not largest:
+            return
+        counts = [count for _, count in histogram]
+        first = next(i for i, count in enumerate(counts) if count)
+        last = max(i for i, count in enumerate(counts) if count)
+        for label, count in histogram[first : last + 1]:
+            bar = "#" * round(count / largest * 40)
+            self.stdout.write(f"  {label:>10} | {bar} {count}")
+
+    @staticmethod
+    def write_report(result, options):
+        """Write the run settings and results to the --output JSON file."""
+        report = {
+            "url": options["url"],
+            "concurrency": options["concurrency"],
+            "duration": result.elapsed,
+            "mix": options["mix"],
+            "requests": result.requests,
+            "endpoints": {
+                name: stats.summary(result.elapsed)
+                for name, stats in result.endpoints.items()
+            },
+        }
+        with open(options["output"], "w", encoding="utf-8") as output:
+            json.dump(report, output, indent=2)
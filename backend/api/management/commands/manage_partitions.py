@@ -0,0 +1,75 @@
+"""
+Django management command to maintain monthly Task partitions (PostgreSQL).
+
+Usage:
+    python manage.py manage_partitions                    # Create upcoming partitions
+    python manage.py manage_partitions --months-ahead 6   # ... further ahead
+    python manage.py manage_partitions --convert          # Partition an existing table
+    python manage.py manage_partitions --list             # Show partitions
+
+Does nothing unless TASK_PARTITIONING is enabled and the database is
+PostgreSQL, so it is safe to run on every deployment.
+"""
+
+from django.core.management.base import BaseCommand
+
+from api.services.partitions import (
+    convert_to_partitioned,
+    ensure_partitions,
+    is_partitioned,
+    list_partitions,
+    partition_name,
+    partitioning_enabled,
+)
+
+
+class Command(BaseCommand):
+    help = "Create upcoming monthly partitions of the Task table (PostgreSQL)"
+
+    def add_arguments(self, parser):
+        """Define command-line arguments."""
+        parser.add_argument(
+            "--months-ahead",
+            type=int,
+            default=None,
+            help="Months to create ahead of the current one "
+            "(default: TASK_PARTITION_MONTHS_AHEAD)",
+        )
+        parser.add_argument(
+            "--convert",
+            action="store_true",
+            help="Convert an existing regular api_task table to partitions "
+            "(copies all rows)",
+        )
+        parser.add_argument(
+            "--list",
+            action="store_true",
+            help="List the existing monthly partitions",
+        )
+
+    def handle(self, *args, **options):
+        """Main command handler."""
+        if not partitioning_enabled():
+            self.stdout.write("Task partitioning is disabled, nothing to do")
+            return
+
+        if options["convert"] and convert_to_partitioned():
+            self.stdout.write(self.style.SUCCESS("Converted api_task to partitions"))
+
+        if not is_partitioned():
+            self.stdout.write(
+                self.style.WARNING(
+                    "api_task is not partitioned yet, run with --convert first"
+                )
+            )
+            return
+
+        created = ensure_partitions(months_ahead=options["months_ahead"])
+        for name in created:
+            self.stdout.write(self.style.SUCCESS(f"  Created {name}"))
+
+        if options["list"]:
+            for month in list_partitions():
+                self.stdout.write(f"  {partition_name(month)}")
+
+        self.stdout.write(f"Created {len(created)} partition(s)")
@@ -0,0 +1,126 @@
+"""
+Django management command to delete old logs in bounded batches.
+
+Usage:
+    python manage.py purge_logs --older-than 90d            # Logs older than 90 days
+    python manage.py purge_logs --older-than 90d --dry-run  # Only count rows
+    python manage.py purge_logs --older-than 12w --batch-size 5000 --sleep 0.1
+
+Rows are deleted bottom-up (tasks, plays, hosts, then the log) in batches of
+--batch-size rows, each in its own transaction, pausing --sleep seconds
+between batches. An interrupted run can simply be started again. When the
+Task table is partitioned, monthly partitions older than the cutoff are
+dropped first. The raw log blobs of the deleted logs are then collected,
+unless other logs share them.
+"""
+
+import argparse
+import re
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from api.services.partitions import (
+    drop_partitions_before,
+    is_partitioned,
+    partitioning_enabled,
+)
+from api.services.purge import (
+    DEFAULT_BATCH_SIZE,
+    PurgeStats,
+    count_purge,
+    logs_older_than,
+    purge_log,
+)
+from api.services.raw_storage import collect_garbage
+
+AGE_PATTERN = re.compile(r"^(\d+)([smhdw]?)$")
+AGE_UNITS = {"s": "seconds", "m": "minutes", "h": "hours", "d": "days", "w": "weeks"}
+
+
+def parse_age(value: str) -> timedelta:
+    """Parse an age like "90d", "12h" or "2w" (a bare number means days)."""
+    match = AGE_PATTERN.match(value.strip())
+    if not match:
+        raise argparse.ArgumentTypeError(
+            f"Invalid age '{value}' (expected e.g. 90d, 12h, 2w)"
+        )
+    amount, unit = match.groups()
+    return timedelta(**{AGE_UNITS[unit or "d"]: int(amount)})
+
+
+class Command(BaseCommand):
+    help = "Delete logs older than a given age in bounded, throttled batches"
+
+    def add_arguments(self, parser):
+        """Define command-line arguments."""
+        parser.add_argument(
+            "--older-than",
+            type=parse_age,
+            required=True,
+            help="Delete logs uploaded more than this long ago (e.g. 90d, 12h, 2w)",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help=f"Rows per DELETE statement (default: {DEFAULT_BATCH_SIZE})",
+        )
+        parser.add_argument(
+            "--sleep",
+            type=float,
+            default=0.0,
+            help="Seconds to pause between batches (default: 0)",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only report how many rows would be deleted",
+        )
+
+    def handle(self, *args, **options):
+        """Main command handler."""
+        cutoff = timezone.now() - options["older_than"]
+        logs = logs_older_than(cutoff)
+
+        if options["dry_run"]:
+            stats = count_purge(logs)
+            self.stdout.write(
+                f"Would delete {stats.logs} logs, {stats.hosts} hosts, "
+                f"{stats.plays} plays, {stats.tasks} tasks "
+                f"(uploaded before {cutoff:%Y-%m-%d %H:%M})"
+            )
+            return
+
+        stats = PurgeStats()
+
+        # With partitioning, whole months of tasks go away with DROP TABLE
+        if partitioning_enabled() and is_partitioned():
+            for name in drop_partitions_before(cutoff):
+                self.stdout.write(f"  Dropped partition {name}")
+
+        # Materialize the ids first: rows are deleted while we iterate
+        for log_id in list(logs.values_list("pk", flat=True)):
+            log = logs.filter(pk=log_id).first()
+            if log is None:
+                continue
+            purge_log(
+                log,
+                batch_size=options["batch_size"],
+                sleep=options["sleep"],
+                stats=stats,
+            )
+            self.stdout.write(
+                f"  Deleted {log.title} ({log.uploaded_at:%Y-%m-%d %H:%M}) - "
+                f"{stats.rows} rows so far, {stats.rows_per_second:.0f} rows/s"
+            )
+
+        blobs = collect_garbage(blobs=stats.raw_blobs)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Deleted {stats.logs} logs, {stats.hosts} hosts, "
+                f"{stats.plays} plays, {stats.tasks} tasks in {stats.elapsed:.1f}s "
+                f"({stats.rows_per_second:.0f} rows/s), {blobs} raw log blob(s)"
+            )
+        )
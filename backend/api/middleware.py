@@ -0,0 +1,321 @@
+"""Middleware for the Ansibeau API."""
+
+import gzip
+import json
+import logging
+import time
+from pathlib import Path
+from typing import Callable
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.utils.cache import patch_vary_headers
+
+from .services.metrics import REQUEST_DURATION
+from .services.metrics import is_enabled as metrics_enabled
+from .services.profiling import (
+    STAGES,
+    SlowRequestSampler,
+    profile_request,
+    server_timing,
+)
+from .services.query_count import count_queries, install
+
+profiling_logger = logging.getLogger("api.profiling")
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional dependency
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - optional dependency
+    zstandard = None
+
+
+def _compress_gzip(content: bytes) -> bytes:
+    return gzip.compress(content, compresslevel=6, mtime=0)
+
+
+def _compress_brotli(content: bytes) -> bytes:
+    return brotli.compress(content, quality=5)
+
+
+def _compress_zstd(content: bytes) -> bytes:
+    return zstandard.ZstdCompressor(level=3).compress(content)
+
+
+def available_encodings() -> list[tuple[str, Callable[[bytes], bytes]]]:
+    """Return supported content encodings, best first."""
+    encodings = []
+    if zstandard is not None:
+        encodings.append(("zstd", _compress_zstd))
+    if brotli is not None:
+        encodings.append(("br", _compress_brotli))
+    encodings.append(("gzip", _compress_gzip))
+    return encodings
+
+
+def parse_accept_encoding(header: str) -> dict[str, float]:
+    """
+    Parse an Accept-Encoding header into a {coding: qvalue} dict.
+
+    Example: "gzip, br;q=0.8, zstd;q=0" -> {"gzip": 1.0, "br": 0.8, "zstd": 0.0}
+    """
+    accepted = {}
+    for part in header.split(","):
+        coding, _, params = part.strip().partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        qvalue = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                qvalue = float(params[2:])
+            except ValueError:
+                qvalue = 0.0
+        accepted[coding] = qvalue
+    return accepted
+
+
+class CompressionMiddleware:
+    """
+    Compress API responses larger than API_COMPRESSION_MIN_SIZE bytes.
+
+    Picks the first of zstd, brotli and gzip accepted by the client (zstd and
+    brotli only when the optional modules are installed). Only paths under
+    API_COMPRESSION_PATH_PREFIXES are compressed, which keeps CSRF-bearing
+    admin pages out of reach of BREACH-style attacks. Streaming responses
+    are passed through untouched. Works in both sync (WSGI) and async (ASGI)
+    middleware chains.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.min_size = getattr(settings, "API_COMPRESSION_MIN_SIZE", 1024)
+        self.path_prefixes = tuple(
+            getattr(settings, "API_COMPRESSION_PATH_PREFIXES", ["/api/"])
+        )
+        self.encodings = available_encodings()
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        return self.process(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return self.process(request, await self.get_response(request))
+
+    def process(self, request, response):
+        """Compress the response when the request path and client allow it."""
+        if not request.path.startswith(self.path_prefixes):
+            return response
+
+        # Vary on Accept-Encoding even when we skip compression below, since
+        # a different client may get a compressed variant of this resource
+        patch_vary_headers(response, ("Accept-Encoding",))
+
+        if (
+            response.streaming
+            or response.has_header("Content-Encoding")
+            or len(response.content) < self.min_size
+        ):
+            return response
+
+        accepted = parse_accept_encoding(request.META.get("HTTP_ACCEPT_ENCODING", ""))
+        for name, compress in self.encodings:
+            if accepted.get(name, 0) > 0:
+                break
+        else:
+            return response
+
+        compressed = compress(response.content)
+        if len(compressed) >= len(response.content):
+            return response
+
+        response.content = compressed
+        response.headers["Content-Length"] = str(len(compressed))
+        response.headers["Content-Encoding"] = name
+
+        # The ETag of the uncompressed body is no longer a strong validator
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            response.headers["ETag"] = "W/" + etag
+
+        return response
+
+
+class QueryCountMiddleware:
+    """
+    Report the number of database queries of each request (API_QUERY_COUNT_HEADER).
+
+    Adds an X-DB-Queries response header, used by the loadtest command. Only
+    the queries run before the response is returned are counted, not those
+    of a streaming response body. Disabled by default.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, "API_QUERY_COUNT_HEADER", False):
+            raise MiddlewareNotUsed
+        install()
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        with count_queries() as queries:
+            response = self.get_response(request)
+        response.headers["X-DB-Queries"] = str(queries.count)
+        return response
+
+    async def __acall__(self, request):
+        with count_queries() as queries:
+            response = await self.get_response(request)
+        response.headers["X-DB-Queries"] = str(queries.count)
+        return response
+
+
+class MetricsMiddleware:
+    """
+    Record the duration of each request per view and method (METRICS_ENABLED).
+
+    Requests matching no URL are recorded under the "unmatched" view. The
+    body of streaming responses is not timed. Disabled by default.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not metrics_enabled():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        start = time.perf_counter()
+        response = self.get_response(request)
+        self.record(request, time.perf_counter() - start)
+        return response
+
+    async def __acall__(self, request):
+        start = time.perf_counter()
+        response = await self.get_response(request)
+        self.record(request, time.perf_counter() - start)
+        return response
+
+    @staticmethod
+    def record(request, duration: float) -> None:
+        match = request.resolver_match
+        REQUEST_DURATION.observe(
+            duration,
+            view=match.view_name if match else "unmatched",
+            method=request.method,
+        )
+
+
+class RequestProfilingMiddleware:
+    """
+    Profile each request (API_PROFILING): total time, database queries and
+    their time, log parsing and response serialization time.
+
+    The timings are sent in a Server-Timing response header, shown by the
+    browser devtools, and logged as one JSON object per request by the
+    "api.profiling" logger. A sample of the requests
+    (API_PROFILING_SAMPLE_RATE) also runs under cProfile: the profiles of
+    those among the slowest API_PROFILING_SLOWEST_PERCENT % of recent
+    requests are written to API_PROFILING_DIR. The body of streaming
+    responses is not profiled.
+
+    Under ASGI, the views run in worker threads, out of reach of a cProfile
+    profiler started by the middleware: requests are timed and logged but
+    not sampled. Disabled by default.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, "API_PROFILING", False):
+            raise MiddlewareNotUsed
+        install()
+        self.get_response = get_response
+        self.sampler = SlowRequestSampler(
+            sample_rate=getattr(settings, "API_PROFILING_SAMPLE_RATE", 0.0),
+            slowest_percent=getattr(settings, "API_PROFILING_SLOWEST_PERCENT", 1.0),
+            directory=Path(getattr(settings, "API_PROFILING_DIR", "profiles")),
+        )
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        profiler = self.sampler.start()
+        try:
+            with profile_request() as profile, count_queries() as queries:
+                response = self.get_response(request)
+        finally:
+            if profiler is not None:
+                self.sampler.stop(profiler)
+        return self.report(request, response, profile, queries, profiler)
+
+    async def __acall__(self, request):
+        with profile_request() as profile, count_queries() as queries:
+            response = await self.get_response(request)
+        return self.report(request, response, profile, queries, None)
+
+    def report(self, request, response, profile, queries, profiler):
+        """Add the Server-Timing header, log the request and keep its profile."""
+        duration = time.perf_counter() - profile.started
+
+        metrics = [
+            ("total", duration, ""),
+            ("db", queries.duration, f"{queries.count} queries"),
+        ]
+        metrics += [(stage, profile.stages.get(stage, 0.0), "") for stage in STAGES]
+        response.headers["Server-Timing"] = server_timing(metrics)
+
+        saved = None
+        slow = self.sampler.record(duration, profiled=profiler is not None)
+        if profiler is not None and slow:
+            saved = self.sampler.save(profiler, request.method, request.path, duration)
+
+        profiling_logger.info(
+            json.dumps(
+                {
+                    "method": request.method,
+                    "path": request.path,
+                    "status": response.status_code,
+                    "total_ms": round(duration * 1000, 1),
+                    "db_queries": queries.count,
+                    "db_ms": round(queries.duration * 1000, 1),
+                    **{
+                        f"{stage}_ms": round(profile.stages.get(stage, 0.0) * 1000, 1)
+                        for stage in STAGES
+                    },
+                    "profile": str(saved) if saved else None,
+                }
+            )
+        )
+        return response
@@ -0,0 +1,74 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("api", "0002_token"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RawLogBlob",
+            fields=[
+                (
+                    "sha256",
+                    models.CharField(max_length=64, primary_key=True, serialize=False),
+                ),
+                (
+                    "data",
+                    models.BinaryField(help_text="zstd or gzip compressed log content"),
+                ),
+                (
+                    "size",
+                    models.PositiveBigIntegerField(
+                        help_text="Compressed size in bytes"
+                    ),
+                ),
+                (
+                    "written_at",
+                    models.DateTimeField(
+                        help_text="Last time this blob was stored or reused"
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Raw log blob",
+                "verbose_name_plural": "Raw log blobs",
+            },
+        ),
+        migrations.AddField(
+            model_name="log",
+            name="raw_compressed_size",
+            field=models.PositiveBigIntegerField(
+                default=0, help_text="Stored (compressed) raw log size in bytes"
+            ),
+        ),
+        migrations.AddField(
+            model_name="log",
+            name="raw_sha256",
+            field=models.CharField(
+                blank=True,
+                db_index=True,
+                help_text="SHA-256 of the raw log content (UTF-8)",
+                max_length=64,
+            ),
+        ),
+        migrations.AddField(
+            model_name="log",
+            name="raw_size",
+            field=models.PositiveBigIntegerField(
+                default=0, help_text="Raw log size in bytes"
+            ),
+        ),
+        migrations.AddField(
+            model_name="log",
+            name="raw_storage",
+            field=models.CharField(
+                blank=True,
+                help_text="Storage backend holding the raw log",
+                max_length=20,
+            ),
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:02
+
+import gzip
+import hashlib
+
+from django.db import migrations
+from django.utils import timezone
+
+
+def move_raw_content(apps, schema_editor):
+    """Compress existing raw_content into RawLogBlob rows."""
+    Log = apps.get_model("api", "Log")
+    RawLogBlob = apps.get_model("api", "RawLogBlob")
+
+    logs = Log.objects.exclude(raw_content="").only("id", "raw_content")
+    for log in logs.iterator(chunk_size=100):
+        data = log.raw_content.encode("utf-8")
+        sha256 = hashlib.sha256(data).hexdigest()
+        blob = RawLogBlob.objects.filter(sha256=sha256).only("size").first()
+        if blob is None:
+            compressed = gzip.compress(data, compresslevel=6, mtime=0)
+            blob = RawLogBlob.objects.create(
+                sha256=sha256,
+                data=compressed,
+                size=len(compressed),
+                written_at=timezone.now(),
+            )
+        Log.objects.filter(pk=log.pk).update(
+            raw_storage="db",
+            raw_sha256=sha256,
+            raw_size=len(data),
+            raw_compressed_size=blob.size,
+        )
+
+
+def restore_raw_content(apps, schema_editor):
+    """Decompress database-stored blobs back into raw_content."""
+    Log = apps.get_model("api", "Log")
+    RawLogBlob = apps.get_model("api", "RawLogBlob")
+
+    logs = Log.objects.filter(raw_storage="db").only("id", "raw_sha256")
+    for log in logs.iterator(chunk_size=100):
+        data = bytes(RawLogBlob.objects.get(sha256=log.raw_sha256).data)
+        if data.startswith(b"\x28\xb5\x2f\xfd"):
+            import zstandard
+
+            data = zstandard.ZstdDecompressor().decompress(data)
+        else:
+            data = gzip.decompress(data)
+        raw_content = data.decode("utf-8")
+        Log.objects.filter(pk=log.pk).update(raw_content=raw_content)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("api", "0003_log_raw_storage"),
+    ]
+
+    operations = [
+        migrations.RunPython(move_raw_content, restore_raw_content),
+    ]
@@ -0,0 +1,16 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:02
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("api", "0004_move_raw_content_to_blobs"),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name="log",
+            name="raw_content",
+        ),
+    ]
@@ -0,0 +1,77 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:40
+
+from django.db import migrations
+
+SOURCE = (
+    "FROM api_task t "
+    "JOIN api_play p ON p.id = t.play_id "
+    "JOIN api_host h ON h.id = p.host_id "
+    "JOIN api_log l ON l.id = h.log_id"
+)
+
+POSTGRES_FORWARD = [
+    "CREATE TABLE api_task_search ("
+    "task_id uuid PRIMARY KEY, "
+    "log_id uuid NOT NULL, "
+    "uploaded_at timestamp with time zone NOT NULL, "
+    "status varchar(15) NOT NULL, "
+    "document tsvector NOT NULL)",
+    "CREATE INDEX api_task_search_document_idx "
+    "ON api_task_search USING GIN (document)",
+    "CREATE INDEX api_task_search_uploaded_idx "
+    "ON api_task_search (uploaded_at DESC, task_id DESC)",
+    "CREATE INDEX api_task_search_log_idx ON api_task_search (log_id)",
+    "INSERT INTO api_task_search (task_id, log_id, uploaded_at, status, document) "
+    "SELECT t.id, h.log_id, l.uploaded_at, t.status, "
+    "setweight(to_tsvector('simple', t.name), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(t.failure_message, '')), 'B') || "
+    "setweight(to_tsvector('simple', p.name), 'C') || "
+    "setweight(to_tsvector('simple', h.hostname), 'D') " + SOURCE,
+]
+
+POSTGRES_BACKWARD = ["DROP TABLE IF EXISTS api_task_search"]
+
+SQLITE_FORWARD = [
+    "CREATE VIRTUAL TABLE api_task_fts USING fts5("
+    "task_name, failure_message, play_name, hostname, "
+    "task_id UNINDEXED, log_id UNINDEXED, status UNINDEXED, uploaded_at UNINDEXED)",
+    "INSERT INTO api_task_fts (task_name, failure_message, play_name, hostname, "
+    "task_id, log_id, status, uploaded_at) "
+    "SELECT t.name, coalesce(t.failure_message, ''), p.name, h.hostname, "
+    "t.id, h.log_id, t.status, l.uploaded_at " + SOURCE,
+]
+
+SQLITE_BACKWARD = ["DROP TABLE IF EXISTS api_task_fts"]
+
+
+def _run(schema_editor, statements):
+    for statement in statements:
+        schema_editor.execute(statement)
+
+
+def create_search_index(apps, schema_editor):
+    """Create and fill the vendor-specific task search index."""
+    vendor = schema_editor.connection.vendor
+    if vendor == "postgresql":
+        _run(schema_editor, POSTGRES_FORWARD)
+    elif vendor == "sqlite":
+        _run(schema_editor, SQLITE_FORWARD)
+
+
+def drop_search_index(apps, schema_editor):
+    """Drop the vendor-specific task search index."""
+    vendor = schema_editor.connection.vendor
+    if vendor == "postgresql":
+        _run(schema_editor, POSTGRES_BACKWARD)
+    elif vendor == "sqlite":
+        _run(schema_editor, SQLITE_BACKWARD)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("api", "0005_remove_log_raw_content"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("api", "0006_task_search_index"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="host",
+            name="log_uploaded_at",
+            field=models.DateTimeField(
+                blank=True,
+                help_text="Upload time of the log (copied from Log)",
+                null=True,
+            ),
+        ),
+        migrations.AddField(
+            model_name="host",
+            name="plays_failed",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="host",
+            name="status",
+            field=models.CharField(
+                blank=True,
+                choices=[("ok", "OK"), ("changed", "Changed"), ("failed", "Failed")],
+                help_text="Worst play status on this host",
+                max_length=10,
+            ),
+        ),
+        migrations.AddField(
+            model_name="host",
+            name="tasks_failed",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name="host",
+            index=models.Index(
+                fields=["hostname", "-log_uploaded_at"], name="api_host_history_idx"
+            ),
+        ),
+    ]
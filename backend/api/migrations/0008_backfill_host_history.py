@@ -0,0 +1,53 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:05
+
+from django.db import migrations
+from django.db.models import Count, Q, Sum
+
+BATCH_SIZE = 1000
+
+
+def backfill_host_summaries(apps, schema_editor):
+    """Fill the per-run summary fields of existing hosts from their plays."""
+    Host = apps.get_model("api", "Host")
+
+    hosts = (
+        Host.objects.select_related("log")
+        .annotate(
+            plays_failed_count=Count("plays", filter=Q(plays__status="failed")),
+            plays_changed_count=Count("plays", filter=Q(plays__status="changed")),
+            tasks_failed_sum=Sum("plays__tasks_failed"),
+        )
+        .order_by("pk")
+    )
+
+    batch = []
+    for host in hosts.iterator(chunk_size=BATCH_SIZE):
+        host.log_uploaded_at = host.log.uploaded_at
+        host.plays_failed = host.plays_failed_count
+        host.tasks_failed = host.tasks_failed_sum or 0
+        if host.plays_failed_count:
+            host.status = "failed"
+        elif host.plays_changed_count:
+            host.status = "changed"
+        else:
+            host.status = "ok"
+        batch.append(host)
+        if len(batch) >= BATCH_SIZE:
+            Host.objects.bulk_update(
+                batch, ["log_uploaded_at", "status", "plays_failed", "tasks_failed"]
+            )
+            batch = []
+    if batch:
+        Host.objects.bulk_update(
+            batch, ["log_uploaded_at", "status", "plays_failed", "tasks_failed"]
+        )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("api", "0007_host_history"),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_host_summaries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("api", "0008_backfill_host_history"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="task",
+            name="created_at",
+            field=models.DateTimeField(
+                editable=False, help_text="Upload time of the log this task belongs to"
+            ),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:09
+
+from django.db import migrations
+
+STAMP_TASKS = (
+    "UPDATE api_task SET created_at = ("
+    "SELECT l.uploaded_at FROM api_play p "
+    "JOIN api_host h ON h.id = p.host_id "
+    "JOIN api_log l ON l.id = h.log_id "
+    "WHERE p.id = api_task.play_id)"
+)
+
+
+def stamp_tasks_with_log_upload_time(apps, schema_editor):
+    """Set created_at of existing tasks to the upload time of their log."""
+    schema_editor.execute(STAMP_TASKS)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("api", "0009_task_created_at_log_upload"),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            stamp_tasks_with_log_upload_time, migrations.RunPython.noop
+        ),
+    ]
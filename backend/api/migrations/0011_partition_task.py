@@ -0,0 +1,130 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:09
+
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.db import migrations
+
+# The rebuild is frozen here rather than imported from api.services.partitions,
+# so later changes to the service do not change what this migration does.
+# Experimental: only runs on PostgreSQL with TASK_PARTITIONING enabled.
+
+TABLE = "api_task"
+OLD_TABLE = f"{TABLE}_old"
+PKEY = f"{TABLE}_pkey"
+DEFAULT_PARTITION = f"{TABLE}_default"
+PARTITION_PREFIX = f"{TABLE}_p"
+# Monthly partitions created after the current month
+MONTHS_AHEAD = 3
+
+
+def _month_start(value):
+    value = value.astimezone(timezone.utc)
+    return datetime(value.year, value.month, 1, tzinfo=timezone.utc)
+
+
+def _next_month(value):
+    if value.month == 12:
+        return value.replace(year=value.year + 1, month=1)
+    return value.replace(month=value.month + 1)
+
+
+def _is_partitioned(cursor):
+    cursor.execute(
+        "SELECT 1 FROM pg_partitioned_table pt "
+        "JOIN pg_class c ON c.oid = pt.partrelid "
+        "WHERE c.relname = %s AND pg_table_is_visible(c.oid)",
+        [TABLE],
+    )
+    return cursor.fetchone() is not None
+
+
+def _rebuild_table(cursor, partitioned):
+    """Recreate api_task (partitioned or not) and copy the rows over."""
+    cursor.execute(
+        "SELECT indexname, indexdef FROM pg_indexes "
+        "WHERE tablename = %s AND schemaname = current_schema()",
+        [TABLE],
+    )
+    indexes = cursor.fetchall()
+    cursor.execute(
+        "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+        "WHERE conrelid = %s::regclass AND contype = 'f'",
+        [TABLE],
+    )
+    foreign_keys = cursor.fetchall()
+
+    cursor.execute(f"ALTER TABLE {TABLE} RENAME TO {OLD_TABLE}")
+    # Free the index names so they can be reused on the new table
+    for index_name, _ in indexes:
+        cursor.execute(f"ALTER INDEX {index_name} RENAME TO {index_name}_old")
+
+    partition_clause = " PARTITION BY RANGE (created_at)" if partitioned else ""
+    cursor.execute(
+        f"CREATE TABLE {TABLE} "
+        f"(LIKE {OLD_TABLE} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"
+        f"{partition_clause}"
+    )
+    # The partition key must be part of the primary key
+    pkey_columns = "id, created_at" if partitioned else "id"
+    cursor.execute(
+        f"ALTER TABLE {TABLE} ADD CONSTRAINT {PKEY} PRIMARY KEY ({pkey_columns})"
+    )
+    for name, definition in foreign_keys:
+        cursor.execute(f"ALTER TABLE {TABLE} ADD CONSTRAINT {name} {definition}")
+    # The definitions were read before the rename, so they target the new table
+    for index_name, definition in indexes:
+        if index_name != PKEY:
+            cursor.execute(definition)
+
+    if partitioned:
+        cursor.execute(f"CREATE TABLE {DEFAULT_PARTITION} PARTITION OF {TABLE} DEFAULT")
+        cursor.execute(f"SELECT min(created_at) FROM {OLD_TABLE}")
+        oldest = cursor.fetchone()[0]
+        now = datetime.now(timezone.utc)
+        month = _month_start(oldest or now)
+        end = _month_start(now)
+        for _ in range(MONTHS_AHEAD):
+            end = _next_month(end)
+        while month <= end:
+            cursor.execute(
+                f"CREATE TABLE {PARTITION_PREFIX}{month:%Y%m} PARTITION OF {TABLE} "
+                f"FOR VALUES FROM ('{month:%Y-%m-%d} 00:00:00+00') "
+                f"TO ('{_next_month(month):%Y-%m-%d} 00:00:00+00')"
+            )
+            month = _next_month(month)
+
+    cursor.execute(f"INSERT INTO {TABLE} SELECT * FROM {OLD_TABLE}")
+    cursor.execute(f"DROP TABLE {OLD_TABLE}")
+
+
+def partition_task_table(apps, schema_editor):
+    """Convert api_task to monthly partitions when TASK_PARTITIONING is on."""
+    connection = schema_editor.connection
+    if connection.vendor != "postgresql":
+        return
+    if not getattr(settings, "TASK_PARTITIONING", False):
+        return
+    with connection.cursor() as cursor:
+        if not _is_partitioned(cursor):
+            _rebuild_table(cursor, partitioned=True)
+
+
+def unpartition_task_table(apps, schema_editor):
+    """Convert a partitioned api_task back into a regular table."""
+    connection = schema_editor.connection
+    if connection.vendor != "postgresql":
+        return
+    with connection.cursor() as cursor:
+        if _is_partitioned(cursor):
+            _rebuild_table(cursor, partitioned=False)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("api", "0010_backfill_task_created_at"),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_task_table, unpartition_task_table),
+    ]
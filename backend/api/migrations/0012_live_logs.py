@@ -0,0 +1,66 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:15
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("api", "0011_partition_task"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="log",
+            name="parse_state",
+            field=models.JSONField(
+                blank=True,
+                help_text="Incremental parser state of a running log",
+                null=True,
+            ),
+        ),
+        migrations.AddField(
+            model_name="log",
+            name="status",
+            field=models.CharField(
+                choices=[("running", "Running"), ("complete", "Complete")],
+                db_index=True,
+                default="complete",
+                max_length=10,
+            ),
+        ),
+        migrations.CreateModel(
+            name="LogChunk",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "seq",
+                    models.PositiveIntegerField(help_text="Chunk position (0-indexed)"),
+                ),
+                ("content", models.TextField()),
+                ("received_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "log",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="chunks",
+                        to="api.log",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Log chunk",
+                "verbose_name_plural": "Log chunks",
+                "ordering": ["seq"],
+                "unique_together": {("log", "seq")},
+            },
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:19
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("api", "0012_live_logs"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="LogEvent",
+            fields=[
+                ("id", models.BigAutoField(primary_key=True, serialize=False)),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[("update", "Update"), ("complete", "Complete")],
+                        max_length=10,
+                    ),
+                ),
+                ("payload", models.JSONField(default=dict)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "log",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="events",
+                        to="api.log",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Log event",
+                "verbose_name_plural": "Log events",
+                "ordering": ["id"],
+                "indexes": [
+                    models.Index(
+                        fields=["log", "id"], name="api_logeven_log_id_e47bf8_idx"
+                    )
+                ],
+            },
+        ),
+    ]
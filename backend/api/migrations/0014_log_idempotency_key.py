@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("api", "0013_log_events"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="log",
+            name="idempotency_key",
+            field=models.CharField(
+                blank=True,
+                help_text="Idempotency-Key header of the upload request",
+                max_length=255,
+                null=True,
+                unique=True,
+            ),
+        ),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:59
+
+import django.db.models.expressions
+from django.db import migrations, models
+from django.db.models import Exists, OuterRef
+
+
+def flag_failed_logs(apps, schema_editor):
+    """Set has_failures on the existing logs with a failed play."""
+    Log = apps.get_model("api", "Log")
+    Play = apps.get_model("api", "Play")
+    Log.objects.filter(
+        Exists(Play.objects.filter(host__log=OuterRef("pk"), status="failed"))
+    ).update(has_failures=True)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("api", "0014_log_idempotency_key"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="log",
+            name="has_failures",
+            field=models.BooleanField(
+                default=False, help_text="Whether a play of the log failed"
+            ),
+        ),
+        migrations.RunPython(flag_failed_logs, migrations.RunPython.noop),
+        migrations.AddField(
+            model_name="play",
+            name="tasks_total",
+            field=models.GeneratedField(
+                db_persist=True,
+                expression=django.db.models.expressions.CombinedExpression(
+                    django.db.models.expressions.CombinedExpression(
+                        models.F("tasks_ok"), "+", models.F("tasks_changed")
+                    ),
+                    "+",
+                    models.F("tasks_failed"),
+                ),
+                output_field=models.IntegerField(),
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="log",
+            index=models.Index(
+                fields=["has_failures", "-uploaded_at"], name="api_log_failures_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="play",
+            index=models.Index(
+                fields=["host", "status"], name="api_play_host_status_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="play",
+            index=models.Index(fields=["tasks_total"], name="api_play_tasks_total_idx"),
+        ),
+    ]
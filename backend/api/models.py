@@ -1,30 +1,163 @@
 import uuid
 from django.db import models
+from django.db.models import F
 
 
 class Log(models.Model):
     """Represents an Ansible log file uploaded by the frontend."""
 
+    STATUS_CHOICES = [
+        ("running", "Running"),
+        ("complete", "Complete"),
+    ]
+
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     title = models.CharField(max_length=255)
     uploaded_at = models.DateTimeField(auto_now_add=True)
-    raw_content = models.TextField(blank=True, help_text="Raw log file content")
+
+    # Live logs are "running" while chunks are appended (see api.services.live_log)
+    status = models.CharField(
+        max_length=10, choices=STATUS_CHOICES, default="complete", db_index=True
+    )
+    parse_state = models.JSONField(
+        null=True,
+        blank=True,
+        help_text="Incremental parser state of a running log",
+    )
+
+    # Denormalized at ingest (and by live logs) for the admin failure filter
+    has_failures = models.BooleanField(
+        default=False, help_text="Whether a play of the log failed"
+    )
+
+    # Reference to the compressed raw log (see api.services.raw_storage)
+    raw_storage = models.CharField(
+        max_length=20, blank=True, help_text="Storage backend holding the raw log"
+    )
+    raw_sha256 = models.CharField(
+        max_length=64,
+        blank=True,
+        db_index=True,
+        help_text="SHA-256 of the raw log content (UTF-8)",
+    )
+    raw_size = models.PositiveBigIntegerField(
+        default=0, help_text="Raw log size in bytes"
+    )
+    raw_compressed_size = models.PositiveBigIntegerField(
+        default=0, help_text="Stored (compressed) raw log size in bytes"
+    )
+
+    # Idempotency-Key of the upload request, so retried uploads return this log
+    idempotency_key = models.CharField(
+        max_length=255,
+        null=True,
+        blank=True,
+        unique=True,
+        help_text="Idempotency-Key header of the upload request",
+    )
 
     class Meta:
         ordering = ["-uploaded_at"]
         verbose_name = "Log"
         verbose_name_plural = "Logs"
+        indexes = [
+            # Failed (or successful) logs, most recent first
+            models.Index(
+                fields=["has_failures", "-uploaded_at"], name="api_log_failures_idx"
+            ),
+        ]
 
     def __str__(self):
         return f"{self.title} ({self.uploaded_at.strftime('%Y-%m-%d %H:%M')})"
 
 
+class RawLogBlob(models.Model):
+    """Compressed raw log content, addressed by the SHA-256 of the raw text."""
+
+    sha256 = models.CharField(max_length=64, primary_key=True)
+    data = models.BinaryField(help_text="zstd or gzip compressed log content")
+    size = models.PositiveBigIntegerField(help_text="Compressed size in bytes")
+    written_at = models.DateTimeField(
+        help_text="Last time this blob was stored or reused"
+    )
+
+    class Meta:
+        verbose_name = "Raw log blob"
+        verbose_name_plural = "Raw log blobs"
+
+    def __str__(self):
+        return self.sha256
+
+
+class LogChunk(models.Model):
+    """A chunk of raw content appended to a running log."""
+
+    log = models.ForeignKey(Log, on_delete=models.CASCADE, related_name="chunks")
+    seq = models.PositiveIntegerField(help_text="Chunk position (0-indexed)")
+    content = models.TextField()
+    received_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["seq"]
+        verbose_name = "Log chunk"
+        verbose_name_plural = "Log chunks"
+        unique_together = [["log", "seq"]]
+
+    def __str__(self):
+        return f"{self.log_id} #{self.seq}"
+
+
+class LogEvent(models.Model):
+    """A change to a running log, streamed to clients watching it."""
+
+    KIND_CHOICES = [
+        ("update", "Update"),
+        ("complete", "Complete"),
+    ]
+
+    # Sequential ids order the events and serve as SSE event ids
+    id = models.BigAutoField(primary_key=True)
+    log = models.ForeignKey(Log, on_delete=models.CASCADE, related_name="events")
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    payload = models.JSONField(default=dict)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["id"]
+        verbose_name = "Log event"
+        verbose_name_plural = "Log events"
+        indexes = [models.Index(fields=["log", "id"])]
+
+    def __str__(self):
+        return f"{self.log_id} #{self.id} ({self.kind})"
+
+
 class Host(models.Model):
     """Represents a server/host that Ansible plays are executed on."""
 
+    STATUS_CHOICES = [
+        ("ok", "OK"),
+        ("changed", "Changed"),
+        ("failed", "Failed"),
+    ]
+
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     log = models.ForeignKey(Log, on_delete=models.CASCADE, related_name="hosts")
     hostname = models.CharField(max_length=255, db_index=True)
+
+    # Per-run summary, denormalized at ingest for the host history timeline
+    log_uploaded_at = models.DateTimeField(
+        null=True, blank=True, help_text="Upload time of the log (copied from Log)"
+    )
+    status = models.CharField(
+        max_length=10,
+        choices=STATUS_CHOICES,
+        blank=True,
+        help_text="Worst play status on this host",
+    )
+    plays_failed = models.PositiveIntegerField(default=0)
+    tasks_failed = models.PositiveIntegerField(default=0)
+
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -33,10 +166,44 @@ class Host(models.Model):
         verbose_name = "Host"
         verbose_name_plural = "Hosts"
         unique_together = [["log", "hostname"]]
+        indexes = [
+            models.Index(
+                fields=["hostname", "-log_uploaded_at"],
+                name="api_host_history_idx",
+            ),
+        ]
 
     def __str__(self):
         return f"{self.hostname} (Log: {self.log.title})"
 
+    def update_summary(self, save=True):
+        """Recompute the per-run summary fields from this host's plays."""
+        statuses = set()
+        self.plays_failed = 0
+        self.tasks_failed = 0
+        for play in self.plays.all():
+            statuses.add(play.status)
+            self.tasks_failed += play.tasks_failed
+            if play.status == "failed":
+                self.plays_failed += 1
+        if "failed" in statuses:
+            self.status = "failed"
+        elif "changed" in statuses:
+            self.status = "changed"
+        else:
+            self.status = "ok"
+        self.log_uploaded_at = self.log.uploaded_at
+        if save:
+            self.save(
+                update_fields=[
+                    "log_uploaded_at",
+                    "status",
+                    "plays_failed",
+                    "tasks_failed",
+                    "updated_at",
+                ]
+            )
+
 
 class Play(models.Model):
     """Represents a single Ansible play execution on a host."""
@@ -57,6 +224,12 @@ class Play(models.Model):
     tasks_ok = models.IntegerField(default=0)
     tasks_changed = models.IntegerField(default=0)
     tasks_failed = models.IntegerField(default=0)
+    # Stored by the database, so that task count ranges can use an index
+    tasks_total = models.GeneratedField(
+        expression=F("tasks_ok") + F("tasks_changed") + F("tasks_failed"),
+        output_field=models.IntegerField(),
+        db_persist=True,
+    )
 
     # Log position fields
     line_number = models.PositiveIntegerField(
@@ -76,6 +249,9 @@ class Play(models.Model):
         indexes = [
             models.Index(fields=["host", "order"]),
             models.Index(fields=["status", "-date"]),
+            # Exists() subqueries of the admin filters on play statuses
+            models.Index(fields=["host", "status"], name="api_play_host_status_idx"),
+            models.Index(fields=["tasks_total"], name="api_play_tasks_total_idx"),
         ]
 
     def __str__(self):
@@ -117,7 +293,12 @@ class Task(models.Model):
         blank=True, null=True, help_text="Error message when task fails"
     )
 
-    created_at = models.DateTimeField(auto_now_add=True)
+    # Stamped with the log's upload time rather than the insert time, so all
+    # tasks of a log share one value (the partition key on PostgreSQL, see
+    # api.services.partitions) and log-scoped queries can filter on it
+    created_at = models.DateTimeField(
+        editable=False, help_text="Upload time of the log this task belongs to"
+    )
 
     class Meta:
         ordering = ["order"]
@@ -131,6 +312,11 @@ class Task(models.Model):
     def __str__(self):
         return f"{self.name} ({self.status}) - {self.play.host.hostname}"
 
+    def save(self, *args, **kwargs):
+        if self.created_at is None:
+            self.created_at = self.play.host.log.uploaded_at
+        super().save(*args, **kwargs)
+
 
 class Token(models.Model):
     """API token for authenticating log submissions."""
@@ -0,0 +1,97 @@
+"""DRF parsers for the Ansibeau API."""
+
+import json
+
+from django.core.files import File
+from django.http import QueryDict
+from django.utils.datastructures import MultiValueDict
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser, DataAndFiles, JSONParser
+
+from .services.log_upload import UploadTooLarge, spool_stream
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+
+class FastJSONParser(JSONParser):
+    """
+    JSON parser backed by orjson when it is installed.
+
+    Falls back to DRF's stdlib-based JSONParser otherwise.
+    """
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        if orjson is None:
+            return super().parse(stream, media_type, parser_context)
+
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+            raise ParseError(f"JSON parse error - {exc}")
+
+
+class NDJSONParser(BaseParser):
+    """
+    Parser for newline-delimited JSON bodies (``application/x-ndjson``).
+
+    The body is spooled like raw log uploads and decoded line by line into
+    a list, one item per non-blank line.
+    """
+
+    media_type = "application/x-ndjson"
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        if stream is None:
+            return []
+        try:
+            spooled = spool_stream(stream)
+        except UploadTooLarge as exc:
+            raise ParseError(str(exc))
+
+        loads = orjson.loads if orjson is not None else json.loads
+        items = []
+        with spooled:
+            for number, line in enumerate(spooled, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    items.append(loads(line))
+                except ValueError as exc:
+                    raise ParseError(f"NDJSON parse error on line {number} - {exc}")
+        return items
+
+
+class PlainTextLogParser(BaseParser):
+    """
+    Parser for raw log bodies (``Content-Type: text/plain``).
+
+    The body is streamed to a spooled temporary file and exposed as the
+    ``file`` upload, so it goes through the same path as multipart uploads.
+    The log title (uploads) and the chunk sequence number (live log appends)
+    are taken from the ``title`` and ``seq`` query parameters.
+    """
+
+    media_type = "text/plain"
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        request = parser_context.get("request")
+
+        data = QueryDict(mutable=True)
+        if request is not None:
+            for name in ("title", "seq"):
+                if name in request.query_params:
+                    data[name] = request.query_params[name]
+
+        files = MultiValueDict()
+        if stream is not None:
+            try:
+                spooled = spool_stream(stream)
+            except UploadTooLarge as exc:
+                raise ParseError(str(exc))
+            files["file"] = File(spooled, name="upload.log")
+
+        return DataAndFiles(data, files)
@@ -1,7 +1,7 @@
 from django.conf import settings
 from rest_framework.permissions import BasePermission
 
-from .models import Token
+from .services.token_cache import token_cache
 
 
 class HasValidToken(BasePermission):
@@ -24,9 +24,8 @@ class HasValidToken(BasePermission):
             self.message = "Token value is empty"
             return False
 
-        try:
-            token = Token.objects.get(value=token_value)
-        except Token.DoesNotExist:
+        token = token_cache.get_token(token_value)
+        if token is None:
             self.message = "Invalid token"
             return False
 
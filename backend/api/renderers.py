@@ -0,0 +1,68 @@
+"""DRF renderers for the Ansibeau API."""
+
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils import encoders
+
+from .services.profiling import timed
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+# UTF-8 encoded U+2028 and U+2029, valid in JSON strings but not in JavaScript
+LINE_SEPARATOR = "\u2028".encode()
+PARAGRAPH_SEPARATOR = "\u2029".encode()
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSON renderer backed by orjson when it is installed.
+
+    Falls back to DRF's stdlib-based JSONRenderer otherwise. Types orjson
+    does not handle natively (Decimal, lazy strings, ...) and datetimes are
+    delegated to DRF's JSONEncoder so the output format stays identical.
+    """
+
+    _encoder = encoders.JSONEncoder()
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        with timed("serialize"):
+            return self._render(data, accepted_media_type, renderer_context)
+
+    def _render(self, data, accepted_media_type, renderer_context):
+        if orjson is None:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        if data is None:
+            return b""
+
+        renderer_context = renderer_context or {}
+        option = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+        # orjson only supports a 2-space indent
+        if self.get_indent(accepted_media_type, renderer_context):
+            option |= orjson.OPT_INDENT_2
+
+        ret = orjson.dumps(data, default=self._encoder.default, option=option)
+        # Escape U+2028 and U+2029 like DRF, so the output is a strict
+        # JavaScript subset
+        return ret.replace(LINE_SEPARATOR, b"\\u2028").replace(
+            PARAGRAPH_SEPARATOR, b"\\u2029"
+        )
+
+
+class PlainTextRenderer(BaseRenderer):
+    """Renderer for text/plain endpoints; error payloads render their detail."""
+
+    media_type = "text/plain"
+    format = "txt"
+    charset = "utf-8"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        if isinstance(data, bytes):
+            return data
+        if isinstance(data, dict) and "detail" in data:
+            data = data["detail"]
+        return str(data).encode(self.charset)
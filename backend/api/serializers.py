@@ -1,5 +1,38 @@
 from rest_framework import serializers
 from .models import Log, Host, Play, Task
+from .services.live_log import create_live_log
+from .services.log_batch import InvalidArchive, get_max_entries, read_archive_entries
+from .services.log_upload import (
+    InvalidUpload,
+    UploadTooLarge,
+    get_max_upload_size,
+    read_log_text,
+)
+from .services.profiling import timed
+from .services.raw_storage import attach_raw_content
+
+
+class ProfiledListSerializer(serializers.ListSerializer):
+    """List serializer timing its output in the request profile."""
+
+    @property
+    def data(self):
+        with timed("serialize"):
+            return super().data
+
+
+class ProfiledSerializerMixin:
+    """
+    Times `.data` in the "serialize" stage of the request profile.
+
+    Serializers used with many=True time their list with
+    ``list_serializer_class = ProfiledListSerializer`` in their Meta.
+    """
+
+    @property
+    def data(self):
+        with timed("serialize"):
+            return super().data
 
 
 class TaskSummarySerializer(serializers.Serializer):
@@ -15,10 +48,48 @@ class TaskSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Task
+        list_serializer_class = ProfiledListSerializer
         fields = ["id", "name", "order", "line_number", "status", "failure_message"]
         read_only_fields = ["id"]
 
 
+class TaskSearchHitSerializer(serializers.ModelSerializer):
+    """Serializer for task search hits with links to their play, host and log."""
+
+    play_id = serializers.UUIDField(source="play.id", read_only=True)
+    play_name = serializers.CharField(source="play.name", read_only=True)
+    play_line_number = serializers.IntegerField(
+        source="play.line_number", read_only=True
+    )
+    host_id = serializers.UUIDField(source="play.host.id", read_only=True)
+    hostname = serializers.CharField(source="play.host.hostname", read_only=True)
+    log_id = serializers.UUIDField(source="play.host.log.id", read_only=True)
+    log_title = serializers.CharField(source="play.host.log.title", read_only=True)
+    uploaded_at = serializers.DateTimeField(
+        source="play.host.log.uploaded_at", read_only=True
+    )
+
+    class Meta:
+        model = Task
+        list_serializer_class = ProfiledListSerializer
+        fields = [
+            "id",
+            "name",
+            "status",
+            "failure_message",
+            "line_number",
+            "play_id",
+            "play_name",
+            "play_line_number",
+            "host_id",
+            "hostname",
+            "log_id",
+            "log_title",
+            "uploaded_at",
+        ]
+        read_only_fields = fields
+
+
 class PlayListSerializer(serializers.ModelSerializer):
     """Serializer for Play model without tasks_list (for log listing routes)."""
 
@@ -81,6 +152,7 @@ class HostSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Host
+        list_serializer_class = ProfiledListSerializer
         fields = ["id", "hostname", "plays"]
         read_only_fields = ["id"]
 
@@ -96,6 +168,19 @@ class HostListSerializer(serializers.ModelSerializer):
         read_only_fields = ["id"]
 
 
+class HostHistorySerializer(serializers.ModelSerializer):
+    """Compact per-run entry of a host's history timeline."""
+
+    log_id = serializers.UUIDField(read_only=True)
+    uploaded_at = serializers.DateTimeField(source="log_uploaded_at", read_only=True)
+
+    class Meta:
+        model = Host
+        list_serializer_class = ProfiledListSerializer
+        fields = ["log_id", "uploaded_at", "status", "plays_failed", "tasks_failed"]
+        read_only_fields = fields
+
+
 class PlayCreateSerializer(serializers.ModelSerializer):
     """Serializer for creating plays with nested task summary data."""
 
@@ -117,7 +202,7 @@ class PlayCreateSerializer(serializers.ModelSerializer):
         return value
 
 
-class LogSerializer(serializers.ModelSerializer):
+class LogSerializer(ProfiledSerializerMixin, serializers.ModelSerializer):
     """Serializer for Log model with nested hosts."""
 
     hosts = HostSerializer(many=True, read_only=True)
@@ -125,8 +210,8 @@ class LogSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Log
-        fields = ["id", "title", "uploaded_at", "hosts", "host_count"]
-        read_only_fields = ["id", "uploaded_at"]
+        fields = ["id", "title", "uploaded_at", "status", "hosts", "host_count"]
+        read_only_fields = ["id", "uploaded_at", "status"]
 
 
 class LogListSerializer(serializers.ModelSerializer):
@@ -136,19 +221,252 @@ class LogListSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Log
-        fields = ["id", "title", "uploaded_at", "host_count"]
-        read_only_fields = ["id", "uploaded_at"]
+        fields = ["id", "title", "uploaded_at", "status", "host_count"]
+        read_only_fields = ["id", "uploaded_at", "status"]
 
 
 class LogCreateSerializer(serializers.ModelSerializer):
-    """Serializer for creating/uploading logs."""
+    """
+    Serializer for creating/uploading logs.
+
+    The log content is given either inline as ``raw_content`` or as an
+    uploaded ``file`` (multipart or raw text/plain body, optionally gzipped).
+    """
+
+    raw_content = serializers.CharField(
+        write_only=True,
+        required=False,
+        allow_blank=True,
+        help_text="Raw log file content",
+    )
+    file = serializers.FileField(
+        write_only=True,
+        required=False,
+        help_text="Log file upload, optionally gzip-compressed",
+    )
 
     class Meta:
         model = Log
-        fields = ["title", "raw_content"]
+        fields = ["title", "raw_content", "file"]
 
     def validate_title(self, value):
         """Ensure title is not empty."""
         if not value or not value.strip():
             raise serializers.ValidationError("Title cannot be empty")
         return value.strip()
+
+    def validate(self, attrs):
+        """Read the uploaded file, if any, into raw_content."""
+        upload = attrs.pop("file", None)
+        if upload is None:
+            return attrs
+
+        if attrs.get("raw_content"):
+            raise serializers.ValidationError(
+                "Provide either raw_content or file, not both"
+            )
+        try:
+            attrs["raw_content"] = read_log_text(upload)
+        except (InvalidUpload, UploadTooLarge) as exc:
+            raise serializers.ValidationError({"file": str(exc)})
+        finally:
+            upload.close()
+        return attrs
+
+    def create(self, validated_data):
+        """Create the log, storing its raw content in raw log storage."""
+        raw_content = validated_data.pop("raw_content", "")
+        log = Log(**validated_data)
+        attach_raw_content(log, raw_content)
+        log.save()
+        return log
+
+
+class LogBatchEntrySerializer(serializers.Serializer):
+    """Serializer for one log of a batch upload."""
+
+    title = serializers.CharField(max_length=255, allow_blank=True)
+    raw_content = serializers.CharField(allow_blank=True)
+
+    def validate_title(self, value):
+        """Ensure title is not empty."""
+        if not value.strip():
+            raise serializers.ValidationError("Title cannot be empty")
+        return value.strip()
+
+
+class LogBatchSerializer(serializers.Serializer):
+    """
+    Serializer for a batch of logs to upload and parse in one request.
+
+    The logs are given as ``logs`` entries (the request body may also be
+    the list of entries itself, as JSON or NDJSON) or as a tar or zip
+    archive ``file`` of log files.
+    """
+
+    logs = LogBatchEntrySerializer(many=True, required=False)
+    file = serializers.FileField(
+        write_only=True,
+        required=False,
+        help_text="tar or zip archive of log files, titled after their names",
+    )
+
+    def to_internal_value(self, data):
+        if isinstance(data, list):
+            data = {"logs": data}
+        return super().to_internal_value(data)
+
+    def validate(self, attrs):
+        """Read the archive, if any, and check the size of the batch."""
+        upload = attrs.pop("file", None)
+        if upload is not None:
+            if attrs.get("logs"):
+                raise serializers.ValidationError(
+                    "Provide either logs or file, not both"
+                )
+            try:
+                entries = read_archive_entries(upload)
+            except (InvalidArchive, UploadTooLarge) as exc:
+                raise serializers.ValidationError({"file": str(exc)})
+            finally:
+                upload.close()
+            archived = LogBatchEntrySerializer(data=entries, many=True)
+            if not archived.is_valid():
+                raise serializers.ValidationError({"file": archived.errors})
+            attrs["logs"] = archived.validated_data
+
+        logs = attrs.get("logs")
+        if not logs:
+            raise serializers.ValidationError("The batch holds no logs")
+        max_entries = get_max_entries()
+        if len(logs) > max_entries:
+            raise serializers.ValidationError(
+                f"A batch holds at most {max_entries} logs"
+            )
+        max_size = get_max_upload_size()
+        if sum(len(entry["raw_content"]) for entry in logs) > max_size:
+            raise serializers.ValidationError(
+                f"Batch exceeds the maximum size of {max_size} bytes"
+            )
+        return attrs
+
+
+class LogBatchResultSerializer(ProfiledSerializerMixin, serializers.ModelSerializer):
+    """Serializer for a log created by a batch upload."""
+
+    # Set from the parse result by the batch action, saving a count query
+    host_count = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = Log
+        fields = ["id", "title", "uploaded_at", "status", "host_count"]
+        read_only_fields = fields
+
+
+class LiveLogCreateSerializer(serializers.ModelSerializer):
+    """Serializer for creating a live log, whose content is appended later."""
+
+    class Meta:
+        model = Log
+        fields = ["title"]
+
+    def validate_title(self, value):
+        """Ensure title is not empty."""
+        if not value or not value.strip():
+            raise serializers.ValidationError("Title cannot be empty")
+        return value.strip()
+
+    def create(self, validated_data):
+        return create_live_log(validated_data["title"])
+
+
+class LogChunkSerializer(serializers.Serializer):
+    """
+    Serializer for a chunk appended to a live log.
+
+    The chunk is given either inline as ``content`` or as an uploaded
+    ``file`` (multipart or raw text/plain body, optionally gzipped).
+    """
+
+    content = serializers.CharField(
+        required=False, allow_blank=True, trim_whitespace=False
+    )
+    file = serializers.FileField(required=False)
+    seq = serializers.IntegerField(
+        required=False,
+        min_value=0,
+        help_text="Chunk position (0-indexed); chunks already received are ignored",
+    )
+
+    def validate(self, attrs):
+        """Read the uploaded file, if any, into content."""
+        upload = attrs.pop("file", None)
+        if upload is None:
+            attrs.setdefault("content", "")
+            return attrs
+
+        if attrs.get("content"):
+            raise serializers.ValidationError(
+                "Provide either content or file, not both"
+            )
+        try:
+            attrs["content"] = read_log_text(upload)
+        except (InvalidUpload, UploadTooLarge) as exc:
+            raise serializers.ValidationError({"file": str(exc)})
+        finally:
+            upload.close()
+        return attrs
+
+
+class LogResultEventSerializer(serializers.Serializer):
+    """
+    Serializer for a structured event sent by the Ansible callback plugin.
+
+    "play" and "task" events need a ``name`` (plays may have a ``date``),
+    "result" events a ``host`` and ``status`` (failed results a
+    ``message``) and "recap" events a ``host`` with its ``stats``.
+    """
+
+    EVENT_CHOICES = ["play", "task", "result", "recap"]
+    REQUIRED_FIELDS = {
+        "play": ["name"],
+        "task": ["name"],
+        "result": ["host", "status"],
+        "recap": ["host"],
+    }
+
+    event = serializers.ChoiceField(choices=EVENT_CHOICES)
+    name = serializers.CharField(required=False, max_length=500)
+    date = serializers.DateTimeField(required=False, allow_null=True)
+    host = serializers.CharField(required=False, max_length=255)
+    status = serializers.ChoiceField(choices=Task.STATUS_CHOICES, required=False)
+    message = serializers.CharField(
+        required=False, allow_null=True, allow_blank=True, trim_whitespace=False
+    )
+    stats = serializers.DictField(
+        child=serializers.IntegerField(min_value=0), required=False
+    )
+
+    def validate(self, attrs):
+        """Ensure the fields required by the event type are present."""
+        missing = [
+            name for name in self.REQUIRED_FIELDS[attrs["event"]] if name not in attrs
+        ]
+        if missing:
+            raise serializers.ValidationError(
+                {name: "This field is required." for name in missing}
+            )
+        return attrs
+
+
+class LogResultsSerializer(serializers.Serializer):
+    """Serializer for a batch of structured events appended to a live log."""
+
+    MAX_EVENTS = 10000
+
+    events = LogResultEventSerializer(many=True, max_length=MAX_EVENTS)
+    seq = serializers.IntegerField(
+        required=False,
+        min_value=0,
+        help_text="Batch position (0-indexed); batches already received are ignored",
+    )
@@ -0,0 +1,192 @@
+"""
+Service streaming the events of running logs to clients (Server-Sent Events).
+
+Appends to a live log record LogEvent rows (see api.services.live_log). In
+each server process, one producer per watched log polls for new events every
+LIVE_EVENTS_POLL_INTERVAL seconds and fans them out to all the clients of
+that process watching the log, so the database load grows with the number
+of watched logs, not with the number of clients.
+
+Events are upserts (new hosts, current play counters, failed tasks), so a
+client may safely receive an event twice. Clients connecting without a
+Last-Event-ID get every event of the log since it started.
+"""
+
+import asyncio
+import logging
+from contextlib import suppress
+from typing import AsyncIterator, Iterator, Optional
+
+from django.conf import settings
+
+from ..models import LogEvent
+from ..renderers import FastJSONRenderer
+
+logger = logging.getLogger(__name__)
+
+# Sent before the stream closes when the log is no longer running
+COMPLETE = b"event: complete\ndata: {}\n\n"
+
+
+def get_poll_interval() -> float:
+    return getattr(settings, "LIVE_EVENTS_POLL_INTERVAL", 1.0)
+
+
+def get_heartbeat_interval() -> float:
+    return getattr(settings, "LIVE_EVENTS_HEARTBEAT", 15.0)
+
+
+def format_event(event: LogEvent) -> bytes:
+    """Format a LogEvent as a Server-Sent Events message."""
+    data = FastJSONRenderer().render(event.payload)
+    return (
+        f"id: {event.id}\nevent: {event.kind}\n".encode() + b"data: " + data + b"\n\n"
+    )
+
+
+def _events(log_id, after: Optional[int], until: Optional[int] = None):
+    events = LogEvent.objects.filter(log_id=log_id).order_by("id")
+    if after is not None:
+        events = events.filter(id__gt=after)
+    if until is not None:
+        events = events.filter(id__lte=until)
+    return events
+
+
+class LogEventProducer:
+    """Polls the events of one log and hands them to its subscribers."""
+
+    def __init__(self, broker: "LogEventBroker", log_id, last_id: int):
+        self.broker = broker
+        self.log_id = log_id
+        self.last_id = last_id
+        self.subscribers: set[asyncio.Queue] = set()
+        self.task: Optional[asyncio.Task] = None
+
+    async def run(self) -> None:
+        try:
+            while self.subscribers:
+                events = [event async for event in _events(self.log_id, self.last_id)]
+                for event in events:
+                    self.last_id = event.id
+                    for queue in self.subscribers:
+                        queue.put_nowait(event)
+                if any(event.kind == "complete" for event in events):
+                    break
+                await asyncio.sleep(get_poll_interval())
+        except Exception:
+            logger.exception("Event producer of log %s failed", self.log_id)
+        finally:
+            self.broker.remove(self)
+            for queue in self.subscribers:
+                queue.put_nowait(None)
+
+
+class LogEventBroker:
+    """Runs one LogEventProducer per log watched in this process."""
+
+    def __init__(self):
+        self._producers: dict = {}
+
+    def remove(self, producer: LogEventProducer) -> None:
+        if self._producers.get(producer.log_id) is producer:
+            del self._producers[producer.log_id]
+
+    async def subscribe(self, log_id, after: Optional[int]) -> AsyncIterator[LogEvent]:
+        """
+        Yield the events of a log after the event id `after`, as they arrive.
+
+        Ends after the "complete" event of the log.
+        """
+        producer = self._producers.get(log_id)
+        if producer is None:
+            latest = await _events(log_id, None).values_list("id", flat=True).alast()
+            # Another client may have started a producer meanwhile
+            producer = self._producers.get(log_id)
+            if producer is None:
+                producer = LogEventProducer(self, log_id, latest or 0)
+                self._producers[log_id] = producer
+                producer.task = asyncio.create_task(producer.run())
+
+        queue: asyncio.Queue = asyncio.Queue()
+        # No await between reading last_id and subscribing: every event after
+        # last_id goes through the queue, the ones before come from the backlog
+        backlog_end = producer.last_id
+        producer.subscribers.add(queue)
+        try:
+            seen = after or 0
+            async for event in _events(log_id, after, until=backlog_end):
+                seen = event.id
+                yield event
+                if event.kind == "complete":
+                    return
+            while (event := await queue.get()) is not None:
+                if event.id > seen:
+                    seen = event.id
+                    yield event
+                if event.kind == "complete":
+                    return
+        finally:
+            producer.subscribers.discard(queue)
+
+
+broker = LogEventBroker()
+
+
+async def stream_log_events(
+    log_id, after: Optional[int], running: bool
+) -> AsyncIterator[bytes]:
+    """
+    Yield the Server-Sent Events stream of a log.
+
+    Comments are sent every LIVE_EVENTS_HEARTBEAT seconds so proxies keep
+    the connection open.
+    """
+    yield b"retry: 3000\n\n"
+    if not running:
+        complete = False
+        async for event in _events(log_id, after):
+            complete = event.kind == "complete"
+            yield format_event(event)
+        if not complete:
+            yield COMPLETE
+        return
+
+    events = broker.subscribe(log_id, after).__aiter__()
+    next_event = asyncio.ensure_future(events.__anext__())
+    try:
+        while True:
+            done, _ = await asyncio.wait({next_event}, timeout=get_heartbeat_interval())
+            if not done:
+                yield b": keep-alive\n\n"
+                continue
+            try:
+                event = next_event.result()
+            except StopAsyncIteration:
+                return
+            yield format_event(event)
+            next_event = asyncio.ensure_future(events.__anext__())
+    finally:
+        next_event.cancel()
+        with suppress(asyncio.CancelledError, StopAsyncIteration):
+            await next_event
+        await events.aclose()
+
+
+def iter_log_event_backlog(
+    log_id, after: Optional[int], running: bool
+) -> Iterator[bytes]:
+    """
+    Yield the events of a log received so far, then end the stream.
+
+    Used under WSGI, where a response cannot wait for new events without
+    holding a worker: the client reconnects after the retry delay with its
+    Last-Event-ID, which turns the stream into long polling.
+    """
+    yield b"retry: 3000\n\n"
+    complete = False
+    for event in _events(log_id, after).iterator():
+        complete = event.kind == "complete"
+        yield format_event(event)
+    if not running and not complete:
+        yield COMPLETE
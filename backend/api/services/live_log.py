@@ -0,0 +1,817 @@
+"""
+Service for live logs, uploaded chunk by chunk while the playbook runs.
+
+A live log is created in the "running" state, receives raw content with
+append_chunk() and is closed with finalize_live_log() once the playbook
+ends. Chunks are parsed incrementally: the parser state saved on the log
+(Log.parse_state) holds the current play and task, the play order and the
+unparsed tail of the previous chunks, so an append only parses its own lines
+and only creates or updates the Host, Play and Task rows they mention.
+
+Logs can also be fed structured results by the Ansible callback plugin
+(append_results()), read by StructuredResultReader without any text parsing.
+
+Each append also records a compact LogEvent with the new hosts, the plays
+whose counters changed and the newly failed tasks, which
+api.services.live_events streams to the clients watching the log.
+
+The incremental parser follows LogParserService: tasks are keyed on (play,
+task name, order within the play section), serial batches repeating a play
+update the results of earlier batches, and a host's later result for a task
+replaces the earlier one.
+"""
+
+import json
+import re
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Optional
+
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from ..models import Host, Log, LogChunk, LogEvent, Play, Task
+from .log_parser import LogParserService, determine_play_status
+from .log_upload import UploadTooLarge, get_max_upload_size
+from .raw_storage import attach_raw_content
+from .search import index_log
+
+# Statuses counted in Play.tasks_failed (see compute_play_host_counts)
+FAILED_STATUSES = ("failed", "fatal", "unreachable")
+
+
+class LiveLogError(Exception):
+    """Raised when a chunk cannot be appended to a live log."""
+
+
+class LogNotRunning(LiveLogError):
+    """Raised when appending to or finalizing a log that is not running."""
+
+
+class ChunkOutOfOrder(LiveLogError):
+    """Raised when a chunk arrives before the chunks preceding it."""
+
+
+@dataclass
+class ParsedResult:
+    """A host result of a task, found in a chunk."""
+
+    play_name: str
+    task_name: str
+    order: int
+    line_number: int
+    hostname: str
+    status: str
+    message: Optional[str] = None
+
+
+@dataclass
+class ParsedChunk:
+    """What the incremental parser found in the lines of a chunk."""
+
+    results: list[ParsedResult] = field(default_factory=list)
+    recap_hosts: list[str] = field(default_factory=list)
+
+
+@dataclass
+class AppendResult:
+    """Outcome of an append_chunk call."""
+
+    seq: int
+    duplicate: bool = False
+    hosts_created: int = 0
+    plays_created: int = 0
+    tasks_created: int = 0
+    tasks_updated: int = 0
+
+
+@dataclass
+class LiveDelta:
+    """Rows created or changed by an append, recorded as a LogEvent."""
+
+    hosts: list[Host] = field(default_factory=list)
+    plays: dict = field(default_factory=dict)
+    failed_tasks: list[Task] = field(default_factory=list)
+
+    def __bool__(self):
+        return bool(self.hosts or self.plays or self.failed_tasks)
+
+    def payload(self) -> dict:
+        """Return the event payload, shaped like the log detail serializers."""
+        return {
+            "hosts": [
+                {"id": str(host.pk), "hostname": host.hostname, "plays": []}
+                for host in self.hosts
+            ],
+            "plays": [
+                {
+                    "id": str(play.pk),
+                    "host_id": str(play.host_id),
+                    "name": play.name,
+                    "date": play.date.isoformat() if play.date else None,
+                    "status": play.status,
+                    "tasks": play.tasks,
+                    "line_number": play.line_number,
+                    "order": play.order,
+                }
+                for play in self.plays.values()
+            ],
+            "failed_tasks": [
+                {
+                    "id": str(task.pk),
+                    "play_id": str(task.play_id),
+                    "host_id": str(task.play.host_id),
+                    "hostname": task.play.host.hostname,
+                    "play": task.play.name,
+                    "name": task.name,
+                    "status": task.status,
+                    "failure_message": task.failure_message,
+                    "line_number": task.line_number,
+                }
+                for task in self.failed_tasks
+            ],
+        }
+
+
+def initial_state() -> dict:
+    """Return the parser state of a live log with no content yet."""
+    return {
+        # Next expected chunk and total size received, in bytes
+        "seq": 0,
+        "size": 0,
+        # "play" (raw stdout) or "logs" (timestamped), detected on the
+        # first non-blank line
+        "format": None,
+        # Lines parsed so far, and the text received but not parsed yet
+        "line": 0,
+        "carry": "",
+        "play": None,
+        # [name, order, line number] of the task section being read
+        "task": None,
+        "in_recap": False,
+        # Next task order per play, reset on each PLAY header
+        "task_orders": {},
+        # Play name -> {"order:task name": line number of its first run}
+        "task_lines": {},
+        # Play name -> [order, line number of its first PLAY header]
+        "plays": {},
+        # Time of the last PLAY header of a timestamped log
+        "timestamp": None,
+    }
+
+
+class IncrementalLogParser:
+    """Parses a log chunk by chunk, resuming from a saved state."""
+
+    TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S,%f"
+    # "web1 : ok=2 changed=1 unreachable=0 failed=0 ..."
+    RECAP_PATTERN = re.compile(r"^(\S+)\s+:\s+ok=\d+")
+    # Lines following a failed result that may hold its message (see
+    # LogParserService._extract_failure_message)
+    FAILURE_LOOKAHEAD = 100
+
+    def __init__(self, state: Optional[dict] = None):
+        self.state = state if state is not None else initial_state()
+        self._service = LogParserService()
+
+    def feed(self, text: str, final: bool = False) -> ParsedChunk:
+        """
+        Parse the complete lines of `text`, appended to the previous chunks.
+
+        An incomplete last line, and a failed result whose message may
+        continue in the next chunk, are kept in the state for the next call.
+
+        Args:
+            text: Newly received log content
+            final: Whether this is the end of the log (parse everything)
+
+        Returns:
+            ParsedChunk with the task results and recap hosts found
+        """
+        state = self.state
+        text = state["carry"] + text
+
+        # A trailing CR may be the first half of a CRLF split across chunks
+        pending_cr = not final and text.endswith("\r")
+        if pending_cr:
+            text = text[:-1]
+        text = text.replace("\r\n", "\n").replace("\r", "\n")
+
+        lines = text.split("\n")
+        tail = "" if final else lines.pop()
+        if pending_cr:
+            tail += "\r"
+
+        if state["format"] is None:
+            first = next((line.strip() for line in lines if line.strip()), None)
+            if first is not None:
+                timestamped = self._service.TIMESTAMP_PATTERN.match(first)
+                state["format"] = "logs" if timestamped else "play"
+        plain = [self._strip_timestamp(line) for line in lines]
+
+        parsed = ParsedChunk()
+        i = 0
+        while i < len(plain):
+            stripped = plain[i].strip()
+            line_number = state["line"] + i + 1
+
+            if stripped.startswith("PLAY RECAP"):
+                state["task"] = None
+                state["in_recap"] = True
+            elif stripped.startswith("PLAY ["):
+                self._start_play(stripped, lines[i], line_number)
+            elif stripped.startswith("TASK ["):
+                self._start_task(stripped, line_number)
+            elif state["task"] is not None:
+                match = self._service.STATUS_PATTERN.match(stripped)
+                if match:
+                    status = match.group(1).lower()
+                    message = None
+                    if status in ("failed", "fatal"):
+                        if not final and not self._failure_complete(plain, i):
+                            # Wait for the rest of the failure block
+                            break
+                        message = self._service._extract_failure_message(plain, i)
+                    task_name, order, task_line = state["task"]
+                    parsed.results.append(
+                        ParsedResult(
+                            play_name=state["play"],
+                            task_name=task_name,
+                            order=order,
+                            line_number=task_line,
+                            hostname=match.group(2),
+                            status=status,
+                            message=message,
+                        )
+                    )
+            elif state["in_recap"]:
+                match = self.RECAP_PATTERN.match(stripped)
+                if match:
+                    parsed.recap_hosts.append(match.group(1))
+            i += 1
+
+        state["line"] += i
+        state["carry"] = "\n".join(lines[i:] + [tail])
+        return parsed
+
+    def _strip_timestamp(self, line: str) -> str:
+        if self.state["format"] != "logs":
+            return line
+        if self._service.TIMESTAMP_PATTERN.match(line):
+            pipe_idx = line.find(" | ")
+            if pipe_idx != -1:
+                return line[pipe_idx + 3 :]
+        return line
+
+    def _start_play(self, stripped: str, line: str, line_number: int) -> None:
+        self.state["task"] = None
+        self.state["in_recap"] = False
+        match = self._service.PLAY_PATTERN.search(stripped)
+        if not match:
+            return
+        self._enter_play(match.group(1), line_number)
+        if self.state["format"] == "logs":
+            self.state["timestamp"] = line.split(" | ", 1)[0]
+
+    def _start_task(self, stripped: str, line_number: int) -> None:
+        self.state["task"] = None
+        self.state["in_recap"] = False
+        match = self._service.TASK_PATTERN.search(stripped)
+        if match:
+            self._enter_task(match.group(1), line_number)
+
+    def _enter_play(self, name: str, line_number: int) -> None:
+        state = self.state
+        state["play"] = name
+        state["task_orders"][name] = 0
+        if name not in state["plays"]:
+            state["plays"][name] = [len(state["plays"]), line_number]
+
+    def _enter_task(self, name: str, line_number: int) -> None:
+        state = self.state
+        if state["play"] is None:
+            return
+        play = state["play"]
+        order = state["task_orders"].get(play, 0)
+        state["task_orders"][play] = order + 1
+        # Serial batches repeat a task: keep the line of its first run
+        task_lines = state["task_lines"].setdefault(play, {})
+        line_number = task_lines.setdefault(f"{order}:{name}", line_number)
+        state["task"] = [name, order, line_number]
+
+    def _failure_complete(self, lines: list[str], index: int) -> bool:
+        """Whether the lines after a failed result hold its whole message."""
+        if len(lines) - index > self.FAILURE_LOOKAHEAD:
+            return True
+        line = lines[index]
+        arrow_idx = line.find("=> {")
+        if arrow_idx != -1 and self._service._parse_msg_from_json(
+            line[arrow_idx + 3 :].strip()
+        ):
+            return True
+        return any(
+            following.strip().startswith(("TASK [", "PLAY [", "PLAY RECAP"))
+            for following in lines[index + 1 :]
+        )
+
+    @property
+    def timestamp(self) -> Optional[datetime]:
+        """Time of the last PLAY header (timestamped logs), like Logs does."""
+        value = self.state["timestamp"]
+        if not value:
+            return None
+        try:
+            return datetime.strptime(value, self.TIMESTAMP_FORMAT)
+        except ValueError:
+            return None
+
+
+class StructuredResultReader(IncrementalLogParser):
+    """
+    Reads the structured events sent by the Ansible callback plugin.
+
+    Events follow the callback calls: "play" and "task" start a section like
+    the PLAY and TASK headers, "result" is a host result of the current task
+    and "recap" the PLAY RECAP line of a host. No text is parsed; the events
+    are rendered as ansible-playbook output instead, which becomes the raw
+    log and gives plays and tasks their line numbers.
+    """
+
+    RECAP_STATS = (
+        "ok",
+        "changed",
+        "unreachable",
+        "failed",
+        "skipped",
+        "rescued",
+        "ignored",
+    )
+    RESULT_SUFFIXES = {
+        "failed": ": FAILED!",
+        "fatal": ": FAILED!",
+        "unreachable": ": UNREACHABLE!",
+    }
+
+    def read(self, events: list[dict]) -> tuple[ParsedChunk, str]:
+        """
+        Apply a batch of events to the state.
+
+        Args:
+            events: Validated events (see LogResultEventSerializer)
+
+        Returns:
+            Tuple of the ParsedChunk found and the rendered raw content
+        """
+        state = self.state
+        lines: list[str] = []
+
+        def emit(line: str) -> int:
+            lines.append(line)
+            return state["line"] + len(lines)
+
+        parsed = ParsedChunk()
+        for event in events:
+            kind = event["event"]
+            if kind == "play":
+                emit("")
+                line_number = emit(_header(f"PLAY [{event['name']}]"))
+                state["task"] = None
+                state["in_recap"] = False
+                self._enter_play(event["name"], line_number)
+                date = event.get("date")
+                state["timestamp"] = date.isoformat() if date else None
+            elif kind == "task":
+                emit("")
+                line_number = emit(_header(f"TASK [{event['name']}]"))
+                state["task"] = None
+                state["in_recap"] = False
+                self._enter_task(event["name"], line_number)
+            elif kind == "result":
+                status = event["status"]
+                line = f"{status}: [{event['host']}]"
+                message = event.get("message")
+                if message is not None:
+                    line += self.RESULT_SUFFIXES.get(status, "")
+                    line += " => " + json.dumps({"msg": message})
+                emit(line)
+                if state["task"] is None:
+                    continue
+                task_name, order, task_line = state["task"]
+                parsed.results.append(
+                    ParsedResult(
+                        play_name=state["play"],
+                        task_name=task_name,
+                        order=order,
+                        line_number=task_line,
+                        hostname=event["host"],
+                        status=status,
+                        message=message,
+                    )
+                )
+            elif kind == "recap":
+                if not state["in_recap"]:
+                    emit("")
+                    emit(_header("PLAY RECAP"))
+                    state["task"] = None
+                    state["in_recap"] = True
+                stats = event.get("stats") or {}
+                counts = "  ".join(
+                    f"{name}={stats.get(name, 0)}" for name in self.RECAP_STATS
+                )
+                emit(f"{event['host']:<26} : {counts}")
+                parsed.recap_hosts.append(event["host"])
+
+        state["line"] += len(lines)
+        return parsed, "".join(f"{line}\n" for line in lines)
+
+    @property
+    def timestamp(self) -> Optional[datetime]:
+        """Start time of the last play, as sent by the callback plugin."""
+        value = self.state["timestamp"]
+        return parse_datetime(value) if value else None
+
+
+def _header(title: str) -> str:
+    """Pad a section header with stars like ansible-playbook does."""
+    # Long titles still get a few stars, which parsers expect
+    return f"{title} " + "*" * max(3, 78 - len(title))
+
+
+def _parser_for(state: dict) -> IncrementalLogParser:
+    if state["format"] == "structured":
+        return StructuredResultReader(state)
+    return IncrementalLogParser(state)
+
+
+def create_live_log(title: str) -> Log:
+    """Create an empty log in the "running" state."""
+    return Log.objects.create(
+        title=title, status="running", parse_state=initial_state()
+    )
+
+
+def _count(play: Play, status: str, delta: int) -> None:
+    """Add `delta` to the play counter of a task status."""
+    if status in FAILED_STATUSES:
+        play.tasks_failed += delta
+    elif status == "changed":
+        play.tasks_changed += delta
+    elif status == "ok":
+        play.tasks_ok += delta
+    # skipping, ignored, rescued not counted in the 3-field summary
+
+
+def _get_hosts(
+    log: Log, hostnames: set[str], result: AppendResult, delta: LiveDelta
+) -> dict:
+    """Return the hosts of a log by hostname, creating the missing ones."""
+    hosts = {
+        host.hostname: host
+        for host in Host.objects.filter(log=log, hostname__in=hostnames)
+    }
+    missing = [
+        Host(
+            log=log,
+            hostname=hostname,
+            log_uploaded_at=log.uploaded_at,
+            status="ok",
+        )
+        for hostname in sorted(hostnames - hosts.keys())
+    ]
+    Host.objects.bulk_create(missing)
+    result.hosts_created += len(missing)
+    delta.hosts.extend(missing)
+    hosts.update((host.hostname, host) for host in missing)
+    return hosts
+
+
+def _new_play(host: Host, name: str, state: dict, date) -> Play:
+    order, line_number = state["plays"][name]
+    return Play(
+        host=host,
+        name=name,
+        date=date,
+        status="ok",
+        line_number=line_number,
+        order=order,
+    )
+
+
+def _apply(
+    log: Log,
+    parser: IncrementalLogParser,
+    parsed: ParsedChunk,
+    result: AppendResult,
+    delta: LiveDelta,
+) -> None:
+    """Create and update the rows for what the parser found in a chunk."""
+    if not parsed.results and not parsed.recap_hosts:
+        return
+
+    hostnames = {r.hostname for r in parsed.results} | set(parsed.recap_hosts)
+    hosts = _get_hosts(log, hostnames, result, delta)
+    if not parsed.results:
+        return
+
+    # Plays of the (host, play) pairs mentioned in the chunk
+    play_names = {r.play_name for r in parsed.results}
+    plays = {
+        (play.host_id, play.name): play
+        for play in Play.objects.select_related("host").filter(
+            host__in=[hosts[r.hostname] for r in parsed.results], name__in=play_names
+        )
+    }
+    new_plays = []
+    for r in parsed.results:
+        key = (hosts[r.hostname].pk, r.play_name)
+        if key not in plays:
+            plays[key] = _new_play(
+                hosts[r.hostname], r.play_name, parser.state, parser.timestamp
+            )
+            new_plays.append(plays[key])
+    Play.objects.bulk_create(new_plays)
+    result.plays_created += len(new_plays)
+
+    # Existing tasks the chunk may update (serial batches, repeated results)
+    tasks = {
+        (task.play_id, task.order, task.name): task
+        for task in Task.objects.filter(
+            play__in=list(plays.values()),
+            created_at=log.uploaded_at,
+            order__in={r.order for r in parsed.results},
+        )
+    }
+    new_tasks, updated_tasks, changed_plays = [], {}, {}
+    for r in parsed.results:
+        play = plays[(hosts[r.hostname].pk, r.play_name)]
+        key = (play.pk, r.order, r.task_name)
+        task = tasks.get(key)
+        if task is None:
+            task = Task(
+                play=play,
+                created_at=log.uploaded_at,
+                name=r.task_name,
+                order=r.order,
+                line_number=r.line_number,
+                status=r.status,
+                failure_message=r.message,
+            )
+            tasks[key] = task
+            new_tasks.append(task)
+        elif (task.status, task.failure_message) != (r.status, r.message):
+            # A later result of the host for the same task wins
+            task.play = play
+            _count(play, task.status, -1)
+            task.status = r.status
+            task.failure_message = r.message
+            if not task._state.adding:
+                updated_tasks[task.pk] = task
+        else:
+            continue
+        _count(play, r.status, 1)
+        changed_plays[play.pk] = play
+        if r.status in FAILED_STATUSES:
+            delta.failed_tasks.append(task)
+
+    Task.objects.bulk_create(new_tasks)
+    Task.objects.bulk_update(
+        updated_tasks.values(), ["status", "failure_message"], batch_size=500
+    )
+    result.tasks_created += len(new_tasks)
+    result.tasks_updated += len(updated_tasks)
+
+    now = timezone.now()
+    for play in changed_plays.values():
+        play.status = determine_play_status(
+            play.tasks_ok, play.tasks_changed, play.tasks_failed
+        )
+        play.updated_at = now
+    Play.objects.bulk_update(
+        changed_plays.values(),
+        ["status", "tasks_ok", "tasks_changed", "tasks_failed", "updated_at"],
+        batch_size=500,
+    )
+    _update_host_summaries({play.host_id for play in changed_plays.values()}, now)
+    _update_has_failures(log)
+    delta.plays.update(changed_plays)
+
+
+def _update_host_summaries(host_ids: set, now) -> None:
+    """Recompute the per-run summary of hosts (see Host.update_summary)."""
+    if not host_ids:
+        return
+    summaries = (
+        Play.objects.filter(host_id__in=host_ids)
+        .values("host_id")
+        .annotate(
+            failed=Count("pk", filter=Q(status="failed")),
+            changed=Count("pk", filter=Q(status="changed")),
+            tasks_failed=Sum("tasks_failed"),
+        )
+    )
+    hosts = []
+    for summary in summaries:
+        if summary["failed"]:
+            status = "failed"
+        elif summary["changed"]:
+            status = "changed"
+        else:
+            status = "ok"
+        hosts.append(
+            Host(
+                pk=summary["host_id"],
+                status=status,
+                plays_failed=summary["failed"],
+                tasks_failed=summary["tasks_failed"] or 0,
+                updated_at=now,
+            )
+        )
+    Host.objects.bulk_update(
+        hosts, ["status", "plays_failed", "tasks_failed", "updated_at"]
+    )
+
+
+def _update_has_failures(log: Log) -> None:
+    """Flag the log if a play failed (a later result may clear the flag)."""
+    has_failures = Host.objects.filter(log=log, status="failed").exists()
+    if has_failures != log.has_failures:
+        log.has_failures = has_failures
+        Log.objects.filter(pk=log.pk).update(has_failures=has_failures)
+
+
+def _lock_running(log: Log) -> Log:
+    log = Log.objects.select_for_update().get(pk=log.pk)
+    if log.status != "running":
+        raise LogNotRunning("The log is not running")
+    return log
+
+
+def append_chunk(log: Log, content: str, seq: Optional[int] = None) -> AppendResult:
+    """
+    Append a chunk of raw content to a running log and parse its new lines.
+
+    Chunks carry a sequence number so clients can retry safely: a chunk
+    already received is ignored, a chunk arriving early is rejected.
+
+    Args:
+        log: The running log
+        content: Raw content of the chunk
+        seq: Position of the chunk (0-indexed), defaults to the next one
+
+    Returns:
+        AppendResult with the number of rows created and updated
+
+    Raises:
+        LogNotRunning: If the log is not running
+        ChunkOutOfOrder: If chunks before `seq` have not been received
+        UploadTooLarge: If the log would exceed LOG_UPLOAD_MAX_SIZE
+    """
+    with transaction.atomic():
+        log = _lock_running(log)
+        state = log.parse_state or initial_state()
+        if state["format"] == "structured":
+            raise LiveLogError("The log receives structured results, not content")
+
+        seq = _check_seq(state, seq)
+        if seq < state["seq"]:
+            return AppendResult(seq=seq, duplicate=True)
+
+        parser = IncrementalLogParser(state)
+        result = AppendResult(seq=seq)
+        _store(log, parser, parser.feed(content), content, result)
+    return result
+
+
+def append_results(
+    log: Log, events: list[dict], seq: Optional[int] = None
+) -> AppendResult:
+    """
+    Append a batch of structured results to a running log.
+
+    Batches are sent by the Ansible callback plugin instead of the raw
+    output: they skip text parsing, and are rendered as ansible-playbook
+    output for the raw log. Like chunks, batches carry a sequence number so
+    retries are safe. A log receives either chunks or batches, not both.
+
+    Args:
+        log: The running log
+        events: Validated events (see LogResultEventSerializer)
+        seq: Position of the batch (0-indexed), defaults to the next one
+
+    Returns:
+        AppendResult with the number of rows created and updated
+
+    Raises:
+        LiveLogError: If the log received raw content
+        LogNotRunning: If the log is not running
+        ChunkOutOfOrder: If batches before `seq` have not been received
+        UploadTooLarge: If the log would exceed LOG_UPLOAD_MAX_SIZE
+    """
+    with transaction.atomic():
+        log = _lock_running(log)
+        state = log.parse_state or initial_state()
+        if state["format"] not in (None, "structured"):
+            raise LiveLogError("The log receives content, not structured results")
+        state["format"] = "structured"
+
+        seq = _check_seq(state, seq)
+        if seq < state["seq"]:
+            return AppendResult(seq=seq, duplicate=True)
+
+        parser = StructuredResultReader(state)
+        result = AppendResult(seq=seq)
+        parsed, content = parser.read(events)
+        _store(log, parser, parsed, content, result)
+    return result
+
+
+def _check_seq(state: dict, seq: Optional[int]) -> int:
+    """Return the position of an append, raising if appends are missing."""
+    expected = state["seq"]
+    if seq is None:
+        return expected
+    if seq > expected:
+        raise ChunkOutOfOrder(f"Expected chunk {expected}, got chunk {seq}")
+    return seq
+
+
+def _store(
+    log: Log,
+    parser: IncrementalLogParser,
+    parsed: ParsedChunk,
+    content: str,
+    result: AppendResult,
+) -> None:
+    """Save an appended chunk, the rows it creates and the parser state."""
+    state = parser.state
+    size = state["size"] + len(content.encode("utf-8"))
+    max_size = get_max_upload_size()
+    if size > max_size:
+        raise UploadTooLarge(f"Log exceeds the maximum size of {max_size} bytes")
+
+    LogChunk.objects.create(log=log, seq=result.seq, content=content)
+    delta = LiveDelta()
+    _apply(log, parser, parsed, result, delta)
+    if delta:
+        LogEvent.objects.create(log=log, kind="update", payload=delta.payload())
+
+    state["seq"] = result.seq + 1
+    state["size"] = size
+    log.parse_state = state
+    log.save(update_fields=["parse_state"])
+
+
+def finalize_live_log(log: Log) -> Log:
+    """
+    Parse the end of a running log and mark it complete.
+
+    Like a full upload, every host gets a play row for every play of the log
+    and timestamped logs date their plays with the last PLAY header. The
+    chunks are then moved to raw log storage and the tasks are indexed for
+    search. The update events of the log are replaced by a "complete" event
+    telling clients to reload the log.
+
+    Raises:
+        LogNotRunning: If the log is not running
+    """
+    with transaction.atomic():
+        log = _lock_running(log)
+        parser = _parser_for(log.parse_state or initial_state())
+        _apply(
+            log,
+            parser,
+            parser.feed("", final=True),
+            AppendResult(seq=-1),
+            LiveDelta(),
+        )
+
+        plays = parser.state["plays"]
+        existing = set(
+            Play.objects.filter(host__log=log).values_list("host_id", "name")
+        )
+        Play.objects.bulk_create(
+            _new_play(host, name, parser.state, parser.timestamp)
+            for host in Host.objects.filter(log=log)
+            for name in plays
+            if (host.pk, name) not in existing
+        )
+        if parser.timestamp is not None:
+            Play.objects.filter(host__log=log).update(date=parser.timestamp)
+
+        content = "".join(
+            log.chunks.order_by("seq").values_list("content", flat=True).iterator()
+        )
+        attach_raw_content(log, content)
+        log.chunks.all().delete()
+
+        log.status = "complete"
+        log.parse_state = None
+        log.save()
+
+        log.events.all().delete()
+        LogEvent.objects.create(log=log, kind="complete")
+
+        index_log(log)
+    return log
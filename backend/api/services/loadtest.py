@@ -0,0 +1,302 @@
+"""
+Service running HTTP load tests against the API (see the loadtest command).
+
+Worker threads each keep one keep-alive connection to the server and send
+requests back to back (a closed loop), picking an operation by its weight
+in the mix. Reads pick logs by popularity: the log of rank r is requested
+with a probability proportional to 1 / r**s (Zipf), so a few logs are hot
+and most are rarely read.
+
+Latencies are recorded per endpoint, with the status codes and the number
+of database queries reported by the server in the X-DB-Queries header (see
+QueryCountMiddleware). This module only uses the standard library.
+"""
+
+import bisect
+import http.client
+import itertools
+import json
+import math
+import random
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+from urllib.parse import urlsplit
+
+# Upper bounds of the latency histogram buckets, in milliseconds
+HISTOGRAM_BOUNDS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000)
+
+
+class LoadTestError(Exception):
+    """Raised when a load test cannot run."""
+
+
+@dataclass
+class Request:
+    """An HTTP request sent by an operation."""
+
+    method: str
+    path: str
+    body: Optional[bytes] = None
+    headers: dict = field(default_factory=dict)
+
+
+@dataclass
+class Operation:
+    """
+    A kind of request of the mix.
+
+    Args:
+        name: Endpoint label the results are reported under
+        weight: Relative frequency in the mix
+        build: Returns the next request, given the random generator of the
+            calling worker thread
+    """
+
+    name: str
+    weight: float
+    build: Callable[[random.Random], Request]
+
+
+class ZipfPicker:
+    """Picks items by popularity: item of rank r with weight 1 / r**s."""
+
+    def __init__(self, items: list, s: float = 1.1):
+        if not items:
+            raise ValueError("ZipfPicker needs at least one item")
+        self.items = items
+        self.cumulative = list(
+            itertools.accumulate(1 / rank**s for rank in range(1, len(items) + 1))
+        )
+
+    def pick(self, rng: random.Random):
+        index = bisect.bisect_left(self.cumulative, rng.random() * self.cumulative[-1])
+        return self.items[min(index, len(self.items) - 1)]
+
+
+@dataclass
+class EndpointStats:
+    """Results of the requests of one endpoint."""
+
+    name: str
+    latencies: list[float] = field(default_factory=list)
+    statuses: dict[int, int] = field(default_factory=dict)
+    queries: list[int] = field(default_factory=list)
+    errors: int = 0
+    bytes_received: int = 0
+
+    @property
+    def requests(self) -> int:
+        return len(self.latencies)
+
+    @property
+    def error_rate(self) -> float:
+        return self.errors / self.requests if self.requests else 0.0
+
+    def record(self, latency: float, status: int, size: int, queries) -> None:
+        self.latencies.append(latency)
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+        # Connection errors are recorded with status 0
+        if status == 0 or status >= 400:
+            self.errors += 1
+        self.bytes_received += size
+        if queries is not None:
+            self.queries.append(queries)
+
+    def merge(self, other: "EndpointStats") -> None:
+        self.latencies += other.latencies
+        for status, count in other.statuses.items():
+            self.statuses[status] = self.statuses.get(status, 0) + count
+        self.queries += other.queries
+        self.errors += other.errors
+        self.bytes_received += other.bytes_received
+
+    def percentile(self, percent: float) -> float:
+        """Latency percentile in seconds (nearest rank)."""
+        if not self.latencies:
+            return 0.0
+        ordered = sorted(self.latencies)
+        rank = max(1, math.ceil(percent / 100 * len(ordered)))
+        return ordered[rank - 1]
+
+    def histogram(self) -> list[tuple[str, int]]:
+        """Request counts per latency bucket, as (label, count) pairs."""
+        counts = [0] * (len(HISTOGRAM_BOUNDS) + 1)
+        for latency in self.latencies:
+            counts[bisect.bisect_left(HISTOGRAM_BOUNDS, latency * 1000)] += 1
+        labels = [f"<={bound}ms" for bound in HISTOGRAM_BOUNDS]
+        labels.append(f">{HISTOGRAM_BOUNDS[-1]}ms")
+        return list(zip(labels, counts))
+
+    def summary(self, elapsed: float) -> dict:
+        return {
+            "requests": self.requests,
+            "throughput": self.requests / elapsed if elapsed > 0 else 0.0,
+            "errors": self.errors,
+            "error_rate": self.error_rate,
+            "statuses": {str(status): n for status, n in sorted(self.statuses.items())},
+            "latency_ms": {
+                "mean": (
+                    sum(self.latencies) / self.requests * 1000 if self.requests else 0
+                ),
+                "p50": self.percentile(50) * 1000,
+                "p90": self.percentile(90) * 1000,
+                "p99": self.percentile(99) * 1000,
+                "max": max(self.latencies, default=0) * 1000,
+            },
+            "histogram": dict(self.histogram()),
+            "queries": (
+                {
+                    "mean": sum(self.queries) / len(self.queries),
+                    "max": max(self.queries),
+                }
+                if self.queries
+                else None
+            ),
+            "bytes_received": self.bytes_received,
+        }
+
+
+@dataclass
+class LoadTestResult:
+    """Results of a load test run."""
+
+    endpoints: dict[str, EndpointStats]
+    elapsed: float
+    # Response bodies of successful POST requests, e.g. to clean up logs
+    created: list[dict] = field(default_factory=list)
+
+    @property
+    def requests(self) -> int:
+        return sum(stats.requests for stats in self.endpoints.values())
+
+
+class LoadTest:
+    """
+    Sends the operations of a mix to a server from `concurrency` threads.
+
+    Runs for `duration` seconds, or until `max_requests` requests were sent.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        operations: list[Operation],
+        concurrency: int = 8,
+        duration: float = 30.0,
+        max_requests: Optional[int] = None,
+        token: Optional[str] = None,
+        seed: int = 0,
+        timeout: float = 60.0,
+    ):
+        parts = urlsplit(url)
+        if parts.scheme not in ("http", "https") or not parts.hostname:
+            raise LoadTestError(f"Invalid server URL '{url}'")
+        if not operations:
+            raise LoadTestError("The mix has no operations")
+        self.scheme = parts.scheme
+        self.netloc = parts.netloc
+        self.prefix = parts.path.rstrip("/")
+        self.operations = operations
+        self.weights = [operation.weight for operation in operations]
+        self.concurrency = max(1, concurrency)
+        self.duration = duration
+        self.max_requests = max_requests
+        self.token = token
+        self.seed = seed
+        self.timeout = timeout
+
+    def _connect(self) -> http.client.HTTPConnection:
+        if self.scheme == "https":
+            return http.client.HTTPSConnection(self.netloc, timeout=self.timeout)
+        return http.client.HTTPConnection(self.netloc, timeout=self.timeout)
+
+    def send(self, connection, request: Request):
+        """Send a request; returns (status, body, X-DB-Queries value)."""
+        headers = {"Accept": "application/json", **request.headers}
+        if self.token:
+            headers["Authorization"] = f"Bearer {self.token}"
+        connection.request(
+            request.method, self.prefix + request.path, request.body, headers
+        )
+        response = connection.getresponse()
+        body = response.read()
+        if response.will_close:
+            connection.close()
+        queries = response.getheader("X-DB-Queries")
+        return response.status, body, int(queries) if queries else None
+
+    def check(self) -> None:
+        """Check that the server answers, before starting the run."""
+        connection = self._connect()
+        try:
+            status, _, _ = self.send(connection, Request("GET", "/api/"))
+        except (OSError, http.client.HTTPException) as exc:
+            raise LoadTestError(f"Cannot reach the server: {exc}")
+        finally:
+            connection.close()
+        if status >= 500:
+            raise LoadTestError(f"The server answers with HTTP {status}")
+
+    def run(self) -> LoadTestResult:
+        """Run the load test and return the results of all threads."""
+        counter = itertools.count()
+        deadline = time.monotonic() + self.duration
+        results = [
+            ({}, []) for _ in range(self.concurrency)
+        ]  # per thread: endpoint stats, created objects
+
+        def worker(index: int) -> None:
+            rng = random.Random(self.seed * 1000 + index)
+            endpoints, created = results[index]
+            connection = self._connect()
+            try:
+                while time.monotonic() < deadline:
+                    if self.max_requests is not None:
+                        if next(counter) >= self.max_requests:
+                            break
+                    operation = rng.choices(self.operations, self.weights)[0]
+                    request = operation.build(rng)
+                    stats = endpoints.setdefault(
+                        operation.name, EndpointStats(operation.name)
+                    )
+                    start = time.perf_counter()
+                    try:
+                        status, body, queries = self.send(connection, request)
+                    except (OSError, http.client.HTTPException):
+                        connection.close()
+                        stats.record(time.perf_counter() - start, 0, 0, None)
+                        continue
+                    stats.record(
+                        time.perf_counter() - start, status, len(body), queries
+                    )
+                    if request.method == "POST" and status in (200, 201):
+                        try:
+                            created.append(json.loads(body))
+                        except ValueError:
+                            pass
+            finally:
+                connection.close()
+
+        start = time.monotonic()
+        threads = [
+            threading.Thread(target=worker, args=(index,), daemon=True)
+            for index in range(self.concurrency)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.monotonic() - start
+
+        merged: dict[str, EndpointStats] = {
+            operation.name: EndpointStats(operation.name)
+            for operation in self.operations
+        }
+        created = []
+        for endpoints, thread_created in results:
+            for name, stats in endpoints.items():
+                merged[name].merge(stats)
+            created += thread_created
+        return LoadTestResult(endpoints=merged, elapsed=elapsed, created=created)
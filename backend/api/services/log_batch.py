@@ -0,0 +1,134 @@
+"""
+Service reading the entries of a batch log upload.
+
+A batch is sent as a JSON list of ``{title, raw_content}`` objects, as NDJSON
+(one object per line, see api.parsers.NDJSONParser) or as a tar or zip
+archive of log files, each titled after its file name. Batches hold at most
+LOG_BATCH_MAX_ENTRIES logs and LOG_UPLOAD_MAX_SIZE bytes of content.
+"""
+
+import tarfile
+import zipfile
+from pathlib import PurePosixPath
+from typing import IO, Iterator
+
+from django.conf import settings
+
+from .log_upload import (
+    InvalidUpload,
+    UploadTooLarge,
+    get_max_upload_size,
+    read_log_text,
+)
+
+ZIP_MAGIC = b"PK\x03\x04"
+
+ARCHIVE_SUFFIXES = (
+    ".tar",
+    ".tar.gz",
+    ".tgz",
+    ".tar.bz2",
+    ".tbz2",
+    ".tar.xz",
+    ".txz",
+    ".zip",
+)
+ARCHIVE_ERRORS = (tarfile.TarError, zipfile.BadZipFile, EOFError, OSError)
+
+
+class InvalidArchive(Exception):
+    """Raised when a batch archive cannot be read."""
+
+
+def get_max_entries() -> int:
+    """Return the maximum number of logs in a batch."""
+    return getattr(settings, "LOG_BATCH_MAX_ENTRIES", 1000)
+
+
+def entry_title(name: str) -> str:
+    """Title of an archived log: its file name without extensions."""
+    filename = PurePosixPath(name).name
+    if filename.endswith(".gz"):
+        filename = filename[: -len(".gz")]
+    return PurePosixPath(filename).stem or filename
+
+
+def _is_log_file(name: str) -> bool:
+    # Skip hidden files such as macOS "._" resource forks
+    return not PurePosixPath(name).name.startswith(".")
+
+
+def is_archive(name: str) -> bool:
+    """Whether a file name is the one of a tar or zip archive."""
+    return name.lower().endswith(ARCHIVE_SUFFIXES)
+
+
+def iter_archive_members(fileobj) -> Iterator[tuple[str, IO[bytes]]]:
+    """
+    Yield the name and an open file of each log file of a tar or zip archive.
+
+    Each member must be read before moving on to the next one. Tar archives
+    may be gzip, bzip2 or xz compressed.
+
+    Raises:
+        InvalidArchive: If the file is not a readable tar or zip archive
+    """
+    fileobj.seek(0)
+    head = fileobj.read(len(ZIP_MAGIC))
+    fileobj.seek(0)
+    try:
+        if head == ZIP_MAGIC:
+            with zipfile.ZipFile(fileobj) as archive:
+                for info in archive.infolist():
+                    if info.is_dir() or not _is_log_file(info.filename):
+                        continue
+                    with archive.open(info) as member:
+                        yield info.filename, member
+            return
+
+        with tarfile.open(fileobj=fileobj, mode="r:*") as archive:
+            for info in archive:
+                if not info.isfile() or not _is_log_file(info.name):
+                    continue
+                yield info.name, archive.extractfile(info)
+    except ARCHIVE_ERRORS as exc:
+        raise InvalidArchive(f"Cannot read the archive: {exc}")
+
+
+def iter_archive_entries(fileobj) -> Iterator[tuple[str, str]]:
+    """
+    Yield the (title, content) of each log file of a tar or zip archive.
+
+    Archived files may be gzip-compressed.
+
+    Raises:
+        InvalidArchive: If the file is not a readable tar or zip archive
+        UploadTooLarge: If an archived log exceeds LOG_UPLOAD_MAX_SIZE
+    """
+    for name, member in iter_archive_members(fileobj):
+        try:
+            raw_content = read_log_text(member)
+        except (*ARCHIVE_ERRORS, InvalidUpload) as exc:
+            raise InvalidArchive(f"Cannot read {name} from the archive: {exc}")
+        yield entry_title(name), raw_content
+
+
+def read_archive_entries(fileobj) -> list[dict]:
+    """
+    Read the logs of a batch archive as ``{title, raw_content}`` entries.
+
+    Raises:
+        InvalidArchive: If the archive cannot be read or holds too many logs
+        UploadTooLarge: If the logs exceed LOG_UPLOAD_MAX_SIZE in total
+    """
+    max_entries = get_max_entries()
+    max_size = get_max_upload_size()
+    entries, size = [], 0
+    for title, raw_content in iter_archive_entries(fileobj):
+        if len(entries) == max_entries:
+            raise InvalidArchive(f"A batch holds at most {max_entries} logs")
+        size += len(raw_content)
+        if size > max_size:
+            raise UploadTooLarge(f"Batch exceeds the maximum size of {max_size} bytes")
+        entries.append({"title": title, "raw_content": raw_content})
+    return entries
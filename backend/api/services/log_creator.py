@@ -1,11 +1,21 @@
 """Service for creating Log/Host/Play/Task database records from parsed results."""
 
-from ..models import Host, Play, Task
+from datetime import datetime
+from typing import Optional
+
+from django.db.models import Case, DateTimeField, Value, When
+
+from ..models import Host, Log, Play, Task
 from .log_parser import (
     ParseResult,
     compute_play_host_counts,
     determine_play_status,
 )
+from .raw_storage import attach_raw_contents
+from .search import index_logs
+
+# Rows per INSERT statement
+BULK_BATCH_SIZE = 1000
 
 
 def create_log_entities(log, result: ParseResult) -> None:
@@ -19,6 +29,74 @@ def create_log_entities(log, result: ParseResult) -> None:
         log: The Log instance (already saved) to attach entities to
         result: The parsed log result containing hosts, plays, and tasks
     """
+    _create_entities([(log, result)])
+
+
+def create_logs(
+    entries: list[tuple[str, str, ParseResult]],
+    uploaded_at: Optional[list[datetime]] = None,
+) -> list[Log]:
+    """
+    Create several parsed logs with shared bulk inserts.
+
+    The raw contents are stored in one pass, and the logs, hosts, plays and
+    tasks of all entries are inserted with one bulk insert per model, instead
+    of a set of queries per log.
+
+    Args:
+        entries: (title, raw content, successful ParseResult) tuples
+        uploaded_at: Upload time of each log, for backfilled data (default:
+            now)
+
+    Returns:
+        The created logs, in the same order
+    """
+    logs = [Log(title=title) for title, _, _ in entries]
+    attach_raw_contents(
+        (log, raw_content) for log, (_, raw_content, _) in zip(logs, entries)
+    )
+    # Sets uploaded_at on each log, which the tasks are stamped with
+    Log.objects.bulk_create(logs, batch_size=BULK_BATCH_SIZE)
+    if uploaded_at is not None:
+        _set_uploaded_at(logs, uploaded_at)
+    _create_entities([(log, result) for log, (_, _, result) in zip(logs, entries)])
+    return logs
+
+
+def _set_uploaded_at(logs: list[Log], uploaded_at: list[datetime]) -> None:
+    """Override the auto_now_add upload times with a single UPDATE."""
+    for log, value in zip(logs, uploaded_at):
+        log.uploaded_at = value
+    Log.objects.filter(pk__in=[log.pk for log in logs]).update(
+        uploaded_at=Case(
+            *[When(pk=log.pk, then=Value(log.uploaded_at)) for log in logs],
+            output_field=DateTimeField(),
+        )
+    )
+
+
+def _create_entities(parsed_logs: list[tuple[Log, ParseResult]]) -> None:
+    hosts, plays, tasks = [], [], []
+    for log, result in parsed_logs:
+        _build_entities(log, result, hosts, plays, tasks)
+
+    Host.objects.bulk_create(hosts, batch_size=BULK_BATCH_SIZE)
+    Play.objects.bulk_create(plays, batch_size=BULK_BATCH_SIZE)
+    Task.objects.bulk_create(tasks, batch_size=BULK_BATCH_SIZE)
+
+    # Flag the logs with a failed play, in one UPDATE
+    failed = {host.log_id for host in hosts if host.status == "failed"}
+    for log, _ in parsed_logs:
+        log.has_failures = log.pk in failed
+    if failed:
+        Log.objects.filter(pk__in=failed).update(has_failures=True)
+
+    # Make the new tasks searchable
+    index_logs([log for log, _ in parsed_logs], new=True)
+
+
+def _build_entities(log, result: ParseResult, hosts, plays, tasks) -> None:
+    """Append the unsaved Host, Play and Task rows of a parsed log."""
     # Pre-compute per-play, per-host task counts from individual tasks
     play_host_counts = compute_play_host_counts(result.tasks)
 
@@ -26,27 +104,48 @@ def create_log_entities(log, result: ParseResult) -> None:
     play_map = {}  # (hostname, play_name) -> Play instance
 
     for parsed_host in result.hosts:
-        host = Host.objects.create(log=log, hostname=parsed_host.hostname)
-
-        for parsed_play in result.plays:
-            counts = play_host_counts.get(
+        play_counts = [
+            play_host_counts.get(
                 (parsed_play.name, parsed_host.hostname),
                 {"ok": 0, "changed": 0, "failed": 0},
             )
+            for parsed_play in result.plays
+        ]
+        play_statuses = [
+            determine_play_status(counts["ok"], counts["changed"], counts["failed"])
+            for counts in play_counts
+        ]
+
+        # The per-run summary feeds the host history timeline
+        host = Host(
+            log=log,
+            hostname=parsed_host.hostname,
+            log_uploaded_at=log.uploaded_at,
+            status=determine_play_status(
+                play_statuses.count("ok"),
+                play_statuses.count("changed"),
+                play_statuses.count("failed"),
+            ),
+            plays_failed=play_statuses.count("failed"),
+            tasks_failed=sum(counts["failed"] for counts in play_counts),
+        )
+        hosts.append(host)
 
-            play = Play.objects.create(
+        for parsed_play, counts, play_status in zip(
+            result.plays, play_counts, play_statuses
+        ):
+            play = Play(
                 host=host,
                 name=parsed_play.name,
                 date=result.timestamp,
-                status=determine_play_status(
-                    counts["ok"], counts["changed"], counts["failed"]
-                ),
+                status=play_status,
                 tasks_ok=counts["ok"],
                 tasks_changed=counts["changed"],
                 tasks_failed=counts["failed"],
                 line_number=parsed_play.line_number,
                 order=parsed_play.order,
             )
+            plays.append(play)
             play_map[(parsed_host.hostname, parsed_play.name)] = play
 
     # Create Task entities from parsed tasks
@@ -54,11 +153,14 @@ def create_log_entities(log, result: ParseResult) -> None:
         for task_result in parsed_task.results:
             play = play_map.get((task_result.hostname, parsed_task.play_name))
             if play:
-                Task.objects.create(
-                    play=play,
-                    name=parsed_task.name,
-                    order=parsed_task.order,
-                    line_number=parsed_task.line_number,
-                    status=task_result.status,
-                    failure_message=task_result.message,
+                tasks.append(
+                    Task(
+                        play=play,
+                        created_at=log.uploaded_at,
+                        name=parsed_task.name,
+                        order=parsed_task.order,
+                        line_number=parsed_task.line_number,
+                        status=task_result.status,
+                        failure_message=task_result.message,
+                    )
                 )
@@ -0,0 +1,254 @@
+"""
+Service for comparing two logs, typically two runs of the same playbook.
+
+Hosts are matched on hostname, plays on (hostname, play order, play name)
+and tasks on (hostname, play order, play name, task order, task name): a play
+is only compared with the play at the same position in the other log. All
+matching is done in SQL with anti-joins and outer joins so the database can
+use hash joins, and rows are streamed from a chunked cursor so large logs are
+never loaded at once.
+"""
+
+import uuid
+from typing import Iterator
+
+from django.db import connection, connections, router
+from django.db.models import Exists, OuterRef
+
+from ..models import Host, Log, Play, Task
+from ..renderers import FastJSONRenderer
+
+# Statuses that count as a task failure
+FAILED_STATUSES = ("failed", "fatal", "unreachable")
+
+# Rows fetched from the database per round trip
+FETCH_SIZE = 2000
+
+
+def _log_summary(log: Log) -> dict:
+    return {"id": log.id, "title": log.title, "uploaded_at": log.uploaded_at}
+
+
+def _uuid(value) -> str:
+    """Normalize a UUID column value (hex string on SQLite) to its string form."""
+    return str(uuid.UUID(str(value)))
+
+
+def _hosts_only_in(log: Log, other: Log):
+    """Hostnames present in `log` but not in `other`."""
+    return (
+        Host.objects.filter(log=log)
+        .exclude(
+            Exists(
+                Host.objects.filter(log=other, hostname=OuterRef("hostname")).values(
+                    "pk"
+                )
+            )
+        )
+        .order_by("hostname")
+        .values_list("hostname", flat=True)
+    )
+
+
+def _task_rows_sql() -> str:
+    """SELECT of the tasks of one log with their match key columns."""
+    qn = connection.ops.quote_name
+    return (
+        f"SELECT h.hostname AS hostname, p.name AS play_name, "
+        f"p.{qn('order')} AS play_order, t.{qn('order')} AS task_order, "
+        f"t.name AS task_name, t.id AS task_id, t.status AS status, "
+        f"t.failure_message AS failure_message, t.line_number AS line_number "
+        f"FROM {Task._meta.db_table} t "
+        f"JOIN {Play._meta.db_table} p ON p.id = t.play_id "
+        f"JOIN {Host._meta.db_table} h ON h.id = p.host_id "
+        # Tasks carry their log's upload time: lets PostgreSQL prune partitions
+        f"WHERE h.log_id = %s AND t.created_at = %s"
+    )
+
+
+def _play_changes_query(base: Log, target: Log) -> tuple[str, list]:
+    """Plays present in both logs whose status differs."""
+    qn = connection.ops.quote_name
+    play_rows = (
+        f"SELECT h.hostname AS hostname, p.name AS name, p.id AS id, "
+        f"p.status AS status, p.{qn('order')} AS play_order "
+        f"FROM {Play._meta.db_table} p "
+        f"JOIN {Host._meta.db_table} h ON h.id = p.host_id "
+        f"WHERE h.log_id = %s"
+    )
+    sql = (
+        "SELECT cur.hostname, cur.name, cur.id, prev.status, cur.status "
+        f"FROM ({play_rows}) cur "
+        f"JOIN ({play_rows}) prev "
+        "ON prev.hostname = cur.hostname AND prev.play_order = cur.play_order "
+        "AND prev.name = cur.name "
+        "WHERE prev.status <> cur.status "
+        "ORDER BY cur.hostname, cur.play_order"
+    )
+    return sql, [_db_pk(target), _db_pk(base)]
+
+
+def _task_changes_query(base: Log, target: Log, recovered: bool) -> tuple[str, list]:
+    """
+    Tasks of `target` that newly failed or recovered compared to `base`.
+
+    A task newly failed when it failed in `target` and its counterpart in
+    `base` did not fail or did not exist. It recovered when its counterpart
+    failed in `base` and it did not fail in `target`.
+    """
+    failed = ", ".join(["%s"] * len(FAILED_STATUSES))
+    if recovered:
+        condition = f"cur.status NOT IN ({failed}) AND prev.status IN ({failed})"
+        join = "JOIN"
+    else:
+        condition = (
+            f"cur.status IN ({failed}) "
+            f"AND (prev.status IS NULL OR prev.status NOT IN ({failed}))"
+        )
+        join = "LEFT JOIN"
+    sql = (
+        "SELECT cur.hostname, cur.play_name, cur.task_order, cur.task_name, "
+        "cur.task_id, prev.status, cur.status, cur.failure_message, "
+        "cur.line_number "
+        f"FROM ({_task_rows_sql()}) cur "
+        f"{join} ({_task_rows_sql()}) prev "
+        "ON prev.hostname = cur.hostname AND prev.play_order = cur.play_order "
+        "AND prev.play_name = cur.play_name "
+        "AND prev.task_order = cur.task_order AND prev.task_name = cur.task_name "
+        f"WHERE {condition} "
+        "ORDER BY cur.hostname, cur.play_order, cur.task_order"
+    )
+    params = [
+        _db_pk(target),
+        connection.ops.adapt_datetimefield_value(target.uploaded_at),
+        _db_pk(base),
+        connection.ops.adapt_datetimefield_value(base.uploaded_at),
+        *FAILED_STATUSES,
+        *FAILED_STATUSES,
+    ]
+    return sql, params
+
+
+def _db_pk(log: Log):
+    return Log._meta.pk.get_db_prep_value(log.pk, connection)
+
+
+def _iter_rows(sql: str, params: list) -> Iterator[tuple]:
+    """Yield result rows, fetched in chunks (server-side cursor on PostgreSQL)."""
+    # Diffs are reads: honour the replica selected for this request
+    read_connection = connections[router.db_for_read(Task)]
+    with read_connection.chunked_cursor() as cursor:
+        cursor.execute(sql, params)
+        while rows := cursor.fetchmany(FETCH_SIZE):
+            yield from rows
+
+
+def iter_log_diff(base: Log, target: Log) -> Iterator[tuple[str, dict]]:
+    """
+    Yield the differences between two logs as (section, item) pairs.
+
+    Sections, in order: hosts_added, hosts_removed, plays_changed,
+    tasks_newly_failed, tasks_recovered.
+    """
+    for hostname in _hosts_only_in(target, base).iterator(chunk_size=FETCH_SIZE):
+        yield "hosts_added", hostname
+    for hostname in _hosts_only_in(base, target).iterator(chunk_size=FETCH_SIZE):
+        yield "hosts_removed", hostname
+
+    for hostname, name, play_id, previous, current in _iter_rows(
+        *_play_changes_query(base, target)
+    ):
+        yield "plays_changed", {
+            "hostname": hostname,
+            "play": name,
+            "play_id": _uuid(play_id),
+            "previous_status": previous,
+            "status": current,
+        }
+
+    for section, recovered in (
+        ("tasks_newly_failed", False),
+        ("tasks_recovered", True),
+    ):
+        for row in _iter_rows(*_task_changes_query(base, target, recovered)):
+            (
+                hostname,
+                play_name,
+                order,
+                name,
+                task_id,
+                previous,
+                current,
+                failure_message,
+                line_number,
+            ) = row
+            item = {
+                "hostname": hostname,
+                "play": play_name,
+                "order": order,
+                "task": name,
+                "task_id": _uuid(task_id),
+                "previous_status": previous,
+                "status": current,
+                "line_number": line_number,
+            }
+            if not recovered:
+                item["failure_message"] = failure_message
+            yield section, item
+
+
+def iter_log_diff_json(base: Log, target: Log) -> Iterator[bytes]:
+    """
+    Stream the differences between two logs as a JSON document.
+
+    Args:
+        base: The reference log (usually the previous run)
+        target: The log compared against it
+
+    Yields:
+        Chunks of a JSON object with "base", "target" and one array per
+        section of iter_log_diff
+    """
+    render = FastJSONRenderer().render
+    sections = [
+        "hosts_added",
+        "hosts_removed",
+        "plays_changed",
+        "tasks_newly_failed",
+        "tasks_recovered",
+    ]
+
+    yield (
+        b'{"base":'
+        + render(_log_summary(base))
+        + b',"target":'
+        + render(_log_summary(target))
+    )
+
+    current = None
+    buffer = []
+    for section, item in iter_log_diff(base, target):
+        if section != current:
+            # Close the previous section and open (possibly empty) ones up
+            # to this one, keeping the output key order stable
+            if current is not None:
+                buffer.append(b"]")
+            start = sections.index(current) + 1 if current is not None else 0
+            for skipped in sections[start : sections.index(section)]:
+                buffer.append(b',"' + skipped.encode() + b'":[]')
+            buffer.append(b',"' + section.encode() + b'":[')
+            current = section
+        else:
+            buffer.append(b",")
+        buffer.append(render(item))
+        if len(buffer) >= FETCH_SIZE:
+            yield b"".join(buffer)
+            buffer = []
+
+    if current is not None:
+        buffer.append(b"]")
+    start = sections.index(current) + 1 if current is not None else 0
+    for skipped in sections[start:]:
+        buffer.append(b',"' + skipped.encode() + b'":[]')
+    buffer.append(b"}")
+    yield b"".join(buffer)
@@ -0,0 +1,327 @@
+"""
+Service importing log files from disk in bulk (see the import_logs command).
+
+Sources (directories, glob patterns, files and tar or zip archives) are
+walked lazily. Each file is read and hashed by the calling process, and
+content already stored (same Log.raw_sha256) is skipped before parsing. The
+other logs are parsed by a pool of worker processes, and their results go
+back, in source order, to the calling process: the single writer, which
+stores them in batches with create_logs, one transaction per batch.
+
+After each batch, the sources it covered are appended to a checkpoint file,
+so an interrupted import started again skips them without reading them.
+Logs lost to a crashed parser process are not checkpointed and are retried
+by the next run.
+"""
+
+import glob
+import hashlib
+import os
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Iterable, Iterator, Optional
+
+from django.db import transaction
+
+from ..cli import make_title
+from ..models import Log
+from .log_batch import (
+    ARCHIVE_ERRORS,
+    InvalidArchive,
+    is_archive,
+    iter_archive_members,
+)
+from .log_creator import create_logs
+from .log_parser import ParseResult
+from .log_upload import InvalidUpload, UploadTooLarge, read_log_text
+from .metrics import PARSE_FAILURES, PERSIST_DURATION, record_parse
+from .parse_pool import create_pool, submit_parse
+
+DEFAULT_BATCH_SIZE = 100
+
+CRASHED_WORKER = "The parser process terminated unexpectedly"
+
+
+@dataclass
+class ImportStats:
+    """Files handled by an import."""
+
+    imported: int = 0
+    skipped: int = 0
+    failed: int = 0
+    bytes_read: int = 0
+    started_at: float = field(default_factory=time.monotonic)
+
+    @property
+    def files(self) -> int:
+        return self.imported + self.skipped + self.failed
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started_at
+
+    @property
+    def files_per_second(self) -> float:
+        elapsed = self.elapsed
+        return self.files / elapsed if elapsed > 0 else 0.0
+
+    @property
+    def bytes_per_second(self) -> float:
+        elapsed = self.elapsed
+        return self.bytes_read / elapsed if elapsed > 0 else 0.0
+
+
+@dataclass
+class ImportEntry:
+    """A log file to import, or the end of an archive when `name` is empty."""
+
+    key: str
+    name: str = ""
+    title: str = ""
+    raw_content: Optional[str] = None
+    sha256: str = ""
+    error: Optional[str] = None
+    skipped: bool = False
+    future: Optional[Future] = None
+    pool: Optional[ProcessPoolExecutor] = None
+
+
+class Checkpoint:
+    """Keys of the sources already imported, one per line of a text file."""
+
+    def __init__(self, path: Optional[Path]):
+        self.path = path
+        self.keys: set[str] = set()
+        if path is not None and path.exists():
+            with open(path, encoding="utf-8") as checkpoint_file:
+                self.keys = {line.rstrip("\n") for line in checkpoint_file}
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.keys
+
+    def add(self, keys: list[str]) -> None:
+        self.keys.update(keys)
+        if self.path is None or not keys:
+            return
+        with open(self.path, "a", encoding="utf-8") as checkpoint_file:
+            checkpoint_file.write("".join(f"{key}\n" for key in keys))
+            checkpoint_file.flush()
+            os.fsync(checkpoint_file.fileno())
+
+
+def source_key(path: Path) -> str:
+    """Checkpoint key of a file: a modified file is imported again."""
+    stat = path.stat()
+    return f"{path.resolve()}:{stat.st_size}:{stat.st_mtime_ns}"
+
+
+def iter_paths(sources: Iterable[str]) -> Iterator[Path]:
+    """
+    Yield the files of each source lazily.
+
+    A source is a directory (walked recursively), a glob pattern (``**``
+    matches subdirectories) or a file. Hidden files are skipped.
+    """
+    for source in sources:
+        if any(char in source for char in "*?["):
+            for name in glob.iglob(source, recursive=True):
+                if os.path.isfile(name):
+                    yield Path(name)
+        elif os.path.isdir(source):
+            for root, dirs, files in os.walk(source):
+                dirs[:] = sorted(name for name in dirs if not name.startswith("."))
+                for name in sorted(files):
+                    if not name.startswith("."):
+                        yield Path(root) / name
+        else:
+            yield Path(source)
+
+
+class LogImporter:
+    """
+    Imports log files with a pool of parser processes and a single writer.
+
+    Args:
+        workers: Number of parser processes
+        batch_size: Logs stored per transaction
+        title: Title template with {name}, {stem} and {path} placeholders
+        checkpoint: Checkpoint of the sources already imported
+        on_progress: Called with the stats after each stored batch
+        on_failure: Called with the source name and error of failed files
+    """
+
+    def __init__(
+        self,
+        workers: int,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        title: str = "{stem}",
+        checkpoint: Optional[Checkpoint] = None,
+        on_progress: Optional[Callable[[ImportStats], None]] = None,
+        on_failure: Optional[Callable[[str, str], None]] = None,
+    ):
+        self.workers = max(1, workers)
+        self.batch_size = max(1, batch_size)
+        self.title = title
+        self.checkpoint = checkpoint or Checkpoint(None)
+        self.on_progress = on_progress or (lambda stats: None)
+        self.on_failure = on_failure or (lambda name, error: None)
+        self.stats = ImportStats()
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._seen: set[str] = set()
+        self._batch: list[tuple[str, str, ParseResult]] = []
+        self._batch_keys: list[str] = []
+
+    def run(self, sources: Iterable[str]) -> ImportStats:
+        """Import the log files of the given sources."""
+        # Files read ahead of the writer: bounds the memory held by contents
+        max_pending = self.workers * 4
+        self._executor = create_pool(self.workers)
+        try:
+            pending: deque[ImportEntry] = deque()
+            entries = self._entries(iter_paths(sources))
+            while chunk := _take(entries, max_pending):
+                self._skip_stored(chunk)
+                for entry in chunk:
+                    if entry.raw_content is not None:
+                        entry.pool = self._executor
+                        entry.future = submit_parse(entry.pool, entry.raw_content)
+                    pending.append(entry)
+                while len(pending) > max_pending:
+                    self._collect(pending.popleft())
+            while pending:
+                self._collect(pending.popleft())
+            self._flush()
+        finally:
+            self._executor.shutdown(cancel_futures=True)
+        return self.stats
+
+    def _entries(self, paths: Iterator[Path]) -> Iterator[ImportEntry]:
+        for path in paths:
+            try:
+                key = source_key(path)
+            except OSError as exc:
+                yield ImportEntry(key="", name=str(path), error=str(exc))
+                continue
+            if key in self.checkpoint:
+                continue
+            if is_archive(path.name):
+                yield from self._archive_entries(path, key)
+                continue
+            entry = ImportEntry(key=key, name=str(path))
+            try:
+                with open(path, "rb") as fileobj:
+                    self._read(entry, fileobj, path)
+            except OSError as exc:
+                entry.error = str(exc)
+            yield entry
+
+    def _archive_entries(self, path: Path, key: str) -> Iterator[ImportEntry]:
+        try:
+            with open(path, "rb") as fileobj:
+                for name, member in iter_archive_members(fileobj):
+                    member_key = f"{key}!{name}"
+                    if member_key in self.checkpoint:
+                        continue
+                    entry = ImportEntry(key=member_key, name=f"{path}!{name}")
+                    try:
+                        self._read(entry, member, path / name)
+                    except ARCHIVE_ERRORS as exc:
+                        entry.error = str(exc)
+                    yield entry
+        except (InvalidArchive, OSError) as exc:
+            yield ImportEntry(key="", name=str(path), error=str(exc))
+            return
+        # Checkpointed once all its files are: the next run skips it whole
+        yield ImportEntry(key=key)
+
+    def _read(self, entry: ImportEntry, fileobj, path: Path) -> None:
+        try:
+            raw_content = read_log_text(fileobj)
+        except (InvalidUpload, UploadTooLarge) as exc:
+            entry.error = str(exc)
+            return
+        data = raw_content.encode("utf-8")
+        self.stats.bytes_read += len(data)
+        entry.title = make_title(self.title, path)[:255]
+        entry.raw_content = raw_content
+        entry.sha256 = hashlib.sha256(data).hexdigest()
+
+    def _skip_stored(self, entries: list[ImportEntry]) -> None:
+        """Mark the entries whose content is stored or already read this run."""
+        hashes = {entry.sha256 for entry in entries if entry.sha256}
+        stored = set(
+            Log.objects.filter(raw_sha256__in=hashes).values_list(
+                "raw_sha256", flat=True
+            )
+        )
+        for entry in entries:
+            if not entry.sha256:
+                continue
+            if entry.sha256 in stored or entry.sha256 in self._seen:
+                entry.skipped = True
+                entry.raw_content = None
+            self._seen.add(entry.sha256)
+
+    def _collect(self, entry: ImportEntry) -> None:
+        """Hand a read (and parsed) entry to the writer, in source order."""
+        if not entry.name:
+            self._batch_keys.append(entry.key)
+            return
+
+        error = entry.error
+        if entry.skipped:
+            self.stats.skipped += 1
+        elif error is None:
+            try:
+                result = entry.future.result()
+            except BrokenProcessPool:
+                # A worker died (e.g. killed for memory): the logs it took
+                # down are not checkpointed, so the next run retries them
+                self._restart_pool(entry.pool)
+                PARSE_FAILURES.inc(error_type="BrokenProcessPool")
+                self.stats.failed += 1
+                self.on_failure(entry.name, CRASHED_WORKER)
+                return
+            record_parse(entry.raw_content, result)
+            if result.success:
+                self.stats.imported += 1
+                self._batch.append((entry.title, entry.raw_content, result))
+            else:
+                error = f"{result.error}: {result.detail}"
+        if error is not None:
+            self.stats.failed += 1
+            self.on_failure(entry.name, error)
+        if entry.key:
+            self._batch_keys.append(entry.key)
+        if len(self._batch) >= self.batch_size:
+            self._flush()
+
+    def _restart_pool(self, broken: ProcessPoolExecutor) -> None:
+        # The other logs pending in the broken pool fail the same way
+        if broken is self._executor:
+            self._executor = create_pool(self.workers)
+            broken.shutdown(wait=False, cancel_futures=True)
+
+    def _flush(self) -> None:
+        """Store the parsed logs of the batch, then checkpoint its sources."""
+        stored = bool(self._batch)
+        if stored:
+            with PERSIST_DURATION.time(mode="batch"), transaction.atomic():
+                create_logs(self._batch)
+        self.checkpoint.add(self._batch_keys)
+        self._batch, self._batch_keys = [], []
+        if stored:
+            self.on_progress(self.stats)
+
+
+def _take(entries: Iterator[ImportEntry], count: int) -> list[ImportEntry]:
+    chunk = []
+    for entry in entries:
+        chunk.append(entry)
+        if len(chunk) == count:
+            break
+    return chunk
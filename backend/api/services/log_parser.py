@@ -70,6 +70,10 @@ class ParseResult:
     detail: Optional[str] = None
     parser_type: Optional[str] = None
     traceback_str: Optional[str] = None
+    # Kind of failure: EmptyLog, NoHosts, or the exception raised by the parser
+    error_type: Optional[str] = None
+    # Time spent parsing, in seconds (set by parse_pool)
+    duration: Optional[float] = None
 
     @property
     def play_names(self) -> list[str]:
@@ -102,6 +106,7 @@ class LogParserService:
                 success=False,
                 error="Empty log content",
                 detail="The provided log content is empty or contains only whitespace",
+                error_type="EmptyLog",
             )
 
         # Normalize line endings (CRLF -> LF) for consistent parsing
@@ -122,6 +127,7 @@ class LogParserService:
                 detail=str(e),
                 parser_type=parser_type,
                 traceback_str=traceback.format_exc(),
+                error_type=type(e).__name__,
             )
 
     def _detect_format(self, content: str) -> str:
@@ -171,6 +177,7 @@ class LogParserService:
                 error="No hosts found in log",
                 detail="The parser could not find any PLAY RECAP section",
                 parser_type="play",
+                error_type="NoHosts",
             )
 
         return ParseResult(
@@ -246,6 +253,7 @@ class LogParserService:
                     error="No hosts found in log",
                     detail="The parser could not find any PLAY RECAP section",
                     parser_type="logs",
+                    error_type="NoHosts",
                 )
 
             # Find line numbers for each play
@@ -0,0 +1,156 @@
+"""
+Service previewing the parse of a log without storing anything.
+
+Dry runs of POST /api/logs/ (``?dry_run=1``) and of the admin test
+submission parse the log in the parser pool and summarize what an upload
+would create, without a database query. Logs larger than
+LOG_PREVIEW_MAX_SIZE bytes are cut after the last complete line below the
+cap, so a preview is parsed in bounded time; the preview then says how much
+of the log was parsed.
+"""
+
+import time
+from dataclasses import dataclass, field
+from typing import Optional
+
+from django.conf import settings
+
+from .log_parser import ParseResult, compute_play_host_counts, determine_play_status
+from .metrics import utf8_size
+from .parse_pool import parse_log
+
+# Preview stages, in the order they run
+STAGES = ("prepare", "queue", "parse", "summarize")
+
+
+def get_max_preview_size() -> int:
+    """Return the number of bytes of a log parsed by a preview."""
+    return getattr(settings, "LOG_PREVIEW_MAX_SIZE", 10 * 1024 * 1024)
+
+
+@dataclass
+class LogPreview:
+    """
+    Parse result of a previewed log.
+
+    Attributes:
+        result: ParseResult of the parsed part of the log
+        size: Size of the submitted log, in bytes (UTF-8)
+        parsed_size: Size of the parsed part of the log, in bytes
+        timings: Seconds spent in each of STAGES (queue: waiting for, and
+            transferring the log to, a parser process)
+        summary: What an upload would create, if the log parsed
+    """
+
+    result: ParseResult
+    size: int
+    parsed_size: int
+    timings: dict[str, float] = field(default_factory=dict)
+    summary: Optional[dict] = None
+
+    @property
+    def truncated(self) -> bool:
+        return self.parsed_size < self.size
+
+    def as_dict(self) -> dict:
+        """Dry run fields of the responses: parsed size and timings (in ms)."""
+        return {
+            "dry_run": True,
+            "size": self.size,
+            "parsed_size": self.parsed_size,
+            "truncated": self.truncated,
+            "timings": {
+                stage: round(seconds * 1000, 3)
+                for stage, seconds in self.timings.items()
+            },
+        }
+
+
+def truncate_log(raw_content: str, max_size: int) -> str:
+    """Cut a log after its last complete line within max_size bytes."""
+    if utf8_size(raw_content) <= max_size:
+        return raw_content
+    head = raw_content.encode("utf-8")[:max_size].decode("utf-8", errors="ignore")
+    end = head.rfind("\n")
+    return head[: end + 1] if end >= 0 else head
+
+
+def summarize(result: ParseResult) -> dict:
+    """
+    Summarize the hosts, plays and tasks a parse result would be stored as.
+
+    Play and host statuses are computed from the task results, the way
+    log_creator stores them.
+    """
+    play_host_counts = compute_play_host_counts(result.tasks)
+    hosts = []
+    for parsed_host in result.hosts:
+        play_counts = [
+            play_host_counts.get(
+                (parsed_play.name, parsed_host.hostname),
+                {"ok": 0, "changed": 0, "failed": 0},
+            )
+            for parsed_play in result.plays
+        ]
+        play_statuses = [
+            determine_play_status(counts["ok"], counts["changed"], counts["failed"])
+            for counts in play_counts
+        ]
+        hosts.append(
+            {
+                "hostname": parsed_host.hostname,
+                "status": determine_play_status(
+                    play_statuses.count("ok"),
+                    play_statuses.count("changed"),
+                    play_statuses.count("failed"),
+                ),
+                "plays_failed": play_statuses.count("failed"),
+                "tasks_failed": sum(counts["failed"] for counts in play_counts),
+            }
+        )
+
+    return {
+        "parser_type": result.parser_type,
+        "date": result.timestamp.isoformat() if result.timestamp else None,
+        "has_failures": any(host["status"] == "failed" for host in hosts),
+        "host_count": len(hosts),
+        "play_count": len(result.plays),
+        "task_count": len(result.tasks),
+        "task_result_count": sum(len(task.results) for task in result.tasks),
+        "plays": [play.name for play in result.plays],
+        "hosts": hosts,
+    }
+
+
+def preview_log(raw_content: str) -> LogPreview:
+    """
+    Parse a log (or its first LOG_PREVIEW_MAX_SIZE bytes) and summarize it.
+
+    Args:
+        raw_content: Raw Ansible log content
+
+    Returns:
+        LogPreview with the summary set if the log parsed
+    """
+    timings = {}
+    start = time.perf_counter()
+    size = utf8_size(raw_content)
+    parsed = truncate_log(raw_content, get_max_preview_size())
+    parsed_size = utf8_size(parsed) if parsed is not raw_content else size
+    timings["prepare"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    result = parse_log(parsed)
+    elapsed = time.perf_counter() - start
+    parse_duration = result.duration if result.duration is not None else elapsed
+    timings["queue"] = max(elapsed - parse_duration, 0.0)
+    timings["parse"] = parse_duration
+
+    preview = LogPreview(
+        result=result, size=size, parsed_size=parsed_size, timings=timings
+    )
+    if result.success:
+        start = time.perf_counter()
+        preview.summary = summarize(result)
+        timings["summarize"] = time.perf_counter() - start
+    return preview
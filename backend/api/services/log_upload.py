@@ -0,0 +1,144 @@
+"""Service for reading uploaded log files without buffering the request body."""
+
+import codecs
+import tempfile
+import zlib
+
+from django.conf import settings
+
+# Read/decompress/decode uploads in chunks of this many bytes
+CHUNK_SIZE = 64 * 1024
+
+GZIP_MAGIC = b"\x1f\x8b"
+GZIP_WBITS = zlib.MAX_WBITS | 16
+
+
+class UploadTooLarge(Exception):
+    """Raised when an upload exceeds LOG_UPLOAD_MAX_SIZE once decompressed."""
+
+
+class InvalidUpload(Exception):
+    """Raised when an uploaded file cannot be read, e.g. truncated gzip data."""
+
+
+def get_max_upload_size() -> int:
+    """Return the maximum accepted log size in bytes (after decompression)."""
+    return getattr(settings, "LOG_UPLOAD_MAX_SIZE", 200 * 1024 * 1024)
+
+
+def spool_stream(stream) -> tempfile.SpooledTemporaryFile:
+    """
+    Copy a binary stream into a spooled temporary file, chunk by chunk.
+
+    The data stays in memory up to FILE_UPLOAD_MAX_MEMORY_SIZE bytes and is
+    rolled over to disk beyond that, like Django's multipart upload handlers.
+
+    Raises:
+        UploadTooLarge: If the stream is larger than LOG_UPLOAD_MAX_SIZE
+    """
+    max_size = get_max_upload_size()
+    spooled = tempfile.SpooledTemporaryFile(
+        max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE, suffix=".upload"
+    )
+    size = 0
+    while chunk := stream.read(CHUNK_SIZE):
+        size += len(chunk)
+        if size > max_size:
+            spooled.close()
+            raise UploadTooLarge(f"Log exceeds the maximum size of {max_size} bytes")
+        spooled.write(chunk)
+    spooled.seek(0)
+    return spooled
+
+
+def _iter_decompressed(fileobj):
+    """Yield the content of a file chunk by chunk, gunzipping it if needed."""
+    head = fileobj.read(CHUNK_SIZE)
+    if not head.startswith(GZIP_MAGIC):
+        chunk = head
+        while chunk:
+            yield chunk
+            chunk = fileobj.read(CHUNK_SIZE)
+        return
+    try:
+        yield from _iter_gunzipped(head, fileobj)
+    except zlib.error as exc:
+        raise InvalidUpload(f"Invalid gzip data: {exc}")
+
+
+def _iter_gunzipped(chunk: bytes, fileobj):
+    """Yield the content of gzip data, which may hold several members."""
+    decompressor = zlib.decompressobj(GZIP_WBITS)
+    # Whether the current member has started (and must be complete)
+    started = False
+    while True:
+        if not started:
+            # Like gzip.GzipFile, ignore zero padding between members
+            chunk = chunk.lstrip(b"\0")
+        if not chunk:
+            chunk = fileobj.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            continue
+        started = True
+        # Bound the output per call so a small gzip bomb cannot expand
+        # into a huge single buffer
+        data = decompressor.decompress(chunk, CHUNK_SIZE)
+        while data:
+            yield data
+            data = decompressor.decompress(decompressor.unconsumed_tail, CHUNK_SIZE)
+        chunk = b""
+        if decompressor.eof:
+            # Another member may follow, e.g. for files joined with cat
+            chunk = decompressor.unused_data
+            decompressor = zlib.decompressobj(GZIP_WBITS)
+            started = False
+    if started:
+        raise InvalidUpload("The gzip data is truncated")
+
+
+def read_log_text(fileobj) -> str:
+    """
+    Read an uploaded log file into a string, decompressing gzip on the fly.
+
+    The content is decoded as UTF-8 (invalid bytes are replaced) and line
+    endings are normalized to LF chunk by chunk, so the parser does not
+    need to copy the whole log again to normalize it.
+
+    Args:
+        fileobj: Binary file-like object (uploaded file or spooled body)
+
+    Returns:
+        The decoded log content
+
+    Raises:
+        UploadTooLarge: If the decompressed content exceeds LOG_UPLOAD_MAX_SIZE
+        InvalidUpload: If the gzip data is invalid or truncated
+    """
+    max_size = get_max_upload_size()
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    parts: list[str] = []
+    size = 0
+    # A trailing CR may be the first half of a CRLF split across chunks
+    pending_cr = False
+
+    fileobj.seek(0)
+    for data in _iter_decompressed(fileobj):
+        size += len(data)
+        if size > max_size:
+            raise UploadTooLarge(f"Log exceeds the maximum size of {max_size} bytes")
+
+        text = decoder.decode(data)
+        if pending_cr:
+            text = "\r" + text
+        pending_cr = text.endswith("\r")
+        if pending_cr:
+            text = text[:-1]
+        parts.append(text.replace("\r\n", "\n").replace("\r", "\n"))
+
+    text = decoder.decode(b"", final=True)
+    if pending_cr:
+        text = "\r" + text
+    parts.append(text.replace("\r\n", "\n").replace("\r", "\n"))
+
+    return "".join(parts)
@@ -0,0 +1,326 @@
+"""
+Service collecting Prometheus metrics, aggregated across server processes.
+
+Counters and histograms are declared at module level and updated in memory.
+A background thread of each process adds its pending updates to a SQLite
+file shared by all the processes of the server (METRICS_DB), at most
+METRICS_FLUSH_INTERVAL seconds after they happen, and on exit. The /metrics
+view renders the totals stored in that file in the Prometheus text
+exposition format: every gunicorn worker, and management commands such as
+import_logs, add to the same series, whichever worker answers the scrape.
+
+Updates are no-ops unless METRICS_ENABLED is set.
+"""
+
+import atexit
+import bisect
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+from django.conf import settings
+
+from .log_parser import ParseResult
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Upper bounds of the histogram buckets
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+SIZE_BUCKETS = tuple(1024 * 4**power for power in range(10))  # 1 KiB to 256 MiB
+LINE_BUCKETS = (10, 100, 1000, 10_000, 100_000, 1_000_000, 10_000_000)
+HOST_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+TASK_BUCKETS = (10, 50, 100, 500, 1000, 5000, 10_000, 50_000, 100_000, 500_000)
+
+# Seconds a flush or a scrape waits for another process holding the store
+STORE_TIMEOUT = 5.0
+
+_metrics: dict[str, "Metric"] = {}
+
+# Updates not flushed yet: (metric, labels, sample) -> amount
+_pending: dict[tuple[str, str, str], float] = {}
+_lock = threading.Lock()
+# Process running the flush thread (a forked child starts its own)
+_flusher_pid: Optional[int] = None
+
+
+def is_enabled() -> bool:
+    return getattr(settings, "METRICS_ENABLED", False)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format(value: float) -> str:
+    if float(value).is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return repr(float(value))
+
+
+class Metric:
+    """
+    A metric family: the series of a metric name, one per set of labels.
+
+    Args:
+        name: Metric name, e.g. ``ansibeau_parse_duration_seconds``
+        documentation: Help text shown by the exposition
+        labels: Names of the labels each update must give a value for
+    """
+
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labels: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        _metrics[name] = self
+
+    def _series(self, labels: dict) -> str:
+        """The label pairs of a series, as written in the exposition."""
+        if set(labels) != set(self.labels):
+            raise ValueError(f"{self.name} takes the labels {self.labels}")
+        return ",".join(
+            f'{name}="{_escape(str(labels[name]))}"' for name in self.labels
+        )
+
+    def samples(self, series: dict[str, dict[str, float]]) -> Iterator[str]:
+        """Exposition lines of the stored series: labels -> sample -> value."""
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    """A total that only goes up, e.g. a number of failures."""
+
+    type = "counter"
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        _add({(self.name, self._series(labels), ""): amount})
+
+    def samples(self, series):
+        for labels, values in sorted(series.items()):
+            selector = f"{{{labels}}}" if labels else ""
+            yield f"{self.name}{selector} {_format(values.get('', 0.0))}"
+
+
+class Histogram(Metric):
+    """Counts of observed values (durations, sizes) per bucket."""
+
+    type = "histogram"
+
+    def __init__(self, name, documentation, labels=(), buckets=DURATION_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(float(bound) for bound in buckets)
+        self.bucket_names = [_format(bound) for bound in self.buckets] + ["+Inf"]
+
+    def observe(self, value: float, **labels) -> None:
+        series = self._series(labels)
+        bucket = self.bucket_names[bisect.bisect_left(self.buckets, value)]
+        _add(
+            {
+                (self.name, series, bucket): 1.0,
+                (self.name, series, "sum"): value,
+                (self.name, series, "count"): 1.0,
+            }
+        )
+
+    @contextmanager
+    def time(self, **labels) -> Iterator[None]:
+        """Observe the duration of this block, in seconds."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self, series):
+        for labels, values in sorted(series.items()):
+            prefix = f"{labels}," if labels else ""
+            cumulative = 0.0
+            # Buckets are stored per interval, and exposed cumulated
+            for bucket in self.bucket_names:
+                cumulative += values.get(bucket, 0.0)
+                yield (
+                    f'{self.name}_bucket{{{prefix}le="{bucket}"}} '
+                    f"{_format(cumulative)}"
+                )
+            selector = f"{{{labels}}}" if labels else ""
+            yield f"{self.name}_sum{selector} {_format(values.get('sum', 0.0))}"
+            yield f"{self.name}_count{selector} {_format(values.get('count', 0.0))}"
+
+
+def _add(updates: dict[tuple[str, str, str], float]) -> None:
+    if not is_enabled():
+        return
+    global _flusher_pid
+    with _lock:
+        for key, amount in updates.items():
+            _pending[key] = _pending.get(key, 0.0) + amount
+        if _flusher_pid != os.getpid():
+            _flusher_pid = os.getpid()
+            threading.Thread(
+                target=_flush_periodically, name="metrics-flush", daemon=True
+            ).start()
+
+
+def _flush_periodically() -> None:
+    while True:
+        time.sleep(getattr(settings, "METRICS_FLUSH_INTERVAL", 1.0))
+        flush()
+
+
+def _reset_after_fork() -> None:
+    # The parent flushes its own pending updates
+    global _lock, _pending, _flusher_pid
+    _lock = threading.Lock()
+    _pending = {}
+    _flusher_pid = None
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def _connect() -> sqlite3.Connection:
+    connection = sqlite3.connect(
+        getattr(settings, "METRICS_DB", "metrics.sqlite3"), timeout=STORE_TIMEOUT
+    )
+    # Losing the last updates in a crash is fine, slowing down writers is not
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=OFF")
+    connection.execute(
+        "CREATE TABLE IF NOT EXISTS samples ("
+        "metric TEXT NOT NULL, labels TEXT NOT NULL, sample TEXT NOT NULL, "
+        "value REAL NOT NULL, PRIMARY KEY (metric, labels, sample))"
+    )
+    return connection
+
+
+def flush() -> None:
+    """Add the pending updates of this process to the shared store."""
+    with _lock:
+        if not _pending:
+            return
+        updates = dict(_pending)
+        _pending.clear()
+    try:
+        connection = _connect()
+        try:
+            with connection:
+                connection.executemany(
+                    "INSERT INTO samples VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT (metric, labels, sample) "
+                    "DO UPDATE SET value = value + excluded.value",
+                    [(*key, amount) for key, amount in updates.items()],
+                )
+        finally:
+            connection.close()
+    except sqlite3.Error:
+        logger.warning("Cannot write the metrics store, retrying", exc_info=True)
+        # Keep the updates for the next flush
+        with _lock:
+            for key, amount in updates.items():
+                _pending[key] = _pending.get(key, 0.0) + amount
+
+
+atexit.register(flush)
+
+
+def render() -> str:
+    """The metrics of all processes, in the Prometheus text exposition format."""
+    flush()
+    stored: dict[str, dict[str, dict[str, float]]] = {}
+    connection = _connect()
+    try:
+        for metric, labels, sample, value in connection.execute(
+            "SELECT metric, labels, sample, value FROM samples"
+        ):
+            stored.setdefault(metric, {}).setdefault(labels, {})[sample] = value
+    finally:
+        connection.close()
+
+    lines = []
+    for metric in _metrics.values():
+        help_text = metric.documentation.replace("\\", "\\\\").replace("\n", "\\n")
+        lines.append(f"# HELP {metric.name} {help_text}")
+        lines.append(f"# TYPE {metric.name} {metric.type}")
+        lines.extend(metric.samples(stored.get(metric.name, {})))
+    return "\n".join(lines) + "\n"
+
+
+def reset() -> None:
+    """Forget the metrics of all processes."""
+    with _lock:
+        _pending.clear()
+    connection = _connect()
+    try:
+        with connection:
+            connection.execute("DELETE FROM samples")
+    finally:
+        connection.close()
+
+
+PARSE_DURATION = Histogram(
+    "ansibeau_parse_duration_seconds",
+    "Time spent parsing a log, in the parser process",
+    labels=("parser_type",),
+)
+PARSE_FAILURES = Counter(
+    "ansibeau_parse_failures_total",
+    "Logs that could not be parsed",
+    labels=("error_type",),
+)
+LOG_SIZE_BYTES = Histogram(
+    "ansibeau_log_size_bytes", "Size of the parsed logs", buckets=SIZE_BUCKETS
+)
+LOG_SIZE_LINES = Histogram(
+    "ansibeau_log_size_lines", "Lines of the parsed logs", buckets=LINE_BUCKETS
+)
+LOG_HOSTS = Histogram(
+    "ansibeau_log_hosts", "Hosts per parsed log", buckets=HOST_BUCKETS
+)
+LOG_TASK_RESULTS = Histogram(
+    "ansibeau_log_task_results",
+    "Task results (one per task and host) per parsed log",
+    buckets=TASK_BUCKETS,
+)
+PERSIST_DURATION = Histogram(
+    "ansibeau_persist_duration_seconds",
+    "Time spent storing parsed logs, per transaction (one log, or a batch)",
+    labels=("mode",),
+)
+REQUEST_DURATION = Histogram(
+    "ansibeau_http_request_duration_seconds",
+    "Time spent handling requests, until the response is returned (without "
+    "the body of streaming responses)",
+    labels=("view", "method"),
+)
+
+
+def utf8_size(text: str) -> int:
+    """Size of a string encoded in UTF-8, without encoding ASCII ones."""
+    return len(text) if text.isascii() else len(text.encode("utf-8"))
+
+
+def record_parse(raw_content: str, result: ParseResult) -> None:
+    """Record the size and outcome of a parsed log."""
+    if not is_enabled():
+        return
+    if result.duration is not None:
+        PARSE_DURATION.observe(
+            result.duration, parser_type=result.parser_type or "unknown"
+        )
+    LOG_SIZE_BYTES.observe(utf8_size(raw_content))
+    lines = raw_content.count("\n")
+    if raw_content and not raw_content.endswith("\n"):
+        lines += 1
+    LOG_SIZE_LINES.observe(lines)
+    if result.success:
+        LOG_HOSTS.observe(len(result.hosts))
+        LOG_TASK_RESULTS.observe(sum(len(task.results) for task in result.tasks))
+    else:
+        PARSE_FAILURES.inc(error_type=result.error_type or "unknown")
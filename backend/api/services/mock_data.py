@@ -0,0 +1,528 @@
+"""
+Service generating realistic mock Ansible runs (see populate_mock_data).
+
+Each mock log is one playbook run against hosts of one environment. Plays
+run on every host, some in serial batches, and are made of a "Gathering
+Facts" task and role tasks with long names. Task outcomes follow per-task
+tendencies (mostly ok, changed or skipped), failures cluster on a few flaky
+tasks of a few bad runs, and hosts that fail or become unreachable stop
+running tasks, as with ansible-playbook.
+
+Runs are generated as the events sent by the Ansible callback plugin and
+rendered by StructuredResultReader, so the stored hosts, plays and tasks
+match the raw log (stored too with raw_logs) line for line, as if it had
+been uploaded.
+"""
+
+import math
+import random
+from dataclasses import dataclass, fields
+from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import Optional
+
+from django.db import transaction
+from django.utils import timezone
+
+from .live_log import StructuredResultReader, initial_state
+from .log_creator import create_logs
+from .log_parser import (
+    ParsedHost,
+    ParsedPlay,
+    ParsedTask,
+    ParsedTaskResult,
+    ParseResult,
+    compute_play_host_counts,
+    determine_play_status,
+)
+
+# Data pools for generating realistic mock data
+ENVIRONMENTS = ["prod", "staging", "dev"]
+SERVICES = ["web", "db", "cache", "lb", "app", "worker", "api", "queue"]
+LOCATIONS = ["us-east-1", "us-west-2", "eu-west-1", "eu-central-1", "ap-south-1"]
+
+LOG_TITLES = [
+    "Production Web Server Deployment",
+    "Database Maintenance and Backup",
+    "Security Patches and Updates",
+    "Application Configuration Update",
+    "Load Balancer Health Check",
+    "Cache Server Optimization",
+    "Monitoring Agent Installation",
+    "SSL Certificate Renewal",
+    "Docker Container Updates",
+    "Kubernetes Cluster Maintenance",
+    "System Package Upgrades",
+    "Application Log Rotation Setup",
+    "Firewall Rules Configuration",
+    "Database Replication Setup",
+    "Web Server Performance Tuning",
+    "API Gateway Configuration",
+    "Message Queue Deployment",
+    "Backup System Verification",
+    "Network Security Audit",
+    "Container Registry Migration",
+]
+
+PLAY_NAMES = {
+    "system_setup": [
+        "Install required system packages",
+        "Configure system timezone and locale",
+        "Setup system users and groups",
+        "Configure firewall rules",
+        "Update system kernel parameters",
+        "Configure system hostname",
+        "Setup NTP time synchronization",
+        "Configure system logging",
+    ],
+    "package_management": [
+        "Install Python dependencies",
+        "Install Node.js and npm",
+        "Install database client libraries",
+        "Update package cache",
+        "Remove obsolete packages",
+        "Install build tools",
+        "Install runtime libraries",
+        "Configure package repositories",
+    ],
+    "service_configuration": [
+        "Configure Nginx web server",
+        "Setup PostgreSQL database",
+        "Configure Redis cache server",
+        "Setup Apache web server",
+        "Configure MySQL database",
+        "Setup Memcached service",
+        "Configure HAProxy load balancer",
+        "Setup RabbitMQ message broker",
+    ],
+    "application_deployment": [
+        "Deploy application code",
+        "Run database migrations",
+        "Compile static assets",
+        "Update application configuration",
+        "Restart application services",
+        "Deploy API services",
+        "Update environment variables",
+        "Build application containers",
+    ],
+    "security": [
+        "Configure SSH security settings",
+        "Setup SSL/TLS certificates",
+        "Configure security groups",
+        "Setup fail2ban",
+        "Configure SELinux policies",
+        "Update security patches",
+        "Configure encryption keys",
+        "Setup authentication services",
+    ],
+    "monitoring": [
+        "Install monitoring agents",
+        "Configure log rotation",
+        "Setup system health checks",
+        "Configure metrics collection",
+        "Setup alerting rules",
+        "Deploy logging infrastructure",
+        "Configure APM agents",
+        "Setup uptime monitoring",
+    ],
+    "file_management": [
+        "Deploy configuration templates",
+        "Update environment variables",
+        "Backup configuration files",
+        "Sync files from repository",
+        "Clean up temporary files",
+        "Deploy application assets",
+        "Update configuration files",
+        "Archive old log files",
+    ],
+}
+
+ROLES = [
+    "common",
+    "base_packages",
+    "users",
+    "sshd",
+    "firewall",
+    "nginx",
+    "postgresql",
+    "redis",
+    "app_deploy",
+    "monitoring_agent",
+    "logrotate",
+    "certificates",
+    "docker",
+    "kubernetes_node",
+]
+
+TASK_ACTIONS = [
+    "Ensure {package} is installed",
+    "Install {package} from the internal repository mirror",
+    "Template {path}",
+    "Ensure {path} exists with mode 0644",
+    "Ensure {service} is started and enabled at boot",
+    "Restart {service} if its configuration changed",
+    "Wait for {service} to accept connections on its listen port",
+    "Check that {path} is valid before reloading {service}",
+    "Copy {path} from the release artifact",
+    "Set sysctl net.core.somaxconn and vm.swappiness for {service}",
+    "Add the {service} system user to the required groups",
+    "Register the current {service} version",
+    "Fail when the running {service} version is not supported",
+    "Run database migrations for {service}",
+    "Flush handlers",
+]
+
+PACKAGES = [
+    "nginx",
+    "python3-psycopg2",
+    "redis-server",
+    "postgresql-16",
+    "chrony",
+    "rsyslog",
+    "ca-certificates",
+    "docker-ce",
+    "node_exporter",
+    "haproxy",
+    "libpq-dev",
+    "build-essential",
+]
+
+PATHS = [
+    "/etc/nginx/conf.d/default.conf",
+    "/etc/ssh/sshd_config",
+    "/etc/systemd/system/app.service",
+    "/etc/logrotate.d/app",
+    "/opt/app/current/config/settings.yml",
+    "/etc/postgresql/16/main/postgresql.conf",
+    "/etc/redis/redis.conf",
+    "/etc/ssl/private/app.key",
+]
+
+FAILURE_MESSAGES = [
+    "No package matching '{package}' is available",
+    "Failed to update apt cache: W:Failed to fetch "
+    "http://mirror.internal/ubuntu/dists/jammy/InRelease  Temporary failure "
+    "resolving 'mirror.internal'",
+    "Unable to start service {service}: Job for {service}.service failed "
+    "because the control process exited with error code.\n"
+    'See "systemctl status {service}.service" and "journalctl -xeu '
+    '{service}.service" for details.',
+    "Destination directory {path} does not exist",
+    "non-zero return code",
+    "MODULE FAILURE\nSee stdout/stderr for the exact error",
+    "Timeout (12s) waiting for privilege escalation prompt: ",
+    "Could not find or access '{path}' on the Ansible Controller.\n"
+    "If you are using a module and expect the file to exist on the remote, "
+    "see the remote_src option",
+    "Status code was 503 and not [200]: HTTP Error 503: Service Unavailable",
+    "Timeout when waiting for 127.0.0.1:8080",
+    "AnsibleUndefinedVariable: '{service}_version' is undefined",
+]
+
+UNREACHABLE_MESSAGES = [
+    "Failed to connect to the host via ssh: ssh: connect to host {host} port 22: "
+    "Connection timed out",
+    "Failed to connect to the host via ssh: ssh: Could not resolve hostname "
+    "{host}: Name or service not known",
+    'Data could not be sent to remote host "{host}". Make sure this host can '
+    "be reached over ssh: kex_exchange_identification: read: Connection reset "
+    "by peer",
+]
+
+# Outcome tendency of a task: weights of ok, changed and skipping results
+TASK_KINDS = {
+    "ok": (97, 3, 0),
+    "changed": (15, 85, 0),
+    "skipping": (10, 0, 90),
+}
+TASK_KIND_WEIGHTS = (60, 25, 15)
+
+# Failure rate of a run: most runs are clean, a few go badly
+RUN_FAILURE_RATES = (0.0, 0.005, 0.05)
+RUN_FAILURE_WEIGHTS = (60, 30, 10)
+
+
+@dataclass
+class MockOptions:
+    """Size of the generated logs (means of skewed distributions)."""
+
+    hosts_per_log: int = 5
+    plays_per_log: int = 10
+    tasks_per_play: int = 8
+    days: int = 30
+    raw_logs: bool = False
+
+
+@dataclass
+class MockStats:
+    """Rows generated by populate_mock_data."""
+
+    logs: int = 0
+    hosts: int = 0
+    plays: int = 0
+    tasks: int = 0
+    ok_plays: int = 0
+    changed_plays: int = 0
+    failed_plays: int = 0
+    failed_tasks: int = 0
+    raw_bytes: int = 0
+
+    @property
+    def rows(self) -> int:
+        return self.logs + self.hosts + self.plays + self.tasks
+
+    def add(self, other: "MockStats") -> None:
+        for stat in fields(self):
+            setattr(
+                self, stat.name, getattr(self, stat.name) + getattr(other, stat.name)
+            )
+
+
+@dataclass
+class MockRun:
+    """A generated log: its title, upload time, raw content and ParseResult."""
+
+    title: str
+    uploaded_at: datetime
+    raw_content: str
+    result: ParseResult
+
+
+def around(rng: random.Random, mean: float, sigma: float = 0.6) -> int:
+    """Draw a positive count from a log-normal distribution of mean `mean`."""
+    mu = math.log(max(mean, 1)) - sigma**2 / 2
+    return max(1, round(rng.lognormvariate(mu, sigma)))
+
+
+@lru_cache(maxsize=None)
+def _fleet(environment: str) -> list[str]:
+    return [
+        f"{environment}-{service}-{location}-{number:02d}"
+        for service in SERVICES
+        for location in LOCATIONS
+        for number in range(1, 100)
+    ]
+
+
+def generate_hostnames(rng: random.Random, environment: str, count: int) -> list:
+    """Pick `count` hosts of an environment's fleet, shared by its runs."""
+    fleet = _fleet(environment)
+    hostnames = rng.sample(fleet, min(count, len(fleet)))
+    # Fleets larger than the pool get numbered overflow hosts
+    hostnames += [
+        f"{environment}-node-{number:05d}" for number in range(count - len(hostnames))
+    ]
+    return hostnames
+
+
+def generate_task_name(rng: random.Random) -> str:
+    action = rng.choice(TASK_ACTIONS).format(
+        package=rng.choice(PACKAGES),
+        path=rng.choice(PATHS),
+        service=rng.choice(SERVICES),
+    )
+    name = f"{rng.choice(ROLES)} : {action}"
+    if rng.random() < 0.15:
+        # Loops and long conditions make for long task names
+        items = rng.sample(PACKAGES, rng.randint(3, len(PACKAGES)))
+        name += f" ({', '.join(items)})"
+    return name[:500]
+
+
+def generate_failure(rng: random.Random, host: str) -> str:
+    return rng.choice(FAILURE_MESSAGES).format(
+        package=rng.choice(PACKAGES),
+        path=rng.choice(PATHS),
+        service=rng.choice(SERVICES),
+        host=host,
+    )
+
+
+def _serial_batches(rng: random.Random, hosts: list) -> list[list]:
+    """Split the hosts of a play in serial batches (one batch mostly)."""
+    if len(hosts) < 4 or rng.random() > 0.25:
+        return [hosts]
+    size = max(1, round(len(hosts) * rng.choice((0.1, 0.25, 0.5))))
+    return [hosts[start : start + size] for start in range(0, len(hosts), size)]
+
+
+def generate_run(
+    rng: random.Random, options: MockOptions, now: Optional[datetime] = None
+) -> MockRun:
+    """Generate one playbook run."""
+    now = now or timezone.now()
+    uploaded_at = now - timedelta(seconds=rng.uniform(0, options.days * 86400))
+    environment = rng.choice(ENVIRONMENTS)
+    hosts = generate_hostnames(rng, environment, around(rng, options.hosts_per_log))
+    failure_rate = rng.choices(RUN_FAILURE_RATES, RUN_FAILURE_WEIGHTS)[0]
+
+    # Play names are unique within a run
+    all_plays = list(
+        dict.fromkeys(name for names in PLAY_NAMES.values() for name in names)
+    )
+    play_count = around(rng, options.plays_per_log, sigma=0.4)
+    play_names = rng.sample(all_plays, min(play_count, len(all_plays)))
+    play_names += [f"{name} (2)" for name in all_plays[: play_count - len(play_names)]]
+
+    events = []
+    stats = {
+        host: dict.fromkeys(StructuredResultReader.RECAP_STATS, 0) for host in hosts
+    }
+    down: set[str] = set()
+    started = uploaded_at - timedelta(minutes=rng.randint(5, 120))
+    for play_index, play_name in enumerate(play_names):
+        tasks = [("Gathering Facts", "ok", 0.0)]
+        for _ in range(around(rng, options.tasks_per_play)):
+            kind = rng.choices(list(TASK_KINDS), TASK_KIND_WEIGHTS)[0]
+            # Failures cluster on a few flaky tasks
+            flaky = rng.random() < 0.05
+            fail_rate = min(0.9, failure_rate * (15 if flaky else 0.3))
+            tasks.append((generate_task_name(rng), kind, fail_rate))
+
+        aborted = False
+        for batch in _serial_batches(rng, hosts):
+            active = [host for host in batch if host not in down]
+            if not active:
+                continue
+            events.append(
+                {
+                    "event": "play",
+                    "name": play_name,
+                    "date": started + timedelta(minutes=play_index * 2),
+                }
+            )
+            for task_index, (task_name, kind, fail_rate) in enumerate(tasks):
+                if not active:
+                    # NO MORE HOSTS LEFT
+                    break
+                events.append({"event": "task", "name": task_name})
+                for host in list(active):
+                    if task_index == 0 and rng.random() < failure_rate / 10:
+                        status = "unreachable"
+                        message = rng.choice(UNREACHABLE_MESSAGES).format(host=host)
+                    elif rng.random() < fail_rate:
+                        status = "fatal"
+                        message = generate_failure(rng, host)
+                    else:
+                        status = rng.choices(
+                            ("ok", "changed", "skipping"), TASK_KINDS[kind]
+                        )[0]
+                        message = None
+                    events.append(
+                        {
+                            "event": "result",
+                            "host": host,
+                            "status": status,
+                            "message": message,
+                        }
+                    )
+                    _count_result(stats[host], status)
+                    if message is not None:
+                        # A failed host runs no further tasks
+                        active.remove(host)
+                        down.add(host)
+            # Like max_fail_percentage: a batch failing entirely ends the run
+            if not active and len(batch) > 1:
+                aborted = True
+                break
+        if aborted:
+            break
+
+    for host in hosts:
+        events.append({"event": "recap", "host": host, "stats": stats[host]})
+
+    reader = StructuredResultReader(initial_state())
+    chunk, raw_content = reader.read(events)
+    result = ParseResult(
+        success=True,
+        hosts=[ParsedHost(hostname=host, **stats[host]) for host in hosts],
+        plays=[
+            ParsedPlay(name=name, order=order, line_number=line_number)
+            for name, (order, line_number) in reader.state["plays"].items()
+        ],
+        timestamp=started,
+    )
+    parsed_tasks: dict[tuple, ParsedTask] = {}
+    for parsed in chunk.results:
+        key = (parsed.play_name, parsed.order, parsed.task_name)
+        task = parsed_tasks.get(key)
+        if task is None:
+            task = parsed_tasks[key] = ParsedTask(
+                name=parsed.task_name,
+                order=parsed.order,
+                play_name=parsed.play_name,
+                line_number=parsed.line_number,
+            )
+        task.results.append(
+            ParsedTaskResult(
+                hostname=parsed.hostname, status=parsed.status, message=parsed.message
+            )
+        )
+    result.tasks = list(parsed_tasks.values())
+    return MockRun(
+        title=rng.choice(LOG_TITLES),
+        uploaded_at=uploaded_at,
+        raw_content=raw_content,
+        result=result,
+    )
+
+
+def _count_result(stats: dict, status: str) -> None:
+    if status == "changed":
+        stats["ok"] += 1
+        stats["changed"] += 1
+    elif status == "skipping":
+        stats["skipped"] += 1
+    elif status == "fatal":
+        stats["failed"] += 1
+    else:
+        stats[status] += 1
+
+
+def _run_stats(run: MockRun) -> MockStats:
+    result = run.result
+    stats = MockStats(logs=1, hosts=len(result.hosts))
+    stats.plays = len(result.hosts) * len(result.plays)
+    stats.tasks = sum(len(task.results) for task in result.tasks)
+    for counts in compute_play_host_counts(result.tasks).values():
+        status = determine_play_status(
+            counts["ok"], counts["changed"], counts["failed"]
+        )
+        if status == "changed":
+            stats.changed_plays += 1
+        elif status == "failed":
+            stats.failed_plays += 1
+        stats.failed_tasks += counts["failed"]
+    # Including the plays a host never ran (after a failure), stored as ok
+    stats.ok_plays = stats.plays - stats.changed_plays - stats.failed_plays
+    if run.raw_content:
+        stats.raw_bytes = len(run.raw_content.encode("utf-8"))
+    return stats
+
+
+def generate_logs(seed: int, count: int, options: MockOptions) -> MockStats:
+    """
+    Generate and store `count` logs in one transaction.
+
+    Runs in the worker processes of populate_mock_data: the same seed
+    generates the same logs.
+
+    Returns:
+        The MockStats of the stored logs
+    """
+    rng = random.Random(seed)
+    now = timezone.now()
+    runs = [generate_run(rng, options, now) for _ in range(count)]
+    if not options.raw_logs:
+        for run in runs:
+            run.raw_content = ""
+
+    stats = MockStats()
+    for run in runs:
+        stats.add(_run_stats(run))
+    with transaction.atomic():
+        create_logs(
+            [(run.title, run.raw_content, run.result) for run in runs],
+            uploaded_at=[run.uploaded_at for run in runs],
+        )
+    return stats
@@ -0,0 +1,180 @@
+"""
+Service running LogParserService.parse in a bounded process pool.
+
+Parsing a large log is CPU-bound and holds the GIL, which stalls every other
+request served by the same process (and the event loop under ASGI). Parses
+are therefore sent to a pool of PARSE_POOL_WORKERS processes. At most
+PARSE_POOL_MAX_PENDING parses are queued or running per server process;
+further callers wait for a slot, which bounds the memory held by pending
+log contents.
+
+With PARSE_POOL_WORKERS = 0 logs are parsed in the calling thread.
+"""
+
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional
+
+from django.conf import settings
+
+from .log_parser import LogParserService, ParseResult
+from .metrics import record_parse
+from .profiling import timed
+
+logger = logging.getLogger(__name__)
+
+_executor: Optional[ProcessPoolExecutor] = None
+_slots: Optional[threading.BoundedSemaphore] = None
+_lock = threading.Lock()
+
+
+def get_pool_size() -> int:
+    """Return the number of parser processes (0 parses in-process)."""
+    default = min(4, os.cpu_count() or 1)
+    return getattr(settings, "PARSE_POOL_WORKERS", default)
+
+
+def _parse(raw_content: str) -> ParseResult:
+    """Entry point executed in the worker processes."""
+    start = time.perf_counter()
+    result = LogParserService().parse(raw_content)
+    result.duration = time.perf_counter() - start
+    return result
+
+
+def create_pool(workers: int) -> ProcessPoolExecutor:
+    """
+    Start a pool of `workers` parser processes, separate from the shared one.
+
+    Used by batch jobs (e.g. the import_logs command) sizing their own pool;
+    parses are sent to it with submit_parse.
+    """
+    # forkserver: forking a threaded server process is not safe, and the
+    # workers must not share the parent's database connections
+    return ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("forkserver"),
+    )
+
+
+def submit_parse(executor: ProcessPoolExecutor, raw_content: str) -> Future:
+    """Submit a log to a pool from create_pool; the future gives a ParseResult."""
+    return executor.submit(_parse, raw_content)
+
+
+def _get_executor() -> tuple[ProcessPoolExecutor, threading.BoundedSemaphore]:
+    global _executor, _slots
+    with _lock:
+        if _executor is None:
+            workers = get_pool_size()
+            max_pending = getattr(settings, "PARSE_POOL_MAX_PENDING", workers * 4)
+            _executor = create_pool(workers)
+            _slots = threading.BoundedSemaphore(max(max_pending, workers))
+        return _executor, _slots
+
+
+def _reset_executor(broken: ProcessPoolExecutor) -> None:
+    global _executor
+    with _lock:
+        if _executor is broken:
+            _executor = None
+    broken.shutdown(wait=False, cancel_futures=True)
+
+
+def parse_log(raw_content: str) -> ParseResult:
+    """
+    Parse a log in the process pool, blocking until the result is ready.
+
+    Args:
+        raw_content: Raw Ansible log content
+
+    Returns:
+        ParseResult from LogParserService.parse
+    """
+    with timed("parse"):
+        if get_pool_size() <= 0:
+            result = _parse(raw_content)
+        else:
+            executor, slots = _get_executor()
+            with slots:
+                try:
+                    result = executor.submit(_parse, raw_content).result()
+                except BrokenProcessPool:
+                    result = _broken(executor)
+    record_parse(raw_content, result)
+    return result
+
+
+def parse_logs(raw_contents: list[str]) -> list[ParseResult]:
+    """
+    Parse several logs in parallel in the process pool.
+
+    Logs are submitted as pool slots free up, so a large batch never holds
+    more than PARSE_POOL_MAX_PENDING pending logs in the pool queue.
+
+    Args:
+        raw_contents: Raw Ansible log contents
+
+    Returns:
+        ParseResult of each log, in the same order
+    """
+    with timed("parse"):
+        results = _parse_all(raw_contents)
+    for raw_content, result in zip(raw_contents, results):
+        record_parse(raw_content, result)
+    return results
+
+
+def _parse_all(raw_contents: list[str]) -> list[ParseResult]:
+    if get_pool_size() <= 0:
+        return [_parse(raw_content) for raw_content in raw_contents]
+
+    executor, slots = _get_executor()
+    futures = []
+    for raw_content in raw_contents:
+        slots.acquire()
+        try:
+            future = executor.submit(_parse, raw_content)
+        except BrokenProcessPool:
+            slots.release()
+            futures.append(None)
+            continue
+        future.add_done_callback(lambda _: slots.release())
+        futures.append(future)
+
+    results = []
+    for future in futures:
+        try:
+            if future is None:
+                raise BrokenProcessPool
+            results.append(future.result())
+        except BrokenProcessPool:
+            results.append(_broken(executor))
+    return results
+
+
+def _broken(executor: ProcessPoolExecutor) -> ParseResult:
+    """Restart a broken pool and return the failure of the parses it lost."""
+    # A worker died (e.g. killed for memory): start a fresh pool
+    logger.exception("Log parser process pool broke, restarting it")
+    _reset_executor(executor)
+    return ParseResult(
+        success=False,
+        error="Log parsing failed",
+        detail="The parser process terminated unexpectedly",
+        error_type="BrokenProcessPool",
+    )
+
+
+def shutdown() -> None:
+    """Stop the worker processes (they are restarted on the next parse)."""
+    global _executor
+    with _lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=True)
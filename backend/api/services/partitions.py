@@ -0,0 +1,268 @@
+"""
+Service for optional monthly range partitioning of the Task table (PostgreSQL).
+
+When TASK_PARTITIONING is enabled, ``api_task`` is a partitioned table
+``PARTITION BY RANGE (created_at)`` with one partition per month named
+``api_task_pYYYYMM`` plus a default partition catching anything outside
+them. A task's created_at is the upload time of its log, so every task of a
+log lives in the partition of the month the log was ingested:
+
+- queries filtering on ``created_at = log.uploaded_at`` touch one partition
+- retention drops whole monthly partitions instead of deleting rows
+
+Only Task is partitioned: Play is referenced by the Task.play foreign key,
+and PostgreSQL requires the referenced key of a partitioned table to include
+the partition column.
+"""
+
+from datetime import datetime, timezone
+from typing import Optional
+
+from django.conf import settings
+from django.db import connection, transaction
+
+TABLE = "api_task"
+DEFAULT_PARTITION = f"{TABLE}_default"
+PARTITION_PREFIX = f"{TABLE}_p"
+
+
+def _month_start(value: datetime) -> datetime:
+    value = value.astimezone(timezone.utc)
+    return datetime(value.year, value.month, 1, tzinfo=timezone.utc)
+
+
+def _next_month(value: datetime) -> datetime:
+    if value.month == 12:
+        return value.replace(year=value.year + 1, month=1)
+    return value.replace(month=value.month + 1)
+
+
+def _bounds(month: datetime) -> str:
+    """FOR VALUES clause of a monthly partition."""
+    return (
+        f"FOR VALUES FROM ('{month:%Y-%m-%d} 00:00:00+00') "
+        f"TO ('{_next_month(month):%Y-%m-%d} 00:00:00+00')"
+    )
+
+
+def partition_name(month: datetime) -> str:
+    """Return the name of the partition holding the given month."""
+    return f"{PARTITION_PREFIX}{month:%Y%m}"
+
+
+def partitioning_enabled() -> bool:
+    """Whether TASK_PARTITIONING is on and the database supports it."""
+    return (
+        getattr(settings, "TASK_PARTITIONING", False)
+        and connection.vendor == "postgresql"
+    )
+
+
+def is_partitioned(conn=connection) -> bool:
+    """Whether api_task currently is a partitioned table."""
+    if conn.vendor != "postgresql":
+        return False
+    with conn.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_partitioned_table pt "
+            "JOIN pg_class c ON c.oid = pt.partrelid "
+            "WHERE c.relname = %s AND pg_table_is_visible(c.oid)",
+            [TABLE],
+        )
+        return cursor.fetchone() is not None
+
+
+def list_partitions(conn=connection) -> list[datetime]:
+    """Return the months of the existing monthly partitions, oldest first."""
+    with conn.cursor() as cursor:
+        cursor.execute(
+            "SELECT c.relname FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid "
+            "JOIN pg_class parent ON parent.oid = i.inhparent "
+            "WHERE parent.relname = %s",
+            [TABLE],
+        )
+        names = [row[0] for row in cursor.fetchall()]
+    months = []
+    for name in names:
+        if not name.startswith(PARTITION_PREFIX):
+            continue
+        suffix = name[len(PARTITION_PREFIX) :]
+        months.append(
+            datetime(int(suffix[:4]), int(suffix[4:]), 1, tzinfo=timezone.utc)
+        )
+    return sorted(months)
+
+
+def create_partition(month: datetime, conn=connection) -> bool:
+    """
+    Create and attach the partition of a month, if it does not exist yet.
+
+    Rows of that month already stored in the default partition are moved
+    into the new partition before it is attached.
+
+    Returns:
+        True if the partition was created
+    """
+    month = _month_start(month)
+    if month in list_partitions(conn):
+        return False
+
+    name = conn.ops.quote_name(partition_name(month))
+    bounds = [month, _next_month(month)]
+    with transaction.atomic(using=conn.alias), conn.cursor() as cursor:
+        cursor.execute(
+            f"CREATE TABLE {name} "
+            f"(LIKE {TABLE} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"
+        )
+        cursor.execute(
+            f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION} "
+            "WHERE created_at >= %s AND created_at < %s RETURNING *) "
+            f"INSERT INTO {name} SELECT * FROM moved",
+            bounds,
+        )
+        cursor.execute(f"ALTER TABLE {TABLE} ATTACH PARTITION {name} {_bounds(month)}")
+    return True
+
+
+def ensure_partitions(
+    months_ahead: Optional[int] = None, now: Optional[datetime] = None, conn=connection
+) -> list[str]:
+    """
+    Create the partitions of the current month and the next `months_ahead`.
+
+    Returns:
+        Names of the partitions created
+    """
+    if months_ahead is None:
+        months_ahead = getattr(settings, "TASK_PARTITION_MONTHS_AHEAD", 3)
+    month = _month_start(now or datetime.now(timezone.utc))
+    created = []
+    for _ in range(months_ahead + 1):
+        if create_partition(month, conn):
+            created.append(partition_name(month))
+        month = _next_month(month)
+    return created
+
+
+def drop_partitions_before(cutoff: datetime, conn=connection) -> list[str]:
+    """
+    Detach and drop the monthly partitions that end at or before `cutoff`.
+
+    Only tasks of logs uploaded before `cutoff` live in those partitions;
+    their plays, hosts and logs still have to be purged afterwards.
+
+    Returns:
+        Names of the partitions dropped
+    """
+    dropped = []
+    for month in list_partitions(conn):
+        if _next_month(month) > cutoff:
+            break
+        name = conn.ops.quote_name(partition_name(month))
+        with transaction.atomic(using=conn.alias), conn.cursor() as cursor:
+            cursor.execute(f"ALTER TABLE {TABLE} DETACH PARTITION {name}")
+            cursor.execute(f"DROP TABLE {name}")
+        dropped.append(partition_name(month))
+    return dropped
+
+
+def _index_definitions(cursor, table: str) -> list[tuple[str, str]]:
+    cursor.execute(
+        "SELECT indexname, indexdef FROM pg_indexes "
+        "WHERE tablename = %s AND schemaname = current_schema()",
+        [table],
+    )
+    return cursor.fetchall()
+
+
+def _foreign_keys(cursor, table: str) -> list[tuple[str, str]]:
+    cursor.execute(
+        "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+        "WHERE conrelid = %s::regclass AND contype = 'f'",
+        [table],
+    )
+    return cursor.fetchall()
+
+
+def _rebuild_table(conn, partitioned: bool) -> None:
+    """Recreate api_task (partitioned or not) and copy the rows over."""
+    old = f"{TABLE}_old"
+    with conn.cursor() as cursor:
+        indexes = _index_definitions(cursor, TABLE)
+        foreign_keys = _foreign_keys(cursor, TABLE)
+        pkey = f"{TABLE}_pkey"
+
+        cursor.execute(f"ALTER TABLE {TABLE} RENAME TO {old}")
+        # Free the index names so they can be reused on the new table
+        for index_name, _ in indexes:
+            cursor.execute(f"ALTER INDEX {index_name} RENAME TO {index_name}_old")
+
+        partition_clause = " PARTITION BY RANGE (created_at)" if partitioned else ""
+        cursor.execute(
+            f"CREATE TABLE {TABLE} "
+            f"(LIKE {old} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"
+            f"{partition_clause}"
+        )
+        # The partition key must be part of the primary key
+        pkey_columns = "id, created_at" if partitioned else "id"
+        cursor.execute(
+            f"ALTER TABLE {TABLE} ADD CONSTRAINT {pkey} PRIMARY KEY ({pkey_columns})"
+        )
+        for name, definition in foreign_keys:
+            cursor.execute(f"ALTER TABLE {TABLE} ADD CONSTRAINT {name} {definition}")
+        # The definitions were read before the rename, so they target the
+        # new table
+        for index_name, definition in indexes:
+            if index_name != pkey:
+                cursor.execute(definition)
+
+        if partitioned:
+            cursor.execute(
+                f"CREATE TABLE {DEFAULT_PARTITION} PARTITION OF {TABLE} DEFAULT"
+            )
+            cursor.execute(f"SELECT min(created_at) FROM {old}")
+            oldest = cursor.fetchone()[0]
+            now = datetime.now(timezone.utc)
+            month = _month_start(oldest or now)
+            end = _month_start(now)
+            while month <= end:
+                cursor.execute(
+                    f"CREATE TABLE {partition_name(month)} "
+                    f"PARTITION OF {TABLE} {_bounds(month)}"
+                )
+                month = _next_month(month)
+
+        cursor.execute(f"INSERT INTO {TABLE} SELECT * FROM {old}")
+        cursor.execute(f"DROP TABLE {old}")
+
+
+def convert_to_partitioned(conn=connection) -> bool:
+    """
+    Turn api_task into a monthly range-partitioned table (PostgreSQL only).
+
+    Copies all rows, so run it during a maintenance window on large tables.
+
+    Returns:
+        True if the table was converted, False if it already was partitioned
+    """
+    if conn.vendor != "postgresql" or is_partitioned(conn):
+        return False
+    with transaction.atomic(using=conn.alias):
+        _rebuild_table(conn, partitioned=True)
+    ensure_partitions(conn=conn)
+    return True
+
+
+def convert_to_regular(conn=connection) -> bool:
+    """
+    Turn a partitioned api_task back into a regular table.
+
+    Returns:
+        True if the table was converted, False if it was not partitioned
+    """
+    if conn.vendor != "postgresql" or not is_partitioned(conn):
+        return False
+    with transaction.atomic(using=conn.alias):
+        _rebuild_table(conn, partitioned=False)
+    return True
@@ -0,0 +1,165 @@
+"""
+Service profiling requests (see RequestProfilingMiddleware).
+
+Each profiled request gets a RequestProfile in a context variable. Code
+worth attributing time to runs in ``timed(stage)`` blocks, e.g. log parsing
+("parse") and response serialization ("serialize"); outside a request, or
+when profiling is disabled, these blocks only cost a context variable read.
+
+A sample of the requests can also run under cProfile. SlowRequestSampler
+keeps their profiles only if they are among the slowest requests, compared
+to the durations of recent requests.
+"""
+
+import bisect
+import cProfile
+import re
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Iterator, Optional
+
+# Stages reported by every profile, in Server-Timing order
+STAGES = ("parse", "serialize")
+
+# Recent request durations the slowest requests are compared to
+RECENT_REQUESTS = 1000
+
+
+@dataclass
+class RequestProfile:
+    """Time spent by a request in each stage, in seconds."""
+
+    started: float = field(default_factory=time.perf_counter)
+    stages: dict[str, float] = field(default_factory=dict)
+
+
+_profile: ContextVar[Optional[RequestProfile]] = ContextVar(
+    "request_profile", default=None
+)
+
+
+@contextmanager
+def profile_request() -> Iterator[RequestProfile]:
+    """Attribute the time of the timed() blocks run in this context."""
+    profile = RequestProfile()
+    token = _profile.set(profile)
+    try:
+        yield profile
+    finally:
+        _profile.reset(token)
+
+
+@contextmanager
+def timed(stage: str) -> Iterator[None]:
+    """Add the time spent in this block to `stage` of the request profile."""
+    profile = _profile.get()
+    if profile is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.stages[stage] = (
+            profile.stages.get(stage, 0.0) + time.perf_counter() - start
+        )
+
+
+def server_timing(metrics: list[tuple[str, float, str]]) -> str:
+    """Format (name, seconds, description) metrics as a Server-Timing header."""
+    entries = []
+    for name, duration, description in metrics:
+        entry = f"{name};dur={duration * 1000:.1f}"
+        if description:
+            entry += f';desc="{description}"'
+        entries.append(entry)
+    return ", ".join(entries)
+
+
+class SlowRequestSampler:
+    """
+    Decides which requests run under cProfile and which profiles to keep.
+
+    Args:
+        sample_rate: Fraction of the requests run under cProfile
+        slowest_percent: Keep the profiles of requests slower than this
+            percentage of the recent requests
+        directory: Directory the kept profiles are written to (.prof files,
+            readable with pstats or snakeviz)
+    """
+
+    def __init__(self, sample_rate: float, slowest_percent: float, directory: Path):
+        self.sample_rate = sample_rate
+        self.slowest_percent = slowest_percent
+        self.directory = directory
+        self._recent: deque[float] = deque(maxlen=RECENT_REQUESTS)
+        self._sorted: list[float] = []
+        self._lock = threading.Lock()
+        # Only one profiler can be active at a time
+        self._profiling = threading.Lock()
+        self._requests = 0
+
+    def start(self) -> Optional[cProfile.Profile]:
+        """Start profiling the request if it is sampled, else return None."""
+        if self.sample_rate <= 0:
+            return None
+        with self._lock:
+            self._requests += 1
+            # Deterministic sampling: every 1 / sample_rate request
+            sampled = int(self._requests * self.sample_rate) != int(
+                (self._requests - 1) * self.sample_rate
+            )
+        if not sampled or not self._profiling.acquire(blocking=False):
+            return None
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Another profiler (e.g. a debugger) is active
+            self._profiling.release()
+            return None
+        return profiler
+
+    def stop(self, profiler: cProfile.Profile) -> None:
+        profiler.disable()
+        self._profiling.release()
+
+    def record(self, duration: float, profiled: bool) -> bool:
+        """
+        Record the duration of a request; returns whether it is among the
+        slowest ones. Profiled requests, slowed down by cProfile, are not
+        added to the recent durations.
+        """
+        with self._lock:
+            slow = self._is_slow(duration)
+            if not profiled:
+                if len(self._recent) == self._recent.maxlen:
+                    oldest = self._recent[0]
+                    del self._sorted[bisect.bisect_left(self._sorted, oldest)]
+                self._recent.append(duration)
+                bisect.insort(self._sorted, duration)
+        return slow
+
+    def _is_slow(self, duration: float) -> bool:
+        if not self._sorted:
+            return True
+        rank = int(len(self._sorted) * (1 - self.slowest_percent / 100))
+        return duration >= self._sorted[min(rank, len(self._sorted) - 1)]
+
+    def save(
+        self, profiler: cProfile.Profile, method: str, path: str, duration
+    ) -> Path:
+        """Write a profile to the profile directory and return its path."""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        slug = re.sub(r"[^A-Za-z0-9]+", "-", path).strip("-")[:80] or "root"
+        timestamp = datetime.now().strftime("%Y%m%dT%H%M%S.%f")
+        filename = f"{timestamp}-{method}-{slug}-{duration * 1000:.0f}ms.prof"
+        target = self.directory / filename
+        profiler.dump_stats(target)
+        return target
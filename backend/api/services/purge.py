@@ -0,0 +1,159 @@
+"""
+Service for purging old logs in bounded batches.
+
+Deleting a Log through the ORM makes Django collect every related Host, Play
+and Task in Python before deleting them, which for large logs loads millions
+of objects and holds locks for the whole cascade. Purging instead deletes
+bottom-up (Task, Play, Host, then the Log itself) with set-based DELETE
+statements of at most ``batch_size`` rows, each committed on its own.
+
+A purge interrupted half-way leaves a log with fewer children but otherwise
+intact, so running it again simply picks up where it stopped.
+"""
+
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Callable, Iterable, Optional
+
+from django.db import connection, transaction
+
+from ..models import Host, Log, Play, Task
+from .search import remove_logs_from_index
+
+DEFAULT_BATCH_SIZE = 1000
+
+
+@dataclass
+class PurgeStats:
+    """Rows deleted (or counted, for dry runs) by a purge."""
+
+    logs: int = 0
+    hosts: int = 0
+    plays: int = 0
+    tasks: int = 0
+    # (storage name, sha256) of the raw content of the deleted logs
+    raw_blobs: set = field(default_factory=set)
+    started_at: float = field(default_factory=time.monotonic)
+
+    @property
+    def rows(self) -> int:
+        return self.logs + self.hosts + self.plays + self.tasks
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started_at
+
+    @property
+    def rows_per_second(self) -> float:
+        elapsed = self.elapsed
+        return self.rows / elapsed if elapsed > 0 else 0.0
+
+
+def _delete_batch(model, pks: list) -> int:
+    """Delete rows of `model` by primary key with a single DELETE statement."""
+    if not pks:
+        return 0
+    prep = model._meta.pk.get_db_prep_value
+    placeholders = ", ".join(["%s"] * len(pks))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {model._meta.db_table} "
+            f"WHERE {model._meta.pk.column} IN ({placeholders})",
+            [prep(pk, connection) for pk in pks],
+        )
+        return cursor.rowcount
+
+
+def _delete_in_batches(model, queryset, batch_size, sleep, on_batch) -> int:
+    """Delete the rows of `queryset` batch by batch, bottom-up safe."""
+    deleted = 0
+    while True:
+        pks = list(queryset.values_list("pk", flat=True)[:batch_size])
+        if not pks:
+            return deleted
+        with transaction.atomic():
+            count = _delete_batch(model, pks)
+        deleted += count
+        on_batch(model, count)
+        if sleep:
+            time.sleep(sleep)
+
+
+def purge_log(
+    log: Log,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    sleep: float = 0.0,
+    stats: Optional[PurgeStats] = None,
+    progress: Optional[Callable[[PurgeStats], None]] = None,
+) -> PurgeStats:
+    """
+    Delete a log and all its hosts, plays and tasks in bounded batches.
+
+    Args:
+        log: The log to delete
+        batch_size: Maximum number of rows per DELETE statement
+        sleep: Seconds to pause after each batch, to leave room for ingest
+        stats: Stats to accumulate into (a new PurgeStats by default)
+        progress: Called with the stats after each batch
+
+    Returns:
+        The accumulated PurgeStats
+    """
+    stats = stats or PurgeStats()
+    counters = {Task: "tasks", Play: "plays", Host: "hosts"}
+
+    def on_batch(model, count):
+        setattr(stats, counters[model], getattr(stats, counters[model]) + count)
+        if progress:
+            progress(stats)
+
+    # Stop search hits on tasks that are about to disappear
+    remove_logs_from_index([log.pk])
+
+    tasks = Task.objects.filter(play__host__log=log, created_at=log.uploaded_at)
+    _delete_in_batches(Task, tasks, batch_size, sleep, on_batch)
+    _delete_in_batches(
+        Play, Play.objects.filter(host__log=log), batch_size, sleep, on_batch
+    )
+    _delete_in_batches(Host, Host.objects.filter(log=log), batch_size, sleep, on_batch)
+
+    # Nothing is left to cascade: the ORM delete is cheap and fires signals
+    log.delete()
+    stats.logs += 1
+    if log.raw_sha256:
+        stats.raw_blobs.add((log.raw_storage, log.raw_sha256))
+    if progress:
+        progress(stats)
+    return stats
+
+
+def purge_logs(
+    logs: Iterable[Log],
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    sleep: float = 0.0,
+    progress: Optional[Callable[[PurgeStats], None]] = None,
+) -> PurgeStats:
+    """Purge several logs with purge_log, accumulating their stats."""
+    stats = PurgeStats()
+    for log in logs:
+        purge_log(
+            log, batch_size=batch_size, sleep=sleep, stats=stats, progress=progress
+        )
+    return stats
+
+
+def logs_older_than(cutoff: datetime):
+    """Logs uploaded before `cutoff`, oldest first."""
+    return Log.objects.filter(uploaded_at__lt=cutoff).order_by("uploaded_at")
+
+
+def count_purge(logs) -> PurgeStats:
+    """Count the rows purging `logs` would delete, without deleting anything."""
+    log_ids = logs.values("pk")
+    return PurgeStats(
+        logs=logs.count(),
+        hosts=Host.objects.filter(log__in=log_ids).count(),
+        plays=Play.objects.filter(host__log__in=log_ids).count(),
+        tasks=Task.objects.filter(play__host__log__in=log_ids).count(),
+    )
@@ -0,0 +1,72 @@
+"""
+Service counting the database queries run while handling a request.
+
+Queries are counted and timed by an execute wrapper installed on each
+database connection when it is opened (see install). The stats of the
+current request live in a context variable, which asgiref copies into the
+threads running the sync code of async views, so their queries count too.
+"""
+
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Iterator, Optional
+
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+
+@dataclass
+class QueryStats:
+    """Number of queries and time spent running them, in seconds."""
+
+    count: int = 0
+    duration: float = 0.0
+
+
+_stats: ContextVar[Optional[QueryStats]] = ContextVar("query_stats", default=None)
+
+
+def _count_query(execute, sql, params, many, context):
+    stats = _stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.count += 1
+        stats.duration += time.perf_counter() - start
+
+
+def _install_wrapper(connection, **kwargs) -> None:
+    if _count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_count_query)
+
+
+def install() -> None:
+    """Count the queries of all database connections, current and future."""
+    connection_created.connect(_install_wrapper)
+    for connection in connections.all(initialized_only=True):
+        _install_wrapper(connection)
+
+
+@contextmanager
+def count_queries() -> Iterator[QueryStats]:
+    """
+    Count and time the queries run in this context.
+
+    install() must have been called for queries to be counted. Queries of
+    nested contexts also count in the enclosing ones.
+    """
+    stats = QueryStats()
+    token = _stats.set(stats)
+    try:
+        yield stats
+    finally:
+        _stats.reset(token)
+        outer = _stats.get()
+        if outer is not None:
+            outer.count += stats.count
+            outer.duration += stats.duration
@@ -0,0 +1,411 @@
+"""
+Service for storing raw log content outside of the Log table.
+
+Raw logs are compressed (zstd when available, gzip otherwise) and stored
+content-addressed by the SHA-256 of their UTF-8 encoding, either in the
+RawLogBlob table or as files under RAW_LOG_STORAGE_DIR. A Log only keeps
+the storage name, the hash and the sizes.
+"""
+
+import gzip
+import hashlib
+import io
+import os
+import tempfile
+import time
+import zlib
+from datetime import timedelta
+from pathlib import Path
+from typing import Iterator, Optional
+
+from django.conf import settings
+from django.utils import timezone
+
+from ..models import Log, RawLogBlob
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - optional dependency
+    zstandard = None
+
+CHUNK_SIZE = 64 * 1024
+
+# Blobs whose references are checked with one query by collect_garbage
+GC_BATCH_SIZE = 500
+
+GZIP_MAGIC = b"\x1f\x8b"
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+
+def get_codec() -> str:
+    """Return the codec used for newly stored logs."""
+    codec = getattr(settings, "RAW_LOG_COMPRESSION", None)
+    if codec is None:
+        codec = "zstd" if zstandard is not None else "gzip"
+    if codec == "zstd" and zstandard is None:
+        codec = "gzip"
+    return codec
+
+
+def compress(data: bytes, codec: str) -> bytes:
+    """Compress bytes with the given codec ("zstd" or "gzip")."""
+    if codec == "zstd":
+        return zstandard.ZstdCompressor(level=10).compress(data)
+    return gzip.compress(data, compresslevel=6, mtime=0)
+
+
+def detect_codec(head: bytes) -> str:
+    """Detect the codec of compressed data from its first bytes."""
+    if head.startswith(ZSTD_MAGIC):
+        return "zstd"
+    if head.startswith(GZIP_MAGIC):
+        return "gzip"
+    raise ValueError("Unknown raw log compression format")
+
+
+def iter_decompressed(fileobj) -> Iterator[bytes]:
+    """Yield the decompressed content of a compressed file, chunk by chunk."""
+    head = fileobj.read(4)
+    codec = detect_codec(head)
+    fileobj.seek(0)
+
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("zstandard is required to read zstd-compressed logs")
+        yield from zstandard.ZstdDecompressor().read_to_iter(
+            fileobj, read_size=CHUNK_SIZE, write_size=CHUNK_SIZE
+        )
+        return
+
+    decompressor = zlib.decompressobj(zlib.MAX_WBITS | 16)
+    while chunk := fileobj.read(CHUNK_SIZE):
+        data = decompressor.decompress(chunk)
+        if data:
+            yield data
+    tail = decompressor.flush()
+    if tail:
+        yield tail
+
+
+class RawLogStorage:
+    """Base class for content-addressed raw log storage backends."""
+
+    name: str = ""
+
+    def exists(self, sha256: str) -> bool:
+        raise NotImplementedError
+
+    def touch(self, sha256: str) -> bool:
+        """
+        Mark an existing blob as recently written (protects it from GC).
+        Returns whether the blob exists.
+        """
+        raise NotImplementedError
+
+    def write(self, sha256: str, data: bytes) -> None:
+        raise NotImplementedError
+
+    def size(self, sha256: str) -> int:
+        raise NotImplementedError
+
+    def open(self, sha256: str):
+        """Return a binary file-like object over the compressed blob."""
+        raise NotImplementedError
+
+    def delete(self, sha256: str, older_than: Optional[float] = None) -> bool:
+        """
+        Delete a blob, if it was last written more than `older_than` seconds
+        ago (when given). Returns whether it was deleted.
+        """
+        raise NotImplementedError
+
+    def list_older_than(self, seconds: float) -> Iterator[str]:
+        """Yield hashes of blobs last written more than `seconds` ago."""
+        raise NotImplementedError
+
+    def stored_sizes(self, hashes) -> dict[str, int]:
+        """Return the compressed size of the stored blobs among `hashes`."""
+        return {sha256: self.size(sha256) for sha256 in hashes if self.exists(sha256)}
+
+    def touch_many(self, hashes) -> int:
+        """Touch several blobs; returns the number of existing ones."""
+        return sum(self.touch(sha256) for sha256 in hashes)
+
+    def write_many(self, blobs: dict[str, bytes]) -> None:
+        for sha256, data in blobs.items():
+            self.write(sha256, data)
+
+
+class DatabaseRawLogStorage(RawLogStorage):
+    """Stores compressed raw logs in the RawLogBlob table."""
+
+    name = "db"
+
+    def exists(self, sha256: str) -> bool:
+        return RawLogBlob.objects.filter(sha256=sha256).exists()
+
+    def touch(self, sha256: str) -> bool:
+        return bool(
+            RawLogBlob.objects.filter(sha256=sha256).update(written_at=timezone.now())
+        )
+
+    def write(self, sha256: str, data: bytes) -> None:
+        RawLogBlob.objects.update_or_create(
+            sha256=sha256,
+            defaults={"data": data, "size": len(data), "written_at": timezone.now()},
+        )
+
+    def size(self, sha256: str) -> int:
+        return RawLogBlob.objects.values_list("size", flat=True).get(sha256=sha256)
+
+    def open(self, sha256: str):
+        data = RawLogBlob.objects.values_list("data", flat=True).get(sha256=sha256)
+        return io.BytesIO(bytes(data))
+
+    def delete(self, sha256: str, older_than: Optional[float] = None) -> bool:
+        blobs = RawLogBlob.objects.filter(sha256=sha256)
+        if older_than is not None:
+            cutoff = timezone.now() - timedelta(seconds=older_than)
+            blobs = blobs.filter(written_at__lt=cutoff)
+        deleted, _ = blobs.delete()
+        return bool(deleted)
+
+    def list_older_than(self, seconds: float) -> Iterator[str]:
+        cutoff = timezone.now() - timedelta(seconds=seconds)
+        yield from (
+            RawLogBlob.objects.filter(written_at__lt=cutoff)
+            .values_list("sha256", flat=True)
+            .iterator()
+        )
+
+    def stored_sizes(self, hashes) -> dict[str, int]:
+        return dict(
+            RawLogBlob.objects.filter(sha256__in=list(hashes)).values_list(
+                "sha256", "size"
+            )
+        )
+
+    def touch_many(self, hashes) -> int:
+        return RawLogBlob.objects.filter(sha256__in=list(hashes)).update(
+            written_at=timezone.now()
+        )
+
+    def write_many(self, blobs: dict[str, bytes]) -> None:
+        now = timezone.now()
+        # A concurrent upload may store the same content first: keep its blob
+        RawLogBlob.objects.bulk_create(
+            [
+                RawLogBlob(sha256=sha256, data=data, size=len(data), written_at=now)
+                for sha256, data in blobs.items()
+            ],
+            batch_size=100,
+            ignore_conflicts=True,
+        )
+
+
+class FileSystemRawLogStorage(RawLogStorage):
+    """Stores compressed raw logs as files under RAW_LOG_STORAGE_DIR."""
+
+    name = "filesystem"
+
+    def __init__(self, root=None):
+        self.root = Path(root or settings.RAW_LOG_STORAGE_DIR)
+
+    def _path(self, sha256: str) -> Path:
+        return self.root / sha256[:2] / sha256[2:4] / sha256
+
+    def exists(self, sha256: str) -> bool:
+        return self._path(sha256).exists()
+
+    def touch(self, sha256: str) -> bool:
+        try:
+            os.utime(self._path(sha256))
+        except FileNotFoundError:
+            return False
+        return True
+
+    def write(self, sha256: str, data: bytes) -> None:
+        path = self._path(sha256)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Write to a temp file and rename so readers never see partial blobs
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as tmp_file:
+                tmp_file.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+
+    def size(self, sha256: str) -> int:
+        return self._path(sha256).stat().st_size
+
+    def open(self, sha256: str):
+        return open(self._path(sha256), "rb")
+
+    def delete(self, sha256: str, older_than: Optional[float] = None) -> bool:
+        path = self._path(sha256)
+        try:
+            if older_than is not None:
+                if path.stat().st_mtime >= time.time() - older_than:
+                    return False
+            path.unlink()
+        except FileNotFoundError:
+            return False
+        return True
+
+    def list_older_than(self, seconds: float) -> Iterator[str]:
+        if not self.root.exists():
+            return
+        cutoff = time.time() - seconds
+        for path in self.root.glob("??/??/*"):
+            if path.name.startswith(".tmp-"):
+                continue
+            if path.stat().st_mtime < cutoff:
+                yield path.name
+
+
+STORAGE_CLASSES = {
+    DatabaseRawLogStorage.name: DatabaseRawLogStorage,
+    FileSystemRawLogStorage.name: FileSystemRawLogStorage,
+}
+
+
+def get_storage(name: Optional[str] = None) -> RawLogStorage:
+    """
+    Return a raw log storage backend.
+
+    Args:
+        name: Backend name ("db" or "filesystem"), defaults to RAW_LOG_STORAGE
+    """
+    name = name or getattr(settings, "RAW_LOG_STORAGE", "db")
+    try:
+        return STORAGE_CLASSES[name]()
+    except KeyError:
+        raise ValueError(f"Unknown raw log storage backend '{name}'")
+
+
+def attach_raw_content(log: Log, raw_content: str) -> None:
+    """
+    Store raw log content and point the (unsaved) log at it.
+
+    Identical content is stored only once; storing it again just refreshes
+    the existing blob so garbage collection does not reclaim it.
+
+    Args:
+        log: Log instance to update (not saved by this function)
+        raw_content: The raw log text
+    """
+    attach_raw_contents([(log, raw_content)])
+
+
+def attach_raw_contents(items) -> None:
+    """
+    Store the raw content of several logs, like attach_raw_content.
+
+    The storage is queried and written once for the whole batch, and
+    content shared by several logs is compressed once.
+
+    Args:
+        items: (log, raw content) pairs; the logs are not saved
+    """
+    storage = get_storage()
+    pending = []
+    for log, raw_content in items:
+        if not raw_content:
+            log.raw_storage = ""
+            log.raw_sha256 = ""
+            log.raw_size = 0
+            log.raw_compressed_size = 0
+            continue
+        data = raw_content.encode("utf-8")
+        pending.append((log, data, hashlib.sha256(data).hexdigest()))
+    if not pending:
+        return
+
+    sizes = storage.stored_sizes({sha256 for _, _, sha256 in pending})
+    # Once refreshed, a blob can no longer be collected (see collect_garbage)
+    if storage.touch_many(sizes) < len(sizes):
+        # Some were collected since they were looked up: store them again
+        sizes = storage.stored_sizes(sizes)
+
+    codec = get_codec()
+    blobs = {}
+    for _, data, sha256 in pending:
+        if sha256 not in sizes:
+            blobs[sha256] = compress(data, codec)
+            sizes[sha256] = len(blobs[sha256])
+    storage.write_many(blobs)
+
+    for log, data, sha256 in pending:
+        log.raw_storage = storage.name
+        log.raw_sha256 = sha256
+        log.raw_size = len(data)
+        log.raw_compressed_size = sizes[sha256]
+
+
+def iter_raw_content(log: Log) -> Iterator[bytes]:
+    """Yield the decompressed raw content of a log as UTF-8 byte chunks."""
+    if not log.raw_sha256:
+        return
+    with get_storage(log.raw_storage).open(log.raw_sha256) as fileobj:
+        yield from iter_decompressed(fileobj)
+
+
+def open_raw_compressed(log: Log):
+    """Return (file-like, codec) over the stored compressed content of a log."""
+    fileobj = get_storage(log.raw_storage).open(log.raw_sha256)
+    codec = detect_codec(fileobj.read(4))
+    fileobj.seek(0)
+    return fileobj, codec
+
+
+def read_raw_content(log: Log) -> str:
+    """Return the full raw content of a log as a string."""
+    return b"".join(iter_raw_content(log)).decode("utf-8", errors="replace")
+
+
+def collect_garbage(grace_seconds: float = 3600, blobs=None) -> int:
+    """
+    Delete stored blobs no longer referenced by any log.
+
+    Blobs written or refreshed within the last `grace_seconds` are kept,
+    so an upload that reuses a blob while it is being collected is safe:
+    the age of a blob is checked again when deleting it.
+
+    Args:
+        grace_seconds: Keep blobs written within this many seconds
+        blobs: (storage name, sha256) pairs to check, e.g. those of purged
+            logs, instead of every stored blob
+
+    Returns:
+        Number of blobs deleted
+    """
+    candidates: dict[str, list[str]] = {}
+    if blobs is None:
+        for name in STORAGE_CLASSES:
+            candidates[name] = list(get_storage(name).list_older_than(grace_seconds))
+    else:
+        for name, sha256 in set(blobs):
+            if name and sha256:
+                candidates.setdefault(name, []).append(sha256)
+
+    deleted = 0
+    for name, hashes in candidates.items():
+        storage = get_storage(name)
+        for start in range(0, len(hashes), GC_BATCH_SIZE):
+            batch = hashes[start : start + GC_BATCH_SIZE]
+            referenced = set(
+                Log.objects.filter(raw_storage=name, raw_sha256__in=batch).values_list(
+                    "raw_sha256", flat=True
+                )
+            )
+            for sha256 in batch:
+                if sha256 in referenced:
+                    continue
+                if storage.delete(sha256, older_than=grace_seconds):
+                    deleted += 1
+    return deleted
@@ -0,0 +1,364 @@
+"""
+Service for full-text search over tasks.
+
+Task names, failure messages, play names and hostnames are indexed at ingest
+time in a vendor-specific index table:
+
+- PostgreSQL: ``api_task_search`` with a ``tsvector`` column and a GIN index
+- SQLite: ``api_task_fts``, an FTS5 virtual table
+
+Other databases fall back to (slow) ``icontains`` filtering. Results are
+ordered by log upload time, newest first, and paginated with a keyset cursor
+on (uploaded_at, task_id).
+"""
+
+import base64
+import json
+import re
+import uuid
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+
+from django.db import connection, connections, router
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+from ..models import Host, Log, Play, Task
+
+PG_TABLE = "api_task_search"
+FTS_TABLE = "api_task_fts"
+
+# Logs indexed per statement by index_logs()
+INDEX_BATCH_SIZE = 200
+
+# Query terms: "quoted phrases" or bare words
+TERM_PATTERN = re.compile(r'"([^"]+)"|(\S+)')
+
+
+class InvalidCursor(ValueError):
+    """Raised when a pagination cursor cannot be decoded."""
+
+
+@dataclass
+class SearchPage:
+    """A page of search hits."""
+
+    tasks: list[Task]
+    next_cursor: Optional[str] = None
+
+
+def encode_cursor(uploaded_at: datetime, task_id: uuid.UUID) -> str:
+    """Encode the position after a hit into an opaque cursor string."""
+    payload = json.dumps([uploaded_at.isoformat(), str(task_id)])
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, uuid.UUID]:
+    """Decode a cursor produced by encode_cursor."""
+    try:
+        uploaded_at, task_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        parsed = parse_datetime(uploaded_at)
+        if parsed is None:
+            raise ValueError(uploaded_at)
+        return parsed, uuid.UUID(task_id)
+    except (ValueError, TypeError) as exc:
+        raise InvalidCursor("Invalid cursor") from exc
+
+
+def _source_sql() -> str:
+    """SELECT joining each task to its play, host and log."""
+    return (
+        f"FROM {Task._meta.db_table} t "
+        f"JOIN {Play._meta.db_table} p ON p.id = t.play_id "
+        f"JOIN {Host._meta.db_table} h ON h.id = p.host_id "
+        f"JOIN {Log._meta.db_table} l ON l.id = h.log_id"
+    )
+
+
+class TaskSearchBackend:
+    """Base class for vendor-specific task search indexes."""
+
+    def index_logs(self, logs: list, new: bool = False) -> None:
+        """
+        Index the tasks of logs given as (log id, upload time) pairs.
+
+        Tasks indexed before are replaced, unless the logs are known to be
+        `new` (not indexed yet).
+        """
+        raise NotImplementedError
+
+    def remove_logs(self, log_ids) -> None:
+        raise NotImplementedError
+
+    def match(self, query, statuses, log_id, since, until, after, limit) -> list:
+        """Return task ids of matching tasks, newest log first."""
+        raise NotImplementedError
+
+    def _filters(self, statuses, log_id, since, until, after):
+        """Build the WHERE clauses shared by the SQL backends."""
+        clauses, params = [], []
+        adapt_dt = connection.ops.adapt_datetimefield_value
+        prep_uuid = Task._meta.pk.get_db_prep_value
+
+        if statuses:
+            clauses.append(f"status IN ({', '.join(['%s'] * len(statuses))})")
+            params.extend(statuses)
+        if log_id is not None:
+            clauses.append("log_id = %s")
+            params.append(prep_uuid(log_id, connection))
+        if since is not None:
+            clauses.append("uploaded_at >= %s")
+            params.append(adapt_dt(since))
+        if until is not None:
+            clauses.append("uploaded_at < %s")
+            params.append(adapt_dt(until))
+        if after is not None:
+            after_uploaded_at, after_task_id = after
+            clauses.append("(uploaded_at < %s OR (uploaded_at = %s AND task_id < %s))")
+            params.extend(
+                [
+                    adapt_dt(after_uploaded_at),
+                    adapt_dt(after_uploaded_at),
+                    prep_uuid(after_task_id, connection),
+                ]
+            )
+        return clauses, params
+
+    def _select(self, match_clause, match_param, table, filters, limit) -> list:
+        clauses, params = filters
+        where = " AND ".join([match_clause, *clauses])
+        sql = (
+            f"SELECT task_id FROM {table} WHERE {where} "
+            "ORDER BY uploaded_at DESC, task_id DESC LIMIT %s"
+        )
+        # Searches are reads: honour the replica selected for this request
+        read_connection = connections[router.db_for_read(Task)]
+        with read_connection.cursor() as cursor:
+            cursor.execute(sql, [match_param, *params, limit])
+            return [uuid.UUID(str(row[0])) for row in cursor.fetchall()]
+
+
+class PostgresTaskSearch(TaskSearchBackend):
+    """tsvector + GIN index maintained in the api_task_search table."""
+
+    def index_logs(self, logs: list, new: bool = False) -> None:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {PG_TABLE} "
+                "(task_id, log_id, uploaded_at, status, document) "
+                "SELECT t.id, h.log_id, l.uploaded_at, t.status, "
+                "setweight(to_tsvector('simple', t.name), 'A') || "
+                "setweight(to_tsvector('simple', coalesce(t.failure_message, '')), 'B')"
+                " || setweight(to_tsvector('simple', p.name), 'C') || "
+                "setweight(to_tsvector('simple', h.hostname), 'D') "
+                f"{_source_sql()} "
+                "WHERE h.log_id = ANY(%s::uuid[]) "
+                "AND t.created_at = ANY(%s::timestamptz[]) "
+                "ON CONFLICT (task_id) DO UPDATE SET log_id = EXCLUDED.log_id, "
+                "uploaded_at = EXCLUDED.uploaded_at, status = EXCLUDED.status, "
+                "document = EXCLUDED.document",
+                [[log_id for log_id, _ in logs], [at for _, at in logs]],
+            )
+
+    def remove_logs(self, log_ids) -> None:
+        log_ids = list(log_ids)
+        if not log_ids:
+            return
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"DELETE FROM {PG_TABLE} WHERE log_id = ANY(%s::uuid[])", [log_ids]
+            )
+
+    def match(self, query, statuses, log_id, since, until, after, limit) -> list:
+        return self._select(
+            "document @@ websearch_to_tsquery('simple', %s)",
+            query,
+            PG_TABLE,
+            self._filters(statuses, log_id, since, until, after),
+            limit,
+        )
+
+
+class SQLiteTaskSearch(TaskSearchBackend):
+    """FTS5 virtual table api_task_fts (development databases)."""
+
+    def index_logs(self, logs: list, new: bool = False) -> None:
+        log_ids = [
+            Log._meta.pk.get_db_prep_value(log_id, connection) for log_id, _ in logs
+        ]
+        times = [connection.ops.adapt_datetimefield_value(at) for _, at in logs]
+        where = (
+            f"WHERE h.log_id IN ({', '.join(['%s'] * len(log_ids))}) "
+            f"AND t.created_at IN ({', '.join(['%s'] * len(times))})"
+        )
+        with connection.cursor() as cursor:
+            if not new:
+                # FTS5 tables have no unique constraint: drop the rows of
+                # tasks indexed before, like ON CONFLICT on PostgreSQL (this
+                # scans the table, as task_id is not indexed)
+                cursor.execute(
+                    f"DELETE FROM {FTS_TABLE} WHERE task_id IN "
+                    f"(SELECT t.id {_source_sql()} {where})",
+                    [*log_ids, *times],
+                )
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE} "
+                "(task_name, failure_message, play_name, hostname, "
+                "task_id, log_id, status, uploaded_at) "
+                "SELECT t.name, coalesce(t.failure_message, ''), p.name, h.hostname, "
+                "t.id, h.log_id, t.status, l.uploaded_at "
+                f"{_source_sql()} {where}",
+                [*log_ids, *times],
+            )
+
+    def remove_logs(self, log_ids) -> None:
+        prep = Log._meta.pk.get_db_prep_value
+        values = [prep(log_id, connection) for log_id in log_ids]
+        if not values:
+            return
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"DELETE FROM {FTS_TABLE} "
+                f"WHERE log_id IN ({', '.join(['%s'] * len(values))})",
+                values,
+            )
+
+    @staticmethod
+    def to_fts_query(query: str) -> str:
+        """Turn a user query into an FTS5 query: all terms must match."""
+        terms = []
+        for phrase, word in TERM_PATTERN.findall(query):
+            term = phrase or word
+            terms.append('"' + term.replace('"', '""') + '"')
+        return " ".join(terms)
+
+    def match(self, query, statuses, log_id, since, until, after, limit) -> list:
+        return self._select(
+            f"{FTS_TABLE} MATCH %s",
+            self.to_fts_query(query),
+            FTS_TABLE,
+            self._filters(statuses, log_id, since, until, after),
+            limit,
+        )
+
+
+class FallbackTaskSearch(TaskSearchBackend):
+    """Unindexed icontains search for databases without a search index."""
+
+    def index_logs(self, logs: list, new: bool = False) -> None:
+        pass
+
+    def remove_logs(self, log_ids) -> None:
+        pass
+
+    def match(self, query, statuses, log_id, since, until, after, limit) -> list:
+        tasks = Task.objects.all()
+        for phrase, word in TERM_PATTERN.findall(query):
+            term = phrase or word
+            tasks = tasks.filter(
+                Q(name__icontains=term)
+                | Q(failure_message__icontains=term)
+                | Q(play__name__icontains=term)
+                | Q(play__host__hostname__icontains=term)
+            )
+        if statuses:
+            tasks = tasks.filter(status__in=statuses)
+        if log_id is not None:
+            tasks = tasks.filter(play__host__log_id=log_id)
+        if since is not None:
+            tasks = tasks.filter(play__host__log__uploaded_at__gte=since)
+        if until is not None:
+            tasks = tasks.filter(play__host__log__uploaded_at__lt=until)
+        if after is not None:
+            after_uploaded_at, after_task_id = after
+            tasks = tasks.filter(
+                Q(play__host__log__uploaded_at__lt=after_uploaded_at)
+                | Q(
+                    play__host__log__uploaded_at=after_uploaded_at, id__lt=after_task_id
+                )
+            )
+        tasks = tasks.order_by("-play__host__log__uploaded_at", "-id")
+        return list(tasks.values_list("id", flat=True)[:limit])
+
+
+def get_backend() -> TaskSearchBackend:
+    """Return the search backend for the default database."""
+    if connection.vendor == "postgresql":
+        return PostgresTaskSearch()
+    if connection.vendor == "sqlite":
+        return SQLiteTaskSearch()
+    return FallbackTaskSearch()
+
+
+def index_log(log) -> None:
+    """Add all tasks of a log to the search index, replacing indexed ones."""
+    index_logs([log])
+
+
+def index_logs(logs, new: bool = False) -> None:
+    """
+    Add all tasks of logs to the search index, replacing indexed ones.
+
+    Args:
+        logs: Logs to index
+        new: The logs were just created, so none of their tasks is indexed
+            (saves a scan of the SQLite index)
+    """
+    backend = get_backend()
+    logs = [(log.pk, log.uploaded_at) for log in logs]
+    # Bounded batches keep the statements under SQLite's parameter limit
+    for start in range(0, len(logs), INDEX_BATCH_SIZE):
+        backend.index_logs(logs[start : start + INDEX_BATCH_SIZE], new=new)
+
+
+def remove_logs_from_index(log_ids) -> None:
+    """Remove all tasks of the given logs from the search index."""
+    get_backend().remove_logs(log_ids)
+
+
+def search_tasks(
+    query: str,
+    statuses: Optional[list[str]] = None,
+    log_id: Optional[uuid.UUID] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    cursor: Optional[str] = None,
+    limit: int = 50,
+) -> SearchPage:
+    """
+    Search tasks by task name, failure message, play name and hostname.
+
+    Args:
+        query: Search terms; all must match. "Quoted phrases" match as a whole.
+        statuses: Only return tasks with one of these statuses
+        log_id: Only return tasks of this log
+        since: Only return tasks of logs uploaded at or after this time
+        until: Only return tasks of logs uploaded before this time
+        cursor: Cursor returned with the previous page
+        limit: Maximum number of hits to return
+
+    Returns:
+        SearchPage with tasks (play, host and log preloaded) and next cursor
+
+    Raises:
+        InvalidCursor: If the cursor cannot be decoded
+    """
+    after = decode_cursor(cursor) if cursor else None
+
+    # Fetch one extra hit to know whether there is a next page
+    task_ids = get_backend().match(
+        query, statuses, log_id, since, until, after, limit + 1
+    )
+    has_more = len(task_ids) > limit
+    task_ids = task_ids[:limit]
+
+    tasks_by_id = Task.objects.select_related("play__host__log").in_bulk(task_ids)
+    tasks = [tasks_by_id[task_id] for task_id in task_ids if task_id in tasks_by_id]
+
+    next_cursor = None
+    if has_more and tasks:
+        last = tasks[-1]
+        next_cursor = encode_cursor(last.play.host.log.uploaded_at, last.id)
+
+    return SearchPage(tasks=tasks, next_cursor=next_cursor)
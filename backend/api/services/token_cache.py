@@ -0,0 +1,103 @@
+"""In-process TTL cache for API token validation."""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from django.conf import settings
+
+from ..models import Token
+
+# Sentinel stored for token values that do not exist (negative caching)
+_MISSING = object()
+
+
+class TokenCache:
+    """
+    Short-TTL, size-bounded LRU cache of Token lookups.
+
+    Entries are keyed on the SHA-256 of the token value so raw secrets are
+    never kept as dict keys. Unknown tokens are cached too, so repeated
+    attempts with a bad token do not hit the database either.
+
+    Only the database row is cached: validity (status and ``expires_at``)
+    is re-evaluated on every lookup, so expiry is honored to the second.
+    The cache is per process; TokenAdmin invalidates the local process and
+    other workers pick up changes after at most TOKEN_CACHE_TTL seconds.
+
+    Invalidations bump a generation counter: a lookup that read the database
+    before an invalidation does not cache the (possibly stale) row after it.
+    """
+
+    def __init__(self):
+        self._entries: OrderedDict[bytes, tuple[float, object]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = 0
+
+    @property
+    def ttl(self) -> float:
+        return getattr(settings, "TOKEN_CACHE_TTL", 10)
+
+    @property
+    def max_size(self) -> int:
+        return getattr(settings, "TOKEN_CACHE_MAX_SIZE", 1024)
+
+    @staticmethod
+    def _key(value: str) -> bytes:
+        return hashlib.sha256(value.encode("utf-8")).digest()
+
+    def get_token(self, value: str) -> Optional[Token]:
+        """
+        Return the Token with this value, or None if it does not exist.
+
+        Served from the cache when a fresh entry exists, otherwise loaded
+        from the database and cached.
+        """
+        if self.ttl <= 0:
+            return Token.objects.filter(value=value).first()
+
+        key = self._key(value)
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires, token = entry
+                if expires > now:
+                    self._entries.move_to_end(key)
+                    return None if token is _MISSING else token
+                del self._entries[key]
+            generation = self._generation
+
+        token = Token.objects.filter(value=value).first()
+
+        with self._lock:
+            if generation != self._generation:
+                # Invalidated while the row was read: it may be stale
+                return token
+            self._entries[key] = (
+                now + self.ttl,
+                _MISSING if token is None else token,
+            )
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+        return token
+
+    def invalidate(self, value: str) -> None:
+        """Drop the cached entry for a token value, if any."""
+        with self._lock:
+            self._generation += 1
+            self._entries.pop(self._key(value), None)
+
+    def clear(self) -> None:
+        """Drop all cached entries."""
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+
+token_cache = TokenCache()
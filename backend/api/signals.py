@@ -0,0 +1,13 @@
+"""Signal handlers keeping denormalized data in sync with the models."""
+
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from .models import Log
+from .services.search import remove_logs_from_index
+
+
+@receiver(post_delete, sender=Log)
+def remove_deleted_log_from_search_index(sender, instance, **kwargs):
+    """Drop the tasks of a deleted log from the task search index."""
+    remove_logs_from_index([instance.pk])
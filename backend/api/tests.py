@@ -1 +1,2841 @@
-# Create your tests here.
+"""
+Query budget tests: each API view and admin changelist runs at most a fixed
+number of SQL queries, however many hosts, plays and tasks it shows.
+
+Every view is requested on a small and a large dataset with the same budget,
+so a query run per host, play or task (an N+1) exceeds it on the large one.
+
+Set QUERY_REPORT to a file path to write the slowest queries of each view
+there, e.g. ``QUERY_REPORT=queries.txt poetry run pytest``.
+
+RendererTests check that FastJSONRenderer renders the same bytes as DRF.
+CompressionTests check the content negotiation of CompressionMiddleware and
+its minimum response size.
+
+MetricsTests check the metrics recorded by uploads and served at /metrics.
+LogPreviewTests check that dry runs parse logs without writing anything.
+
+UploadTests check raw body, multipart and gzip uploads, the size limit on
+decompressed content and the rejection of truncated gzip data.
+
+BatchUploadTests check batches sent as JSON, NDJSON and tar or zip archives,
+the 207 response of partly failed batches and the entry and size limits.
+
+IdempotencyTests check that uploads retried with the same Idempotency-Key,
+concurrently or not, return the first log instead of storing another one.
+UploadCLITests run the ansibeau-upload command against a scripted HTTP
+server to check its retries.
+
+SearchIndexTests check that indexing a log again does not duplicate hits.
+
+LogDiffTests check the hosts, plays and tasks reported as changed between
+two runs, plays being compared with the play at the same position.
+
+LiveLogTests check that a log uploaded in chunks, split anywhere, is stored
+like the same log uploaded at once, and that finalizing it completes it.
+Structured results (the Ansible callback plugin's batches) give the rows
+the text parser finds in their rendered output; retried batches are not
+applied twice and out of order ones are rejected.
+
+CallbackPluginTests (with ansible installed) send a run through the batch
+sender of the Ansible callback plugin, a batch being sent twice.
+
+ImportLogsTests check that import_logs skips content already stored,
+resumes after the last checkpointed batch and reads tar and zip archives.
+
+PurgeTests check that purge_logs and the admin action delete old logs and
+their raw content, and keep newer ones.
+
+PartitioningTests (PostgreSQL only) migrate the Task table to monthly
+partitions and back, and purge logs by dropping their partitions.
+
+LiveEventTests read the Server-Sent Events stream of a running log, under
+ASGI and as the backlog replayed under WSGI, resuming after Last-Event-ID.
+
+ASGITests check that, served over ASGI, uploads do not wait for each other
+(request profiling included) and raw logs and diffs are streamed.
+
+AsyncViewTests check that the async read views (API_ASYNC_VIEWS) return the
+same payloads and errors as the DRF views they replace.
+
+ParsePoolTests parse logs in a real forkserver pool, which is restarted
+when a worker dies.
+
+ReplicaRoutingTests check that reads go to a healthy read replica, that
+lagging or unreachable replicas are skipped, and that objects missing on
+the replica are looked up again on the primary.
+
+TokenCacheTests check the token lookup cache: negative caching, expiry
+checked on cache hits, and invalidation by the admin and during lookups.
+
+RawStorageTests check the round trip of raw logs through each storage
+backend, and that garbage collection only deletes unreferenced blobs, even
+if an upload reuses one while it is collected.
+"""
+
+import asyncio
+import gzip
+import http.server
+import importlib.util
+import io
+import json
+import os
+import random
+import tarfile
+import tempfile
+import threading
+import time
+import unittest
+import uuid
+import zipfile
+from datetime import timedelta
+from io import StringIO
+from pathlib import Path
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import OperationalError, connection, connections
+from django.db.migrations.executor import MigrationExecutor
+from django.db.models import F, Q
+from django.http import HttpResponse
+from django.test import (
+    AsyncRequestFactory,
+    LiveServerTestCase,
+    RequestFactory,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from . import async_views, cli, db_router
+from .middleware import CompressionMiddleware, available_encodings, brotli
+from .models import Host, Log, Play, RawLogBlob, Task, Token
+from .permissions import HasValidToken
+from .renderers import FastJSONRenderer
+from .services import live_events, log_import, metrics, parse_pool
+from .services.log_creator import create_logs
+from .services.live_log import (
+    FAILED_STATUSES,
+    append_chunk,
+    create_live_log,
+    finalize_live_log,
+)
+from .services.log_parser import LogParserService, ParseResult
+from .services.mock_data import MockOptions, generate_run
+from .services.partitions import (
+    convert_to_partitioned,
+    convert_to_regular,
+    create_partition,
+    is_partitioned,
+    list_partitions,
+    partition_name,
+)
+from .services.raw_storage import (
+    collect_garbage,
+    get_storage,
+    read_raw_content,
+    zstandard,
+)
+from .services.search import get_backend, index_logs, search_tasks
+from .services.token_cache import token_cache
+from .views import LogViewSet
+
+SMALL = MockOptions(hosts_per_log=1, plays_per_log=1, tasks_per_play=1)
+LARGE = MockOptions(hosts_per_log=40, plays_per_log=6, tasks_per_play=8)
+
+# Queries listed per view in the QUERY_REPORT file
+SLOWEST_QUERIES = 5
+
+# View name -> (duration in seconds, SQL) of the queries of its largest case
+_report: dict[str, list[tuple[float, str]]] = {}
+
+
+def tearDownModule():
+    path = os.environ.get("QUERY_REPORT")
+    if not path or not _report:
+        return
+    lines = []
+    for name, queries in sorted(_report.items()):
+        total = sum(duration for duration, _ in queries)
+        lines.append(f"{name}: {len(queries)} queries in {total * 1000:.1f}ms")
+        for duration, sql in sorted(queries, reverse=True)[:SLOWEST_QUERIES]:
+            lines.append(f"  {duration * 1000:8.2f}ms  {sql[:300]}")
+        lines.append("")
+    with open(path, "w", encoding="utf-8") as report:
+        report.write("\n".join(lines))
+
+
+def mock_run(options: MockOptions, seed: int):
+    """A generated playbook run, the same for the same seed."""
+    return generate_run(random.Random(seed), options)
+
+
+def create_mock_log(title: str, options: MockOptions, seed: int):
+    run = mock_run(options, seed)
+    return create_logs([(title, run.raw_content, run.result)])[0]
+
+
+class QueryTimer:
+    """Database execute wrapper recording the duration and SQL of queries."""
+
+    def __init__(self):
+        self.queries: list[tuple[float, str]] = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((time.perf_counter() - start, sql))
+
+
+class QueryBudgetTestCase(TestCase):
+    """Stores a small and a large log, and checks the queries of requests."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.small = create_mock_log("budget small", SMALL, seed=1)
+        cls.large = create_mock_log("budget large", LARGE, seed=2)
+
+    def assertQueryBudget(
+        self, budget: int, name: str, requests: list, count_inserts: bool = True
+    ):
+        """
+        Call each request, from the smallest case to the largest one, and
+        check that it succeeds with at most `budget` queries.
+
+        With `count_inserts` False, bulk INSERT statements are not counted:
+        their number grows with the rows stored, as bulk inserts are split
+        in batches (of at most 999 parameters on SQLite).
+        """
+        for request in requests:
+            timer = QueryTimer()
+            with connection.execute_wrapper(timer):
+                response = request()
+                self.assertLess(response.status_code, 400, f"{name} failed")
+                if response.streaming:
+                    # Streamed bodies run their queries while being consumed
+                    b"".join(response.streaming_content)
+            queries = timer.queries
+            if not count_inserts:
+                queries = [
+                    (duration, sql)
+                    for duration, sql in queries
+                    if not sql.startswith('INSERT INTO "api_')
+                ]
+            self.assertLessEqual(
+                len(queries),
+                budget,
+                f"{name} ran {len(queries)} queries (budget {budget}):\n"
+                + "\n".join(sql for _, sql in queries),
+            )
+        _report[name] = queries
+
+
+@override_settings(PARSE_POOL_WORKERS=0)
+class APIQueryBudgetTests(QueryBudgetTestCase):
+    """Query budgets of the API endpoints."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.token = Token.objects.create(value="budget-token")
+
+    def setUp(self):
+        # Every upload looks its token up, as on a cold worker
+        token_cache.clear()
+
+    def each_log(self, path: str) -> list:
+        return [
+            lambda log=log: self.client.get(path.format(log=log.pk))
+            for log in (self.small, self.large)
+        ]
+
+    def test_log_detail(self):
+        self.assertQueryBudget(
+            3, "GET /api/logs/{id}/", self.each_log("/api/logs/{log}/")
+        )
+
+    def test_log_hosts(self):
+        self.assertQueryBudget(
+            3, "GET /api/logs/{id}/hosts/", self.each_log("/api/logs/{log}/hosts/")
+        )
+
+    def test_log_raw(self):
+        self.assertQueryBudget(
+            2, "GET /api/logs/{id}/raw/", self.each_log("/api/logs/{log}/raw/")
+        )
+
+    def test_log_diff(self):
+        self.assertQueryBudget(
+            7,
+            "GET /api/logs/{id}/diff/{other}/",
+            [
+                lambda: self.client.get(
+                    f"/api/logs/{self.small.pk}/diff/{self.small.pk}/"
+                ),
+                lambda: self.client.get(
+                    f"/api/logs/{self.small.pk}/diff/{self.large.pk}/"
+                ),
+            ],
+        )
+
+    def test_play_tasks(self):
+        plays = [
+            Play.objects.filter(host__log=log).first()
+            for log in (self.small, self.large)
+        ]
+        self.assertQueryBudget(
+            2,
+            "GET /api/plays/{id}/tasks/",
+            [
+                lambda play=play: self.client.get(f"/api/plays/{play.pk}/tasks/")
+                for play in plays
+            ],
+        )
+
+    def test_host_history(self):
+        hosts = [
+            Host.objects.filter(log=log).first() for log in (self.small, self.large)
+        ]
+        self.assertQueryBudget(
+            1,
+            "GET /api/hosts/{hostname}/history/",
+            [
+                lambda host=host: self.client.get(
+                    f"/api/hosts/{host.hostname}/history/"
+                )
+                for host in hosts
+            ],
+        )
+
+    def test_search(self):
+        self.assertQueryBudget(
+            2,
+            "GET /api/search/",
+            [
+                lambda log=log: self.client.get(
+                    "/api/search/", {"q": "Gathering", "log": str(log.pk)}
+                )
+                for log in (self.small, self.large)
+            ],
+        )
+
+    def test_upload(self):
+        runs = [mock_run(SMALL, seed=3), mock_run(LARGE, seed=4)]
+        self.assertQueryBudget(
+            9,
+            "POST /api/logs/",
+            [
+                lambda run=run: self.client.post(
+                    "/api/logs/?title=upload",
+                    run.raw_content,
+                    content_type="text/plain",
+                    HTTP_AUTHORIZATION=f"Bearer {self.token.value}",
+                )
+                for run in runs
+            ],
+            count_inserts=False,
+        )
+
+    def test_batch_upload(self):
+        batches = [
+            [mock_run(SMALL, seed=5)],
+            [mock_run(SMALL, seed=6), mock_run(LARGE, seed=7), mock_run(LARGE, seed=8)],
+        ]
+        self.assertQueryBudget(
+            6,
+            "POST /api/logs/batch/",
+            [
+                lambda runs=runs: self.client.post(
+                    "/api/logs/batch/",
+                    json.dumps(
+                        [
+                            {"title": f"batch {index}", "raw_content": run.raw_content}
+                            for index, run in enumerate(runs)
+                        ]
+                    ),
+                    content_type="application/json",
+                    HTTP_AUTHORIZATION=f"Bearer {self.token.value}",
+                )
+                for runs in batches
+            ],
+            count_inserts=False,
+        )
+
+
+class AdminQueryBudgetTests(QueryBudgetTestCase):
+    """Query budgets of the admin changelists."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        for seed in range(10, 20):
+            create_mock_log(f"budget other {seed}", SMALL, seed=seed)
+        for index in range(10):
+            Token.objects.create(value=f"budget-token-{index}")
+        cls.user = get_user_model().objects.create_superuser(
+            "admin", "admin@example.com", "password"
+        )
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def changelist(self, model: str, small_filter: dict) -> list:
+        """The changelist filtered on the small log, then unfiltered."""
+        path = f"/admin/api/{model}/"
+        return [
+            lambda: self.client.get(path, small_filter),
+            lambda: self.client.get(path),
+        ]
+
+    def test_log_changelist(self):
+        self.assertQueryBudget(
+            7, "admin log changelist", self.changelist("log", {"q": "budget small"})
+        )
+
+    def test_host_changelist(self):
+        self.assertQueryBudget(
+            8,
+            "admin host changelist",
+            self.changelist("host", {"log__id__exact": self.small.pk}),
+        )
+
+    def test_play_changelist(self):
+        self.assertQueryBudget(
+            9,
+            "admin play changelist",
+            self.changelist("play", {"host__log__id__exact": self.small.pk}),
+        )
+
+    def test_task_changelist(self):
+        self.assertQueryBudget(
+            7,
+            "admin task changelist",
+            self.changelist("task", {"play__host__log__id__exact": self.small.pk}),
+        )
+
+    def test_filtered_changelists(self):
+        for path, params in (
+            ("/admin/api/log/", {"has_failures": "yes"}),
+            ("/admin/api/host/", {"play_status": "ok"}),
+            ("/admin/api/play/", {"task_count": "6-10"}),
+        ):
+            self.assertQueryBudget(
+                9,
+                f"admin changelist {path} {params}",
+                [lambda path=path, params=params: self.client.get(path, params)],
+            )
+
+    def assertFilterCount(self, path: str, params: dict, expected):
+        response = self.client.get(path, params)
+        self.assertEqual(response.context["cl"].result_count, expected.count())
+
+    def test_filters_match_plays(self):
+        """The stored flags and totals filter like the plays they summarize."""
+        failed_logs = Log.objects.filter(hosts__plays__status="failed").distinct()
+        self.assertTrue(failed_logs.exists())
+        for value, expected in (
+            ("yes", failed_logs),
+            ("no", Log.objects.exclude(pk__in=failed_logs)),
+        ):
+            self.assertFilterCount("/admin/api/log/", {"has_failures": value}, expected)
+
+        for status in ("failed", "changed"):
+            self.assertFilterCount(
+                "/admin/api/host/",
+                {"play_status": status},
+                Host.objects.filter(plays__status=status).distinct(),
+            )
+        self.assertFilterCount(
+            "/admin/api/host/",
+            {"play_status": "ok"},
+            Host.objects.filter(plays__status="ok")
+            .exclude(Q(plays__status="changed") | Q(plays__status="failed"))
+            .distinct(),
+        )
+
+        total = F("tasks_ok") + F("tasks_changed") + F("tasks_failed")
+        plays = Play.objects.alias(total=total)
+        for value, expected in (
+            ("0-5", plays.filter(total__lte=5)),
+            ("6-10", plays.filter(total__range=(6, 10))),
+            ("11-20", plays.filter(total__range=(11, 20))),
+            ("20+", plays.filter(total__gt=20)),
+        ):
+            self.assertFilterCount("/admin/api/play/", {"task_count": value}, expected)
+
+    def test_token_changelist(self):
+        self.assertQueryBudget(
+            5, "admin token changelist", self.changelist("token", {"status": "active"})
+        )
+
+
+class RendererTests(TestCase):
+    """FastJSONRenderer renders the same bytes as DRF's JSONRenderer."""
+
+    def test_same_output(self):
+        data = {
+            "title": "Deploy \u2028 #42 \u2029 caf\u00e9 \U0001f680",
+            "uploaded_at": timezone.now(),
+            "id": uuid.uuid4(),
+            "hosts": [{"hostname": "web1", "failed": 0}, None, 1.5, True],
+            3: "int key",
+        }
+        expected = JSONRenderer().render(data)
+        rendered = FastJSONRenderer().render(data)
+        self.assertEqual(rendered, expected)
+        self.assertIn(b"\\u2028", rendered)
+        self.assertIn(b"\\u2029", rendered)
+        self.assertNotIn("\u2028".encode(), rendered)
+        self.assertNotIn("\u2029".encode(), rendered)
+
+    def test_indent(self):
+        data = {"title": "line\u2028separator", "results": [1, 2]}
+        context = {"indent": 2}
+        rendered = FastJSONRenderer().render(data, renderer_context=context)
+        self.assertIn(b"\n  ", rendered)
+        self.assertIn(b"\\u2028", rendered)
+        self.assertEqual(json.loads(rendered), data)
+
+
+class CompressionTests(TestCase):
+    """CompressionMiddleware content negotiation on API responses."""
+
+    body = json.dumps([{"hostname": f"web{n}", "status": "ok"} for n in range(200)])
+
+    def respond(self, accept_encoding=None, path="/api/logs/", body=None, **headers):
+        middleware = CompressionMiddleware(
+            lambda request: HttpResponse(
+                self.body if body is None else body,
+                content_type="application/json",
+                headers=headers,
+            )
+        )
+        request_headers = {}
+        if accept_encoding is not None:
+            request_headers["Accept-Encoding"] = accept_encoding
+        return middleware(RequestFactory().get(path, headers=request_headers))
+
+    def assertIdentity(self, response, body=None):
+        self.assertFalse(response.has_header("Content-Encoding"))
+        self.assertEqual(response.content.decode(), self.body if body is None else body)
+
+    def assertVary(self, response):
+        self.assertIn("Accept-Encoding", response["Vary"])
+
+    def test_gzip(self):
+        response = self.respond("gzip")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(response["Content-Length"], str(len(response.content)))
+        self.assertEqual(gzip.decompress(response.content).decode(), self.body)
+        self.assertVary(response)
+
+    def test_identity(self):
+        for accept_encoding in (None, "", "identity", "gzip;q=0", "compress, deflate"):
+            response = self.respond(accept_encoding)
+            self.assertIdentity(response)
+            self.assertVary(response)
+
+    @unittest.skipIf(zstandard is None, "zstandard is not installed")
+    def test_zstd(self):
+        response = self.respond("gzip, br, zstd")
+        self.assertEqual(response["Content-Encoding"], "zstd")
+        decompressed = zstandard.ZstdDecompressor().decompressobj()
+        self.assertEqual(decompressed.decompress(response.content).decode(), self.body)
+        # Not when the client refuses it
+        response = self.respond("zstd;q=0, gzip")
+        self.assertNotEqual(response["Content-Encoding"], "zstd")
+
+    @unittest.skipIf(brotli is None, "brotli is not installed")
+    def test_brotli(self):
+        response = self.respond("gzip, br")
+        self.assertEqual(response["Content-Encoding"], "br")
+        self.assertEqual(brotli.decompress(response.content).decode(), self.body)
+        response = self.respond("br;q=0, gzip")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+
+    def test_best_encoding_first(self):
+        # The server order wins over the client's q-values
+        best = available_encodings()[0][0]
+        response = self.respond("gzip;q=1, br;q=0.5, zstd;q=0.1")
+        self.assertEqual(response["Content-Encoding"], best)
+
+    def test_min_size(self):
+        with override_settings(API_COMPRESSION_MIN_SIZE=len(self.body) + 1):
+            response = self.respond("gzip")
+            self.assertIdentity(response)
+            self.assertVary(response)
+        with override_settings(API_COMPRESSION_MIN_SIZE=len(self.body)):
+            self.assertEqual(self.respond("gzip")["Content-Encoding"], "gzip")
+
+    def test_incompressible(self):
+        body = '{"id": 1}'
+        with override_settings(API_COMPRESSION_MIN_SIZE=0):
+            # Sent as is when compression would make it larger
+            self.assertIdentity(self.respond("gzip", body=body), body)
+
+    def test_other_paths(self):
+        response = self.respond("gzip", path="/admin/api/log/")
+        self.assertIdentity(response)
+        self.assertFalse(response.has_header("Vary"))
+
+    def test_etag(self):
+        response = self.respond("gzip", ETag='"abc"')
+        self.assertEqual(response["ETag"], 'W/"abc"')
+        response = self.respond("identity", ETag='"abc"')
+        self.assertEqual(response["ETag"], '"abc"')
+
+    def test_api_responses(self):
+        log = create_mock_log("compressed", LARGE, seed=7)
+        path = f"/api/logs/{log.pk}/hosts/"
+        response = self.client.get(path, headers={"Accept-Encoding": "gzip"})
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertVary(response)
+        self.assertEqual(
+            json.loads(gzip.decompress(response.content)),
+            self.client.get(path).json(),
+        )
+
+
+class MetricsTests(TestCase):
+    """Metrics recorded by uploads and requests, served at /metrics."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.directory = tempfile.TemporaryDirectory()
+        cls.enabled = override_settings(
+            METRICS_ENABLED=True,
+            METRICS_DB=os.path.join(cls.directory.name, "metrics.sqlite3"),
+            METRICS_TOKEN="",
+            PARSE_POOL_WORKERS=0,
+        )
+        cls.enabled.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        # Drop the updates of the last requests, not to flush them elsewhere
+        metrics.reset()
+        cls.enabled.disable()
+        cls.directory.cleanup()
+        super().tearDownClass()
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.token = Token.objects.create(value="metrics-token")
+
+    def setUp(self):
+        metrics.reset()
+
+    def upload(self, raw_content: str):
+        return self.client.post(
+            "/api/logs/?title=metrics",
+            raw_content,
+            content_type="text/plain",
+            HTTP_AUTHORIZATION=f"Bearer {self.token.value}",
+        )
+
+    def scrape(self) -> list[str]:
+        response = self.client.get("/metrics")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], metrics.CONTENT_TYPE)
+        return response.content.decode().splitlines()
+
+    def test_upload_metrics(self):
+        run = mock_run(SMALL, seed=30)
+        self.assertEqual(self.upload(run.raw_content).status_code, 201)
+        self.assertEqual(self.upload("not an ansible log\n").status_code, 500)
+
+        lines = self.scrape()
+        self.assertIn(
+            'ansibeau_parse_duration_seconds_count{parser_type="play"} 2', lines
+        )
+        self.assertIn('ansibeau_parse_failures_total{error_type="NoHosts"} 1', lines)
+        self.assertIn("ansibeau_log_size_bytes_count 2", lines)
+        self.assertIn("ansibeau_log_hosts_count 1", lines)
+        self.assertIn('ansibeau_log_hosts_bucket{le="1"} 1', lines)
+        self.assertIn('ansibeau_persist_duration_seconds_count{mode="single"} 1', lines)
+        self.assertIn(
+            "ansibeau_http_request_duration_seconds_count"
+            '{view="log-list",method="POST"} 2',
+            lines,
+        )
+
+    def test_histogram_buckets_are_cumulative(self):
+        for lines in (5, 50, 50, 5000):
+            metrics.LOG_SIZE_LINES.observe(lines)
+        scraped = self.scrape()
+        for bound, count in (("10", 1), ("100", 3), ("1000", 3), ("+Inf", 4)):
+            self.assertIn(
+                f'ansibeau_log_size_lines_bucket{{le="{bound}"}} {count}', scraped
+            )
+        self.assertIn("ansibeau_log_size_lines_sum 5105", scraped)
+
+    def test_token(self):
+        with override_settings(METRICS_TOKEN="scraper"):
+            self.assertEqual(self.client.get("/metrics").status_code, 401)
+            response = self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer scraper")
+            self.assertEqual(response.status_code, 200)
+
+    def test_disabled(self):
+        with override_settings(METRICS_ENABLED=False):
+            self.assertEqual(self.client.get("/metrics").status_code, 404)
+
+
+@override_settings(PARSE_POOL_WORKERS=0)
+class UploadTests(TestCase):
+    """Log files uploaded as raw bodies or multipart files, maybe gzipped."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.token = Token.objects.create(value="upload-token")
+        cls.content = mock_run(SMALL, seed=40).raw_content
+
+    def post(self, body, content_type="text/plain"):
+        return self.client.post(
+            "/api/logs/?title=upload",
+            body,
+            content_type=content_type,
+            headers={"Authorization": f"Bearer {self.token.value}"},
+        )
+
+    def post_file(self, data: bytes, name: str = "run.log"):
+        return self.client.post(
+            "/api/logs/",
+            {"title": "upload", "file": SimpleUploadedFile(name, data)},
+            headers={"Authorization": f"Bearer {self.token.value}"},
+        )
+
+    def assertStored(self, response, content: str):
+        self.assertEqual(response.status_code, 201, response.content)
+        log = Log.objects.get(pk=response.json()["id"])
+        self.assertEqual(read_raw_content(log), content)
+
+    def assertRejected(self, response, message: str):
+        self.assertEqual(response.status_code, 400)
+        self.assertIn(message, response.content.decode())
+        self.assertFalse(Log.objects.exists())
+
+    def test_text_plain(self):
+        body = self.content.replace("\n", "\r\n").encode()
+        self.assertStored(self.post(body), self.content)
+
+    def test_multipart(self):
+        self.assertStored(self.post_file(self.content.encode()), self.content)
+
+    def test_gzip(self):
+        compressed = gzip.compress(self.content.encode())
+        self.assertStored(self.post(compressed), self.content)
+        self.assertStored(self.post_file(compressed, "run.log.gz"), self.content)
+
+    def test_concatenated_gzip(self):
+        lines = self.content.splitlines(keepends=True)
+        half = len(lines) // 2
+        members = [
+            gzip.compress("".join(part).encode())
+            for part in (lines[:half], lines[half:])
+        ]
+        # Members may be separated by zero padding
+        self.assertStored(self.post(members[0] + b"\0" * 8 + members[1]), self.content)
+
+    def test_truncated_gzip(self):
+        compressed = gzip.compress(self.content.encode())
+        self.assertRejected(self.post(compressed[:-8]), "truncated")
+        self.assertRejected(
+            self.post_file(compressed[: len(compressed) // 2]), "truncated"
+        )
+
+    def test_invalid_gzip(self):
+        compressed = gzip.compress(self.content.encode())
+        self.assertRejected(self.post(compressed + b"trailing data"), "Invalid gzip")
+
+    def test_size_limit(self):
+        size = len(self.content.encode())
+        compressed = gzip.compress(self.content.encode())
+        with override_settings(LOG_UPLOAD_MAX_SIZE=size - 1):
+            self.assertLess(len(compressed), size - 1)
+            # Checked on the decompressed content
+            self.assertRejected(self.post(compressed), "maximum size")
+            self.assertRejected(self.post_file(compressed), "maximum size")
+            self.assertRejected(self.post(self.content.encode()), "maximum size")
+        with override_settings(LOG_UPLOAD_MAX_SIZE=size):
+            self.assertStored(self.post(compressed), self.content)
+
+
+@override_settings(PARSE_POOL_WORKERS=0)
+class BatchUploadTests(TestCase):
+    """Batches of logs uploaded as JSON, NDJSON or archives to /api/logs/batch/."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.token = Token.objects.create(value="batch-token")
+        cls.runs = [mock_run(SMALL, seed=seed) for seed in (41, 42, 43)]
+        # Like inline uploads, batch entries are stored without surrounding
+        # whitespace
+        cls.contents = [run.raw_content.strip() for run in cls.runs]
+
+    def post(self, body, content_type="application/json"):
+        return self.client.post(
+            "/api/logs/batch/",
+            body,
+            content_type=content_type,
+            headers={"Authorization": f"Bearer {self.token.value}"},
+        )
+
+    def post_archive(self, data: bytes, name: str):
+        return self.client.post(
+            "/api/logs/batch/",
+            {"file": SimpleUploadedFile(name, data)},
+            headers={"Authorization": f"Bearer {self.token.value}"},
+        )
+
+    def entries(self, *contents):
+        return [
+            {"title": f"batch {index}", "raw_content": content}
+            for index, content in enumerate(contents)
+        ]
+
+    @staticmethod
+    def tar(files: dict[str, bytes], mode="w:gz") -> bytes:
+        buffer = io.BytesIO()
+        with tarfile.open(fileobj=buffer, mode=mode) as archive:
+            directory = tarfile.TarInfo("logs")
+            directory.type = tarfile.DIRTYPE
+            archive.addfile(directory)
+            for name, data in files.items():
+                info = tarfile.TarInfo(name)
+                info.size = len(data)
+                archive.addfile(info, io.BytesIO(data))
+        return buffer.getvalue()
+
+    @staticmethod
+    def zip(files: dict[str, bytes]) -> bytes:
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w") as archive:
+            archive.writestr("logs/", b"")
+            for name, data in files.items():
+                archive.writestr(name, data)
+        return buffer.getvalue()
+
+    def archived_files(self) -> dict[str, bytes]:
+        first, second, _ = self.contents
+        return {
+            "logs/web.log": first.encode(),
+            # Archived logs may be gzipped
+            "logs/db.log.gz": gzip.compress(second.encode()),
+            # Skipped, like macOS resource forks
+            "logs/._web.log": b"\0\0",
+        }
+
+    def assertCreated(self, response, titles: list[str]):
+        self.assertEqual(response.status_code, 201, response.content)
+        data = response.json()
+        self.assertEqual(data["created"], len(titles))
+        self.assertEqual(data["failed"], 0)
+        self.assertEqual([item["log"]["title"] for item in data["results"]], titles)
+        self.assertEqual(
+            sorted(Log.objects.values_list("title", flat=True)), sorted(titles)
+        )
+
+    def assertRejected(self, response, message: str):
+        self.assertEqual(response.status_code, 400)
+        self.assertIn(message, response.content.decode())
+        self.assertFalse(Log.objects.exists())
+
+    def test_json(self):
+        self.assertCreated(
+            self.post(json.dumps(self.entries(*self.contents))),
+            ["batch 0", "batch 1", "batch 2"],
+        )
+        Log.objects.all().delete()
+        self.assertCreated(
+            self.post(json.dumps({"logs": self.entries(self.contents[0])})),
+            ["batch 0"],
+        )
+
+    def test_mixed_results(self):
+        first, second, _ = self.contents
+        response = self.post(
+            json.dumps(self.entries(first, "not an ansible log", second))
+        )
+        self.assertEqual(response.status_code, 207)
+        data = response.json()
+        self.assertEqual((data["created"], data["failed"]), (2, 1))
+        self.assertEqual(
+            [(item["index"], item["status"]) for item in data["results"]],
+            [(0, 201), (1, 500), (2, 201)],
+        )
+        created, failed, _ = data["results"]
+        self.assertEqual(created["log"]["host_count"], len(self.runs[0].result.hosts))
+        self.assertEqual(failed["error"]["raw_content_preview"], "not an ansible log")
+        self.assertEqual(
+            sorted(Log.objects.values_list("title", flat=True)), ["batch 0", "batch 2"]
+        )
+        log = Log.objects.get(pk=created["log"]["id"])
+        self.assertEqual(read_raw_content(log), first)
+
+    def test_ndjson(self):
+        first, second, _ = self.entries(*self.contents)
+        # Blank lines are skipped
+        lines = [json.dumps(first), "", json.dumps(second)]
+        self.assertCreated(
+            self.post("\n".join(lines) + "\n", "application/x-ndjson"),
+            ["batch 0", "batch 1"],
+        )
+
+    def test_invalid_ndjson(self):
+        body = json.dumps(self.entries(self.contents[0])[0]) + "\n{oops\n"
+        self.assertRejected(self.post(body, "application/x-ndjson"), "line 2")
+
+    def test_archives(self):
+        files = self.archived_files()
+        for name, data in (
+            ("logs.tar.gz", self.tar(files)),
+            ("logs.tar", self.tar(files, mode="w")),
+            ("logs.zip", self.zip(files)),
+        ):
+            with self.subTest(name):
+                self.assertCreated(self.post_archive(data, name), ["web", "db"])
+                Log.objects.all().delete()
+
+    def test_invalid_archive(self):
+        self.assertRejected(
+            self.post_archive(b"not an archive", "logs.tar"), "Cannot read"
+        )
+        files = {"logs/web.log.gz": gzip.compress(b"truncated")[:-8]}
+        self.assertRejected(self.post_archive(self.zip(files), "logs.zip"), "truncated")
+
+    def test_entry_limit(self):
+        with override_settings(LOG_BATCH_MAX_ENTRIES=1):
+            self.assertRejected(
+                self.post(json.dumps(self.entries(*self.contents[:2]))),
+                "at most 1 logs",
+            )
+            self.assertRejected(
+                self.post_archive(self.zip(self.archived_files()), "logs.zip"),
+                "at most 1 logs",
+            )
+        with override_settings(LOG_BATCH_MAX_ENTRIES=2):
+            self.assertCreated(
+                self.post_archive(self.zip(self.archived_files()), "logs.zip"),
+                ["web", "db"],
+            )
+
+    def test_size_limit(self):
+        first, second, _ = self.contents
+        size = len(first) + len(second)
+        entries = json.dumps(self.entries(first, second))
+        archive = self.tar(self.archived_files())
+        with override_settings(LOG_UPLOAD_MAX_SIZE=size - 1):
+            self.assertRejected(self.post(entries), "maximum size")
+            # Checked on the decompressed content of the archive
+            self.assertLess(len(archive), size - 1)
+            self.assertRejected(self.post_archive(archive, "logs.tgz"), "maximum size")
+        with override_settings(LOG_UPLOAD_MAX_SIZE=size):
+            self.assertCreated(self.post_archive(archive, "logs.tgz"), ["web", "db"])
+
+
+@override_settings(PARSE_POOL_WORKERS=0)
+class IdempotencyTests(TestCase):
+    """Uploads retried with the same Idempotency-Key create a single log."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.token = Token.objects.create(value="idempotency-token")
+        cls.content = mock_run(SMALL, seed=44).raw_content
+
+    def post(self, key=None, content=None):
+        headers = {"Authorization": f"Bearer {self.token.value}"}
+        if key is not None:
+            headers["Idempotency-Key"] = key
+        return self.client.post(
+            "/api/logs/?title=retried",
+            self.content if content is None else content,
+            content_type="text/plain",
+            headers=headers,
+        )
+
+    def test_replay(self):
+        created = self.post("key-1")
+        self.assertEqual(created.status_code, 201)
+        self.assertFalse(created.has_header("Idempotent-Replayed"))
+
+        # The body of a retry is not read
+        for content in (self.content, "not an ansible log\n"):
+            replayed = self.post("key-1", content)
+            self.assertEqual(replayed.status_code, 200)
+            self.assertEqual(replayed["Idempotent-Replayed"], "true")
+            self.assertEqual(replayed.json(), created.json())
+        self.assertEqual(Log.objects.count(), 1)
+
+        # Other keys and uploads without a key create other logs
+        self.assertEqual(self.post("key-2").status_code, 201)
+        self.assertEqual(self.post().status_code, 201)
+        self.assertEqual(self.post().status_code, 201)
+        self.assertEqual(Log.objects.count(), 4)
+
+    def test_key_too_long(self):
+        response = self.post("k" * (LogViewSet.MAX_IDEMPOTENCY_KEY_LENGTH + 1))
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("Idempotency-Key", response.json()["error"])
+        self.assertFalse(Log.objects.exists())
+
+    def test_concurrent_retry(self):
+        created = self.post("key-1")
+        replay_upload = LogViewSet._replay_upload
+        calls = []
+
+        def missed_first(view, key):
+            # The first lookup runs before the concurrent upload stored its log
+            calls.append(key)
+            return None if len(calls) == 1 else replay_upload(view, key)
+
+        with mock.patch.object(
+            LogViewSet, "_replay_upload", autospec=True, side_effect=missed_first
+        ):
+            replayed = self.post("key-1")
+        # The insert failed on the unique key, and the stored log was returned
+        self.assertEqual(calls, ["key-1", "key-1"])
+        self.assertEqual(replayed.status_code, 200)
+        self.assertEqual(replayed["Idempotent-Replayed"], "true")
+        self.assertEqual(replayed.json()["id"], created.json()["id"])
+        self.assertEqual(Log.objects.count(), 1)
+        self.assertEqual(Host.objects.count(), len(created.json()["hosts"]))
+
+
+class ScriptedHandler(http.server.BaseHTTPRequestHandler):
+    """Answers requests with the next of the server's scripted responses."""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        self.server.requests.append((self.path, dict(self.headers), body))
+        response = self.server.responses.pop(0)
+        if response is None:
+            # Drop the connection without answering
+            self.close_connection = True
+            return
+        status, payload, headers = response
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        for name, value in {**headers, "Content-Length": str(len(data))}.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class UploadCLITests(unittest.TestCase):
+    """The retry loop and output of the ansibeau-upload command (api.cli)."""
+
+    def setUp(self):
+        self.server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), ScriptedHandler)
+        self.server.requests = []
+        self.server.responses = []
+        thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = Path(directory.name) / "site.log"
+        self.content = mock_run(SMALL, seed=45).raw_content.encode()
+        self.path.write_bytes(self.content)
+
+        # No backoff delays
+        sleep = mock.patch("api.cli.time.sleep")
+        self.sleeps = sleep.start()
+        self.addCleanup(sleep.stop)
+
+    def respond(self, *responses):
+        self.server.responses.extend(responses)
+
+    def upload(self, retries=3):
+        uploader = cli.Uploader(self.url, "cli-token", retries=retries)
+        return uploader.upload(self.path, "site")
+
+    def test_retries(self):
+        self.respond(
+            (503, {"detail": "unavailable"}, {}),
+            None,
+            (429, {"detail": "slow down"}, {}),
+            (201, {"id": "log-1"}, {}),
+        )
+        result = self.upload()
+        self.assertIsNone(result.error)
+        self.assertEqual(result.log_id, "log-1")
+        self.assertFalse(result.replayed)
+        self.assertEqual(result.attempts, 4)
+        self.assertEqual(self.sleeps.call_count, 3)
+
+        # Every attempt sent the same gzipped body and key
+        self.assertEqual(len(self.server.requests), 4)
+        key = cli.idempotency_key("site", self.content)
+        for path, headers, body in self.server.requests:
+            self.assertEqual(path, "/api/logs/?title=site")
+            self.assertEqual(headers["Idempotency-Key"], key)
+            self.assertEqual(headers["Authorization"], "Bearer cli-token")
+            self.assertEqual(gzip.decompress(body), self.content)
+
+    def test_gives_up(self):
+        self.respond(*[(502, {}, {})] * 3)
+        result = self.upload(retries=2)
+        self.assertEqual(result.error, "Gave up after 3 attempts (HTTP 502)")
+        self.assertEqual(len(self.server.requests), 3)
+
+    def test_errors_are_not_retried(self):
+        # A log the API cannot parse would fail again
+        self.respond((500, {"error": "Log parsing failed", "parser_type": "play"}, {}))
+        result = self.upload()
+        self.assertEqual(result.error, "HTTP 500: Log parsing failed")
+        self.respond((400, {"error": "Title cannot be empty"}, {}))
+        result = self.upload()
+        self.assertEqual(result.error, "HTTP 400: Title cannot be empty")
+        self.assertEqual(len(self.server.requests), 2)
+
+    def test_main(self):
+        self.respond((200, {"id": "log-1"}, {"Idempotent-Replayed": "true"}))
+        with mock.patch("sys.stdout", new_callable=StringIO) as out:
+            code = cli.main(["--url", self.url, "--token", "t", str(self.path)])
+        self.assertEqual(code, 0)
+        output = out.getvalue()
+        self.assertIn(f"EXISTS  {self.path} -> log-1", output)
+        self.assertIn("1 uploaded (1 already stored), 0 failed", output)
+
+        self.respond((401, {"detail": "Invalid token"}, {}))
+        with mock.patch("sys.stdout", new_callable=StringIO) as out:
+            code = cli.main(["--url", self.url, "--token", "t", str(self.path)])
+        self.assertEqual(code, 1)
+        self.assertIn(f"FAILED  {self.path}: HTTP 401: Invalid token", out.getvalue())
+
+
+@override_settings(PARSE_POOL_WORKERS=0)
+class LogPreviewTests(TestCase):
+    """Dry runs of POST /api/logs/ and of the admin test submission."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.playbook = mock_run(LARGE, seed=40)
+        cls.token = Token.objects.create(value="preview-token")
+        cls.admin = get_user_model().objects.create_superuser(
+            "preview-admin", "preview@example.com", "password"
+        )
+
+    def dry_run(self, raw_content: str, query: str = "dry_run=1", **headers):
+        timer = QueryTimer()
+        with connection.execute_wrapper(timer):
+            response = self.client.post(
+                f"/api/logs/?title=preview&{query}",
+                raw_content,
+                content_type="text/plain",
+                HTTP_AUTHORIZATION=f"Bearer {self.token.value}",
+                **headers,
+            )
+        writes = [
+            sql for _, sql in timer.queries if not sql.lstrip().startswith("SELECT")
+        ]
+        self.assertEqual(writes, [], "a dry run wrote to the database")
+        self.assertFalse(Log.objects.exists())
+        return response
+
+    def test_dry_run(self):
+        response = self.dry_run(self.playbook.raw_content)
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertTrue(data["dry_run"])
+        self.assertFalse(data["truncated"])
+        self.assertEqual(data["title"], "preview")
+        self.assertEqual(data["host_count"], len(self.playbook.result.hosts))
+        self.assertEqual(data["play_count"], len(self.playbook.result.plays))
+        self.assertEqual(len(data["hosts"]), data["host_count"])
+        self.assertEqual(
+            list(data["timings"]), ["prepare", "queue", "parse", "summarize"]
+        )
+
+        # The summary matches what an upload stores
+        self.client.post(
+            "/api/logs/?title=stored",
+            self.playbook.raw_content,
+            content_type="text/plain",
+            HTTP_AUTHORIZATION=f"Bearer {self.token.value}",
+        )
+        log = Log.objects.get()
+        self.assertEqual(data["has_failures"], log.has_failures)
+        self.assertEqual(
+            {host["hostname"]: host["status"] for host in data["hosts"]},
+            dict(log.hosts.values_list("hostname", "status")),
+        )
+
+    def test_dry_run_ignores_idempotency_key(self):
+        response = self.dry_run(
+            self.playbook.raw_content, "dry_run=true", HTTP_IDEMPOTENCY_KEY="preview"
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_dry_run_failure(self):
+        response = self.dry_run("not an ansible log\n")
+        self.assertEqual(response.status_code, 500)
+        data = response.json()
+        self.assertTrue(data["dry_run"])
+        self.assertIn("error", data)
+        self.assertNotIn("summarize", data["timings"])
+
+    def test_oversized_log_is_truncated(self):
+        raw_content = self.playbook.raw_content
+        with override_settings(LOG_PREVIEW_MAX_SIZE=len(raw_content) // 2):
+            response = self.client.post(
+                "/api/logs/?title=preview&dry_run=1",
+                raw_content,
+                content_type="text/plain",
+                HTTP_AUTHORIZATION=f"Bearer {self.token.value}",
+            )
+        data = response.json()
+        self.assertTrue(data["truncated"])
+        self.assertEqual(data["size"], len(raw_content.encode()))
+        self.assertLessEqual(data["parsed_size"], len(raw_content) // 2)
+        # Cut at a line boundary
+        self.assertEqual(raw_content.encode()[: data["parsed_size"]][-1:], b"\n", data)
+
+    def test_admin_preview(self):
+        self.client.force_login(self.admin)
+        response = self.client.post(
+            "/admin/api/log/submit-test/",
+            {
+                "title": "admin preview",
+                "raw_content": self.playbook.raw_content,
+                "dry_run": "Preview",
+            },
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "nothing was stored")
+        self.assertEqual(
+            response.context["preview"]["host_count"], len(self.playbook.result.hosts)
+        )
+        self.assertFalse(Log.objects.exists())
+        # The form keeps the log, to submit it for real
+        self.assertEqual(
+            response.context["form_data"]["raw_content"], self.playbook.raw_content
+        )
+
+
+REPLICA = "replica"
+
+
+@override_settings(
+    DATABASE_REPLICAS=[REPLICA], REPLICA_MAX_LAG=5, REPLICA_CHECK_INTERVAL=60
+)
+class ReplicaRoutingTests(TestCase):
+    """Reads routed to a read replica, a second (empty) in-memory database."""
+
+    databases = {"default", REPLICA}
+
+    @classmethod
+    def setUpClass(cls):
+        connections.settings[REPLICA] = {
+            **connections.settings["default"],
+            "NAME": "file:replica?mode=memory&cache=shared",
+        }
+        with connections[REPLICA].schema_editor() as editor:
+            for model in apps.get_app_config("api").get_models():
+                editor.create_model(model)
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections[REPLICA].close()
+        del connections[REPLICA]
+        del connections.settings[REPLICA]
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.log = create_mock_log("primary", SMALL, seed=30)
+
+    def setUp(self):
+        db_router._health.clear()
+        self.addCleanup(db_router._health.clear)
+
+    def replica_queries(self, request) -> tuple:
+        """Send a request; returns its response and its queries on the replica."""
+        timer = QueryTimer()
+        with connections[REPLICA].execute_wrapper(timer):
+            response = request()
+        return response, [sql for _, sql in timer.queries]
+
+    def test_reads_go_to_the_replica(self):
+        # Only on the replica, so only found if read there
+        replica_log = Log.objects.using(REPLICA).create(title="replica only")
+        with mock.patch("api.db_router.replica_lag", return_value=0.0):
+            response = self.client.get(f"/api/logs/{replica_log.pk}/")
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json()["title"], "replica only")
+
+            # Writes go to the primary
+            token = Token.objects.create(value="replica-token")
+            response = self.client.post(
+                "/api/logs/?title=written",
+                mock_run(SMALL, seed=31).raw_content,
+                content_type="text/plain",
+                headers={"Authorization": f"Bearer {token.value}"},
+            )
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(Log.objects.filter(title="written").exists())
+        self.assertFalse(Log.objects.using(REPLICA).filter(title="written").exists())
+
+    def test_missing_on_replica_retried_on_primary(self):
+        with mock.patch("api.db_router.replica_lag", return_value=0.0):
+            for path in (
+                f"/api/logs/{self.log.pk}/",
+                f"/api/logs/{self.log.pk}/hosts/",
+            ):
+                response, queries = self.replica_queries(lambda: self.client.get(path))
+                self.assertEqual(response.status_code, 200, path)
+                self.assertTrue(queries, path)
+            # Missing everywhere: still a 404
+            response = self.client.get(f"/api/logs/{uuid.uuid4()}/")
+            self.assertEqual(response.status_code, 404)
+
+    async def test_async_views_retry_on_primary(self):
+        path = f"/api/logs/{self.log.pk}/"
+        with mock.patch("api.db_router.replica_lag", return_value=0.0):
+            request = AsyncRequestFactory().get(path)
+            response = await async_views.LogDetailView.as_view()(
+                request, pk=self.log.pk
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content)["id"], str(self.log.pk))
+
+    def test_lagging_replica_is_skipped(self):
+        # The replica has none of the primary's logs: it lags without bound
+        self.assertEqual(db_router.replica_lag(REPLICA), float("inf"))
+        with self.assertLogs("api.db_router", "WARNING") as logs:
+            response, queries = self.replica_queries(
+                lambda: self.client.get(f"/api/logs/{self.log.pk}/")
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("lags", logs.output[0])
+        # Only the lag check ran on the replica
+        self.assertEqual(len(queries), 1)
+        self.assertIsNone(db_router.pick_replica())
+
+    def test_unreachable_replica_is_skipped(self):
+        with (
+            mock.patch(
+                "api.db_router.replica_lag", side_effect=OperationalError("down")
+            ),
+            self.assertLogs("api.db_router", "WARNING") as logs,
+        ):
+            response = self.client.get(f"/api/logs/{self.log.pk}/")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("unreachable", logs.output[0])
+
+    def test_health_is_cached(self):
+        with mock.patch("api.db_router.replica_lag", return_value=0.0) as lag:
+            self.assertEqual(db_router.pick_replica(), REPLICA)
+            self.assertEqual(db_router.pick_replica(), REPLICA)
+            self.assertEqual(lag.call_count, 1)
+            with override_settings(REPLICA_CHECK_INTERVAL=0):
+                db_router.pick_replica()
+            self.assertEqual(lag.call_count, 2)
+        with mock.patch("api.db_router.replica_lag", return_value=10.0):
+            db_router._health.clear()
+            self.assertIsNone(db_router.pick_replica())
+
+
+class TokenCacheTests(TestCase):
+    """The in-process cache of token lookups, and its invalidation."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.token = Token.objects.create(value="cached-token")
+
+    def setUp(self):
+        token_cache.clear()
+        self.addCleanup(token_cache.clear)
+
+    def check(self, value: str) -> tuple[bool, str]:
+        """Whether HasValidToken accepts a token, and why not."""
+        request = RequestFactory().get("/", HTTP_AUTHORIZATION=f"Bearer {value}")
+        permission = HasValidToken()
+        return permission.has_permission(request, None), getattr(
+            permission, "message", ""
+        )
+
+    def assertLookupQueries(self, value: str, queries: int):
+        """Check that looking a token up runs `queries` queries."""
+        with self.assertNumQueries(queries):
+            return token_cache.get_token(value)
+
+    def test_hits(self):
+        self.assertEqual(self.assertLookupQueries(self.token.value, 1), self.token)
+        self.assertEqual(self.assertLookupQueries(self.token.value, 0), self.token)
+
+    def test_negative_caching(self):
+        self.assertIsNone(self.assertLookupQueries("unknown", 1))
+        self.assertIsNone(self.assertLookupQueries("unknown", 0))
+        self.assertEqual(self.check("unknown"), (False, "Invalid token"))
+
+    def test_ttl(self):
+        self.assertLookupQueries(self.token.value, 1)
+        with mock.patch("time.monotonic", return_value=time.monotonic() + 3600):
+            self.assertLookupQueries(self.token.value, 1)
+        with override_settings(TOKEN_CACHE_TTL=0):
+            self.assertLookupQueries(self.token.value, 1)
+            self.assertLookupQueries(self.token.value, 1)
+
+    def test_expiry_is_checked_on_hits(self):
+        now = timezone.now()
+        Token.objects.filter(pk=self.token.pk).update(
+            expires_at=now + timedelta(minutes=5)
+        )
+        self.assertEqual(self.check(self.token.value), (True, ""))
+        later = now + timedelta(minutes=10)
+        with (
+            mock.patch("django.utils.timezone.now", return_value=later),
+            self.assertNumQueries(0),
+        ):
+            self.assertEqual(self.check(self.token.value), (False, "Token has expired"))
+
+    def test_invalidation_during_lookup(self):
+        # The token is changed while its row is being read
+        def invalidate(execute, sql, params, many, context):
+            result = execute(sql, params, many, context)
+            token_cache.invalidate(self.token.value)
+            return result
+
+        with connection.execute_wrapper(invalidate):
+            token_cache.get_token(self.token.value)
+        # The row read before the invalidation was not cached
+        self.assertLookupQueries(self.token.value, 1)
+        self.assertLookupQueries(self.token.value, 0)
+
+    def test_admin_invalidates(self):
+        user = get_user_model().objects.create_superuser(
+            "admin", "admin@example.com", "password"
+        )
+        self.client.force_login(user)
+        other = Token.objects.create(value="other-token")
+        for token in (self.token, other):
+            self.assertEqual(self.check(token.value), (True, ""))
+
+        response = self.client.post(
+            f"/admin/api/token/{self.token.pk}/change/",
+            {
+                "value": "renamed-token",
+                "status": "inactive",
+                "expires_at_0": "",
+                "expires_at_1": "",
+                "comment": "",
+            },
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.check("cached-token"), (False, "Invalid token"))
+        self.assertEqual(self.check("renamed-token"), (False, "Token is inactive"))
+
+        self.client.post(f"/admin/api/token/{other.pk}/delete/", {"post": "yes"})
+        self.assertEqual(self.check(other.value), (False, "Invalid token"))
+
+        tokens = [
+            Token.objects.create(value=f"bulk-token-{index}") for index in range(2)
+        ]
+        for token in tokens:
+            self.assertEqual(self.check(token.value), (True, ""))
+        self.client.post(
+            "/admin/api/token/",
+            {
+                "action": "delete_selected",
+                "_selected_action": [token.pk for token in tokens],
+                "post": "yes",
+            },
+        )
+        for token in tokens:
+            self.assertEqual(self.check(token.value), (False, "Invalid token"))
+
+
+@override_settings(PARSE_POOL_WORKERS=0)
+class RawStorageTests(TestCase):
+    """Raw logs stored in the RawLogBlob table (RAW_LOG_STORAGE=db)."""
+
+    storage = "db"
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.token = Token.objects.create(value="storage-token")
+        cls.playbook = mock_run(SMALL, seed=50)
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        settings = override_settings(
+            RAW_LOG_STORAGE=self.storage, RAW_LOG_STORAGE_DIR=self.directory.name
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def upload(self, raw_content: str, title: str = "storage") -> Log:
+        response = self.client.post(
+            f"/api/logs/?title={title}",
+            raw_content,
+            content_type="text/plain",
+            HTTP_AUTHORIZATION=f"Bearer {self.token.value}",
+        )
+        self.assertEqual(response.status_code, 201, response.content)
+        return Log.objects.get(pk=response.json()["id"])
+
+    def stored_blobs(self) -> set[str]:
+        return set(get_storage(self.storage).list_older_than(-60))
+
+    def age_blobs(self, seconds: float) -> None:
+        """Pretend the stored blobs were last written `seconds` ago."""
+        if self.storage == "db":
+            RawLogBlob.objects.update(
+                written_at=timezone.now() - timedelta(seconds=seconds)
+            )
+            return
+        past = time.time() - seconds
+        for sha256 in self.stored_blobs():
+            os.utime(get_storage(self.storage)._path(sha256), (past, past))
+
+    def download(self, log: Log, accept_encoding: str = ""):
+        """The raw content of a log as sent, and the response."""
+        response = self.client.get(
+            f"/api/logs/{log.pk}/raw/", HTTP_ACCEPT_ENCODING=accept_encoding
+        )
+        self.assertEqual(response.status_code, 200)
+        return b"".join(response.streaming_content), response
+
+    def test_identical_uploads_share_a_blob(self):
+        first = self.upload(self.playbook.raw_content, "first")
+        second = self.upload(self.playbook.raw_content, "second")
+        self.assertEqual(first.raw_storage, self.storage)
+        self.assertEqual(first.raw_sha256, second.raw_sha256)
+        self.assertEqual(self.stored_blobs(), {first.raw_sha256})
+        self.assertEqual(read_raw_content(second), self.playbook.raw_content)
+
+    def check_round_trip(self, codec: str) -> None:
+        with override_settings(RAW_LOG_COMPRESSION=codec):
+            log = self.upload(self.playbook.raw_content)
+        self.assertLess(log.raw_compressed_size, log.raw_size)
+
+        content, response = self.download(log)
+        self.assertEqual(content.decode(), self.playbook.raw_content)
+        self.assertFalse(response.has_header("Content-Encoding"))
+        self.assertEqual(int(response["Content-Length"]), log.raw_size)
+
+        # Sent as stored to clients accepting the codec
+        content, response = self.download(log, codec)
+        self.assertEqual(response["Content-Encoding"], codec)
+        self.assertEqual(len(content), log.raw_compressed_size)
+
+    def test_gzip_round_trip(self):
+        self.check_round_trip("gzip")
+
+    @unittest.skipIf(zstandard is None, "zstandard is not installed")
+    def test_zstd_round_trip(self):
+        self.check_round_trip("zstd")
+
+    def test_collect_garbage(self):
+        kept = self.upload(self.playbook.raw_content, "kept")
+        deleted = self.upload(mock_run(SMALL, seed=51).raw_content, "deleted")
+        deleted.delete()
+        self.age_blobs(7200)
+        # Unreferenced, but within the grace period
+        recent = self.upload(mock_run(SMALL, seed=52).raw_content, "recent")
+        recent.delete()
+
+        self.assertEqual(collect_garbage(grace_seconds=3600), 1)
+        self.assertEqual(self.stored_blobs(), {kept.raw_sha256, recent.raw_sha256})
+        self.assertEqual(read_raw_content(kept), self.playbook.raw_content)
+
+        self.age_blobs(7200)
+        self.assertEqual(collect_garbage(grace_seconds=3600), 1)
+        self.assertEqual(self.stored_blobs(), {kept.raw_sha256})
+
+    def test_blob_reused_during_collection(self):
+        content = self.playbook.raw_content
+        self.upload(content, "deleted").delete()
+        self.age_blobs(7200)
+        storage_class = type(get_storage(self.storage))
+        delete = storage_class.delete
+        reused = []
+
+        def reuse_then_delete(storage, sha256, **kwargs):
+            # An upload reuses the blob once it was found unreferenced
+            reused.append(self.upload(content, "reused"))
+            return delete(storage, sha256, **kwargs)
+
+        with mock.patch.object(storage_class, "delete", reuse_then_delete):
+            self.assertEqual(collect_garbage(grace_seconds=3600), 0)
+        self.assertEqual(len(reused), 1)
+        self.assertEqual(read_raw_content(reused[0]), content)
+
+
+class FileSystemRawStorageTests(RawStorageTests):
+    """Raw logs stored as files (RAW_LOG_STORAGE=filesystem)."""
+
+    storage = "filesystem"
+
+
+class SearchIndexTests(TestCase):
+    """The task search index of the default database."""
+
+    def test_reindexing_does_not_duplicate_hits(self):
+        log = create_mock_log("search", SMALL, seed=60)
+        hostname = log.hosts.get().hostname
+
+        def hits():
+            page = search_tasks(f'"{hostname}"', log_id=log.pk, limit=100)
+            return [task.id for task in page.tasks]
+
+        indexed = hits()
+        self.assertTrue(indexed)
+        self.assertEqual(len(indexed), len(set(indexed)))
+        index_logs([log])
+        self.assertEqual(hits(), indexed)
+
+
+def ansible_log(plays: list[tuple[str, list[tuple[str, dict]]]]) -> str:
+    """
+    A playbook run log from (play name, [(task name, {host: status})]).
+
+    Statuses of failed tasks are followed by a "Broken pipe" failure message.
+    """
+    lines = []
+    recap: dict[str, dict[str, int]] = {}
+    for play, tasks in plays:
+        lines += [f"PLAY [{play}] " + "*" * 40, ""]
+        for task, results in tasks:
+            lines.append(f"TASK [{task}] " + "*" * 40)
+            for host, task_status in results.items():
+                counts = recap.setdefault(host, {"ok": 0, "changed": 0, "failed": 0})
+                if task_status == "fatal":
+                    counts["failed"] += 1
+                    lines.append(
+                        f"fatal: [{host}]: FAILED! => "
+                        '{"changed": false, "msg": "Broken pipe"}'
+                    )
+                else:
+                    counts[task_status] += 1
+                    lines.append(f"{task_status}: [{host}]")
+            lines.append("")
+    lines += ["PLAY RECAP " + "*" * 40]
+    for host, counts in recap.items():
+        lines.append(
+            f"{host}                       : ok={counts['ok']}  "
+            f"changed={counts['changed']}  unreachable=0  failed={counts['failed']}  "
+            "skipped=0  rescued=0  ignored=0"
+        )
+    return "\n".join(lines) + "\n"
+
+
+def callback_events(plays: list[tuple[str, list[tuple[str, dict]]]]) -> list[dict]:
+    """The events the Ansible callback plugin sends for the same run as ansible_log."""
+    events, recap = [], {}
+    for play, tasks in plays:
+        events.append({"event": "play", "name": play, "date": "2026-02-09T10:30:00Z"})
+        for task, results in tasks:
+            events.append({"event": "task", "name": task})
+            for host, task_status in results.items():
+                result = {"event": "result", "host": host, "status": task_status}
+                counted = task_status
+                if task_status == "fatal":
+                    result["message"] = "Broken pipe"
+                    counted = "failed"
+                events.append(result)
+                stats = recap.setdefault(host, {"ok": 0, "changed": 0, "failed": 0})
+                stats[counted] += 1
+    events += [
+        {"event": "recap", "host": host, "stats": stats}
+        for host, stats in recap.items()
+    ]
+    return events
+
+
+# A run with failures, for the structured results tests
+STRUCTURED_PLAYS = [
+    (
+        "Setup",
+        [
+            ("Gathering Facts", {"web1": "ok", "web2": "ok", "db1": "ok"}),
+            ("Install", {"web1": "changed", "web2": "fatal", "db1": "ok"}),
+            ("Configure", {"web1": "ok", "db1": "changed"}),
+        ],
+    ),
+    ("Deploy", [("Restart", {"web1": "fatal", "db1": "ok"})]),
+]
+
+
+class LogDiffTests(TestCase):
+    """The hosts, plays and tasks reported by the diff of two runs."""
+
+    def diff(self, base_plays, target_plays) -> dict:
+        contents = [ansible_log(base_plays), ansible_log(target_plays)]
+        now = timezone.now()
+        base, target = create_logs(
+            [
+                (title, content, LogParserService().parse(content))
+                for title, content in zip(("base", "target"), contents)
+            ],
+            uploaded_at=[now - timedelta(hours=1), now],
+        )
+        response = self.client.get(f"/api/logs/{base.pk}/diff/{target.pk}/")
+        self.assertEqual(response.status_code, 200)
+        diff = json.loads(b"".join(response.streaming_content))
+        self.assertEqual(diff["base"]["id"], str(base.pk))
+        self.assertEqual(diff["target"]["id"], str(target.pk))
+        return diff
+
+    @staticmethod
+    def summary(items: list[dict], *keys: str) -> list[tuple]:
+        return [tuple(item[key] for key in keys) for item in items]
+
+    def test_changes(self):
+        diff = self.diff(
+            [
+                (
+                    "Setup",
+                    [
+                        ("Install", {"web1": "changed", "web2": "ok", "db1": "ok"}),
+                        ("Start", {"web1": "ok", "web2": "fatal", "db1": "ok"}),
+                    ],
+                )
+            ],
+            [
+                (
+                    "Setup",
+                    [
+                        ("Install", {"web1": "fatal", "web2": "ok", "web3": "ok"}),
+                        ("Start", {"web1": "ok", "web2": "ok", "web3": "fatal"}),
+                    ],
+                )
+            ],
+        )
+        self.assertEqual(diff["hosts_added"], ["web3"])
+        self.assertEqual(diff["hosts_removed"], ["db1"])
+        self.assertEqual(
+            self.summary(
+                diff["plays_changed"], "hostname", "play", "previous_status", "status"
+            ),
+            [("web1", "Setup", "changed", "failed"), ("web2", "Setup", "failed", "ok")],
+        )
+        self.assertEqual(
+            self.summary(
+                diff["tasks_newly_failed"],
+                "hostname",
+                "task",
+                "order",
+                "previous_status",
+                "status",
+                "failure_message",
+            ),
+            [
+                ("web1", "Install", 0, "changed", "fatal", "Broken pipe"),
+                ("web3", "Start", 1, None, "fatal", "Broken pipe"),
+            ],
+        )
+        self.assertEqual(
+            self.summary(
+                diff["tasks_recovered"], "hostname", "task", "previous_status", "status"
+            ),
+            [("web2", "Start", "fatal", "ok")],
+        )
+        self.assertNotIn("failure_message", diff["tasks_recovered"][0])
+        play = Play.objects.get(pk=diff["plays_changed"][0]["play_id"])
+        self.assertEqual(play.host.log_id, uuid.UUID(diff["target"]["id"]))
+
+    def test_identical_runs(self):
+        plays = [("Setup", [("Install", {"web1": "ok"}), ("Start", {"web1": "fatal"})])]
+        diff = self.diff(plays, plays)
+        for section in (
+            "hosts_added",
+            "hosts_removed",
+            "plays_changed",
+            "tasks_newly_failed",
+            "tasks_recovered",
+        ):
+            self.assertEqual(diff[section], [], section)
+
+    def test_plays_are_matched_on_their_position(self):
+        setup = ("Setup", [("Install", {"web1": "fatal"})])
+        deploy = ("Deploy", [("Install", {"web1": "ok"})])
+        # Each play is compared with the same play at the same position only:
+        # once reordered, they have no counterpart
+        diff = self.diff([setup, deploy], [deploy, setup])
+        self.assertEqual(diff["plays_changed"], [])
+        self.assertEqual(diff["tasks_recovered"], [])
+        self.assertEqual(
+            self.summary(diff["tasks_newly_failed"], "play", "task", "previous_status"),
+            [("Setup", "Install", None)],
+        )
+        # In place, the same plays are compared
+        diff = self.diff(
+            [setup, deploy], [("Setup", [("Install", {"web1": "ok"})]), deploy]
+        )
+        self.assertEqual(
+            self.summary(diff["plays_changed"], "play", "previous_status", "status"),
+            [("Setup", "failed", "ok")],
+        )
+        self.assertEqual(
+            self.summary(diff["tasks_recovered"], "play", "task"),
+            [("Setup", "Install")],
+        )
+
+
+@override_settings(PARSE_POOL_WORKERS=0)
+class LiveLogTests(TestCase):
+    """Logs uploaded chunk by chunk with the live, append and finalize actions."""
+
+    def setUp(self):
+        self.token = Token.objects.create(value="live-token")
+        # A run with failures, so has_failures is checked both ways
+        self.playbook = mock_run(LARGE, seed=100)
+
+    def post(self, path: str, data=None, **kwargs):
+        return self.client.post(
+            path,
+            data,
+            headers={"Authorization": f"Bearer {self.token.value}"},
+            **kwargs,
+        )
+
+    def start(self) -> str:
+        response = self.post(
+            "/api/logs/live/", {"title": "live"}, content_type="application/json"
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()["status"], "running")
+        return response.json()["id"]
+
+    def append(self, log_id: str, chunk: bytes, seq: int):
+        return self.post(
+            f"/api/logs/{log_id}/append/?seq={seq}", chunk, content_type="text/plain"
+        )
+
+    def finalize(self, log_id: str):
+        response = self.post(f"/api/logs/{log_id}/finalize/")
+        self.assertEqual(response.status_code, 200)
+        return Log.objects.get(pk=log_id)
+
+    def rows(self, log: Log) -> dict:
+        """The hosts, plays and tasks of a log, without their ids."""
+        return {
+            "hosts": sorted(
+                log.hosts.values_list(
+                    "hostname", "status", "plays_failed", "tasks_failed"
+                )
+            ),
+            "plays": sorted(
+                Play.objects.filter(host__log=log).values_list(
+                    "host__hostname",
+                    "name",
+                    "order",
+                    "status",
+                    "tasks_ok",
+                    "tasks_changed",
+                    "tasks_failed",
+                )
+            ),
+            "tasks": sorted(
+                Task.objects.filter(play__host__log=log).values_list(
+                    "play__host__hostname",
+                    "play__name",
+                    "name",
+                    "order",
+                    "line_number",
+                    "status",
+                    "failure_message",
+                )
+            ),
+        }
+
+    def test_chunks_match_one_shot_upload(self):
+        content = self.playbook.raw_content.encode()
+        response = self.post(
+            "/api/logs/?title=one+shot",
+            self.playbook.raw_content,
+            content_type="text/plain",
+        )
+        self.assertEqual(response.status_code, 201)
+        expected = Log.objects.get(pk=response.json()["id"])
+        self.assertTrue(expected.has_failures)
+        expected_rows = self.rows(expected)
+        self.assertTrue(expected_rows["tasks"])
+
+        rng = random.Random(7)
+        for attempt in range(3):
+            # Offsets fall anywhere, mid-line included (the mock log is ASCII)
+            offsets = sorted(rng.sample(range(1, len(content)), 12 * (attempt + 1)))
+            chunks = [
+                content[start:end]
+                for start, end in zip([0, *offsets], [*offsets, len(content)])
+            ]
+            log_id = self.start()
+            for seq, chunk in enumerate(chunks):
+                response = self.append(log_id, chunk, seq)
+                self.assertEqual(response.status_code, 200, response.content)
+                self.assertFalse(response.json()["duplicate"])
+            log = self.finalize(log_id)
+            self.assertEqual(self.rows(log), expected_rows)
+            self.assertEqual(read_raw_content(log), self.playbook.raw_content)
+
+    def test_chunk_out_of_order(self):
+        log_id = self.start()
+        self.assertEqual(self.append(log_id, b"PLAY [a] ***\n", 1).status_code, 409)
+        self.assertEqual(self.append(log_id, b"PLAY [a] ***\n", 0).status_code, 200)
+        self.assertEqual(self.append(log_id, b"TASK [b] ***\n", 2).status_code, 409)
+        self.assertEqual(Log.objects.get(pk=log_id).chunks.count(), 1)
+
+    def test_duplicate_chunk(self):
+        lines = self.playbook.raw_content.splitlines(keepends=True)
+        head, tail = "".join(lines[:20]).encode(), "".join(lines[20:]).encode()
+        log_id = self.start()
+        self.assertEqual(self.append(log_id, head, 0).status_code, 200)
+        counts = (Host.objects.count(), Play.objects.count(), Task.objects.count())
+
+        # A resent chunk is acknowledged but not parsed or stored again
+        response = self.append(log_id, head, 0)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()["duplicate"])
+        self.assertEqual(
+            (Host.objects.count(), Play.objects.count(), Task.objects.count()), counts
+        )
+        self.assertEqual(Log.objects.get(pk=log_id).chunks.count(), 1)
+
+        self.assertEqual(self.append(log_id, tail, 1).status_code, 200)
+        log = self.finalize(log_id)
+        self.assertEqual(read_raw_content(log), self.playbook.raw_content)
+
+    def send_results(self, log_id: str, events: list[dict], seq=None):
+        data = {"events": events}
+        if seq is not None:
+            data["seq"] = seq
+        return self.post(
+            f"/api/logs/{log_id}/results/", data, content_type="application/json"
+        )
+
+    def test_structured_results_match_text(self):
+        events = callback_events(STRUCTURED_PLAYS)
+        log_id = self.start()
+        # Batches split sections: a task and its results arrive separately
+        for seq, start in enumerate(range(0, len(events), 4)):
+            response = self.send_results(log_id, events[start : start + 4], seq)
+            self.assertEqual(response.status_code, 200, response.content)
+            self.assertFalse(response.json()["duplicate"])
+        log = self.finalize(log_id)
+        self.assertTrue(log.has_failures)
+
+        # The rendered output, parsed as text, gives the same rows, recap
+        # included
+        raw_content = read_raw_content(log)
+        response = self.post(
+            "/api/logs/?title=text", raw_content, content_type="text/plain"
+        )
+        self.assertEqual(response.status_code, 201)
+        expected = Log.objects.get(pk=response.json()["id"])
+        self.assertEqual(self.rows(log), self.rows(expected))
+        self.assertEqual(
+            self.rows(log)["hosts"],
+            [
+                ("db1", "changed", 0, 0),
+                ("web1", "failed", 1, 1),
+                ("web2", "failed", 1, 1),
+            ],
+        )
+        self.assertEqual(
+            Task.objects.get(
+                play__host__log=log, play__host__hostname="web2", name="Install"
+            ).status,
+            "fatal",
+        )
+        self.assertIn('fatal: [web1]: FAILED! => {"msg": "Broken pipe"}', raw_content)
+
+    def test_structured_duplicate_batch(self):
+        events = callback_events(STRUCTURED_PLAYS)
+        log_id = self.start()
+        self.assertEqual(self.send_results(log_id, events[:8], 0).status_code, 200)
+        counts = (Host.objects.count(), Play.objects.count(), Task.objects.count())
+
+        # A retried batch is acknowledged but not applied again
+        response = self.send_results(log_id, events[:8], 0)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()["duplicate"])
+        self.assertEqual(
+            (Host.objects.count(), Play.objects.count(), Task.objects.count()), counts
+        )
+        self.assertEqual(Log.objects.get(pk=log_id).chunks.count(), 1)
+
+        # Without a seq, a batch is the next one
+        response = self.send_results(log_id, events[8:])
+        self.assertEqual(response.json()["seq"], 1)
+        log = self.finalize(log_id)
+        self.assertEqual(
+            Task.objects.filter(play__host__log=log).count(),
+            sum(len(results) for _, tasks in STRUCTURED_PLAYS for _, results in tasks),
+        )
+
+    def test_structured_batch_out_of_order(self):
+        events = callback_events(STRUCTURED_PLAYS)
+        log_id = self.start()
+        self.assertEqual(self.send_results(log_id, events[4:8], 1).status_code, 409)
+        self.assertEqual(self.send_results(log_id, events[:4], 0).status_code, 200)
+        self.assertEqual(self.send_results(log_id, events[8:], 2).status_code, 409)
+        self.assertEqual(Log.objects.get(pk=log_id).chunks.count(), 1)
+        self.assertEqual(Task.objects.filter(play__host__log_id=log_id).count(), 2)
+
+        # A log receives structured results or raw content, not both
+        self.assertEqual(self.append(log_id, b"PLAY [a] ***\n", 1).status_code, 409)
+        other = self.start()
+        self.assertEqual(self.append(other, b"PLAY [a] ***\n", 0).status_code, 200)
+        self.assertEqual(self.send_results(other, events[:4], 1).status_code, 409)
+
+    def test_finalize(self):
+        log_id = self.start()
+        response = self.append(log_id, self.playbook.raw_content.encode(), 0)
+        self.assertEqual(response.status_code, 200)
+        failed = Task.objects.filter(
+            play__host__log_id=log_id, status__in=FAILED_STATUSES
+        )
+        task = failed.select_related("play__host").first()
+        self.assertIsNotNone(task)
+
+        def hits():
+            page = search_tasks(
+                f'"{task.play.host.hostname}"',
+                statuses=list(FAILED_STATUSES),
+                log_id=log_id,
+                limit=1000,
+            )
+            return {hit.pk for hit in page.tasks}
+
+        # Running logs are not searchable yet
+        self.assertEqual(hits(), set())
+        log = self.finalize(log_id)
+        self.assertEqual(log.status, "complete")
+        self.assertTrue(log.has_failures)
+        self.assertIsNone(log.parse_state)
+        self.assertFalse(log.chunks.exists())
+        self.assertIn(task.pk, hits())
+        self.assertTrue(hits() <= set(failed.values_list("pk", flat=True)))
+
+        # A finalized log takes no more chunks and cannot be finalized again
+        self.assertEqual(self.append(log_id, b"", 1).status_code, 409)
+        response = self.post(f"/api/logs/{log_id}/finalize/")
+        self.assertEqual(response.status_code, 409)
+
+    def test_finalize_without_failures(self):
+        playbook = mock_run(LARGE, seed=101)
+        log_id = self.start()
+        response = self.append(log_id, playbook.raw_content.encode(), 0)
+        self.assertEqual(response.status_code, 200)
+        log = self.finalize(log_id)
+        self.assertEqual(log.status, "complete")
+        self.assertFalse(log.has_failures)
+
+
+CALLBACK_PLUGIN = (
+    settings.BASE_DIR.parent / "integrations/ansible/callback_plugins/ansibeau.py"
+)
+
+
+def load_callback_plugin():
+    """The Ansible callback plugin module, or None if ansible is not installed."""
+    if importlib.util.find_spec("ansible") is None:
+        return None
+    spec = importlib.util.spec_from_file_location("ansibeau_callback", CALLBACK_PLUGIN)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+callback_plugin = load_callback_plugin()
+
+
+@unittest.skipIf(callback_plugin is None, "ansible is not installed")
+@override_settings(PARSE_POOL_WORKERS=0)
+class CallbackPluginTests(LiveServerTestCase):
+    """The batch sender of the Ansible callback plugin against a live server."""
+
+    def setUp(self):
+        token = Token.objects.create(value="plugin-token")
+        self.api = callback_plugin.AnsibeauClient(
+            self.live_server_url, token.value, max_retries=3
+        )
+        self.log = self.api.post("/api/logs/live/", {"title": "plugin"})
+
+    def test_batches_are_applied_once(self):
+        post = self.api.post
+        replies = []
+
+        def post_twice(path, data=None):
+            reply = post(path, data)
+            if path.endswith("/results/") and not replies:
+                # The reply to the first batch was lost: it is sent again
+                replies.append(post(path, data))
+            return reply
+
+        sender = callback_plugin.BatchSender(
+            self.api, self.log["id"], batch_size=4, flush_interval=0.01, max_buffer=8
+        )
+        with mock.patch.object(self.api, "post", side_effect=post_twice):
+            for event in callback_events(STRUCTURED_PLAYS):
+                sender.add(event)
+            sender.close()
+        self.assertIsNone(sender.error)
+        self.assertTrue(replies[0]["duplicate"])
+
+        log = Log.objects.get(pk=self.log["id"])
+        self.assertEqual(log.status, "complete")
+        self.assertTrue(log.has_failures)
+        self.assertEqual(
+            sorted(
+                Task.objects.filter(play__host__log=log).values_list(
+                    "play__host__hostname", "play__name", "name", "status"
+                )
+            ),
+            sorted(
+                (host, play, task, task_status)
+                for play, tasks in STRUCTURED_PLAYS
+                for task, results in tasks
+                for host, task_status in results.items()
+            ),
+        )
+
+
+class ImportLogsTests(TestCase):
+    """The import_logs command, with one parser process."""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.root = Path(directory.name)
+        self.logs = self.root / "logs"
+        self.checkpoint = self.root / "import.checkpoint"
+        self.contents = {
+            name: mock_run(SMALL, seed=seed).raw_content
+            for seed, name in enumerate(("web", "db", "app", "cache"), start=70)
+        }
+        self.write("web.log", self.contents["web"])
+        self.write("db.log.gz", gzip.compress(self.contents["db"].encode()))
+        self.write("nested/app.log", self.contents["app"])
+        # The same content in another directory, walked after the first one
+        self.write("copies/web.log", self.contents["web"])
+        self.write("broken.log", "not an ansible log\n")
+        self.write(".hidden.log", self.contents["cache"])
+
+    def write(self, name: str, content, directory=None) -> Path:
+        path = (directory or self.logs) / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        if isinstance(content, str):
+            content = content.encode()
+        path.write_bytes(content)
+        return path
+
+    def run_import(self, *sources, batch_size=2, reset=False) -> tuple[str, str]:
+        stdout, stderr = StringIO(), StringIO()
+        args = ["--reset"] if reset else []
+        call_command(
+            "import_logs",
+            *(sources or [str(self.logs)]),
+            "--workers",
+            "1",
+            "--batch-size",
+            str(batch_size),
+            "--checkpoint",
+            str(self.checkpoint),
+            *args,
+            stdout=stdout,
+            stderr=stderr,
+        )
+        return stdout.getvalue(), stderr.getvalue()
+
+    def assertImported(self, titles: list[str]):
+        self.assertEqual(
+            sorted(Log.objects.values_list("title", flat=True)), sorted(titles)
+        )
+        for log in Log.objects.all():
+            self.assertEqual(read_raw_content(log), self.contents[log.title])
+
+    def test_import(self):
+        stdout, stderr = self.run_import()
+        self.assertIn("Done: 5 files: 3 imported, 1 already stored, 1 failed", stdout)
+        self.assertIn("Failed", stderr)
+        self.assertIn("broken.log", stderr)
+        self.assertImported(["web", "db", "app"])
+        self.assertEqual(Host.objects.count(), 3)
+
+    def test_content_already_stored(self):
+        self.run_import()
+        # Without the checkpoint, files are read again but not stored again
+        stdout, _ = self.run_import(reset=True)
+        self.assertIn("Done: 5 files: 0 imported, 4 already stored, 1 failed", stdout)
+        self.assertImported(["web", "db", "app"])
+
+    def test_resume(self):
+        create = log_import.create_logs
+        calls = []
+
+        def interrupted(entries):
+            calls.append(entries)
+            if len(calls) > 1:
+                raise KeyboardInterrupt
+            return create(entries)
+
+        with mock.patch.object(log_import, "create_logs", side_effect=interrupted):
+            with self.assertRaises(KeyboardInterrupt):
+                self.run_import()
+        # The first batch (2 logs, in source order) was stored and checkpointed
+        # with the failed file read before them
+        self.assertEqual([title for title, _, _ in calls[0]], ["db", "web"])
+        self.assertImported(["db", "web"])
+        self.assertEqual(len(self.checkpoint.read_text().splitlines()), 3)
+
+        self.write("cache.log", self.contents["cache"])
+        stdout, _ = self.run_import()
+        self.assertIn("Resuming from", stdout)
+        self.assertIn("(3 sources already imported)", stdout)
+        # The checkpointed files are not read again
+        self.assertIn("Done: 3 files: 2 imported, 1 already stored, 0 failed", stdout)
+        self.assertImported(["web", "db", "app", "cache"])
+
+        stdout, _ = self.run_import()
+        self.assertIn("Done: 0 files", stdout)
+        # A modified file is read again
+        self.write("web.log", self.contents["web"] + "\n")
+        stdout, _ = self.run_import()
+        self.assertIn("Done: 1 files: 1 imported, 0 already stored, 0 failed", stdout)
+        self.assertEqual(Log.objects.filter(title="web").count(), 2)
+
+    def test_archives(self):
+        files = {
+            "run/web.log": self.contents["web"].encode(),
+            "run/db.log.gz": gzip.compress(self.contents["db"].encode()),
+        }
+        buffer = io.BytesIO()
+        with tarfile.open(fileobj=buffer, mode="w:gz") as archive:
+            for name, data in files.items():
+                info = tarfile.TarInfo(name)
+                info.size = len(data)
+                archive.addfile(info, io.BytesIO(data))
+        self.write("runs.tgz", buffer.getvalue(), self.root)
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w") as archive:
+            archive.writestr("app.log", self.contents["app"])
+        self.write("app.zip", buffer.getvalue(), self.root)
+        self.write("broken.zip", b"PK\x03\x04 not a zip", self.root)
+
+        stdout, stderr = self.run_import(
+            str(self.root / "runs.tgz"), str(self.root / "*.zip")
+        )
+        self.assertIn("Done: 4 files: 3 imported, 0 already stored, 1 failed", stdout)
+        self.assertIn("broken.zip", stderr)
+        self.assertImported(["web", "db", "app"])
+
+        # Imported archives are checkpointed whole
+        stdout, _ = self.run_import(str(self.root / "runs.tgz"))
+        self.assertIn("Done: 0 files", stdout)
+
+
+class PurgeTests(TestCase):
+    """The purge_logs command and the purge admin action."""
+
+    @classmethod
+    def setUpTestData(cls):
+        now = timezone.now()
+        runs = [mock_run(LARGE, seed=seed) for seed in range(70, 74)]
+        # Two logs of about 100 days ago, two of the last days
+        ages = [100, 101, 1, 2]
+        logs = create_logs(
+            [
+                (f"purge {index}", run.raw_content, run.result)
+                for index, run in enumerate(runs)
+            ],
+            uploaded_at=[now - timedelta(days=age) for age in ages],
+        )
+        cls.old, cls.new = logs[:2], logs[2:]
+        cls.raw_contents = {log.pk: run.raw_content for log, run in zip(logs, runs)}
+
+    def purge(self, *args) -> str:
+        # Raw blobs are only collected after a grace period
+        RawLogBlob.objects.update(written_at=timezone.now() - timedelta(days=1))
+        stdout = StringIO()
+        call_command("purge_logs", "--older-than", "30d", *args, stdout=stdout)
+        return stdout.getvalue()
+
+    def indexed_tasks(self) -> dict:
+        """Search index hits of each log, found by hostname."""
+        hits = {}
+        for log_id, hostname in Host.objects.values_list("log_id", "hostname"):
+            hits.setdefault(log_id, set()).update(
+                get_backend().match(
+                    f'"{hostname}"', None, log_id, None, None, None, 100_000
+                )
+            )
+        return hits
+
+    def test_purge_older_logs(self):
+        indexed = self.indexed_tasks()
+        self.assertEqual(set(indexed), set(self.raw_contents))
+
+        output = self.purge("--batch-size", "50")
+        self.assertIn("Deleted 2 logs", output)
+
+        old_ids = [log.pk for log in self.old]
+        self.assertFalse(Log.objects.filter(pk__in=old_ids).exists())
+        self.assertFalse(Host.objects.filter(log_id__in=old_ids).exists())
+        self.assertFalse(Play.objects.filter(host__log_id__in=old_ids).exists())
+        self.assertFalse(Task.objects.filter(play__host__log_id__in=old_ids).exists())
+        self.assertFalse(
+            RawLogBlob.objects.filter(
+                sha256__in=[log.raw_sha256 for log in self.old]
+            ).exists()
+        )
+        for log in self.old:
+            self.assertEqual(
+                get_backend().match('"purge"', None, log.pk, None, None, None, 1),
+                [],
+            )
+            for task_id in indexed[log.pk]:
+                self.assertFalse(Task.objects.filter(pk=task_id).exists())
+
+        # Newer logs are intact
+        self.assertEqual(
+            self.indexed_tasks(), {log.pk: indexed[log.pk] for log in self.new}
+        )
+        for log in self.new:
+            log.refresh_from_db()
+            self.assertEqual(read_raw_content(log), self.raw_contents[log.pk])
+            self.assertEqual(
+                Task.objects.filter(play__host__log=log).count(),
+                len(indexed[log.pk]),
+            )
+
+    def test_partitions_are_dropped_first(self):
+        total = Task.objects.count()
+        calls = []
+        command = "api.management.commands.purge_logs"
+        with (
+            mock.patch(f"{command}.partitioning_enabled", return_value=True),
+            mock.patch(f"{command}.is_partitioned", return_value=True),
+            mock.patch(
+                f"{command}.drop_partitions_before",
+                side_effect=lambda cutoff: calls.append((cutoff, Task.objects.count()))
+                or ["api_task_p202601"],
+            ),
+        ):
+            output = self.purge()
+        self.assertIn("Dropped partition api_task_p202601", output)
+        # Called with the cutoff, before any row was deleted
+        ((cutoff, tasks),) = calls
+        self.assertEqual(tasks, total)
+        expected = timezone.now() - timedelta(days=30)
+        self.assertLess(abs(expected - cutoff), timedelta(minutes=1))
+
+    def test_dry_run(self):
+        output = self.purge("--dry-run")
+        self.assertIn("Would delete 2 logs", output)
+        self.assertEqual(Log.objects.count(), 4)
+
+    def test_only_purged_blobs_are_collected(self):
+        # Unreferenced, but left to gc_raw_logs
+        RawLogBlob.objects.create(
+            sha256="0" * 64, data=b"", size=0, written_at=timezone.now()
+        )
+        self.assertIn("2 raw log blob(s)", self.purge())
+        self.assertTrue(RawLogBlob.objects.filter(sha256="0" * 64).exists())
+
+    def purge_action(self, logs):
+        user = get_user_model().objects.create_superuser(
+            "admin", "admin@example.com", "password"
+        )
+        self.client.force_login(user)
+        RawLogBlob.objects.update(written_at=timezone.now() - timedelta(days=1))
+        return self.client.post(
+            "/admin/api/log/",
+            {"action": "purge_selected", "_selected_action": [log.pk for log in logs]},
+            follow=True,
+        )
+
+    def test_admin_action(self):
+        response = self.purge_action(self.old)
+        self.assertContains(response, "Purged 2 logs")
+        self.assertEqual(set(Log.objects.all()), set(self.new))
+        self.assertFalse(
+            RawLogBlob.objects.filter(
+                sha256__in=[log.raw_sha256 for log in self.old]
+            ).exists()
+        )
+
+    def test_admin_action_is_capped(self):
+        with mock.patch("api.admin.PURGE_ACTION_MAX_ROWS", 10):
+            response = self.purge_action(self.old)
+        self.assertContains(response, "python manage.py purge_logs")
+        self.assertEqual(Log.objects.count(), 4)
+
+
+@unittest.skipUnless(connection.vendor == "postgresql", "Partitioning needs PostgreSQL")
+@override_settings(TASK_PARTITIONING=True)
+class PartitioningTests(TransactionTestCase):
+    """Monthly partitions of the Task table (run with DJANGO_PROD settings)."""
+
+    def migrate(self, target: str) -> None:
+        executor = MigrationExecutor(connection)
+        if target == "latest":
+            targets = executor.loader.graph.leaf_nodes("api")
+        else:
+            targets = [("api", target)]
+        executor.migrate(targets)
+
+    def count(self, table: str) -> int:
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT count(*) FROM {table}")
+            return cursor.fetchone()[0]
+
+    def partitions(self) -> list[str]:
+        return [partition_name(month) for month in list_partitions()]
+
+    def test_migration_forward_and_back(self):
+        log = create_mock_log("partitioned", LARGE, seed=80)
+        tasks = Task.objects.count()
+        month = partition_name(log.uploaded_at)
+        try:
+            self.migrate("0010_backfill_task_created_at")
+            self.assertFalse(is_partitioned())
+
+            self.migrate("0011_partition_task")
+            self.assertTrue(is_partitioned())
+            self.assertEqual(self.count("api_task"), tasks)
+            # Every task of the log is in the partition of its upload month
+            self.assertEqual(self.count(month), tasks)
+            self.assertEqual(self.count("api_task_default"), 0)
+
+            self.migrate("0010_backfill_task_created_at")
+            self.assertFalse(is_partitioned())
+            self.assertEqual(self.count("api_task"), tasks)
+        finally:
+            self.migrate("latest")
+        self.assertEqual(
+            Task.objects.filter(
+                play__host__log=log, created_at=log.uploaded_at
+            ).count(),
+            tasks,
+        )
+
+    def test_purge_drops_old_partitions(self):
+        convert_to_partitioned()
+        try:
+            run = mock_run(SMALL, seed=81)
+            old, new = create_logs(
+                [("old", run.raw_content, run.result)] * 2,
+                uploaded_at=[
+                    timezone.now() - timedelta(days=100),
+                    timezone.now() - timedelta(days=1),
+                ],
+            )
+            create_partition(old.uploaded_at)
+            self.assertIn(partition_name(old.uploaded_at), self.partitions())
+
+            stdout = StringIO()
+            call_command("purge_logs", "--older-than", "30d", stdout=stdout)
+            self.assertIn(
+                f"Dropped partition {partition_name(old.uploaded_at)}",
+                stdout.getvalue(),
+            )
+            self.assertNotIn(partition_name(old.uploaded_at), self.partitions())
+            self.assertFalse(Log.objects.filter(pk=old.pk).exists())
+            self.assertTrue(Task.objects.filter(play__host__log=new).exists())
+        finally:
+            convert_to_regular()
+
+
+@override_settings(PARSE_POOL_WORKERS=0)
+class ASGITests(TransactionTestCase):
+    """Requests sent through Django's ASGI handler (AsyncClient)."""
+
+    def setUp(self):
+        self.token = Token.objects.create(value="asgi-token")
+
+    async def upload(self, raw_content: str, title: str = "asgi"):
+        return await self.async_client.post(
+            f"/api/logs/?title={title}",
+            raw_content,
+            content_type="text/plain",
+            headers={"Authorization": f"Bearer {self.token.value}"},
+        )
+
+    def upload_concurrently(self) -> list:
+        """Send two uploads whose parses each wait for the other one."""
+        barrier = threading.Barrier(2, timeout=5)
+
+        def parse_log(raw_content):
+            barrier.wait()
+            return ParseResult(success=False, error="Not parsed", error_type="Test")
+
+        async def upload_both():
+            return await asyncio.gather(self.upload("first\n"), self.upload("second\n"))
+
+        with mock.patch("api.views.parse_log", parse_log):
+            responses = asyncio.run(upload_both())
+        self.assertEqual([response.status_code for response in responses], [500, 500])
+        self.assertEqual(responses[0].json()["error"], "Not parsed")
+        return responses
+
+    def test_uploads_are_parsed_concurrently(self):
+        self.upload_concurrently()
+
+    @override_settings(API_PROFILING=True)
+    def test_profiled_uploads_are_parsed_concurrently(self):
+        # A sync-only middleware would run both requests in a single thread
+        for response in self.upload_concurrently():
+            self.assertRegex(response["Server-Timing"], r"^total;dur=[\d.]+, db;")
+
+    async def read_stream(self, path: str, **headers):
+        """GET a streamed response; returns it with its body chunks."""
+        response = await self.async_client.get(path, headers=headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        # An async iterator is sent chunk by chunk (a sync one is read whole)
+        self.assertTrue(response.is_async)
+        return response, [chunk async for chunk in response.streaming_content]
+
+    def test_streamed_responses(self):
+        runs = [mock_run(LARGE, seed=seed) for seed in (91, 92)]
+        base, target = create_logs(
+            [
+                (f"asgi {index}", run.raw_content, run.result)
+                for index, run in enumerate(runs)
+            ]
+        )
+
+        async def read_all():
+            raw = await self.read_stream(f"/api/logs/{base.pk}/raw/")
+            compressed = await self.read_stream(
+                f"/api/logs/{base.pk}/raw/", **{"Accept-Encoding": "gzip"}
+            )
+            diff = await self.read_stream(f"/api/logs/{base.pk}/diff/{target.pk}/")
+            return raw, compressed, diff
+
+        (_, raw), (response, compressed), (_, diff) = asyncio.run(read_all())
+        self.assertEqual(b"".join(raw).decode(), runs[0].raw_content)
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(len(b"".join(compressed)), base.raw_compressed_size)
+        self.assertGreater(len(diff), 1)
+        self.assertEqual(json.loads(b"".join(diff))["target"]["id"], str(target.pk))
+
+    def test_upload(self):
+        run = mock_run(SMALL, seed=90)
+        response = asyncio.run(self.upload(run.raw_content))
+        self.assertEqual(response.status_code, 201)
+        log = Log.objects.get(pk=response.json()["id"])
+        self.assertEqual(log.hosts.count(), len(run.result.hosts))
+
+
+class AsyncViewTests(TestCase):
+    """The async read views of API_ASYNC_VIEWS answer like the DRF ones."""
+
+    @classmethod
+    def setUpTestData(cls):
+        now = timezone.now()
+        cls.playbook = mock_run(LARGE, seed=95)
+        # The same run three times: its hosts have a history
+        cls.logs = create_logs(
+            [
+                (f"async {age}", cls.playbook.raw_content, cls.playbook.result)
+                for age in range(3)
+            ],
+            uploaded_at=[now - timedelta(hours=age) for age in range(3)],
+        )
+        cls.log = cls.logs[0]
+        cls.play = Play.objects.filter(host__log=cls.log, tasks_failed__gt=0).first()
+        cls.hostname = cls.play.host.hostname
+
+    async def assertSameResponse(self, path: str, view, query=None, **kwargs):
+        expected = await sync_to_async(self.client.get)(path, query)
+        request = AsyncRequestFactory().get(path, query)
+        response = await view.as_view()(request, **kwargs)
+        self.assertEqual(response.status_code, expected.status_code, path)
+        self.assertEqual(json.loads(response.content), expected.json(), path)
+        return response
+
+    async def test_log_detail(self):
+        for pk in (self.log.pk, uuid.uuid4()):
+            await self.assertSameResponse(
+                f"/api/logs/{pk}/", async_views.LogDetailView, pk=pk
+            )
+
+    async def test_log_hosts(self):
+        for pk in (self.log.pk, uuid.uuid4()):
+            await self.assertSameResponse(
+                f"/api/logs/{pk}/hosts/", async_views.LogHostsView, pk=pk
+            )
+
+    async def test_play_tasks(self):
+        path = f"/api/plays/{self.play.pk}/tasks/"
+        for query in (None, {"status": "failed"}, {"status": "ok"}):
+            await self.assertSameResponse(
+                path, async_views.PlayTasksView, query, pk=self.play.pk
+            )
+        response = await self.assertSameResponse(
+            path, async_views.PlayTasksView, {"status": "bogus"}, pk=self.play.pk
+        )
+        self.assertEqual(response.status_code, 400)
+        pk = uuid.uuid4()
+        response = await self.assertSameResponse(
+            f"/api/plays/{pk}/tasks/", async_views.PlayTasksView, pk=pk
+        )
+        self.assertEqual(response.status_code, 404)
+
+    async def test_host_history(self):
+        path = f"/api/hosts/{self.hostname}/history/"
+        response = await self.assertSameResponse(
+            path, async_views.HostHistoryView, {"limit": 2}, hostname=self.hostname
+        )
+        page = json.loads(response.content)
+        self.assertEqual(len(page["results"]), 2)
+        self.assertIsNotNone(page["next_before"])
+        # The next page, then bad parameters
+        for query in (
+            {"limit": 2, "before": page["next_before"]},
+            {"limit": 0},
+            {"limit": "many"},
+            {"before": "yesterday"},
+            {"before": page["next_before"], "before_id": "last"},
+        ):
+            await self.assertSameResponse(
+                path, async_views.HostHistoryView, query, hostname=self.hostname
+            )
+        response = await self.assertSameResponse(
+            "/api/hosts/unknown/history/",
+            async_views.HostHistoryView,
+            hostname="unknown",
+        )
+        self.assertEqual(response.status_code, 404)
+
+    async def test_host_history_with_equal_upload_times(self):
+        # Three more runs uploaded at the same time as the newest one
+        await sync_to_async(create_logs)(
+            [
+                (f"async same {n}", self.playbook.raw_content, self.playbook.result)
+                for n in range(3)
+            ],
+            uploaded_at=[self.log.uploaded_at] * 3,
+        )
+        expected = await sync_to_async(
+            lambda: sorted(
+                str(pk)
+                for pk in Host.objects.filter(hostname=self.hostname).values_list(
+                    "log_id", flat=True
+                )
+            )
+        )()
+        self.assertEqual(len(expected), 6)
+
+        path = f"/api/hosts/{self.hostname}/history/"
+        seen = []
+        query = {"limit": 2}
+        while True:
+            response = await self.assertSameResponse(
+                path, async_views.HostHistoryView, query, hostname=self.hostname
+            )
+            page = json.loads(response.content)
+            seen += [run["log_id"] for run in page["results"]]
+            if page["next_before"] is None:
+                break
+            query = {
+                "limit": 2,
+                "before": page["next_before"],
+                "before_id": page["next_before_id"],
+            }
+        # Every run once, none skipped at the page boundaries
+        self.assertEqual(sorted(seen), expected)
+
+
+class ParsePoolTests(TestCase):
+    """Logs parsed in a pool of forkserver processes (PARSE_POOL_WORKERS)."""
+
+    def setUp(self):
+        settings = override_settings(PARSE_POOL_WORKERS=1)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        parse_pool.shutdown()
+        self.addCleanup(parse_pool.shutdown)
+
+    def test_parse(self):
+        playbook = mock_run(SMALL, seed=96)
+        result = parse_pool.parse_log(playbook.raw_content)
+        self.assertTrue(result.success)
+        self.assertIsNotNone(result.duration)
+        self.assertEqual(
+            [host.hostname for host in result.hosts],
+            [host.hostname for host in playbook.result.hosts],
+        )
+        self.assertEqual(len(result.tasks), len(playbook.result.tasks))
+
+        results = parse_pool.parse_logs(["not a playbook log\n", playbook.raw_content])
+        self.assertFalse(results[0].success)
+        self.assertTrue(results[0].error)
+        self.assertTrue(results[1].success)
+
+    def test_pool_restarts_after_a_worker_dies(self):
+        playbook = mock_run(SMALL, seed=97)
+        self.assertTrue(parse_pool.parse_log(playbook.raw_content).success)
+        executor, _ = parse_pool._get_executor()
+        for process in list(executor._processes.values()):
+            process.kill()
+            process.join(5)
+
+        with self.assertLogs("api.services.parse_pool", "ERROR"):
+            result = parse_pool.parse_log(playbook.raw_content)
+        self.assertFalse(result.success)
+        self.assertEqual(result.error_type, "BrokenProcessPool")
+
+        # The next parse starts a new pool
+        self.assertTrue(parse_pool.parse_log(playbook.raw_content).success)
+        self.assertIsNot(parse_pool._get_executor()[0], executor)
+
+
+def parse_sse(data: bytes) -> list[dict]:
+    """The messages of a Server-Sent Events stream, without comments."""
+    messages = []
+    for block in data.decode().split("\n\n"):
+        fields = dict(
+            line.split(": ", 1)
+            for line in block.splitlines()
+            if line and not line.startswith(":")
+        )
+        if "event" in fields:
+            messages.append(fields)
+    return messages
+
+
+@override_settings(
+    PARSE_POOL_WORKERS=0, LIVE_EVENTS_POLL_INTERVAL=0.01, LIVE_EVENTS_HEARTBEAT=60
+)
+class LiveEventTests(TransactionTestCase):
+    """The Server-Sent Events stream of a running log."""
+
+    def setUp(self):
+        lines = mock_run(LARGE, seed=98).raw_content.splitlines(keepends=True)
+        third = len(lines) // 3
+        self.chunks = [
+            "".join(lines[:third]),
+            "".join(lines[third : 2 * third]),
+            "".join(lines[2 * third :]),
+        ]
+        self.log = create_live_log("events")
+        self.path = f"/api/logs/{self.log.pk}/events/"
+
+    def event_ids(self) -> list[str]:
+        return [
+            str(pk)
+            for pk in self.log.events.order_by("id").values_list("id", flat=True)
+        ]
+
+    def test_backlog_without_asgi(self):
+        for seq, chunk in enumerate(self.chunks):
+            append_chunk(self.log, chunk, seq)
+        ids = self.event_ids()
+        self.assertEqual(len(ids), 3)
+
+        # Under WSGI the stream ends after the backlog; clients reconnect
+        response = self.client.get(self.path)
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        messages = parse_sse(b"".join(response.streaming_content))
+        self.assertEqual([message["id"] for message in messages], ids)
+        self.assertEqual({message["event"] for message in messages}, {"update"})
+        for message in messages:
+            self.assertIn("plays", json.loads(message["data"]))
+
+        response = self.client.get(self.path, headers={"Last-Event-ID": ids[0]})
+        messages = parse_sse(b"".join(response.streaming_content))
+        self.assertEqual([message["id"] for message in messages], ids[1:])
+        response = self.client.get(self.path, {"after": ids[2]})
+        self.assertEqual(parse_sse(b"".join(response.streaming_content)), [])
+
+        finalize_live_log(self.log)
+        response = self.client.get(self.path, headers={"Last-Event-ID": ids[2]})
+        messages = parse_sse(b"".join(response.streaming_content))
+        self.assertEqual([message["event"] for message in messages], ["complete"])
+
+        response = self.client.get(self.path, headers={"Last-Event-ID": "x"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_stream_and_resume(self):
+        append_chunk(self.log, self.chunks[0], 0)
+        (first,) = self.event_ids()
+
+        async def next_message(stream) -> dict:
+            while True:
+                messages = parse_sse(await asyncio.wait_for(anext(stream), 5))
+                if messages:
+                    return messages[0]
+
+        async def read_to_end(stream) -> list[dict]:
+            data = b"".join([chunk async for chunk in stream])
+            return parse_sse(data)
+
+        async def watch():
+            response = await self.async_client.get(self.path)
+            self.assertTrue(response.is_async)
+            stream = aiter(response.streaming_content)
+            received = [await next_message(stream)]
+
+            await sync_to_async(append_chunk)(self.log, self.chunks[1], 1)
+            received.append(await next_message(stream))
+
+            # A client resuming after the first event shares the producer
+            resumed = await self.async_client.get(
+                self.path, headers={"Last-Event-ID": first}
+            )
+            resumed_stream = aiter(resumed.streaming_content)
+            resumed_received = [await next_message(resumed_stream)]
+            self.assertEqual(list(live_events.broker._producers), [self.log.pk])
+            producer = live_events.broker._producers[self.log.pk]
+            self.assertEqual(len(producer.subscribers), 2)
+
+            await sync_to_async(append_chunk)(self.log, self.chunks[2], 2)
+            received.append(await next_message(stream))
+            resumed_received.append(await next_message(resumed_stream))
+
+            await sync_to_async(finalize_live_log)(self.log)
+            received += await read_to_end(stream)
+            resumed_received += await read_to_end(resumed_stream)
+            return received, resumed_received
+
+        received, resumed = asyncio.run(watch())
+        ids = [message["id"] for message in received]
+        self.assertEqual(ids[0], first)
+        self.assertEqual(len(set(ids)), len(ids))
+        self.assertEqual(ids, sorted(ids, key=int))
+        self.assertEqual(
+            [message["event"] for message in received],
+            ["update", "update", "update", "complete"],
+        )
+        # Resumed after the first event: the same events, without it
+        self.assertEqual(resumed, received[1:])
+        self.assertEqual(live_events.broker._producers, {})
+
+    def test_stream_of_complete_log(self):
+        append_chunk(self.log, "".join(self.chunks), 0)
+        finalize_live_log(self.log)
+
+        async def read():
+            response = await self.async_client.get(self.path)
+            self.assertTrue(response.is_async)
+            content = [chunk async for chunk in response.streaming_content]
+            return parse_sse(b"".join(content))
+
+        messages = asyncio.run(read())
+        self.assertEqual([message["event"] for message in messages], ["complete"])
@@ -1,11 +1,79 @@
+from django.conf import settings
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from . import views
+from . import async_views, views
 
 router = DefaultRouter()
 router.register(r"logs", views.LogViewSet, basename="log")
+router.register(r"hosts", views.HostViewSet, basename="host")
 router.register(r"plays", views.PlayViewSet, basename="play")
+router.register(r"search", views.SearchViewSet, basename="search")
 
 urlpatterns = [
+    path(
+        "logs/<uuid:pk>/events/",
+        async_views.LogEventsView.as_view(),
+        name="log-events",
+    ),
+    # Ingest actions, each in its own thread under ASGI
+    path(
+        "logs/",
+        async_views.ingest_view({"post": "create"}, detail=False),
+        name="log-list",
+    ),
+    path(
+        "logs/batch/",
+        async_views.ingest_view({"post": "batch"}, detail=False),
+        name="log-batch",
+    ),
+    path(
+        "logs/live/",
+        async_views.ingest_view({"post": "live"}, detail=False),
+        name="log-live",
+    ),
+    path(
+        "logs/<uuid:pk>/append/",
+        async_views.ingest_view({"post": "append"}, detail=True),
+        name="log-append",
+    ),
+    path(
+        "logs/<uuid:pk>/results/",
+        async_views.ingest_view({"post": "results"}, detail=True),
+        name="log-results",
+    ),
+    path(
+        "logs/<uuid:pk>/finalize/",
+        async_views.ingest_view({"post": "finalize"}, detail=True),
+        name="log-finalize",
+    ),
+]
+
+if settings.API_ASYNC_VIEWS:
+    # Async read views (ASGI deployments) take precedence over the DRF ones.
+    # They are named after them, e.g. for the request duration metrics.
+    urlpatterns += [
+        path(
+            "logs/<uuid:pk>/",
+            async_views.LogDetailView.as_view(),
+            name="log-detail",
+        ),
+        path(
+            "logs/<uuid:pk>/hosts/",
+            async_views.LogHostsView.as_view(),
+            name="log-hosts",
+        ),
+        path(
+            "plays/<uuid:pk>/tasks/",
+            async_views.PlayTasksView.as_view(),
+            name="play-tasks",
+        ),
+        path(
+            "hosts/<str:hostname>/history/",
+            async_views.HostHistoryView.as_view(),
+            name="host-history",
+        ),
+    ]
+
+urlpatterns += [
     path("", include(router.urls)),
 ]
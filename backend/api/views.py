@@ -1,97 +1,479 @@
-from rest_framework import mixins, status, viewsets
+import dataclasses
+import secrets
+import uuid
+from datetime import datetime, time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.cache import patch_vary_headers
+from django.utils.dateparse import parse_date, parse_datetime
+from django.views.decorators.http import require_GET
+from rest_framework import mixins, permissions, status, viewsets
 from rest_framework.decorators import action
+from rest_framework.generics import get_object_or_404
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
 
-from .models import Host, Log, Play, Task
+from .db_router import (
+    current_read_database,
+    iter_reading_from,
+    pick_replica,
+    reset_read_database,
+    set_read_database,
+)
+from .middleware import parse_accept_encoding
+from .models import Host, Log, LogChunk, Play, Task
+from .parsers import NDJSONParser, PlainTextLogParser
+from .renderers import PlainTextRenderer
 from .permissions import HasValidToken
 from .serializers import (
+    HostHistorySerializer,
     HostSerializer,
+    LiveLogCreateSerializer,
+    LogBatchResultSerializer,
+    LogBatchSerializer,
+    LogChunkSerializer,
     LogCreateSerializer,
+    LogResultsSerializer,
     LogSerializer,
+    TaskSearchHitSerializer,
     TaskSerializer,
 )
-from .services.log_creator import create_log_entities
-from .services.log_parser import LogParserService
+from .services.live_log import (
+    LiveLogError,
+    append_chunk,
+    append_results,
+    finalize_live_log,
+)
+from .services import metrics
+from .services.log_creator import create_log_entities, create_logs
+from .services.log_diff import iter_log_diff_json
+from .services.log_preview import preview_log
+from .services.log_upload import UploadTooLarge
+from .services.parse_pool import parse_log, parse_logs
+from .services.raw_storage import CHUNK_SIZE, iter_decompressed, open_raw_compressed
+from .services.search import InvalidCursor, search_tasks
+
+
+def parse_error_data(raw_content: str, result) -> dict:
+    """Error payload of a log that could not be parsed."""
+    data = {
+        "error": result.error or "Log parsing failed",
+        "detail": result.detail or "Unknown parsing error",
+        "raw_content_preview": raw_content[:500] if raw_content else None,
+        "parser_type": result.parser_type,
+    }
+    if result.traceback_str:
+        data["traceback"] = result.traceback_str
+    return data
+
+
+async def _aiter_in_sync_thread(iterable):
+    """Iterate a sync iterable in the sync thread of the request, item by item."""
+    iterator = iter(iterable)
+    done = object()
+    pull = sync_to_async(next)
+    try:
+        while (item := await pull(iterator, done)) is not done:
+            yield item
+    finally:
+        close = getattr(iterator, "close", None)
+        if close is not None:
+            await sync_to_async(close)()
+
+
+def streaming_response(request, iterable, **kwargs) -> StreamingHttpResponse:
+    """
+    Stream the chunks of `iterable` as the response body.
+
+    Under ASGI, Django reads a sync iterator to the end before sending
+    anything, so the iterable is wrapped in an async iterator pulling one
+    chunk at a time: the body is sent as it is generated, and only one chunk
+    is held in memory.
+    """
+    if isinstance(getattr(request, "_request", request), ASGIRequest):
+        iterable = _aiter_in_sync_thread(iterable)
+    return StreamingHttpResponse(iterable, **kwargs)
+
+
+def is_dry_run(request) -> bool:
+    """Whether the request only previews the parse (``?dry_run=1``)."""
+    value = request.query_params.get("dry_run", "")
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+class ReplicaReadMixin:
+    """
+    Serve the read-only actions listed in `replica_actions` from a replica.
+
+    A healthy replica is picked per request (see api.db_router); other
+    actions, and every write, use the primary. Objects not found on the
+    replica, e.g. a log uploaded a moment ago, are looked up again on the
+    primary.
+    """
+
+    replica_actions: tuple[str, ...] = ()
+
+    def initial(self, request, *args, **kwargs):
+        self._read_database_token = None
+        if (
+            self.action in self.replica_actions
+            and request.method in permissions.SAFE_METHODS
+        ):
+            alias = pick_replica()
+            if alias is not None:
+                self._read_database_token = set_read_database(alias)
+        super().initial(request, *args, **kwargs)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        token = getattr(self, "_read_database_token", None)
+        if token is not None:
+            reset_read_database(token)
+            self._read_database_token = None
+        return response
+
+    def retry_on_primary(self, lookup):
+        """Call `lookup`, retrying on the primary if the replica raises 404."""
+        try:
+            return lookup()
+        except Http404:
+            if current_read_database() is None:
+                raise
+            # The replica may not have caught up yet: stay on the primary
+            set_read_database(None)
+            return lookup()
+
+    def get_object(self):
+        return self.retry_on_primary(super().get_object)
 
 
 class LogViewSet(
-    mixins.CreateModelMixin, mixins.RetrieveModelMixin, viewsets.GenericViewSet
+    ReplicaReadMixin,
+    mixins.CreateModelMixin,
+    mixins.RetrieveModelMixin,
+    viewsets.GenericViewSet,
 ):
     """
     ViewSet for viewing and creating logs.
 
     create: Upload and parse a new Ansible log (requires Bearer token)
+    batch: Upload and parse many logs in one request (requires Bearer token)
+    live: Create a running log to append content to (requires Bearer token)
+    append: Append a chunk to a running log (requires Bearer token)
+    results: Append structured results to a running log (requires Bearer token)
+    finalize: Mark a running log complete (requires Bearer token)
     retrieve: Get a specific log with all hosts and plays
     hosts: Get all hosts for a specific log
+    raw: Download the raw log content
+    diff: Compare the log with another log
     """
 
     queryset = Log.objects.all()
     serializer_class = LogSerializer
+    replica_actions = ("retrieve", "hosts", "diff")
     # Disable DRF's SessionAuthentication (which enforces CSRF) on this
     # viewset — auth is handled by HasValidToken permission on create.
     authentication_classes = []
+    # Logs can also be uploaded as multipart files or raw text/plain bodies,
+    # and batches as NDJSON
+    parser_classes = api_settings.DEFAULT_PARSER_CLASSES + [
+        PlainTextLogParser,
+        NDJSONParser,
+    ]
+
+    MAX_IDEMPOTENCY_KEY_LENGTH = 255
+
+    # Actions writing logs
+    token_actions = ("create", "batch", "live", "append", "results", "finalize")
 
     def get_permissions(self):
-        if self.action == "create":
+        if self.action in self.token_actions:
             return [HasValidToken()]
         return super().get_permissions()
 
     def get_serializer_class(self):
         if self.action == "create":
             return LogCreateSerializer
+        if self.action == "batch":
+            return LogBatchSerializer
+        if self.action == "live":
+            return LiveLogCreateSerializer
+        if self.action == "append":
+            return LogChunkSerializer
+        if self.action == "results":
+            return LogResultsSerializer
         return LogSerializer
 
     def get_queryset(self):
+        if self.action in ("hosts", "raw", "diff", "append", "results", "finalize"):
+            return Log.objects.all()
         return Log.objects.all().prefetch_related("hosts__plays")
 
     def create(self, request, *args, **kwargs):
         """
         Create a new log by uploading and parsing Ansible output.
 
-        The log content is stored and parsed to extract hosts and plays.
+        The log content is accepted as JSON (``raw_content``), as a multipart
+        ``file`` upload, or as a raw ``text/plain`` body with the title in the
+        ``title`` query parameter. Uploaded files may be gzip-compressed.
+
+        The log content is parsed to extract hosts and plays, then stored.
         On success, returns the created log with all parsed data.
         On parsing failure, returns a 500 error with detailed information.
+
+        Uploads with an ``Idempotency-Key`` header can be retried safely: a
+        key already used returns its log (200 OK) without reading the body.
+
+        With ``?dry_run=1`` the log is only parsed (see preview).
         """
+        if is_dry_run(request):
+            return self.preview(request)
+
+        key = request.headers.get("Idempotency-Key") or None
+        if key is not None:
+            if len(key) > self.MAX_IDEMPOTENCY_KEY_LENGTH:
+                return Response(
+                    {
+                        "error": "Idempotency-Key must be at most "
+                        f"{self.MAX_IDEMPOTENCY_KEY_LENGTH} characters"
+                    },
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            replayed = self._replay_upload(key)
+            if replayed is not None:
+                return replayed
+
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
+        raw_content = serializer.validated_data.get("raw_content", "")
 
-        # Save the log first to store raw content
-        log = serializer.save()
-
-        # Parse the log content
-        parser_service = LogParserService()
-        result = parser_service.parse(log.raw_content)
+        # Parse the log content before storing anything (in the parser pool)
+        result = parse_log(raw_content)
 
         if not result.success:
-            # Delete the log on parsing failure
-            log.delete()
-
-            error_response = {
-                "error": result.error or "Log parsing failed",
-                "detail": result.detail or "Unknown parsing error",
-                "raw_content_preview": log.raw_content[:500]
-                if log.raw_content
-                else None,
-                "parser_type": result.parser_type,
-            }
-
-            if result.traceback_str:
-                error_response["traceback"] = result.traceback_str
-
             return Response(
-                error_response, status=status.HTTP_500_INTERNAL_SERVER_ERROR
+                parse_error_data(raw_content, result),
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
             )
 
-        # Create Host, Play, and Task entities from parsed data
-        create_log_entities(log, result)
+        # Store the log and its raw content, then create Host, Play, and Task
+        # entities from parsed data
+        try:
+            with metrics.PERSIST_DURATION.time(mode="single"), transaction.atomic():
+                log = serializer.save(idempotency_key=key)
+                create_log_entities(log, result)
+        except IntegrityError:
+            # A concurrent retry with the same key stored the log first
+            replayed = self._replay_upload(key) if key is not None else None
+            if replayed is None:
+                raise
+            return replayed
 
-        # Refresh log to include newly created hosts and plays
-        log.refresh_from_db()
+        # Fetch the newly created hosts and plays, in one query per model
+        log = Log.objects.prefetch_related("hosts__plays").get(pk=log.pk)
 
         # Return the full log with nested hosts and plays
         output_serializer = LogSerializer(log)
         return Response(output_serializer.data, status=status.HTTP_201_CREATED)
 
+    def preview(self, request):
+        """
+        Parse a log without storing it, for ``POST /api/logs/?dry_run=1``.
+
+        The request is validated like an upload, then the log (up to
+        LOG_PREVIEW_MAX_SIZE bytes) is parsed in the parser pool. Returns
+        200 OK with a summary of the hosts, plays and tasks the upload would
+        create, or the 500 error payload of a failed upload, both with the
+        parsed size and the time spent in each stage. Idempotency keys are
+        ignored.
+        """
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        raw_content = serializer.validated_data.get("raw_content", "")
+
+        preview = preview_log(raw_content)
+        if not preview.result.success:
+            return Response(
+                {**parse_error_data(raw_content, preview.result), **preview.as_dict()},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            )
+        return Response(
+            {
+                "title": serializer.validated_data["title"],
+                **preview.as_dict(),
+                **preview.summary,
+            },
+            status=status.HTTP_200_OK,
+        )
+
+    @action(detail=False, methods=["post"])
+    def batch(self, request):
+        """
+        Upload and parse many logs in one request.
+
+        The logs are given as JSON (a list of ``{title, raw_content}``
+        objects, or ``{"logs": [...]}``), as NDJSON (one object per line,
+        ``Content-Type: application/x-ndjson``) or as a tar or zip archive
+        uploaded as the multipart ``file``. They are parsed in parallel in
+        the parser pool and the successfully parsed logs are stored in one
+        transaction with shared bulk inserts.
+
+        Returns:
+            The number of logs created and failed, and a result per entry,
+            in order: ``status`` 201 with the created ``log``, or 500 with
+            the ``error`` payload of the single upload endpoint. The response
+            status is 201 if every log was created, 207 otherwise.
+        """
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        entries = serializer.validated_data["logs"]
+
+        results = parse_logs([entry["raw_content"] for entry in entries])
+        with metrics.PERSIST_DURATION.time(mode="batch"), transaction.atomic():
+            logs = iter(
+                create_logs(
+                    [
+                        (entry["title"], entry["raw_content"], result)
+                        for entry, result in zip(entries, results)
+                        if result.success
+                    ]
+                )
+            )
+
+        items = []
+        for index, (entry, result) in enumerate(zip(entries, results)):
+            if not result.success:
+                error = parse_error_data(entry["raw_content"], result)
+                items.append({"index": index, "status": 500, "error": error})
+                continue
+            log = next(logs)
+            log.host_count = len(result.hosts)
+            items.append(
+                {
+                    "index": index,
+                    "status": 201,
+                    "log": LogBatchResultSerializer(log).data,
+                }
+            )
+
+        failed = sum(1 for result in results if not result.success)
+        return Response(
+            {"created": len(items) - failed, "failed": failed, "results": items},
+            status=status.HTTP_207_MULTI_STATUS if failed else status.HTTP_201_CREATED,
+        )
+
+    def _replay_upload(self, key):
+        """Return the response to a retried upload, or None if the key is new."""
+        log = (
+            Log.objects.filter(idempotency_key=key)
+            .prefetch_related("hosts__plays")
+            .first()
+        )
+        if log is None:
+            return None
+        return Response(
+            LogSerializer(log).data, headers={"Idempotent-Replayed": "true"}
+        )
+
+    @action(detail=False, methods=["post"])
+    def live(self, request):
+        """
+        Create a live log, in the "running" state, for a playbook still running.
+
+        Content is then sent with the append action, and the log closed with
+        the finalize action once the playbook ends.
+
+        Returns:
+            The created log (without hosts).
+        """
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        log = serializer.save()
+        return Response(LogSerializer(log).data, status=status.HTTP_201_CREATED)
+
+    @action(detail=True, methods=["post"])
+    def append(self, request, pk=None):
+        """
+        Append a chunk of content to a running log.
+
+        The chunk is given as JSON (``content``, optional ``seq``), as a
+        multipart ``file`` upload, or as a raw ``text/plain`` body with the
+        sequence number in the ``seq`` query parameter. Only the new lines are
+        parsed; hosts, plays and tasks they mention are created or updated.
+
+        Returns:
+            The chunk sequence number and the rows created and updated.
+            "duplicate" is true if the chunk had already been received.
+            Returns 409 if the log is not running or chunks are missing
+            before ``seq``, 400 if the log would exceed its maximum size.
+        """
+        log = self.get_object()
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            result = append_chunk(
+                log,
+                serializer.validated_data["content"],
+                seq=serializer.validated_data.get("seq"),
+            )
+        except LiveLogError as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_409_CONFLICT)
+        except UploadTooLarge as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(dataclasses.asdict(result))
+
+    @action(detail=True, methods=["post"])
+    def results(self, request, pk=None):
+        """
+        Append a batch of structured results to a running log.
+
+        Sent by the Ansible callback plugin instead of the raw output: the
+        batch (``events``, optional ``seq``) holds play and task starts, host
+        results and recap lines, stored without text parsing.
+
+        Returns:
+            The batch sequence number and the rows created and updated, like
+            the append action, with the same error statuses. Also returns
+            409 if raw content was appended to the log.
+        """
+        log = self.get_object()
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            result = append_results(
+                log,
+                serializer.validated_data["events"],
+                seq=serializer.validated_data.get("seq"),
+            )
+        except LiveLogError as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_409_CONFLICT)
+        except UploadTooLarge as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(dataclasses.asdict(result))
+
+    @action(detail=True, methods=["post"])
+    def finalize(self, request, pk=None):
+        """
+        Parse the end of a running log (PLAY RECAP) and mark it complete.
+
+        Returns:
+            The complete log with all hosts and plays.
+            Returns 409 if the log is not running.
+        """
+        log = self.get_object()
+        try:
+            log = finalize_live_log(log)
+        except LiveLogError as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_409_CONFLICT)
+        log = Log.objects.prefetch_related("hosts__plays").get(pk=log.pk)
+        return Response(LogSerializer(log).data)
+
     @action(detail=True, methods=["get"])
     def hosts(self, request, pk=None):
         """
@@ -105,15 +487,222 @@ class LogViewSet(
         serializer = HostSerializer(hosts, many=True)
         return Response(serializer.data)
 
+    @action(detail=True, methods=["get"], renderer_classes=[PlainTextRenderer])
+    def raw(self, request, pk=None):
+        """
+        Stream the raw log content as text/plain.
+
+        The stored compressed content is sent as-is when the client accepts
+        its encoding (zstd or gzip); otherwise it is decompressed on the fly.
+        """
+        log = self.get_object()
+        if log.status == "running":
+            # Not in raw log storage yet: stream the chunks received so far
+            return streaming_response(
+                request, _iter_chunks(log), content_type="text/plain; charset=utf-8"
+            )
+        if not log.raw_sha256:
+            return HttpResponse(b"", content_type="text/plain; charset=utf-8")
 
-class PlayViewSet(viewsets.GenericViewSet):
+        fileobj, codec = open_raw_compressed(log)
+        accepted = parse_accept_encoding(request.META.get("HTTP_ACCEPT_ENCODING", ""))
+
+        if accepted.get(codec, 0) > 0:
+            response = streaming_response(
+                request, _iter_file(fileobj), content_type="text/plain; charset=utf-8"
+            )
+            response["Content-Encoding"] = codec
+            response["Content-Length"] = str(log.raw_compressed_size)
+        else:
+            response = streaming_response(
+                request,
+                _iter_decompressed_file(fileobj),
+                content_type="text/plain; charset=utf-8",
+            )
+            response["Content-Length"] = str(log.raw_size)
+
+        patch_vary_headers(response, ("Accept-Encoding",))
+        return response
+
+    @action(detail=True, methods=["get"], url_path=r"diff/(?P<other>[^/.]+)")
+    def diff(self, request, pk=None, other=None):
+        """
+        Compare this log (the base, e.g. the previous run) with another log.
+
+        Reports hosts added and removed, plays whose status changed, and
+        tasks that newly failed or recovered. Plays are matched on
+        (hostname, play order, play name) and tasks on (hostname, play order,
+        play name, task order, task name). The result is
+        computed with SQL joins and streamed as JSON.
+
+        Returns:
+            JSON object with "base", "target", "hosts_added", "hosts_removed",
+            "plays_changed", "tasks_newly_failed" and "tasks_recovered".
+            Returns 404 if either log UUID is not found.
+        """
+        base = self.get_object()
+        target = self.retry_on_primary(
+            lambda: get_object_or_404(Log.objects.all(), pk=other)
+        )
+        # The body is generated after the view returns: keep it on the same
+        # database as the lookups above
+        return streaming_response(
+            request,
+            iter_reading_from(
+                current_read_database(), iter_log_diff_json(base, target)
+            ),
+            content_type="application/json",
+        )
+
+
+def _iter_chunks(log):
+    """Yield the chunks received so far for a running log, UTF-8 encoded."""
+    chunks = LogChunk.objects.filter(log=log).order_by("seq")
+    for content in chunks.values_list("content", flat=True).iterator():
+        yield content.encode("utf-8")
+
+
+def _iter_file(fileobj):
+    """Yield a binary file chunk by chunk, closing it when done."""
+    with fileobj:
+        while chunk := fileobj.read(CHUNK_SIZE):
+            yield chunk
+
+
+def _iter_decompressed_file(fileobj):
+    """Yield the decompressed content of a file, closing it when done."""
+    with fileobj:
+        yield from iter_decompressed(fileobj)
+
+
+class HostViewSet(ReplicaReadMixin, viewsets.GenericViewSet):
+    """
+    ViewSet for host-centric operations across logs.
+
+    history: Per-run timeline of a hostname, newest first
+    """
+
+    queryset = Host.objects.all()
+    replica_actions = ("history",)
+    lookup_field = "hostname"
+    # Hostnames usually contain dots
+    lookup_value_regex = r"[^/]+"
+
+    DEFAULT_HISTORY_LIMIT = 90
+    MAX_HISTORY_LIMIT = 1000
+
+    @classmethod
+    def history_runs(cls, hostname: str, params) -> tuple:
+        """
+        Read the query parameters of a host history request.
+
+        Runs are ordered newest first, on (upload time, log id) so runs
+        uploaded at the same time are not skipped between pages.
+
+        Returns:
+            (runs queryset, limit, whether a cursor was given)
+
+        Raises:
+            ValueError: If a parameter is invalid, with the error message
+        """
+        try:
+            limit = min(
+                int(params.get("limit", cls.DEFAULT_HISTORY_LIMIT)),
+                cls.MAX_HISTORY_LIMIT,
+            )
+        except ValueError:
+            limit = 0
+        if limit < 1:
+            raise ValueError(f"'limit' must be between 1 and {cls.MAX_HISTORY_LIMIT}")
+
+        runs = Host.objects.filter(hostname=hostname).order_by(
+            "-log_uploaded_at", "-log_id"
+        )
+
+        before = params.get("before")
+        if before:
+            parsed = parse_datetime(before)
+            if parsed is None:
+                raise ValueError(f"Invalid datetime for 'before': '{before}'")
+            if timezone.is_naive(parsed):
+                parsed = timezone.make_aware(parsed)
+            before_id = params.get("before_id")
+            if before_id:
+                try:
+                    before_id = uuid.UUID(before_id)
+                except ValueError:
+                    raise ValueError(
+                        f"Invalid log id for 'before_id': '{before_id}'"
+                    ) from None
+                runs = runs.filter(
+                    Q(log_uploaded_at__lt=parsed)
+                    | Q(log_uploaded_at=parsed, log_id__lt=before_id)
+                )
+            else:
+                runs = runs.filter(log_uploaded_at__lt=parsed)
+        return runs, limit, bool(before)
+
+    @staticmethod
+    def history_page(hostname: str, results: list, has_more: bool) -> dict:
+        """The response of a host history request, with the next page cursor."""
+        last = results[-1] if has_more else None
+        return {
+            "hostname": hostname,
+            "results": results,
+            "next_before": last["uploaded_at"] if last else None,
+            "next_before_id": last["log_id"] if last else None,
+        }
+
+    @action(detail=True, methods=["get"])
+    def history(self, request, hostname=None):
+        """
+        List the runs of a host across logs, newest first.
+
+        Served from the denormalized summary on Host and the
+        (hostname, log_uploaded_at) index, without joining plays.
+
+        Query Parameters:
+            limit (optional): Number of runs (default 90, max 1000)
+            before (optional): Only runs uploaded before this ISO datetime
+                (use "next_before" of the previous page)
+            before_id (optional): With "before", also the runs uploaded at
+                that time with a smaller log id (use "next_before_id")
+
+        Returns:
+            Timeline entries with log id, upload time, status and failure counts.
+            Returns 400 if a parameter is invalid.
+            Returns 404 if the hostname never appeared in a log.
+        """
+        try:
+            runs, limit, paged = self.history_runs(hostname, request.query_params)
+        except ValueError as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Fetch one extra run to know whether there is a next page
+        page = list(
+            runs.only(
+                "log_id", "log_uploaded_at", "status", "plays_failed", "tasks_failed"
+            )[: limit + 1]
+        )
+        if not page and not paged:
+            return Response(
+                {"error": f"Host '{hostname}' not found"},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+
+        results = HostHistorySerializer(page[:limit], many=True).data
+        return Response(self.history_page(hostname, results, len(page) > limit))
+
+
+class PlayViewSet(ReplicaReadMixin, viewsets.GenericViewSet):
     """
     ViewSet for Play-related operations.
 
     tasks: List all tasks for a specific play with optional status filtering
     """
 
-    queryset = Play.objects.all()
+    queryset = Play.objects.select_related("host__log")
+    replica_actions = ("tasks",)
 
     @action(detail=True, methods=["get"])
     def tasks(self, request, pk=None):
@@ -130,7 +719,10 @@ class PlayViewSet(viewsets.GenericViewSet):
             Returns 404 if play UUID not found.
         """
         play = self.get_object()
-        tasks = Task.objects.filter(play=play).order_by("order")
+        # Tasks carry their log's upload time: lets PostgreSQL prune partitions
+        tasks = Task.objects.filter(
+            play=play, created_at=play.host.log.uploaded_at
+        ).order_by("order")
 
         status_filter = request.query_params.get("status")
         if status_filter:
@@ -151,3 +743,149 @@ class PlayViewSet(viewsets.GenericViewSet):
 
         serializer = TaskSerializer(tasks, many=True)
         return Response(serializer.data)
+
+
+class SearchViewSet(ReplicaReadMixin, viewsets.ViewSet):
+    """
+    Full-text search over tasks.
+
+    list: Search task names, failure messages, play names and hostnames
+    """
+
+    replica_actions = ("list",)
+    MAX_LIMIT = 200
+
+    def list(self, request):
+        """
+        Search tasks, newest logs first.
+
+        Query Parameters:
+            q (required): Search terms, all must match ("quoted phrases" allowed)
+            status (optional): Filter by task status ("failed" includes "fatal")
+            log (optional): Only search tasks of this log UUID
+            since / until (optional): ISO datetimes bounding the log upload time
+            limit (optional): Page size (default 50, max 200)
+            cursor (optional): Cursor from the previous page's "next_cursor"
+
+        Returns:
+            Matching tasks with their play/host/log links and line numbers.
+            Returns 400 if a parameter is invalid.
+        """
+        params = request.query_params
+        query = params.get("q", "").strip()
+        if not query:
+            return Response(
+                {"error": "Query parameter 'q' is required"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        statuses = None
+        status_filter = params.get("status")
+        if status_filter:
+            valid_statuses = [choice[0] for choice in Task.STATUS_CHOICES]
+            if status_filter not in valid_statuses:
+                return Response(
+                    {
+                        "error": f"Invalid status '{status_filter}'",
+                        "valid_statuses": valid_statuses,
+                    },
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            # Include both "failed" and "fatal" when filtering on "failed"
+            if status_filter == "failed":
+                statuses = ["failed", "fatal"]
+            else:
+                statuses = [status_filter]
+
+        try:
+            log_id = uuid.UUID(params["log"]) if params.get("log") else None
+        except ValueError:
+            return Response(
+                {"error": f"Invalid log id '{params['log']}'"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        bounds = {}
+        for name in ("since", "until"):
+            value = params.get(name)
+            if not value:
+                bounds[name] = None
+                continue
+            parsed = parse_datetime(value) or _parse_date(value)
+            if parsed is None:
+                return Response(
+                    {"error": f"Invalid datetime for '{name}': '{value}'"},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            if timezone.is_naive(parsed):
+                parsed = timezone.make_aware(parsed)
+            bounds[name] = parsed
+
+        try:
+            limit = min(int(params.get("limit", 50)), self.MAX_LIMIT)
+        except ValueError:
+            limit = 0
+        if limit < 1:
+            return Response(
+                {"error": f"'limit' must be between 1 and {self.MAX_LIMIT}"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        try:
+            page = search_tasks(
+                query,
+                statuses=statuses,
+                log_id=log_id,
+                since=bounds["since"],
+                until=bounds["until"],
+                cursor=params.get("cursor"),
+                limit=limit,
+            )
+        except InvalidCursor:
+            return Response(
+                {"error": "Invalid cursor"}, status=status.HTTP_400_BAD_REQUEST
+            )
+
+        next_url = None
+        if page.next_cursor:
+            next_params = params.copy()
+            next_params["cursor"] = page.next_cursor
+            next_url = request.build_absolute_uri(
+                f"{request.path}?{next_params.urlencode()}"
+            )
+
+        return Response(
+            {
+                "results": TaskSearchHitSerializer(page.tasks, many=True).data,
+                "next_cursor": page.next_cursor,
+                "next": next_url,
+            }
+        )
+
+
+def _parse_date(value):
+    """Parse a YYYY-MM-DD date into a datetime at midnight, or None."""
+    parsed = parse_date(value)
+    if parsed is None:
+        return None
+    return datetime.combine(parsed, time.min)
+
+
+@require_GET
+def metrics_view(request):
+    """
+    Serve the Prometheus metrics of all server processes (see
+    api.services.metrics) in the text exposition format.
+
+    Returns 404 unless METRICS_ENABLED is set, and 401 without the
+    METRICS_TOKEN bearer token when one is configured.
+    """
+    if not metrics.is_enabled():
+        raise Http404
+    token = getattr(settings, "METRICS_TOKEN", "")
+    if token and not secrets.compare_digest(
+        request.headers.get("Authorization", "").encode(),
+        f"Bearer {token}".encode(),
+    ):
+        return HttpResponse(status=401, headers={"WWW-Authenticate": "Bearer"})
+    return HttpResponse(metrics.render(), content_type=metrics.CONTENT_TYPE)
@@ -10,5 +10,18 @@ echo 'PostgreSQL started'
 echo 'Running migrations...'
 django-admin migrate
 
+echo 'Creating upcoming task partitions...'
+django-admin manage_partitions
+
 echo 'Starting service...'
-exec gunicorn --bind 0.0.0.0:8000 --workers=4 ansibeau.wsgi
+# Prometheus metrics of all the workers, added up in a store reset on start
+export METRICS_ENABLED=${METRICS_ENABLED:-True}
+export METRICS_DB=${METRICS_DB:-/tmp/ansibeau-metrics.sqlite3}
+rm -f "$METRICS_DB" "$METRICS_DB-wal" "$METRICS_DB-shm"
+# ASGI: uvicorn workers serve the async read views (api.async_views) as
+# coroutines and the ingest actions each in a thread of their own. Django runs
+# the other DRF views one at a time, in a single thread per worker. Logs are
+# parsed in a process pool per worker
+export API_ASYNC_VIEWS=${API_ASYNC_VIEWS:-True}
+exec gunicorn --bind 0.0.0.0:8000 --workers=${API_WORKERS:-4} \
+    --worker-class uvicorn_worker.UvicornWorker ansibeau.asgi
@@ -1,4 +1,4 @@
-import { useState } from 'react';
+import { useEffect, useRef, useState } from 'react';
 import { Loader2, Copy, Check } from 'lucide-react';
 import { Prism as SyntaxHighlighter } from 'react-syntax-highlighter';
 import { oneDark } from 'react-syntax-highlighter/dist/esm/styles/prism';
@@ -25,6 +25,32 @@ export function CollapsibleTaskSection({
   const [error, setError] = useState<string | null>(null);
   const [copiedTaskId, setCopiedTaskId] = useState<string | null>(null);
 
+  // The count of a running log grows: drop the cached tasks when it changes
+  const loadedCount = useRef(count);
+  useEffect(() => {
+    if (count === loadedCount.current) return;
+    loadedCount.current = count;
+    setTasks(null);
+    if (isExpanded) {
+      loadTasks();
+    }
+    // eslint-disable-next-line react-hooks/exhaustive-deps
+  }, [count]);
+
+  const loadTasks = async () => {
+    setLoading(true);
+    setError(null);
+    try {
+      const fetchedTasks = await fetchTasks(playId, status);
+      setTasks(fetchedTasks);
+    } catch (err) {
+      const message = err instanceof Error ? err.message : 'Failed to load tasks';
+      setError(message);
+    } finally {
+      setLoading(false);
+    }
+  };
+
   const handleCopy = async (taskId: string, text: string) => {
     await navigator.clipboard.writeText(text);
     setCopiedTaskId(taskId);
@@ -39,17 +65,7 @@ export function CollapsibleTaskSection({
 
     // Fetch tasks on first expand only
     if (newExpanded && tasks === null) {
-      setLoading(true);
-      setError(null);
-      try {
-        const fetchedTasks = await fetchTasks(playId, status);
-        setTasks(fetchedTasks);
-      } catch (err) {
-        const message = err instanceof Error ? err.message : 'Failed to load tasks';
-        setError(message);
-      } finally {
-        setLoading(false);
-      }
+      await loadTasks();
     }
   };
 
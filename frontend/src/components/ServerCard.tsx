@@ -1,3 +1,4 @@
+import { memo } from 'react';
 import { Server } from 'lucide-react';
 import { type Host } from '../types/ansible';
 import { PlayCard } from './PlayCard';
@@ -6,7 +7,8 @@ interface ServerCardProps {
   host: Host;
 }
 
-export function ServerCard({ host }: ServerCardProps) {
+// Memoized: live updates only replace the hosts they touch
+export const ServerCard = memo(function ServerCard({ host }: ServerCardProps) {
   const getOverallStatusColor = () => {
     const hasFailedPlays = host.plays.some(play => play.status === 'failed');
     const hasChangedPlays = host.plays.some(play => play.status === 'changed');
@@ -30,4 +32,4 @@ export function ServerCard({ host }: ServerCardProps) {
       </div>
     </div>
   );
-}
+});
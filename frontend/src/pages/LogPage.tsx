@@ -1,14 +1,20 @@
 import { useEffect, useState } from 'react';
 import { useParams } from 'react-router-dom';
 import { ServerCard } from '../components/ServerCard';
-import { fetchLog } from '../services/api';
-import { type Host, type Log } from '../types/ansible';
+import { fetchLog, subscribeToLogEvents } from '../services/api';
+import { applyLogUpdate } from '../services/liveLog';
+import { type Host, type LiveFailedTask, type Log } from '../types/ansible';
+
+// Failed tasks of a running log listed above the hosts
+const MAX_RECENT_FAILURES = 10;
 
 function LogPage() {
   const { logId } = useParams<{ logId: string }>();
   const [log, setLog] = useState<Log | null>(null);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState<string | null>(null);
+  const [recentFailures, setRecentFailures] = useState<LiveFailedTask[]>([]);
+  const isRunning = log?.status === 'running';
 
   useEffect(() => {
     if (!logId) {
@@ -33,6 +39,32 @@ function LogPage() {
     loadLog();
   }, [logId]);
 
+  // Follow running logs: apply the deltas pushed by the server in place
+  useEffect(() => {
+    if (!logId || !isRunning) return;
+
+    return subscribeToLogEvents(logId, {
+      onUpdate: (update) => {
+        setLog((prev) => (prev ? applyLogUpdate(prev, update) : prev));
+        if (update.failed_tasks.length > 0) {
+          setRecentFailures((prev) =>
+            [...[...update.failed_tasks].reverse(), ...prev]
+              .filter((task, index, all) => all.findIndex((t) => t.id === task.id) === index)
+              .slice(0, MAX_RECENT_FAILURES)
+          );
+        }
+      },
+      onComplete: async () => {
+        // Picks up the play dates and the status set when the log completes
+        try {
+          setLog(await fetchLog(logId));
+        } catch {
+          setLog((prev) => (prev ? { ...prev, status: 'complete' } : prev));
+        }
+      },
+    });
+  }, [logId, isRunning]);
+
   useEffect(() => {
     if (log) {
       document.title = `${log.title} - Ansibeau`;
@@ -97,7 +129,15 @@ function LogPage() {
     <div className="min-h-screen bg-slate-900 py-6 px-4 sm:px-6 lg:px-8">
       <div className="max-w-7xl mx-auto">
         <div className="mb-5">
-          <h1 className="text-3xl font-bold text-slate-100 mb-1">{log.title}</h1>
+          <div className="flex items-center gap-3 mb-1">
+            <h1 className="text-3xl font-bold text-slate-100">{log.title}</h1>
+            {isRunning && (
+              <span className="flex items-center gap-1.5 text-sm font-medium text-blue-400">
+                <span className="w-2 h-2 rounded-full bg-blue-400 animate-pulse" />
+                Live
+              </span>
+            )}
+          </div>
           <p className="text-slate-400 text-base">
             {new Date(log.uploaded_at).toLocaleDateString('en-US', {
               year: 'numeric',
@@ -109,6 +149,21 @@ function LogPage() {
           </p>
         </div>
 
+        {isRunning && recentFailures.length > 0 && (
+          <div className="mb-5 bg-slate-800 border border-red-900 rounded-lg p-4">
+            <h2 className="text-sm font-semibold text-red-400 mb-2">Recent failures</h2>
+            <ul className="space-y-1 text-sm text-slate-300">
+              {recentFailures.map((task) => (
+                <li key={task.id}>
+                  <span className="font-medium text-slate-100">{task.hostname}</span>
+                  <span className="text-slate-500"> · {task.play} · </span>
+                  {task.name}
+                </li>
+              ))}
+            </ul>
+          </div>
+        )}
+
         {sortedHosts.length === 0 ? (
           <div className="text-slate-400 text-center py-8">
             No hosts found in this log
@@ -1,4 +1,4 @@
-import { Log, Task, PlayStatus } from '../types/ansible';
+import { Log, LogUpdate, Task, PlayStatus } from '../types/ansible';
 
 const getBackendUri = (): string => {
   const config = window.ANSIBEAU_CONFIG;
@@ -78,3 +78,29 @@ export const fetchTasks = async (playId: string, status: PlayStatus): Promise<Ta
   }
   return response.json();
 };
+
+export interface LogEventHandlers {
+  onUpdate: (update: LogUpdate) => void;
+  onComplete: () => void;
+}
+
+/**
+ * Follow a running log through its Server-Sent Events stream.
+ *
+ * The browser reconnects on its own, resuming after the last event received.
+ * Returns a function closing the stream.
+ */
+export const subscribeToLogEvents = (logId: string, handlers: LogEventHandlers): (() => void) => {
+  const backendUri = getBackendUri();
+  const source = new EventSource(`${backendUri}/api/logs/${logId}/events/`);
+
+  source.addEventListener('update', (event) => {
+    handlers.onUpdate(JSON.parse((event as MessageEvent<string>).data));
+  });
+  source.addEventListener('complete', () => {
+    source.close();
+    handlers.onComplete();
+  });
+
+  return () => source.close();
+};
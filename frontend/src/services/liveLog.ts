@@ -0,0 +1,40 @@
+import { type Host, type Log, type LogUpdate, type Play } from '../types/ansible';
+
+const byOrder = (a: Play, b: Play) => (a.order ?? 0) - (b.order ?? 0);
+
+/**
+ * Apply a log event stream delta to a log.
+ *
+ * Only the hosts touched by the update get new objects, so memoized
+ * components of the other hosts do not re-render. Updates are upserts and
+ * may be applied more than once.
+ */
+export function applyLogUpdate(log: Log, update: LogUpdate): Log {
+  const hosts = [...log.hosts];
+  const indexById = new Map(hosts.map((host, index) => [host.id, index]));
+
+  for (const host of update.hosts) {
+    if (!indexById.has(host.id)) {
+      indexById.set(host.id, hosts.length);
+      hosts.push({ ...host, plays: [] });
+    }
+  }
+
+  const playsByHost = new Map<string, Play[]>();
+  for (const { host_id, ...play } of update.plays) {
+    playsByHost.set(host_id, [...(playsByHost.get(host_id) ?? []), play]);
+  }
+
+  for (const [hostId, plays] of playsByHost) {
+    const index = indexById.get(hostId);
+    if (index === undefined) continue;
+    const host: Host = hosts[index];
+    const merged = new Map(host.plays.map((play) => [play.id, play]));
+    for (const play of plays) {
+      merged.set(play.id, play);
+    }
+    hosts[index] = { ...host, plays: [...merged.values()].sort(byOrder) };
+  }
+
+  return { ...log, hosts, host_count: hosts.length };
+}
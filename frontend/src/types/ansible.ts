@@ -23,6 +23,8 @@ export interface Play {
   date: string | null;
   status: PlayStatus;
   tasks: TaskSummary;
+  line_number?: number | null;
+  order?: number;
 }
 
 export interface Host {
@@ -31,10 +33,33 @@ export interface Host {
   plays: Play[];
 }
 
+export type LogStatus = 'running' | 'complete';
+
 export interface Log {
   id: string;
   title: string;
   uploaded_at: string;
+  status?: LogStatus;
   hosts: Host[];
   host_count: number;
 }
+
+/** A task that failed in a running log, as sent by the log event stream. */
+export interface LiveFailedTask {
+  id: string;
+  play_id: string;
+  host_id: string;
+  hostname: string;
+  play: string;
+  name: string;
+  status: TaskStatus;
+  failure_message: string | null;
+  line_number: number | null;
+}
+
+/** Delta of a running log: new hosts, updated plays and newly failed tasks. */
+export interface LogUpdate {
+  hosts: Host[];
+  plays: (Play & { host_id: string })[];
+  failed_tasks: LiveFailedTask[];
+}
@@ -0,0 +1,452 @@
+"""
+Ansible callback plugin streaming playbook results to Ansibeau.
+
+The plugin creates a live log when the playbook starts, sends plays, tasks,
+host results and the recap as structured batches to
+POST /api/logs/{id}/results/ while the playbook runs, and finalizes the log
+at the end of the run. No output has to be captured and uploaded afterwards.
+
+Batches are sent by a background thread over one persistent HTTP
+connection, so a slow server does not slow the playbook down until the
+buffer is full. Failed requests are retried with exponential backoff; each
+batch carries a sequence number, so a retried batch is never applied twice.
+"""
+
+import atexit
+import http.client
+import json
+import os
+import random
+import ssl
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from urllib.parse import urlsplit
+
+from ansible.plugins.callback import CallbackBase
+
+DOCUMENTATION = r"""
+name: ansibeau
+type: notification
+short_description: Streams playbook results to Ansibeau
+description:
+  - Sends the plays, tasks, host results and recap of a playbook run to an
+    Ansibeau server as structured batches while the playbook runs.
+  - The run shows up as a live log, finalized when the playbook ends.
+requirements:
+  - Enable the plugin with C(callbacks_enabled = ansibeau)
+options:
+  url:
+    description: Base URL of the Ansibeau API server, without C(/api/).
+    required: true
+    env:
+      - name: ANSIBEAU_URL
+    ini:
+      - section: callback_ansibeau
+        key: url
+  token:
+    description: API token, sent as a C(Bearer) token.
+    required: true
+    env:
+      - name: ANSIBEAU_TOKEN
+    ini:
+      - section: callback_ansibeau
+        key: token
+  title:
+    description: Title of the log. Defaults to the playbook file name.
+    env:
+      - name: ANSIBEAU_TITLE
+    ini:
+      - section: callback_ansibeau
+        key: title
+  web_url:
+    description: Base URL of the Ansibeau web interface, to print a link to the log.
+    env:
+      - name: ANSIBEAU_WEB_URL
+    ini:
+      - section: callback_ansibeau
+        key: web_url
+  batch_size:
+    description: Maximum number of events per request.
+    type: int
+    default: 500
+    env:
+      - name: ANSIBEAU_BATCH_SIZE
+    ini:
+      - section: callback_ansibeau
+        key: batch_size
+  flush_interval:
+    description: Seconds to wait for more events before sending a partial batch.
+    type: float
+    default: 1.0
+    env:
+      - name: ANSIBEAU_FLUSH_INTERVAL
+    ini:
+      - section: callback_ansibeau
+        key: flush_interval
+  max_buffer:
+    description: >-
+      Maximum number of events waiting to be sent. When the buffer is full the
+      playbook waits for the server.
+    type: int
+    default: 20000
+    env:
+      - name: ANSIBEAU_MAX_BUFFER
+    ini:
+      - section: callback_ansibeau
+        key: max_buffer
+  max_retries:
+    description: >-
+      Attempts of a request before giving up. The plugin then stops sending
+      results and the playbook carries on.
+    type: int
+    default: 8
+    env:
+      - name: ANSIBEAU_MAX_RETRIES
+    ini:
+      - section: callback_ansibeau
+        key: max_retries
+  timeout:
+    description: Timeout of a request, in seconds.
+    type: float
+    default: 30.0
+    env:
+      - name: ANSIBEAU_TIMEOUT
+    ini:
+      - section: callback_ansibeau
+        key: timeout
+  validate_certs:
+    description: Whether to validate the TLS certificate of the server.
+    type: bool
+    default: true
+    env:
+      - name: ANSIBEAU_VALIDATE_CERTS
+    ini:
+      - section: callback_ansibeau
+        key: validate_certs
+"""
+
+# Failure messages longer than this are truncated
+MAX_MESSAGE_LENGTH = 65536
+
+
+class ApiError(Exception):
+    """Raised when the API rejects a request, or keeps failing."""
+
+
+class AnsibeauClient:
+    """JSON client of the Ansibeau API over one persistent connection."""
+
+    # Statuses worth retrying: the server may be restarting or overloaded
+    RETRY_STATUSES = (429, 502, 503, 504)
+    BACKOFF_BASE = 0.5
+    BACKOFF_MAX = 30.0
+
+    def __init__(self, url, token, timeout=30.0, max_retries=8, validate_certs=True):
+        parts = urlsplit(url)
+        if parts.scheme not in ("http", "https") or not parts.hostname:
+            raise ApiError(f"Invalid Ansibeau URL '{url}'")
+        self.scheme = parts.scheme
+        self.netloc = parts.netloc
+        self.prefix = parts.path.rstrip("/")
+        self.token = token
+        self.timeout = timeout
+        self.max_retries = max(1, max_retries)
+        self.context = None
+        if self.scheme == "https" and not validate_certs:
+            self.context = ssl._create_unverified_context()
+        self._connection = None
+
+    def _connect(self):
+        if self._connection is None:
+            if self.scheme == "https":
+                self._connection = http.client.HTTPSConnection(
+                    self.netloc, timeout=self.timeout, context=self.context
+                )
+            else:
+                self._connection = http.client.HTTPConnection(
+                    self.netloc, timeout=self.timeout
+                )
+        return self._connection
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def post(self, path, data=None):
+        """
+        POST JSON to an API path, retrying with exponential backoff.
+
+        Returns:
+            The decoded JSON response
+
+        Raises:
+            ApiError: If the server rejects the request or every attempt failed
+        """
+        body = json.dumps(data if data is not None else {}).encode("utf-8")
+        headers = {
+            "Authorization": f"Bearer {self.token}",
+            "Content-Type": "application/json",
+            "Accept": "application/json",
+        }
+        error = None
+        for attempt in range(self.max_retries):
+            if attempt:
+                delay = min(self.BACKOFF_MAX, self.BACKOFF_BASE * 2**attempt)
+                time.sleep(delay * random.uniform(0.5, 1.0))
+            try:
+                connection = self._connect()
+                connection.request("POST", self.prefix + path, body, headers)
+                response = connection.getresponse()
+                payload = response.read()
+            except (OSError, http.client.HTTPException) as exc:
+                # The server may have closed the kept-alive connection
+                self.close()
+                error = f"{type(exc).__name__}: {exc}"
+                continue
+
+            if response.status in self.RETRY_STATUSES or response.status >= 500:
+                error = f"HTTP {response.status}"
+                if response.will_close:
+                    self.close()
+                continue
+            if response.will_close:
+                self.close()
+            if response.status >= 400:
+                raise ApiError(
+                    f"POST {path} failed with HTTP {response.status}: "
+                    f"{payload[:500].decode('utf-8', 'replace')}"
+                )
+            return json.loads(payload) if payload else {}
+
+        raise ApiError(
+            f"POST {path} failed after {self.max_retries} attempts ({error})"
+        )
+
+
+class BatchSender:
+    """
+    Sends events to a live log from a background thread.
+
+    Events are buffered up to `max_buffer`: when the buffer is full, add()
+    blocks until the thread has sent a batch. After a request has failed for
+    good, events are dropped so the playbook is never held up.
+    """
+
+    def __init__(self, client, log_id, batch_size, flush_interval, max_buffer):
+        self.client = client
+        self.log_id = log_id
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.max_buffer = max(self.batch_size, max_buffer)
+        self.error = None
+        self._events = deque()
+        self._seq = 0
+        self._closing = False
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(
+            target=self._run, name="ansibeau-sender", daemon=True
+        )
+        self._thread.start()
+
+    def add(self, event):
+        with self._condition:
+            while (
+                len(self._events) >= self.max_buffer
+                and self.error is None
+                and self._thread.is_alive()
+            ):
+                self._condition.wait()
+            if self.error is not None:
+                return
+            self._events.append(event)
+            if len(self._events) >= self.batch_size:
+                self._condition.notify_all()
+
+    def close(self):
+        """Send the remaining events and finalize the log."""
+        with self._condition:
+            self._closing = True
+            self._condition.notify_all()
+        self._thread.join()
+        try:
+            if self.error is None:
+                self.client.post(f"/api/logs/{self.log_id}/finalize/")
+        except ApiError as exc:
+            self.error = str(exc)
+        finally:
+            self.client.close()
+
+    def _next_batch(self):
+        with self._condition:
+            deadline = time.monotonic() + self.flush_interval
+            while len(self._events) < self.batch_size and not self._closing:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+            count = min(len(self._events), self.batch_size)
+            batch = [self._events.popleft() for _ in range(count)]
+            self._condition.notify_all()
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if not batch:
+                if self._closing:
+                    return
+                continue
+            try:
+                self.client.post(
+                    f"/api/logs/{self.log_id}/results/",
+                    {"seq": self._seq, "events": batch},
+                )
+            except ApiError as exc:
+                with self._condition:
+                    self.error = str(exc)
+                    self._events.clear()
+                    self._condition.notify_all()
+                return
+            self._seq += 1
+
+
+class CallbackModule(CallbackBase):
+    """Streams playbook results to Ansibeau."""
+
+    CALLBACK_VERSION = 2.0
+    CALLBACK_TYPE = "notification"
+    CALLBACK_NAME = "ansibeau"
+    CALLBACK_NEEDS_ENABLED = True
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.sender = None
+        self.disabled = False
+
+    def set_options(self, task_keys=None, var_options=None, direct=None):
+        super().set_options(task_keys=task_keys, var_options=var_options, direct=direct)
+        if not self.get_option("url") or not self.get_option("token"):
+            self._display.warning(
+                "The ansibeau callback needs ANSIBEAU_URL and ANSIBEAU_TOKEN, "
+                "results will not be sent"
+            )
+            self.disabled = True
+
+    def _send(self, event):
+        if self.sender is not None:
+            self.sender.add(event)
+
+    def v2_playbook_on_start(self, playbook):
+        if self.disabled:
+            return
+        title = self.get_option("title") or os.path.basename(playbook._file_name)
+        try:
+            client = AnsibeauClient(
+                self.get_option("url"),
+                self.get_option("token"),
+                timeout=self.get_option("timeout"),
+                max_retries=self.get_option("max_retries"),
+                validate_certs=self.get_option("validate_certs"),
+            )
+            log = client.post("/api/logs/live/", {"title": title})
+        except ApiError as exc:
+            self._display.warning(f"Could not create the Ansibeau log: {exc}")
+            self.disabled = True
+            return
+
+        self.sender = BatchSender(
+            client,
+            log["id"],
+            batch_size=self.get_option("batch_size"),
+            flush_interval=self.get_option("flush_interval"),
+            max_buffer=self.get_option("max_buffer"),
+        )
+        # Finalize the log even if the run is interrupted
+        atexit.register(self._finish)
+
+        web_url = self.get_option("web_url")
+        if web_url:
+            self._display.display(
+                f"Ansibeau: {web_url.rstrip('/')}/log/{log['id']}", screen_only=True
+            )
+
+    def v2_playbook_on_play_start(self, play):
+        self._send(
+            {
+                "event": "play",
+                "name": play.get_name().strip() or "PLAY",
+                "date": datetime.now(timezone.utc).isoformat(),
+            }
+        )
+
+    def v2_playbook_on_task_start(self, task, is_conditional):
+        self._send({"event": "task", "name": task.get_name().strip()})
+
+    def v2_playbook_on_handler_task_start(self, task):
+        self._send({"event": "task", "name": task.get_name().strip()})
+
+    def _send_result(self, result, status, message=None):
+        self._send(
+            {
+                "event": "result",
+                "host": result._host.get_name(),
+                "status": status,
+                "message": message,
+            }
+        )
+
+    def v2_runner_on_ok(self, result):
+        status = "changed" if result._result.get("changed", False) else "ok"
+        self._send_result(result, status)
+
+    def v2_runner_on_failed(self, result, ignore_errors=False):
+        self._send_result(result, "fatal", failure_message(result._result))
+
+    def v2_runner_on_skipped(self, result):
+        self._send_result(result, "skipping")
+
+    def v2_runner_on_unreachable(self, result):
+        self._send_result(result, "unreachable", failure_message(result._result))
+
+    def v2_playbook_on_stats(self, stats):
+        for host in sorted(stats.processed):
+            summary = stats.summarize(host)
+            self._send(
+                {
+                    "event": "recap",
+                    "host": host,
+                    "stats": {
+                        "ok": summary["ok"],
+                        "changed": summary["changed"],
+                        "unreachable": summary["unreachable"],
+                        "failed": summary["failures"],
+                        "skipped": summary["skipped"],
+                        "rescued": summary["rescued"],
+                        "ignored": summary["ignored"],
+                    },
+                }
+            )
+        self._finish()
+
+    def _finish(self):
+        sender, self.sender = self.sender, None
+        if sender is None:
+            return
+        sender.close()
+        if sender.error is not None:
+            self._display.warning(f"Ansibeau results incomplete: {sender.error}")
+
+
+def failure_message(result):
+    """Return the message of a failed result, like the log parser extracts it."""
+    message = result.get("msg")
+    if isinstance(message, list):
+        message = "\n".join(str(item) for item in message)
+    if not message:
+        message = result.get("stderr") or result.get("module_stderr")
+    if not message:
+        return None
+    return str(message)[:MAX_MESSAGE_LENGTH]